@@ -0,0 +1,163 @@
+import os
+
+import streamlit as st
+
+from alert_ingest import (DEFAULT_CHUNK_ROWS, count_techniques, detect_format, list_server_exports, rank_groups,
+                          server_export_path, unknown_techniques)
+from config import ALERTS_DIR
+
+
+def _ingest(fileobj, alert_format, field, total_bytes):
+    """
+    Count the techniques of an alert file, with a progress bar and throughput.
+
+    Args:
+        fileobj (file): Binary file object of the alerts
+        alert_format (str): "csv" or "jsonl"
+        field (str): Column or field of the technique IDs (None to guess)
+        total_bytes (int): Size of the file, for the progress bar
+
+    Returns:
+        tuple: (Counter of technique IDs, IngestStats)
+    """
+    progress_bar = st.progress(0.0, text="Reading alerts...")
+
+    def report(rows, bytes_read):
+        fraction = min(bytes_read / total_bytes, 1.0) if total_bytes else 0.0
+        progress_bar.progress(fraction, text=f"Read {rows:,} alerts ({bytes_read / 1e6:,.1f} MB)")
+
+    try:
+        return count_techniques(fileobj, alert_format, field=field, chunk_rows=DEFAULT_CHUNK_ROWS, progress=report)
+    finally:
+        progress_bar.empty()
+
+
+def display_alert_analysis_page(knowledge_base):
+    """
+    Display the Alert Analysis page: groups ranked against the techniques seen in SIEM alerts.
+
+    The counts are kept in the session, so changing the ranking options does
+    not read the file again.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
+    """
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-header">🚨 Alert Analysis</div>', unsafe_allow_html=True)
+
+    st.markdown("""
+    Upload a CSV or JSONL export of SIEM alerts carrying ATT&CK technique IDs. The file is read in
+    chunks and only the number of alerts per technique is kept, then threat groups are ranked by
+    how much of what was observed they are known to use.
+    """)
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        uploaded_file = st.file_uploader("Alert export", type=["csv", "jsonl", "ndjson", "json"])
+        # Only the exports of the directory configured on the server can be picked, never a typed path
+        server_name = st.selectbox(
+            "Or an export on the server",
+            [""] + list_server_exports(ALERTS_DIR),
+            format_func=lambda name: name or "None",
+            help="Large exports can be read straight from the server's alerts directory (THREAT_CARVER_ALERTS_DIR)"
+        ) if ALERTS_DIR else ""
+    with col2:
+        field = st.text_input(
+            "Technique column or field",
+            placeholder="Guess",
+            help="CSV column or JSON field (dots for nested fields, e.g. threat.technique.id). "
+                 "When empty, common column names are tried, then every field is scanned."
+        ).strip() or None
+
+    if uploaded_file is not None:
+        source = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, "file_id", None), field)
+    elif server_name:
+        try:
+            server_path = server_export_path(ALERTS_DIR, server_name)
+            source = (server_path, os.path.getsize(server_path), os.path.getmtime(server_path), field)
+        except (ValueError, OSError):
+            st.error(f"{server_name} is no longer available in the alerts directory.")
+            st.markdown('</div>', unsafe_allow_html=True)
+            return
+    else:
+        st.markdown('<div class="alert alert-info">Choose an alert file to analyze.</div>', unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+
+    # Read the file only when it (or the field) changes
+    if st.session_state.get("alert_analysis_source") != source:
+        try:
+            alert_format = detect_format(source[0])
+            if uploaded_file is not None:
+                uploaded_file.seek(0)
+                counts, stats = _ingest(uploaded_file, alert_format, field, source[1])
+            else:
+                with open(server_path, "rb") as alert_file:
+                    counts, stats = _ingest(alert_file, alert_format, field, source[1])
+        except (ValueError, OSError) as e:
+            st.error(f"Could not read the alerts: {e}")
+            st.markdown('</div>', unsafe_allow_html=True)
+            return
+        st.session_state["alert_analysis_source"] = source
+        st.session_state["alert_analysis_result"] = (counts, stats)
+    counts, stats = st.session_state["alert_analysis_result"]
+
+    # Throughput of the ingestion
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Alerts", f"{stats.rows:,}")
+    col2.metric("Techniques seen", len(counts))
+    col3.metric("Alerts per second", f"{stats.rows_per_second:,.0f}")
+    col4.metric("MB per second", f"{stats.megabytes_per_second:,.1f}")
+    st.caption(f"{stats.bytes_read / 1e6:,.1f} MB read in {stats.seconds:.2f} s, "
+               f"{stats.technique_hits:,} technique IDs found "
+               f"({'column ' + repr(stats.field) if stats.field else 'all fields scanned'})")
+
+    if not counts:
+        st.warning("No ATT&CK technique IDs were found in this file.")
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+
+    unknown = unknown_techniques(knowledge_base, counts)
+    if unknown:
+        with st.expander(f"{len(unknown)} technique IDs not in the ATT&CK data"):
+            st.dataframe([{"Technique ID": tech_id, "Alerts": count} for tech_id, count in unknown],
+                         use_container_width=True, hide_index=True)
+
+    # Ranking of the groups
+    st.markdown("### 🎯 Groups Matching the Observed Techniques")
+    st.caption("Each observed technique a group uses adds log(1 + alerts) × log(1 + groups / groups using it), "
+               "so repeated alerts count less and techniques used by few groups count more. "
+               "Alerts for a sub-technique also count for its parent.")
+    top_k = st.slider("Groups to show", min_value=5, max_value=100, value=20, step=5)
+    ranking = rank_groups(knowledge_base, counts, limit=top_k)
+    if ranking.empty:
+        st.markdown('<div class="alert alert-info">No threat group uses the observed techniques.</div>',
+                    unsafe_allow_html=True)
+    else:
+        ranking = ranking.rename(columns={
+            "group": "Group", "score": "Score", "matched": "Matched Techniques",
+            "group_techniques": "Group Techniques", "coverage": "Coverage",
+            "matched_techniques": "Technique IDs"
+        })
+        st.dataframe(ranking, use_container_width=True, hide_index=True,
+                     column_config={"Coverage": st.column_config.ProgressColumn(
+                         "Coverage", min_value=0.0, max_value=1.0, format="%.2f")})
+
+        csv = ranking.to_csv(index=False)
+        st.download_button(
+            label="📥 Download Ranking as CSV",
+            data=csv,
+            file_name="alert_group_ranking.csv",
+            mime="text/csv",
+        )
+
+    # Most frequent observed techniques
+    with st.expander("Observed techniques"):
+        st.dataframe([{"Technique ID": tech_id,
+                       "Name": knowledge_base.technique_by_id[tech_id].name
+                       if tech_id in knowledge_base.technique_by_id else "",
+                       "Alerts": count}
+                      for tech_id, count in counts.most_common()],
+                     use_container_width=True, hide_index=True)
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,453 @@
+"""
+Technique counts from SIEM alert exports, and groups ranked against them.
+
+Alert exports can have millions of rows, so they are never loaded whole: CSV
+files with a technique column are read in chunks of rows (that column only),
+JSONL files with a technique field line by line, JSON array exports one entry
+at a time, and any other file is scanned in large blocks of raw bytes. Only
+the running count of each technique ID is kept. Memory therefore grows with
+the chunk size and the number of distinct techniques, not with the size of
+the file.
+
+Groups are then ranked by the techniques they share with the observed ones,
+each weighted by how often it was seen and by how few groups use it, with the
+group technique bitsets of group_similarity.py.
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+from collections import Counter, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from stix_stream import iter_array_items
+
+# ATT&CK technique and sub-technique IDs, e.g. T1059 or t1059.001
+TECHNIQUE_ID_RE = re.compile(r"\b[Tt]\d{4}(?:\.\d{3})?\b")
+BYTES_TECHNIQUE_ID_RE = re.compile(TECHNIQUE_ID_RE.pattern.encode("ascii"))
+
+# Column or field names tried, in order, when none is given
+TECHNIQUE_FIELD_NAMES = (
+    "technique_id", "technique_ids", "mitre_technique_id", "attack_technique_id",
+    "threat.technique.id", "threat.technique.subtechnique.id",
+    "technique", "techniques", "mitre_technique", "attack_technique", "mitre_attack",
+)
+
+# Supported alert file formats, by file extension (.json files can be JSON Lines or one JSON array)
+ALERT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl"}
+
+# Rows per CSV chunk / JSONL batch, between two progress reports
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Bytes per block when a file is scanned without being parsed
+RAW_BLOCK_BYTES = 4 << 20
+
+
+class IngestStats(namedtuple("IngestStats", ["rows", "bytes_read", "seconds", "technique_hits", "field"])):
+    """
+    Size and throughput of one alert file ingestion.
+
+    Attributes:
+        rows (int): Alert rows read
+        bytes_read (int): Bytes read from the file
+        seconds (float): Wall-clock time spent reading and counting
+        technique_hits (int): Technique IDs found (a row can have several)
+        field (str): The column or field the IDs were read from (None if every field was scanned)
+    """
+
+    __slots__ = ()
+
+    @property
+    def rows_per_second(self):
+        """float: Alert rows read per second"""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        """float: Megabytes read per second"""
+        return self.bytes_read / 1e6 / self.seconds if self.seconds else 0.0
+
+
+class _CountingReader(io.RawIOBase):
+    """Binary file wrapper counting the bytes read through it."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._raw.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        self.bytes_read += size
+        return size
+
+
+def detect_format(filename):
+    """
+    Guess the format of an alert file from its name.
+
+    Args:
+        filename (str): File name or path
+
+    Returns:
+        str: "csv" or "jsonl"
+
+    Raises:
+        ValueError: If the extension is not a supported one
+    """
+    lowered = filename.lower()
+    for extension, alert_format in ALERT_FORMATS.items():
+        if lowered.endswith(extension):
+            return alert_format
+    raise ValueError(f"Unsupported alert file {filename!r} (expected one of {', '.join(ALERT_FORMATS)})")
+
+
+def list_server_exports(directory):
+    """
+    List the alert exports of a server directory.
+
+    Args:
+        directory (str): The directory set as THREAT_CARVER_ALERTS_DIR
+
+    Returns:
+        list: Sorted names of its regular files with a supported extension, leaving out links to files
+              outside of it (none if it cannot be read)
+    """
+    try:
+        with os.scandir(directory) as entries:
+            names = [entry.name for entry in entries
+                     if entry.is_file() and entry.name.lower().endswith(tuple(ALERT_FORMATS))]
+    except OSError:
+        return []
+    root = os.path.realpath(directory) + os.sep
+    return sorted(name for name in names if os.path.realpath(os.path.join(directory, name)).startswith(root))
+
+
+def server_export_path(directory, name):
+    """
+    Resolve the path of an alert export inside a server directory.
+
+    Symbolic links are followed, so a link pointing out of the directory is refused too.
+
+    Args:
+        directory (str): The directory set as THREAT_CARVER_ALERTS_DIR
+        name (str): Name of the file, as returned by list_server_exports()
+
+    Returns:
+        str: The real path of the file
+
+    Raises:
+        ValueError: If the path is outside the directory
+    """
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"{name!r} is not in the alerts directory")
+    return path
+
+
+def _pick_field(names, field):
+    """
+    Choose the column holding technique IDs.
+
+    Args:
+        names (list): Column names of the file
+        field (str): Requested column (None to guess from TECHNIQUE_FIELD_NAMES)
+
+    Returns:
+        str: The column, or None to scan every column
+
+    Raises:
+        ValueError: If the requested column does not exist
+    """
+    if field:
+        if field not in names:
+            raise ValueError(f"Column {field!r} not found (columns: {', '.join(map(str, names))})")
+        return field
+    by_lower = {str(name).strip().lower(): name for name in names}
+    for candidate in TECHNIQUE_FIELD_NAMES:
+        if candidate in by_lower:
+            return by_lower[candidate]
+    return None
+
+
+def _count_values(values, counts):
+    """
+    Add the technique IDs found in a column of strings to counts.
+
+    Alert columns repeat the same few values, so each distinct value is
+    searched once and its IDs are weighted by how many cells hold it.
+
+    Args:
+        values (pandas.Series): Cell values (a cell can list several IDs)
+        counts (Counter): Technique ID counts, updated in place
+
+    Returns:
+        int: The number of IDs found
+    """
+    hits = 0
+    for value, cells in values.value_counts().items():
+        for technique_id in TECHNIQUE_ID_RE.findall(str(value)):
+            counts[technique_id.upper()] += cells
+            hits += cells
+    return hits
+
+
+def _iter_raw(reader, counts):
+    """
+    Count the technique IDs of a text file without parsing it, yielding (rows, hits, None) after each block.
+
+    The file is read in large blocks cut at the last line break, and the IDs
+    are found by one regular expression pass over each block.
+    """
+    tail = b""
+    while True:
+        block = reader.read(RAW_BLOCK_BYTES)
+        if not block:
+            break
+        block = tail + block
+        cut = block.rfind(b"\n") + 1
+        block, tail = block[:cut], block[cut:]
+        if block:
+            yield block.count(b"\n"), _count_block(block, counts), None
+    if tail.strip():
+        yield 1, _count_block(tail, counts), None
+
+
+def _count_block(block, counts):
+    """Add the technique IDs found in a block of bytes to counts, returning how many were found."""
+    found = Counter(BYTES_TECHNIQUE_ID_RE.findall(block))
+    for technique_id, count in found.items():
+        counts[technique_id.decode("ascii").upper()] += count
+    return sum(found.values())
+
+
+def _iter_csv(reader, field, chunk_rows, counts):
+    """Count the technique IDs of a CSV file, yielding (rows, hits, field) after each chunk."""
+    header_line = reader.readline().decode("utf-8", errors="replace")
+    header = next(csv.reader([header_line]), [])
+    column = _pick_field(header, field)
+    if column is None:
+        # No technique column: every column is scanned, which needs no CSV parsing at all
+        yield from _iter_raw(reader, counts)
+        return
+    # The header line has been consumed, so the column is read by position (SIEM exports often repeat
+    # column names, which pandas refuses as explicit names)
+    position = header.index(column)
+    text = io.TextIOWrapper(reader, encoding="utf-8", errors="replace", newline="")
+    chunks = pd.read_csv(text, header=None, usecols=[position], dtype=str,
+                         chunksize=chunk_rows, on_bad_lines="skip")
+    for chunk in chunks:
+        yield len(chunk), _count_values(chunk[position], counts), column
+
+
+def _field_value(record, field):
+    """Get a field of a JSON record, following dots into nested objects (e.g. threat.technique.id)."""
+    if field in record:
+        return record[field]
+    value = record
+    for part in field.split("."):
+        if isinstance(value, list):
+            value = [item.get(part) for item in value if isinstance(item, dict)]
+        elif isinstance(value, dict):
+            value = value.get(part)
+        else:
+            return None
+    return value
+
+
+def _value_ids(value):
+    """Find the technique IDs of a JSON field value (a string, a list of IDs or any other value)."""
+    if isinstance(value, list):
+        # e.g. ECS threat.technique.id, a list of IDs
+        value = " ".join(item if isinstance(item, str) else json.dumps(item) for item in value)
+    elif not isinstance(value, str):
+        value = json.dumps(value)
+    return TECHNIQUE_ID_RE.findall(value)
+
+
+def _iter_json_array(reader, field, chunk_rows, counts):
+    """Count the technique IDs of a JSON array of alerts, yielding (rows, hits, field) after each batch."""
+    rows = hits = 0
+    for record in iter_array_items(reader):
+        rows += 1
+        if not field:
+            found = _value_ids(record)
+        elif isinstance(record, dict):
+            found = _value_ids(_field_value(record, field))
+        else:
+            found = ()
+        if found:
+            counts.update(technique_id.upper() for technique_id in found)
+            hits += len(found)
+        if rows == chunk_rows:
+            yield rows, hits, field
+            rows = hits = 0
+    if rows:
+        yield rows, hits, field
+
+
+def _iter_jsonl(reader, field, chunk_rows, counts):
+    """Count the technique IDs of a JSONL file (or a JSON array), yielding (rows, hits, field) after each batch."""
+    if reader.peek(1).lstrip(b" \t\r\n")[:1] == b"[":
+        # A .json export holding one array of alerts rather than one alert per line
+        yield from _iter_json_array(reader, field, chunk_rows, counts)
+        return
+    if not field:
+        # Without a field, the raw lines are scanned, which avoids parsing the JSON at all
+        yield from _iter_raw(reader, counts)
+        return
+    rows = hits = 0
+    for line in reader:
+        if not line.strip():
+            continue
+        rows += 1
+        # Only lines mentioning a technique ID somewhere are worth parsing
+        if BYTES_TECHNIQUE_ID_RE.search(line):
+            try:
+                value = _field_value(json.loads(line), field)
+            except (ValueError, AttributeError):
+                value = None
+            found = _value_ids(value)
+            if found:
+                counts.update(technique_id.upper() for technique_id in found)
+                hits += len(found)
+        if rows == chunk_rows:
+            yield rows, hits, field
+            rows = hits = 0
+    if rows:
+        yield rows, hits, field
+
+
+def count_techniques(fileobj, alert_format, field=None, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """
+    Stream an alert file and count the technique IDs it mentions.
+
+    Args:
+        fileobj (file): Binary file object, e.g. open(path, "rb") or a Streamlit upload
+        alert_format (str): "csv" or "jsonl" (see detect_format); "jsonl" also reads a file holding one JSON array
+        field (str): Column (CSV) or field (JSONL, dots for nested fields) holding the IDs.
+                     CSV columns are guessed from TECHNIQUE_FIELD_NAMES when not given;
+                     otherwise every column or the whole JSON line is scanned.
+        chunk_rows (int): Rows parsed between two progress reports (files scanned without
+                          parsing report after each block of RAW_BLOCK_BYTES)
+        progress (callable): Called as progress(rows, bytes_read) after each chunk
+
+    Returns:
+        tuple: (Counter of upper-case technique IDs, IngestStats)
+
+    Raises:
+        ValueError: If the format is unknown, the CSV column does not exist or a JSON array is malformed
+    """
+    if alert_format not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown alert format {alert_format!r}")
+
+    reader = io.BufferedReader(_CountingReader(fileobj), buffer_size=1 << 20)
+    iterate = _iter_csv if alert_format == "csv" else _iter_jsonl
+    counts = Counter()
+    rows = hits = 0
+    used_field = field
+    started = time.perf_counter()
+    for chunk_rows_read, chunk_hits, used_field in iterate(reader, field, chunk_rows, counts):
+        rows += chunk_rows_read
+        hits += chunk_hits
+        if progress is not None:
+            progress(rows, reader.raw.bytes_read)
+    seconds = time.perf_counter() - started
+    return counts, IngestStats(rows, reader.raw.bytes_read, seconds, hits, used_field)
+
+
+def roll_up(technique_counts):
+    """
+    Add the counts of sub-techniques to their parent techniques.
+
+    An alert for T1059.001 is also evidence of T1059, which is how most groups
+    are mapped when the exact sub-technique is unknown.
+
+    Args:
+        technique_counts (Counter): Technique ID counts
+
+    Returns:
+        Counter: Counts including the rolled-up parents
+    """
+    rolled = Counter(technique_counts)
+    for technique_id, count in technique_counts.items():
+        if "." in technique_id:
+            rolled[technique_id.split(".", 1)[0]] += count
+    return rolled
+
+
+def rank_groups(knowledge_base, technique_counts, limit=None):
+    """
+    Rank groups by the weighted overlap of their techniques with observed ones.
+
+    Each observed technique a group uses adds log(1 + times seen) x
+    log(1 + number of groups / groups using it) to the group's score: repeated
+    alerts count with diminishing returns, and techniques used by few groups
+    tell more about who is behind them than ones used by everyone.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): Groups and their techniques
+        technique_counts (Counter): Observed technique ID counts (from count_techniques)
+        limit (int): Keep only the top groups (all groups with a match by default)
+
+    Returns:
+        pandas.DataFrame: Columns group, score, matched, group_techniques, coverage
+                          (share of the group's techniques observed) and
+                          matched_techniques, best match first
+    """
+    columns = ["group", "score", "matched", "group_techniques", "coverage", "matched_techniques"]
+    counts = roll_up(technique_counts)
+    observed = [(tech_id, count) for tech_id, count in counts.items() if tech_id in knowledge_base.technique_by_id]
+    similarity = knowledge_base.group_similarity
+    if not observed or not similarity.groups:
+        return pd.DataFrame(columns=columns)
+
+    tech_ids = [tech_id for tech_id, _ in observed]
+    membership = similarity.membership([knowledge_base.technique_by_id[tech_id].stix_id for tech_id in tech_ids])
+    groups_using = membership.sum(axis=0)
+    group_count = len(similarity.groups)
+    rarity = np.where(groups_using > 0, np.log1p(group_count / np.maximum(groups_using, 1)), 0.0)
+    weights = np.log1p(np.array([count for _, count in observed], dtype=np.float64)) * rarity
+
+    scores = membership @ weights
+    matched = membership.sum(axis=1)
+    rows = np.flatnonzero(matched)
+    # Best score first, then most matched techniques, then by name (row order)
+    rows = rows[np.lexsort((rows, -matched[rows], -scores[rows]))]
+    if limit is not None:
+        rows = rows[:limit]
+
+    sizes = np.array([similarity.technique_count(similarity.groups[row]) for row in rows], dtype=np.int64)
+    return pd.DataFrame({
+        "group": [similarity.groups[row] for row in rows],
+        "score": np.round(scores[rows], 3),
+        "matched": matched[rows],
+        "group_techniques": sizes,
+        "coverage": np.round(matched[rows] / np.maximum(sizes, 1), 3),
+        "matched_techniques": [", ".join(sorted(tech_ids[column] for column in np.flatnonzero(membership[row])))
+                               for row in rows],
+    }, columns=columns)
+
+
+def unknown_techniques(knowledge_base, technique_counts):
+    """
+    Get the observed technique IDs that are not in the knowledge base.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The knowledge base
+        technique_counts (Counter): Observed technique ID counts
+
+    Returns:
+        list: (technique ID, count) tuples, most seen first
+    """
+    return [(tech_id, count) for tech_id, count in technique_counts.most_common()
+            if tech_id not in knowledge_base.technique_by_id]
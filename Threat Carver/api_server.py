@@ -0,0 +1,382 @@
+"""
+Read-only JSON API over the ATT&CK knowledge base.
+
+Every Streamlit session reruns the whole app script, which is far too heavy
+for tools that only need a lookup. This server loads the knowledge base once
+(through KnowledgeBaseRefresher, so new ATT&CK releases are swapped in in the
+background like in the app) and answers every client from that single
+in-memory index:
+
+    GET /groups                      every group with its technique count
+    GET /groups/{id}/techniques      techniques of a group (ATT&CK ID, name or STIX ID)
+    GET /techniques/{id}             one technique with its sub-techniques and the groups using it
+    GET /search?q=...&limit=&procedures=1
+                                     full-text technique search
+    GET /atomics/{id}                Atomic Red Team tests of a technique
+    GET /health                      loaded domains, releases and data generation
+
+Requests are handled by a fixed pool of threads. Responses are serialized
+once per data generation and kept in a small LRU cache with their ETag and
+gzip-compressed body, so repeated lookups cost a dictionary hit, and clients
+revalidating with If-None-Match get an empty 304.
+
+Usage:
+    python api_server.py [--host HOST] [--port PORT] [--workers N]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import yaml
+
+from atomics import open_atomics, summarize_tests
+from config import API_HOST, API_PORT, API_WORKERS, ATTACK_DOMAINS, SHARED_STORE
+from data_refresh import KnowledgeBaseRefresher
+from shared_store import StoreAtomics
+
+# Responses kept serialized (and compressed) per data generation
+RESPONSE_CACHE_SIZE = 4096
+
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+
+# Default and maximum number of search results
+SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+
+
+class ApiError(Exception):
+    """An error answered with a JSON body and an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CachedResponse:
+    """A serialized JSON response, its ETag and its gzip-compressed body (built on first use)."""
+
+    __slots__ = ("status", "body", "etag", "_gzipped")
+
+    def __init__(self, status, payload):
+        self.status = status
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+        self._gzipped = None
+
+    def gzipped(self):
+        """Get the gzip-compressed body (compressed once, then reused)."""
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+def _group_summary(group, technique_count=None):
+    summary = {"id": group.group_id, "name": group.name, "stix_id": group.stix_id, "domains": list(group.domains)}
+    if technique_count is not None:
+        summary["technique_count"] = technique_count
+    return summary
+
+
+def _technique_summary(tech):
+    return {"id": tech.tech_id, "name": tech.name, "tactics": list(tech.tactics), "domain": tech.domain,
+            "stix_id": tech.stix_id}
+
+
+class ThreatCarverApi:
+    """
+    The API endpoints, answered from the current knowledge base of a refresher.
+    """
+
+    def __init__(self, refresher, atomics=None):
+        """
+        Args:
+            refresher (KnowledgeBaseRefresher): Holder of the current knowledge base
+            atomics (AtomicsLoader, AtomicsMirror or StoreAtomics): Atomic Red Team tests (the configured
+                                                                    source or shared store by default)
+        """
+        self._refresher = refresher
+        self._atomics = atomics
+        self._atomics_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        # (generation, group lookup) of the current knowledge base, replaced as a whole
+        self._groups = (None, None)
+        self._routes = (
+            (re.compile(r"^/groups/?$"), self.groups),
+            (re.compile(r"^/groups/([^/]+)/techniques/?$"), self.group_techniques),
+            (re.compile(r"^/techniques/([^/]+)/?$"), self.technique),
+            (re.compile(r"^/search/?$"), self.search),
+            (re.compile(r"^/atomics/([^/]+)/?$"), self.atomics),
+            (re.compile(r"^/health/?$"), self.health),
+        )
+
+    def _group_lookup(self, state):
+        """Get the group lookup (ATT&CK ID, name and STIX ID, lower case) of a knowledge base state."""
+        generation, lookup = self._groups
+        if generation != state.generation:
+            lookup = {}
+            for group in state.knowledge_base.groups_dict.values():
+                lookup[group.stix_id.lower()] = group
+                lookup[group.name.lower()] = group
+                if group.group_id:
+                    lookup[group.group_id.lower()] = group
+            self._groups = (state.generation, lookup)
+        return lookup
+
+    def _atomics_loader(self):
+        with self._atomics_lock:
+            if self._atomics is None:
+                self._atomics = StoreAtomics(SHARED_STORE) if SHARED_STORE else open_atomics()
+            return self._atomics
+
+    def respond(self, path, query):
+        """
+        Answer a GET request.
+
+        The knowledge base state is read once, so a response never mixes two
+        releases; cached responses are keyed by its generation.
+
+        Args:
+            path (str): URL path (percent-decoded)
+            query (dict): Query parameters, as returned by urllib.parse.parse_qs()
+
+        Returns:
+            CachedResponse: The response
+        """
+        state = self._refresher.state
+        key = (state.generation, path, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        for pattern, endpoint in self._routes:
+            match = pattern.match(path)
+            if match:
+                try:
+                    response = CachedResponse(HTTPStatus.OK, endpoint(state, *match.groups(), query=query))
+                except ApiError as e:
+                    response = CachedResponse(e.status, {"error": str(e)})
+                break
+        else:
+            response = CachedResponse(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint {path}"})
+
+        # Atomics come from a cache that fills up over time, so misses are not kept
+        if response.status == HTTPStatus.OK or not path.startswith("/atomics"):
+            with self._lock:
+                self._cache[key] = response
+                while len(self._cache) > RESPONSE_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return response
+
+    def groups(self, state, query):
+        """GET /groups: every group, by name."""
+        kb = state.knowledge_base
+        counts = kb.group_to_techniques
+        return [_group_summary(group, len({usage.technique.stix_id for usage in counts.get(group.name, ())}))
+                for group in sorted(kb.groups_dict.values(), key=lambda group: group.name.lower())]
+
+    def group_techniques(self, state, group_key, query):
+        """GET /groups/{id}/techniques: the techniques of a group, with their procedures."""
+        group = self._group_lookup(state).get(group_key.lower())
+        if group is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown group {group_key}")
+        usages = state.knowledge_base.group_to_techniques.get(group.name, ())
+        return {
+            "group": _group_summary(group),
+            "techniques": [dict(_technique_summary(usage.technique), procedure=usage.procedure,
+                                relationship_id=usage.stix_id)
+                           for usage in usages],
+        }
+
+    def technique(self, state, tech_id, query):
+        """GET /techniques/{id}: a technique, its parent and sub-techniques, and the groups using it."""
+        kb = state.knowledge_base
+        tech = kb.technique_by_id.get(tech_id.upper()) or kb.techniques_dict.get(tech_id)
+        if tech is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown technique {tech_id}")
+        parent = kb.technique_tree.parent(tech.stix_id)
+        return dict(
+            _technique_summary(tech),
+            description=tech.description,
+            parent=_technique_summary(parent) if parent is not None else None,
+            subtechniques=[_technique_summary(sub) for sub in kb.technique_tree.subtechniques(tech.stix_id)],
+            groups=[dict(_group_summary(usage.group), procedure=usage.procedure)
+                    for usage in kb.groups_using(tech.tech_id)],
+        )
+
+    def search(self, state, query):
+        """GET /search?q=...: techniques matching a full-text query, most relevant first."""
+        text = (query.get("q") or [""])[0].strip()
+        if not text:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Missing query parameter q")
+        try:
+            limit = int((query.get("limit") or [SEARCH_LIMIT])[0])
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be an integer")
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        include_procedures = (query.get("procedures") or ["0"])[0].lower() in ("1", "true", "yes")
+        results = state.knowledge_base.search_techniques(text, include_procedures, limit)
+        return {"query": text, "results": [_technique_summary(tech) for tech in results]}
+
+    def atomics(self, state, tech_id, query):
+        """GET /atomics/{id}: the Atomic Red Team tests of a technique."""
+        tech_id = tech_id.upper()
+        if tech_id not in state.knowledge_base.technique_by_id:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown technique {tech_id}")
+        try:
+            atomic_data = self._atomics_loader().get(tech_id)
+        except yaml.YAMLError as e:
+            raise ApiError(HTTPStatus.BAD_GATEWAY, f"Invalid Atomic Red Team file for {tech_id}: {e}")
+        if not atomic_data:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No Atomic Red Team tests for {tech_id}")
+        return {
+            "technique_id": tech_id,
+            "summary": [summary._asdict() for summary in summarize_tests(tech_id, atomic_data)],
+            "atomic_tests": atomic_data.get("atomic_tests") or [],
+        }
+
+    def health(self, state, query):
+        """GET /health: what is loaded."""
+        kb = state.knowledge_base
+        return {
+            "generation": state.generation,
+            "loaded_at": state.loaded_at,
+            "domains": list(kb.domains),
+            "releases": dict(kb.releases),
+            "errors": {domain: str(error) for domain, error in state.errors.items()},
+            "groups": len(kb.groups_dict),
+            "techniques": len(kb.techniques_dict),
+        }
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Serves the GET requests of a ThreadPoolHTTPServer from its ThreatCarverApi."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "ThreatCarverAPI/1.0"
+    # Headers and body are written separately; without this, keep-alive clients wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._answer(send_body=True)
+
+    def do_HEAD(self):
+        self._answer(send_body=False)
+
+    def _answer(self, send_body):
+        url = urlsplit(self.path)
+        response = self.server.api.respond(unquote(url.path), parse_qs(url.query))
+
+        if response.status == HTTPStatus.OK and self._etag_matches(response.etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", response.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = response.body
+        compressed = len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if compressed:
+            body = response.gzipped()
+        self.send_response(response.status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        if response.status == HTTPStatus.OK:
+            self.send_header("ETag", response.etag)
+            # Clients may keep the response but must revalidate it (a cheap 304 when unchanged)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _etag_matches(self, etag):
+        header = self.headers.get("If-None-Match")
+        if not header:
+            return False
+        candidates = [candidate.strip() for candidate in header.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    HTTP server handing every connection to a fixed pool of worker threads.
+
+    Unlike ThreadingHTTPServer, which starts a thread per connection, the
+    number of threads stays bounded however many clients connect.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, api, workers=API_WORKERS, quiet=False):
+        """
+        Args:
+            address (tuple): (host, port) to listen on
+            api (ThreatCarverApi): The endpoints
+            workers (int): Worker threads
+            quiet (bool): Do not log every request
+        """
+        super().__init__(address, ApiRequestHandler)
+        self.api = api
+        self.quiet = quiet
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-only JSON API over the ATT&CK knowledge base")
+    parser.add_argument("--host", default=API_HOST, help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=API_PORT, help="Port to listen on (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help="Threads handling requests (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="Do not log every request")
+    args = parser.parse_args(argv)
+
+    print("Loading the ATT&CK knowledge base...", file=sys.stderr)
+    refresher = KnowledgeBaseRefresher(ATTACK_DOMAINS)
+    refresher.start()
+    server = ThreadPoolHTTPServer((args.host, args.port), ThreatCarverApi(refresher), args.workers, args.quiet)
+    print(f"Serving the Threat Carver API on http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        refresher.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
-import requests
 import json
+import logging
+import uuid
 import pandas as pd
 import streamlit as st
 import plotly.express as px
@@ -7,7 +8,18 @@ from datetime import datetime
 import yaml
 
 # Import the technique replication module
-from technique_replication import display_technique_replication_page
+from technique_replication import (display_atomic_test_planner_page, display_technique_replication_page,
+                                   start_atomics_warmup)
+from knowledge_base import DOMAIN_LABELS
+from data_refresh import KnowledgeBaseRefresher
+from alert_analysis import display_alert_analysis_page
+from detection_coverage import display_detection_coverage_page
+from whats_new import display_whats_new_page
+from defense_planning import display_defense_planning
+from config import (ATOMICS_PREFETCH, ATTACK_DOMAINS, ATTACK_LAZY_DOMAINS, METRICS_HOST, METRICS_PORT, PERF_LOG,
+                    PERF_PANEL, SHARED_STORE)
+from instrumentation import count, finish_rerun, get_registry, start_metrics_server, start_rerun, timed
+from table_view import collapse_subtechniques, expand_subtechniques, paginate, tactic_badges
 
 # Set page configuration
 st.set_page_config(
@@ -17,6 +29,21 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Time the stages of this rerun and count what it renders (see instrumentation.py)
+rerun_metrics = start_rerun(session=st.session_state.setdefault("perf_session", uuid.uuid4().hex[:12]))
+
+# The Prometheus endpoint is started (or fails) once per process, and a failure is logged whatever the panel setting
+@st.cache_resource
+def start_metrics_endpoint(port, host):
+    try:
+        start_metrics_server(port, host)
+    except OSError as e:
+        logging.warning("Prometheus metrics endpoint disabled: could not listen on %s:%s (%s)", host, port, e)
+        return e
+    return None
+
+metrics_error = start_metrics_endpoint(METRICS_PORT, METRICS_HOST) if METRICS_PORT else None
+
 # Load external CSS
 def load_css(file_name):
     with open(file_name) as f:
@@ -25,71 +52,57 @@ def load_css(file_name):
 # Load the external CSS file
 load_css('styles.css')
 
-# URL to the latest Enterprise ATT&CK data (MITRE CTI repository)
-ATTACK_JSON_URL = "https://raw.githubusercontent.com/mitre/cti/master/enterprise-attack/enterprise-attack.json"
+# Parse the ATT&CK data once per process and share it between all sessions.
+# cache_resource returns the same object on every rerun instead of a deep copy,
+# and the raw bundle is released as soon as the knowledge base is built.
+# The bundle itself comes from the on-disk snapshot cache (see snapshot_cache.py),
+# and after the first parse it is loaded from a compiled snapshot (see compiled_snapshot.py).
+# The enterprise, mobile and ICS bundles are fetched and parsed concurrently and merged
+# into one knowledge base. A single refresher holds it for the whole process and checks
+# for new bundles in a background thread (see data_refresh.py); lazy domains are merged
+# into it when a session first picks them, so no domain is ever loaded twice.
+@st.cache_resource(show_spinner="Loading MITRE ATT&CK data...")
+def get_refresher(domains):
+    count("attack_data_cache_misses")
+    refresher = KnowledgeBaseRefresher(domains)
+    refresher.start()
+    return refresher
 
-@st.cache_data  # Cache the data to prevent re-downloading on every interaction
-def load_attack_data():
-    resp = requests.get(ATTACK_JSON_URL)
-    resp.raise_for_status()
-    return resp.json()
+# Domains loaded at startup; lazy domains are only loaded once they are picked in the sidebar
+# (a shared store holds all the domains it was built with, so none are lazy then)
+lazy_domains = () if SHARED_STORE else ATTACK_LAZY_DOMAINS
+startup_domains = [domain for domain in ATTACK_DOMAINS if domain not in lazy_domains] or list(ATTACK_DOMAINS[:1])
+extra_domains = st.session_state.get("extra_attack_domains", [])
+loaded_domains = tuple(domain for domain in ATTACK_DOMAINS if domain in startup_domains or domain in extra_domains)
+with timed("load"):
+    refresher = get_refresher(tuple(startup_domains))
+    if any(domain not in refresher.domains for domain in extra_domains):
+        with st.spinner("Loading more MITRE ATT&CK data..."):
+            if not refresher.add_domains(extra_domains) and \
+                    any(domain not in refresher.domains for domain in extra_domains):
+                # The data loaded so far stays in use; the domains are tried again on the next rerun
+                st.error(f"More MITRE ATT&CK data could not be loaded: {refresher.last_error}")
+if not rerun_metrics.counters.get("attack_data_cache_misses"):
+    count("attack_data_cache_hits")
+latest_state = refresher.state
 
-# Load and parse the ATT&CK data
-attack_data = load_attack_data()
+# Each session keeps the knowledge base it started with, so a background refresh never
+# changes the data under an analyst; they switch to the new one from the sidebar.
+# Picking another domain switches to the current knowledge base, which has it
+pinned_domains, kb_state = st.session_state.get("knowledge_base_state", ((), None))
+if kb_state is None or not set(loaded_domains).issubset(pinned_domains):
+    kb_state = latest_state
+    st.session_state["knowledge_base_state"] = (loaded_domains, kb_state)
+knowledge_base, domain_errors = kb_state.knowledge_base, kb_state.errors
 
-# Dictionaries to store techniques and groups
-techniques_dict = {}
-groups_dict = {}
+# Download the Atomic Red Team tests of every technique in the background (once per process)
+if ATOMICS_PREFETCH:
+    start_atomics_warmup(knowledge_base)
 
-for obj in attack_data.get("objects", []):
-    o_type = obj.get("type")
-    if o_type == "attack-pattern":
-        tech_stix_id = obj.get("id")
-        name = obj.get("name", "")
-        description = obj.get("description", "")
-        # Get technique external ID (e.g., T1234 or T1234.001)
-        tech_id = None
-        for ref in obj.get("external_references", []):
-            if ref.get("source_name") == "mitre-attack":
-                tech_id = ref.get("external_id")
-                break
-        # Get tactics from kill_chain_phases
-        tactics = []
-        for phase in obj.get("kill_chain_phases", []):
-            if phase.get("kill_chain_name", "").startswith("mitre"):
-                # phase_name is the tactic name (like "Defense Evasion")
-                tactics.append(phase.get("phase_name"))
-        techniques_dict[tech_stix_id] = {
-            "tech_id": tech_id,
-            "name": name,
-            "description": description,
-            "tactics": tactics
-        }
-    elif o_type == "intrusion-set":
-        group_stix_id = obj.get("id")
-        group_name = obj.get("name", "")
-        group_id = None
-        for ref in obj.get("external_references", []):
-            if ref.get("source_name") == "mitre-attack":
-                group_id = ref.get("external_id")
-                break
-        groups_dict[group_stix_id] = {
-            "name": group_name,
-            "group_id": group_id
-        }
-
-# Build mapping from group name to techniques list
-group_to_techniques = {}
-for obj in attack_data.get("objects", []):
-    if obj.get("type") == "relationship" and obj.get("relationship_type") == "uses":
-        src_id = obj.get("source_ref")
-        tgt_id = obj.get("target_ref")
-        if src_id in groups_dict and tgt_id in techniques_dict:
-            group_name = groups_dict[src_id]["name"]
-            # Copy technique details and add procedure if available
-            tech_info = techniques_dict[tgt_id].copy()
-            tech_info["procedure"] = obj.get("description", "")
-            group_to_techniques.setdefault(group_name, []).append(tech_info)
+# Dictionaries of techniques and groups, and mapping from group name to techniques list
+techniques_dict = knowledge_base.techniques_dict
+groups_dict = knowledge_base.groups_dict
+group_to_techniques = knowledge_base.group_to_techniques
 
 # App header
 st.markdown("""
@@ -114,14 +127,48 @@ with st.sidebar:
     # Updated navigation options
     page = st.radio(
         "Select Page",
-        ["Group Analysis", "Technique Explorer", "Technique Replication", "About Attack Framework"]
+        ["Group Analysis", "Technique Explorer", "Technique Replication", "Atomic Test Planner",
+         "Alert Analysis", "Detection Coverage", "What's New", "About Attack Framework"]
     )
+    rerun_metrics.page = page
     
     st.markdown("---")
     
     st.markdown("### Data Information")
-    st.markdown(f"**Last Updated:** {datetime.now().strftime('%B %d, %Y')}")
     st.markdown("**Source:** MITRE CTI Repository")
+    # Release of each bundle as published by MITRE, and when it was downloaded
+    for domain in knowledge_base.domains:
+        release = knowledge_base.releases.get(domain) or {}
+        bundle = kb_state.bundles.get(domain)
+        details = []
+        if release.get("version"):
+            details.append(f"v{release['version']}")
+        if release.get("modified"):
+            details.append("released " + datetime.fromisoformat(release["modified"][:10]).strftime("%B %d, %Y"))
+        if bundle is not None:
+            details.append("fetched " + datetime.fromtimestamp(bundle.fetched_at).strftime("%B %d, %Y"))
+        st.markdown(f"**{DOMAIN_LABELS.get(domain, domain)}:** " + (", ".join(details) or "version unknown"))
+    if refresher.interval > 0 and refresher.last_checked:
+        st.caption("Checked for new data at " + datetime.fromtimestamp(refresher.last_checked).strftime("%H:%M")
+                   + (f" (failed: {refresher.last_error})" if refresher.last_error else ""))
+    if kb_state.generation < latest_state.generation:
+        st.info("Newer ATT&CK data has been loaded in the background.")
+        if st.button("Switch to the new data"):
+            st.session_state["knowledge_base_state"] = (loaded_domains, latest_state)
+            st.rerun()
+    for domain, error in domain_errors.items():
+        st.warning(f"{DOMAIN_LABELS.get(domain, domain)} ATT&CK could not be loaded: {error}")
+    
+    # Lazy domains are loaded the first time they are selected
+    lazy_options = [domain for domain in ATTACK_DOMAINS if domain not in startup_domains]
+    if lazy_options:
+        st.multiselect(
+            "Load more domains",
+            options=lazy_options,
+            format_func=lambda domain: DOMAIN_LABELS.get(domain, domain),
+            help="Domains loaded here stay loaded for every session",
+            key="extra_attack_domains"
+        )
     
     st.markdown("---")
     
@@ -131,8 +178,12 @@ with st.sidebar:
         1. **Group Analysis**: Select a threat group from the dropdown, filter by tactics if needed, and explore their techniques
         2. **Technique Explorer**: Search for specific techniques and view their details
         3. **Technique Replication**: Find specific techniques and view Atomic Red Team tests to replicate them in a controlled environment
-        4. Use the search bar to find specific techniques or groups
-        5. View detailed information and download as CSV where available
+        4. **Atomic Test Planner**: Filter and summarize every Atomic Red Team test at once, e.g. for the tactics of one group
+        5. **Alert Analysis**: Upload a SIEM alert export and rank threat groups by the techniques observed in it
+        6. **Detection Coverage**: Load your detection-rule inventory and find the coverage gaps of one or all threat groups
+        7. **What's New**: See what changed in the latest ATT&CK release, including new techniques per group
+        8. Use the search bar to find specific techniques or groups
+        9. View detailed information and download as CSV where available
         """)
     
     with st.expander("About Threat Carver"):
@@ -160,12 +211,13 @@ if page == "Group Analysis":
     st.markdown('</div>', unsafe_allow_html=True)
     
     if selected_group:
+        # Technique entries of this group per tactic (a row of the precomputed group x tactic matrix)
+        tactic_matrix = knowledge_base.tactic_matrix
+        group_tactic_counts = tactic_matrix.group_counts(selected_group)
+        group_tactic_counts = group_tactic_counts[group_tactic_counts > 0]
+        
         # Get tactics for filter (unique tactics used by this group's techniques)
-        tactic_set = set()
-        for tech in group_to_techniques[selected_group]:
-            for tactic in tech.get("tactics", []):
-                tactic_set.add(tactic)
-        tactics_options = sorted(tactic_set)
+        tactics_options = list(group_tactic_counts.index)
         
         with col2:
             selected_tactics = st.multiselect("Filter by Tactic:", options=tactics_options, default=[])
@@ -174,19 +226,14 @@ if page == "Group Analysis":
         st.markdown("<div style='display: flex; gap: 1rem; margin-top: 1.5rem;'>", unsafe_allow_html=True)
         
         # Count total techniques used by this group
-        total_techniques = len(group_to_techniques[selected_group])
+        total_techniques = len(knowledge_base.group_positions[selected_group])
         
         # Count unique tactics
-        unique_tactics = len(tactic_set)
-        
-        # Count techniques by tactic category
-        tactic_counts = {}
-        for tech in group_to_techniques[selected_group]:
-            for tactic in tech.get("tactics", []):
-                tactic_counts[tactic] = tactic_counts.get(tactic, 0) + 1
+        unique_tactics = len(group_tactic_counts)
         
         # Find most common tactic
-        most_common_tactic = max(tactic_counts.items(), key=lambda x: x[1]) if tactic_counts else ("None", 0)
+        most_common_tactic = ((group_tactic_counts.idxmax(), int(group_tactic_counts.max()))
+                              if unique_tactics else ("None", 0))
         
         # Stats cards
         st.markdown(f"""
@@ -224,158 +271,166 @@ if page == "Group Analysis":
         st.markdown(f'<div class="card-header">🧠 Overview of {selected_group}</div>', unsafe_allow_html=True)
         
         # Get group details
-        group_description = groups_dict.get(selected_group, {}).get("description", "No description available.")
-        group_sector = groups_dict.get(selected_group, {}).get("industry", "No industry information available.")
+        group_record = knowledge_base.group_by_name.get(selected_group)
+        group_description = (group_record and group_record.description) or "No description available."
+        group_sector = "No industry information available."
         
         st.markdown(f"""
             <p><strong>Description:</strong> {group_description}</p>
             <p><strong>Industry Targets:</strong> {group_sector}</p>
-            <p><strong>Group ID:</strong> {next((g["group_id"] for g in groups_dict.values() if g["name"] == selected_group), "Unknown")}</p>
+            <p><strong>Group ID:</strong> {(group_record and group_record.group_id) or "Unknown"}</p>
+            <p><strong>Domains:</strong> {", ".join(DOMAIN_LABELS.get(domain, domain) for domain in group_record.domains) if group_record else "Unknown"}</p>
         """, unsafe_allow_html=True)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
-        # Filter techniques if tactics are selected
-        techniques_list = group_to_techniques[selected_group]
-        if selected_tactics:
-            techniques_list = [tech for tech in techniques_list 
-                              if set(tech.get("tactics", [])) & set(selected_tactics)]
+        # Filter techniques if tactics are selected (positions of the group's entries in knowledge_base.usages)
+        with timed("filter"):
+            positions = knowledge_base.group_positions[selected_group]
+            if selected_tactics:
+                positions = tactic_matrix.filter_positions(positions, selected_tactics)
 
-        # Apply enhanced search filter if search term is provided
-        if search_term:
-            search_term_lower = search_term.lower()
-            filtered_techniques = []
-            
-            for tech in techniques_list:
-                # Check all possible fields for the search term
-                if (search_term_lower in tech["name"].lower() or 
-                    search_term_lower in tech.get("description", "").lower() or
-                    (tech["tech_id"] and search_term_lower in tech["tech_id"].lower()) or
-                    search_term_lower in tech.get("procedure", "").lower() or
-                    any(search_term_lower in tactic.lower() for tactic in tech.get("tactics", []))):
-                    filtered_techniques.append(tech)
-            
-            techniques_list = filtered_techniques
-            
-            # If no results found in this group but search term exists, offer global search
-            if not techniques_list and search_term:
-                st.warning(f"No results found for '{search_term}' in the selected group. Would you like to search across all groups?")
-                if st.button("Search All Groups"):
-                    # Search across all groups
-                    global_results = []
-                    for group_name, techs in group_to_techniques.items():
-                        for tech in techs:
-                            if (search_term_lower in tech["name"].lower() or 
-                                search_term_lower in tech.get("description", "").lower() or
-                                (tech["tech_id"] and search_term_lower in tech["tech_id"].lower()) or
-                                search_term_lower in tech.get("procedure", "").lower() or
-                                any(search_term_lower in tactic.lower() for tactic in tech.get("tactics", []))):
-                                # Add group name to the technique info for display
-                                tech_copy = tech.copy()
-                                tech_copy["group_name"] = group_name
-                                global_results.append(tech_copy)
+            # Apply search filter if search term is provided (ranked by relevance)
+            if search_term:
+                positions = knowledge_base.search_usages(search_term, positions)
+            techniques_list = [knowledge_base.usages[position] for position in positions]
+
+        # If no results found in this group but search term exists, offer global search
+        if search_term and not techniques_list:
+            st.warning(f"No results found for '{search_term}' in the selected group. Would you like to search across all groups?")
+            if st.button("Search All Groups"):
+                # Search across all groups
+                with timed("filter"):
+                    global_results = knowledge_base.search_usages(search_term)
+                
+                if global_results:
+                    st.success(f"Found {len(global_results)} results across all groups")
+                    
+                    # Create a DataFrame with the global results
+                    global_data = []
+                    for position in global_results:
+                        tech = knowledge_base.usages[position]
+                        global_data.append({
+                            "Group": tech.group.name,
+                            "Technique ID": tech.tech_id,
+                            "Technique Name": tech.name,
+                            "Tactic(s)": ", ".join(tech.tactics),
+                            "Description": tech.description[:150] + "..." if tech.description else ""
+                        })
                     
-                    if global_results:
-                        st.success(f"Found {len(global_results)} results across all groups")
-                        
-                        # Create a DataFrame with the global results
-                        global_data = []
-                        for tech in global_results:
-                            global_data.append({
-                                "Group": tech["group_name"],
-                                "Technique ID": tech["tech_id"],
-                                "Technique Name": tech["name"],
-                                "Tactic(s)": ", ".join(tech.get("tactics", [])),
-                                "Description": tech.get("description", "")[:150] + "..." if tech.get("description", "") else ""
-                            })
-                        
+                    with timed("dataframe"):
                         global_df = pd.DataFrame(global_data)
-                        st.dataframe(global_df, use_container_width=True)
+                    count("rows_rendered", len(global_df))
+                    st.dataframe(global_df, use_container_width=True)
 
         # Create a visualization of tactics distribution
         if techniques_list:
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.markdown('<div class="card-header">📊 Tactics Distribution</div>', unsafe_allow_html=True)
             
-            # Count techniques by tactic
-            tactic_distribution = {}
-            for tech in techniques_list:
-                for tactic in tech.get("tactics", []):
-                    tactic_distribution[tactic] = tactic_distribution.get(tactic, 0) + 1
+            # Count techniques by tactic: the precomputed row, or a masked sum over the filtered entries
+            if selected_tactics or search_term:
+                tactic_distribution = tactic_matrix.tactic_counts(positions)
+                tactic_distribution = tactic_distribution[tactic_distribution > 0]
+            else:
+                tactic_distribution = group_tactic_counts
             
             # Create a DataFrame for the chart
-            tactic_df = pd.DataFrame({
-                'Tactic': list(tactic_distribution.keys()),
-                'Count': list(tactic_distribution.values())
-            }).sort_values('Count', ascending=False)
+            tactic_df = tactic_distribution.rename_axis('Tactic').reset_index(name='Count').sort_values(
+                'Count', ascending=False, kind='stable')
             
             # Create a bar chart
-            fig = px.bar(
-                tactic_df, 
-                x='Tactic', 
-                y='Count',
-                color='Count',
-                color_continuous_scale='Blues',
-                title=f'Tactics Distribution for {selected_group}',
-                labels={'Count': 'Number of Techniques', 'Tactic': 'Tactic Name'}
-            )
-            fig.update_layout(
-                xaxis_title="Tactic",
-                yaxis_title="Number of Techniques",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(family="Segoe UI, sans-serif", size=12),
-                margin=dict(l=20, r=20, t=40, b=20),
-            )
+            with timed("plotly"):
+                fig = px.bar(
+                    tactic_df, 
+                    x='Tactic', 
+                    y='Count',
+                    color='Count',
+                    color_continuous_scale='Blues',
+                    title=f'Tactics Distribution for {selected_group}',
+                    labels={'Count': 'Number of Techniques', 'Tactic': 'Tactic Name'}
+                )
+                fig.update_layout(
+                    xaxis_title="Tactic",
+                    yaxis_title="Number of Techniques",
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    font=dict(family="Segoe UI, sans-serif", size=12),
+                    margin=dict(l=20, r=20, t=40, b=20),
+                )
             st.plotly_chart(fig, use_container_width=True)
             
+            # Compare with every other group (columns of the group x tactic matrix)
+            with st.expander("Compare with all groups"):
+                all_counts = tactic_matrix.counts_frame()
+                comparison = pd.DataFrame({
+                    'Techniques': all_counts.loc[selected_group],
+                    'Average per Group': all_counts.mean().round(1),
+                    'Rank among Groups': all_counts.rank(ascending=False, method='min').loc[selected_group].astype(int),
+                    'Groups Using Tactic': (all_counts > 0).sum()
+                }).rename_axis('Tactic').sort_values('Techniques', ascending=False, kind='stable')
+                st.dataframe(comparison, use_container_width=True)
+            
             st.markdown('</div>', unsafe_allow_html=True)
 
         # Prepare DataFrame with enhanced formatting for techniques
         if techniques_list:
-            # Format tactics with badges
-            def format_tactics(tactics_list):
-                if not tactics_list:
-                    return ""
-                
-                badges = []
-                for tactic in tactics_list:
-                    tactic_slug = tactic.lower().replace(" ", "-")
-                    badges.append(f'<span class="badge badge-{tactic_slug}">{tactic}</span>')
-                
-                return " ".join(badges)
-            
-            # Create a DataFrame with formatted data
-            techniques_data = []
-            for tech in techniques_list:
-                techniques_data.append({
-                    "Technique ID": tech["tech_id"],
-                    "Technique Name": tech["name"],
-                    "Tactic(s)": format_tactics(tech.get("tactics", [])),
-                    "Description": tech.get("description", "")[:150] + "..." if tech.get("description", "") else "",
-                    "Procedure Example": tech.get("procedure", "")[:150] + "..." if tech.get("procedure", "") else ""
-                })
-            
-            df = pd.DataFrame(techniques_data)
-            
             # Display results in a table with enhanced styling
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.markdown(f'<div class="card-header">🔍 Techniques used by {selected_group} ({len(techniques_list)} results)</div>', unsafe_allow_html=True)
             
+            # Sort the parent rows on the server, then build HTML for the visible page only
+            # (sub-techniques are only added for the parents expanded on that page)
+            def usage_technique(usage):
+                return usage.technique.stix_id
+            top_rows, subtechnique_rows = collapse_subtechniques(
+                techniques_list, knowledge_base.technique_tree, "group_techniques", usage_technique)
+            page_rows = paginate(top_rows, {
+                "Relevance" if search_term else "Default": None,
+                "Technique ID": lambda tech: tech.tech_id or "",
+                "Technique Name": lambda tech: tech.name.lower(),
+                "Tactic": lambda tech: tech.tactics[0] if tech.tactics else ""
+            }, key="group_techniques")
+            table_rows = expand_subtechniques(page_rows, subtechnique_rows, "group_techniques", usage_technique)
+            page_rows = [tech for tech, _, _ in table_rows]
+            
+            # Create a DataFrame with formatted data (tactic badges are cached per tactic set)
+            with timed("dataframe"):
+                df = pd.DataFrame([{
+                    "Technique ID": (("↳ " if depth else "") + (tech.tech_id or "")
+                                     + (f" (+{folded})" if folded else "")),
+                    "Technique Name": tech.name,
+                    "Tactic(s)": tactic_badges(tech.tactics),
+                    "Description": tech.description[:150] + "..." if tech.description else "",
+                    "Procedure Example": tech.procedure[:150] + "..." if tech.procedure else ""
+                } for tech, depth, folded in table_rows])
+            
             if not df.empty:
                 # Convert DataFrame to HTML with custom styling
-                html_table = df.to_html(escape=False, index=False, classes='dataframe')
+                with timed("to_html"):
+                    html_table = df.to_html(escape=False, index=False, classes='dataframe')
+                count("rows_rendered", len(df))
+                count("bytes_rendered", len(html_table.encode("utf-8")))
                 
                 # Display the table in a container
                 st.markdown('<div class="table-container">', unsafe_allow_html=True)
                 st.markdown(html_table, unsafe_allow_html=True)
                 st.markdown('</div>', unsafe_allow_html=True)
                 
-                # Add export options
+                # Add export options (every result, with plain-text tactics)
+                with timed("export"):
+                    export_df = pd.DataFrame([{
+                        "Technique ID": tech.tech_id,
+                        "Technique Name": tech.name,
+                        "Tactic(s)": ", ".join(tech.tactics),
+                        "Description": tech.description,
+                        "Procedure Example": tech.procedure
+                    } for tech in techniques_list])
+                    csv_data = export_df.to_csv(index=False)
+                    json_data = export_df.to_json(orient="records")
                 col1, col2 = st.columns(2)
                 with col1:
                     # CSV download button
-                    csv_data = df.to_csv(index=False)
                     st.download_button(
                         label="📥 Download CSV",
                         data=csv_data,
@@ -385,7 +440,6 @@ if page == "Group Analysis":
                 
                 with col2:
                     # JSON download option
-                    json_data = df.to_json(orient="records")
                     st.download_button(
                         label="📥 Download JSON",
                         data=json_data,
@@ -401,28 +455,91 @@ if page == "Group Analysis":
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.markdown('<div class="card-header">🔎 Technique Details</div>', unsafe_allow_html=True)
             
-            # Create a selectbox for technique selection
-            technique_options = [f"{tech['tech_id']} - {tech['name']}" for tech in techniques_list]
-            if technique_options:
-                selected_technique_option = st.selectbox("Select a technique to view details:", technique_options)
-                
-                # Find the selected technique
-                selected_tech_id = selected_technique_option.split(" - ")[0]
-                selected_technique = next((tech for tech in techniques_list if tech["tech_id"] == selected_tech_id), None)
+            # Create a selectbox for technique selection (options are indexes into the visible page)
+            if page_rows:
+                selected_index = st.selectbox(
+                    "Select a technique to view details:",
+                    options=range(len(page_rows)),
+                    format_func=lambda i: f"{page_rows[i].tech_id} - {page_rows[i].name}"
+                )
+                selected_technique = page_rows[selected_index] if selected_index is not None else None
                 
                 if selected_technique:
-                    st.markdown(f"### {selected_technique['tech_id']} - {selected_technique['name']}")
-                    st.markdown(f"**Tactics:** {format_tactics(selected_technique.get('tactics', []))}", unsafe_allow_html=True)
+                    st.markdown(f"### {selected_technique.tech_id} - {selected_technique.name}")
+                    st.markdown(f"**Tactics:** {tactic_badges(selected_technique.tactics)}", unsafe_allow_html=True)
                     st.markdown("**Description:**")
-                    st.markdown(f"{selected_technique.get('description', 'No description available.')}")
+                    st.markdown(f"{selected_technique.description or 'No description available.'}")
                     
-                    if selected_technique.get('procedure'):
+                    if selected_technique.procedure:
                         st.markdown("**Procedure Example:**")
-                        st.markdown(f"{selected_technique.get('procedure')}")
+                        st.markdown(f"{selected_technique.procedure}")
             else:
                 st.markdown("No techniques available to display details.")
             
             st.markdown('</div>', unsafe_allow_html=True)
+        
+        # Groups with overlapping techniques (bitset similarity over all groups)
+        st.markdown('<div class="card">', unsafe_allow_html=True)
+        st.markdown(f'<div class="card-header">🧬 Groups Similar to {selected_group}</div>', unsafe_allow_html=True)
+        
+        group_similarity = knowledge_base.group_similarity
+        col1, col2 = st.columns(2)
+        with col1:
+            similarity_metric = st.radio("Similarity measure", ["Jaccard", "Cosine"], horizontal=True,
+                                         help="Jaccard: shared / all techniques of both groups. "
+                                              "Cosine: shared / geometric mean of the two technique counts.")
+        with col2:
+            similar_count = st.slider("Number of similar groups", min_value=3, max_value=30, value=10)
+        
+        similar_groups = group_similarity.most_similar(selected_group, similar_count, similarity_metric.lower())
+        if similar_groups:
+            with timed("dataframe"):
+                similar_df = pd.DataFrame([{
+                    "Group": group_name,
+                    "Similarity": round(similarity, 3),
+                    "Shared Techniques": shared,
+                    "Group Techniques": group_similarity.technique_count(group_name)
+                } for group_name, similarity, shared in similar_groups])
+            count("rows_rendered", len(similar_df))
+            st.dataframe(similar_df, use_container_width=True, hide_index=True)
+            
+            # Drill down into the techniques two groups have in common
+            compare_group = st.selectbox("Show techniques shared with:", similar_df["Group"].tolist())
+            if compare_group:
+                shared_techniques = group_similarity.shared_techniques(selected_group, compare_group)
+                st.markdown(", ".join(f"`{tech.tech_id}` {tech.name}" for tech in shared_techniques))
+            
+            with st.expander("Overlap heatmap"):
+                heatmap_scope = st.radio("Groups", [f"{selected_group} and its most similar groups", "All groups"],
+                                         horizontal=True)
+                heatmap_groups = (None if heatmap_scope == "All groups"
+                                  else [selected_group] + [group_name for group_name, _, _ in similar_groups])
+                names, similarity_matrix, _ = group_similarity.pairwise(heatmap_groups, similarity_metric.lower())
+                with timed("plotly"):
+                    fig = px.imshow(
+                        similarity_matrix,
+                        x=names,
+                        y=names,
+                        color_continuous_scale='Blues',
+                        zmin=0,
+                        zmax=1,
+                        labels={'color': f'{similarity_metric} similarity'}
+                    )
+                    fig.update_layout(
+                        height=max(400, min(1200, 18 * len(names))),
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(family="Segoe UI, sans-serif", size=12),
+                        margin=dict(l=20, r=20, t=40, b=20),
+                    )
+                st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.markdown('<div class="alert alert-info">No other group shares a technique with this group.</div>', unsafe_allow_html=True)
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        # Software, campaigns and mitigations, from the relationship graph
+        display_defense_planning(knowledge_base, selected_group)
 
 elif page == "Technique Explorer":
     st.markdown('<div class="card">', unsafe_allow_html=True)
@@ -431,31 +548,27 @@ elif page == "Technique Explorer":
     # Search for techniques
     technique_search = st.text_input("🔍 Search for techniques by ID, name, or description", "")
     
-    # Get all techniques
-    all_techniques = list(techniques_dict.values())
+    # Filter by tactic through the tactic index
+    explorer_tactics = st.multiselect("Filter by Tactic:", options=list(knowledge_base.techniques_by_tactic), default=[])
     
-    # Enhanced search for techniques
-    if technique_search:
-        search_term_lower = technique_search.lower()
-        filtered_techniques = []
-        
-        for tech in all_techniques:
-            # Check all possible fields for the search term
-            if (search_term_lower in tech["name"].lower() or
-                search_term_lower in tech.get("description", "").lower() or
-                (tech["tech_id"] and search_term_lower in tech["tech_id"].lower()) or
-                any(search_term_lower in tactic.lower() for tactic in tech.get("tactics", []))):
-                filtered_techniques.append(tech)
-                
-        # Also search in procedures across all groups
-        for group_name, techs in group_to_techniques.items():
-            for tech in techs:
-                # Only add if not already in filtered_techniques and contains search term in procedure
-                if (tech["tech_id"] not in [t["tech_id"] for t in filtered_techniques] and
-                    search_term_lower in tech.get("procedure", "").lower()):
-                    filtered_techniques.append(tech)
-    else:
-        filtered_techniques = all_techniques
+    # Filter by ATT&CK domain when several are loaded
+    explorer_domains = []
+    if len(knowledge_base.domains) > 1:
+        explorer_domains = st.multiselect("Filter by Domain:", options=list(knowledge_base.domains), default=[],
+                                          format_func=lambda domain: DOMAIN_LABELS.get(domain, domain))
+    
+    # Search techniques (and procedures across all groups) through the full-text index
+    with timed("filter"):
+        if technique_search:
+            filtered_techniques = knowledge_base.search_techniques(technique_search, include_procedures=True)
+        else:
+            filtered_techniques = list(techniques_dict.values())
+        if explorer_tactics:
+            tactic_tech_ids = {tech.tech_id for tactic in explorer_tactics
+                               for tech in knowledge_base.techniques_by_tactic[tactic]}
+            filtered_techniques = [tech for tech in filtered_techniques if tech.tech_id in tactic_tech_ids]
+        if explorer_domains:
+            filtered_techniques = [tech for tech in filtered_techniques if tech.domain in explorer_domains]
     
     # Display technique count
     st.markdown(f"**Found {len(filtered_techniques)} techniques**")
@@ -471,45 +584,66 @@ elif page == "Technique Explorer":
             # In a full implementation, you could use HTML with CSS for better highlighting
             return text.replace(search_term, f"[{search_term}]")
         
-        technique_df = pd.DataFrame([{
-            "ID": tech["tech_id"],
-            "Name": highlight_text(tech["name"], technique_search) if technique_search else tech["name"],
-            "Tactics": ", ".join(tech.get("tactics", [])),
-            "Description": highlight_text(tech.get("description", "")[:100] + "..." if tech.get("description", "") else "", 
-                                         technique_search)
-        } for tech in filtered_techniques])
+        # Only the rows of the visible page are sent to the browser, sub-techniques
+        # folded under their parent until it is expanded
+        top_rows, subtechnique_rows = collapse_subtechniques(
+            filtered_techniques, knowledge_base.technique_tree, "explorer_techniques")
+        page_rows = paginate(top_rows, {
+            "Relevance" if technique_search else "Default": None,
+            "ID": lambda tech: tech.tech_id or "",
+            "Name": lambda tech: tech.name.lower(),
+            "Tactic": lambda tech: tech.tactics[0] if tech.tactics else ""
+        }, key="explorer_techniques")
+        table_rows = expand_subtechniques(page_rows, subtechnique_rows, "explorer_techniques")
+        page_rows = [tech for tech, _, _ in table_rows]
+        
+        with timed("dataframe"):
+            technique_df = pd.DataFrame([{
+                "ID": ("↳ " if depth else "") + (tech.tech_id or ""),
+                "Sub-techniques": f"+{folded}" if folded else "",
+                "Name": highlight_text(tech.name, technique_search) if technique_search else tech.name,
+                "Tactics": ", ".join(tech.tactics),
+                "Domain": DOMAIN_LABELS.get(tech.domain, tech.domain),
+                "Description": highlight_text(tech.description[:100] + "..." if tech.description else "", 
+                                             technique_search)
+            } for tech, depth, folded in table_rows])
+        count("rows_rendered", len(technique_df))
         
-        st.dataframe(technique_df, use_container_width=True)
+        st.dataframe(technique_df, use_container_width=True, hide_index=True)
         
-        # Select a technique to view details
+        # Select a technique to view details (from the visible page)
         selected_technique_id = st.selectbox(
             "Select a technique to view details:",
-            options=[f"{tech['tech_id']} - {tech['name']}" for tech in filtered_techniques]
+            options=[f"{tech.tech_id} - {tech.name}" for tech in page_rows]
         )
         
         # Display technique details
         if selected_technique_id:
             tech_id = selected_technique_id.split(" - ")[0]
-            technique = next((t for t in filtered_techniques if t["tech_id"] == tech_id), None)
+            technique = knowledge_base.technique_by_id.get(tech_id)
             
             if technique:
                 st.markdown("### Technique Details")
-                st.markdown(f"**ID:** {technique['tech_id']}")
-                st.markdown(f"**Name:** {technique['name']}")
-                st.markdown(f"**Tactics:** {', '.join(technique.get('tactics', []))}")
+                st.markdown(f"**ID:** {technique.tech_id}")
+                st.markdown(f"**Name:** {technique.name}")
+                st.markdown(f"**Tactics:** {', '.join(technique.tactics)}")
+                st.markdown(f"**Domain:** {DOMAIN_LABELS.get(technique.domain, technique.domain)}")
+                parent = knowledge_base.technique_tree.parent(technique.stix_id)
+                if parent is not None:
+                    st.markdown(f"**Sub-technique of:** {parent.tech_id} - {parent.name}")
+                subtechniques = knowledge_base.technique_tree.subtechniques(technique.stix_id)
+                if subtechniques:
+                    st.markdown("**Sub-techniques:** " + ", ".join(f"{sub.tech_id} {sub.name}" for sub in subtechniques))
                 st.markdown("**Description:**")
-                st.markdown(f"{technique.get('description', 'No description available.')}")
+                st.markdown(f"{technique.description or 'No description available.'}")
                 
-                # Find groups using this technique
-                groups_using = []
-                for group_name, techs in group_to_techniques.items():
-                    if any(t["tech_id"] == technique["tech_id"] for t in techs):
-                        groups_using.append(group_name)
+                # Find groups using this technique (precomputed technique -> groups index)
+                groups_using = knowledge_base.groups_using(technique.tech_id)
                 
                 if groups_using:
                     st.markdown("### Groups Using This Technique")
-                    for group in groups_using:
-                        st.markdown(f"- {group}")
+                    for usage in groups_using:
+                        st.markdown(f"- **{usage.group.name}**" + (f": {usage.procedure}" if usage.procedure else ""))
     else:
         st.markdown("No techniques found matching your search criteria.")
     
@@ -517,7 +651,19 @@ elif page == "Technique Explorer":
 
 elif page == "Technique Replication":
     # Use the imported function to display the Technique Replication page
-    display_technique_replication_page(techniques_dict)
+    display_technique_replication_page(knowledge_base)
+
+elif page == "Atomic Test Planner":
+    display_atomic_test_planner_page(knowledge_base)
+
+elif page == "Alert Analysis":
+    display_alert_analysis_page(knowledge_base)
+
+elif page == "Detection Coverage":
+    display_detection_coverage_page(knowledge_base)
+
+elif page == "What's New":
+    display_whats_new_page(knowledge_base)
 
 elif page == "About Attack Framework":
     st.markdown('<div class="card">', unsafe_allow_html=True)
@@ -563,3 +709,29 @@ elif page == "About Attack Framework":
     """)
     
     st.markdown('<div class="footer">Created with Streamlit and Python | Data from MITRE CTI</div>', unsafe_allow_html=True)
+
+# Stage timings and counters of this rerun, added to the process totals and the JSON log
+rerun_metrics = finish_rerun(PERF_LOG)
+if PERF_PANEL and rerun_metrics is not None:
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("⏱️ Performance", expanded=False):
+            st.markdown(f"**This rerun:** {rerun_metrics.seconds * 1000:.1f} ms ({rerun_metrics.page})")
+            if rerun_metrics.stages:
+                st.dataframe(pd.DataFrame([{
+                    "Stage": stage,
+                    "Calls": calls,
+                    "ms": round(seconds * 1000, 2)
+                } for stage, (calls, seconds) in rerun_metrics.stages.items()]), use_container_width=True,
+                    hide_index=True)
+            if rerun_metrics.counters:
+                st.dataframe(pd.DataFrame([{"Counter": name, "Value": value}
+                                           for name, value in rerun_metrics.counters.items()]),
+                             use_container_width=True, hide_index=True)
+            totals = get_registry().snapshot()
+            st.caption("Process totals: " + ", ".join(
+                [f"{sum(rerun['calls'] for rerun in totals['reruns'].values())} reruns"] +
+                [f"{name} {value}" for name, value in sorted(totals["counters"].items())]))
+            if METRICS_PORT:
+                st.caption(f"Prometheus metrics: http://{METRICS_HOST}:{METRICS_PORT}/metrics"
+                           + (f" (could not start: {metrics_error})" if metrics_error else ""))
@@ -0,0 +1,166 @@
+"""
+Columnar table of every Atomic Red Team test across all techniques.
+
+The Technique Replication page shows the tests of one technique at a time.
+AtomicTestTable flattens the atomics catalog into a pandas DataFrame with one
+row per test, plus boolean platform and tactic matrices aligned with it, so
+questions such as "all Linux sh tests without elevation for the tactics used
+by group X" are answered with vectorized masks instead of visiting techniques
+one by one.
+"""
+import numpy as np
+import pandas as pd
+
+# Dimensions the tests can be summarized by, and whether a test can have several values
+SUMMARY_DIMENSIONS = {
+    "tactic": True,
+    "platform": True,
+    "executor": False,
+    "technique_id": False,
+}
+
+
+def _one_hot(values_per_row, index):
+    """
+    Build a boolean matrix with one column per distinct value.
+
+    Args:
+        values_per_row (list): A tuple of values for each row
+        index (pandas.Index): Index of the rows
+
+    Returns:
+        pandas.DataFrame: True where the row has the column's value
+    """
+    labels = sorted({value for values in values_per_row for value in values})
+    columns = {label: number for number, label in enumerate(labels)}
+    matrix = np.zeros((len(values_per_row), len(labels)), dtype=bool)
+    rows = [row for row, values in enumerate(values_per_row) for _ in values]
+    cols = [columns[value] for values in values_per_row for value in values]
+    matrix[rows, cols] = True
+    return pd.DataFrame(matrix, index=index, columns=labels)
+
+
+class AtomicTestTable:
+    """
+    Every atomic test of a catalog, joined with the ATT&CK tactics of its technique.
+
+    Attributes:
+        tests (pandas.DataFrame): One row per test
+        platforms (pandas.DataFrame): Boolean matrix of supported platforms, aligned with tests
+        tactics (pandas.DataFrame): Boolean matrix of the technique's tactics, aligned with tests
+    """
+
+    def __init__(self, catalog, knowledge_base):
+        """
+        Args:
+            catalog (dict): Technique ID to a tuple of AtomicTestSummary (see atomics.py)
+            knowledge_base (AttackKnowledgeBase): Used for technique names and tactics
+        """
+        summaries = [summary for tech_id in sorted(catalog) for summary in catalog[tech_id]]
+        techniques = [knowledge_base.technique_by_id.get(summary.technique_id) for summary in summaries]
+        tactics = [technique.tactics if technique else () for technique in techniques]
+
+        self.tests = pd.DataFrame({
+            "technique_id": pd.Categorical([summary.technique_id for summary in summaries]),
+            "technique_name": [technique.name if technique else "" for technique in techniques],
+            "test_number": np.array([summary.number for summary in summaries], dtype=np.int16),
+            "test_name": [summary.name for summary in summaries],
+            "guid": [summary.guid for summary in summaries],
+            "tactics": [", ".join(values) for values in tactics],
+            "platforms": [", ".join(summary.platforms) for summary in summaries],
+            "executor": pd.Categorical([summary.executor for summary in summaries]),
+            "elevation_required": np.array([summary.elevation_required for summary in summaries], dtype=bool),
+            "has_cleanup": np.array([summary.has_cleanup for summary in summaries], dtype=bool),
+            "input_argument_count": np.array([summary.input_argument_count for summary in summaries],
+                                             dtype=np.int16),
+            "dependency_count": np.array([summary.dependency_count for summary in summaries], dtype=np.int16),
+        })
+        self.platforms = _one_hot([summary.platforms for summary in summaries], self.tests.index)
+        self.tactics = _one_hot(tactics, self.tests.index)
+
+    def __len__(self):
+        return len(self.tests)
+
+    @property
+    def executors(self):
+        """list: Executor names of all tests, sorted"""
+        return sorted(name for name in self.tests["executor"].cat.categories if name)
+
+    def filter(self, platforms=None, executors=None, tactics=None, technique_ids=None,
+               elevation_required=None, has_cleanup=None):
+        """
+        Select the tests matching every given condition.
+
+        Args:
+            platforms (iterable): Keep tests supporting any of these platforms
+            executors (iterable): Keep tests run by any of these executors
+            tactics (iterable): Keep tests of techniques in any of these tactics
+            technique_ids (iterable): Keep tests of these techniques
+            elevation_required (bool): Keep tests that need (True) or do not need (False) elevation
+            has_cleanup (bool): Keep tests with (True) or without (False) a cleanup command
+
+        Returns:
+            pandas.DataFrame: The matching rows of tests
+        """
+        mask = np.ones(len(self.tests), dtype=bool)
+        if platforms:
+            mask &= self._any_of(self.platforms, platforms)
+        if executors:
+            mask &= self.tests["executor"].isin(list(executors)).to_numpy()
+        if tactics:
+            mask &= self._any_of(self.tactics, tactics)
+        if technique_ids is not None:
+            mask &= self.tests["technique_id"].isin(list(technique_ids)).to_numpy()
+        if elevation_required is not None:
+            mask &= self.tests["elevation_required"].to_numpy() == elevation_required
+        if has_cleanup is not None:
+            mask &= self.tests["has_cleanup"].to_numpy() == has_cleanup
+        return self.tests[mask]
+
+    def summarize(self, tests, by):
+        """
+        Count tests per tactic, platform, executor or technique.
+
+        A test counts once for each tactic or platform it has.
+
+        Args:
+            tests (pandas.DataFrame): Rows of tests, usually returned by filter()
+            by (str): One of SUMMARY_DIMENSIONS
+
+        Returns:
+            pandas.DataFrame: Columns by, "tests", "techniques" and "elevated", most tests first
+        """
+        if by not in SUMMARY_DIMENSIONS:
+            raise ValueError(f"Cannot summarize tests by {by!r}")
+
+        if SUMMARY_DIMENSIONS[by]:
+            matrix = (self.tactics if by == "tactic" else self.platforms).loc[tests.index]
+            values = matrix.to_numpy()
+            elevated = tests["elevation_required"].to_numpy()
+            # Distinct techniques per column: unique (technique, column) pairs of the set cells
+            rows, cols = np.nonzero(values)
+            technique_codes = tests["technique_id"].cat.codes.to_numpy()[rows]
+            pairs = np.unique(np.stack([cols, technique_codes]), axis=1)
+            summary = pd.DataFrame({
+                by: matrix.columns,
+                "tests": values.sum(axis=0),
+                "techniques": np.bincount(pairs[0], minlength=len(matrix.columns)),
+                "elevated": (values & elevated[:, None]).sum(axis=0),
+            })
+            summary = summary[summary["tests"] > 0]
+        else:
+            summary = tests.groupby(by, observed=True).agg(
+                tests=("guid", "size"),
+                techniques=("technique_id", "nunique"),
+                elevated=("elevation_required", "sum"),
+            ).reset_index()
+            summary[by] = summary[by].astype(str)
+        return summary.sort_values(["tests", by], ascending=[False, True]).reset_index(drop=True)
+
+    @staticmethod
+    def _any_of(matrix, labels):
+        """Rows of a boolean matrix with any of the given columns set (unknown labels match nothing)."""
+        columns = [label for label in labels if label in matrix.columns]
+        if not columns:
+            return np.zeros(len(matrix), dtype=bool)
+        return matrix[columns].to_numpy().any(axis=1)
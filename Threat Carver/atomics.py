@@ -0,0 +1,624 @@
+"""
+Loaders for Atomic Red Team tests.
+
+The Technique Replication page used to download one technique's YAML file when
+the user selected it, over a new connection each time, and techniques without
+tests paid a full round trip just to get a 404. AtomicsLoader instead fetches
+the files for many techniques at once through a bounded pool of worker threads
+sharing one pooled requests.Session with retries. Parsed tests are kept in
+memory, techniques without tests are remembered on disk for a while (negative
+cache), and the whole set can be warmed up in the background at startup.
+
+AtomicsMirror reads the same files from a local checkout or tarball of the
+atomic-red-team repository, for machines without internet access. Opening it
+only lists the technique files (the member names of a tarball); a file is
+parsed when its tests are displayed or by the background warm-up, which fills
+in the catalog of every technique's tests (platforms, executor, elevation,
+number of dependencies).
+
+Both parse YAML with libyaml's CSafeLoader when PyYAML was built with it, and
+keep parsed files on disk as JSON, keyed by the SHA-256 of their contents, so
+a file is only ever parsed once. The cache directory may be shared, so it only
+ever holds plain data.
+"""
+import hashlib
+import json
+import os
+import re
+import tarfile
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+
+import requests
+import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (ATOMIC_RED_TEAM_BASE_URL, ATOMICS_NEGATIVE_TTL, ATOMICS_RETRIES, ATOMICS_WORKERS,
+                    CACHE_DIR, OFFLINE)
+from instrumentation import count
+from snapshot_cache import SnapshotCache, is_remote_source, local_source_path
+
+# Responses worth retrying: rate limiting and server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# The C parser is several times faster than the pure-Python one
+SAFE_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Technique folders and files inside an atomics folder: atomics/T1059.001/T1059.001.yaml
+TECHNIQUE_ID_RE = re.compile(r"^T\d{4}(\.\d{3})?$")
+ATOMICS_FILE_RE = re.compile(r"(?:^|/)atomics/(T\d{4}(?:\.\d{3})?)/\1\.yaml$")
+
+TARBALL_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class AtomicTestSummary(namedtuple("AtomicTestSummary", [
+        "technique_id", "number", "name", "guid", "platforms", "executor", "elevation_required",
+        "has_cleanup", "input_argument_count", "dependency_count"])):
+    """Catalog entry of one atomic test: what the tables show without the full YAML."""
+
+    __slots__ = ()
+
+
+def summarize_tests(technique_id, atomic_data):
+    """
+    Build the catalog entries of a technique's Atomic Red Team file.
+
+    Args:
+        technique_id (str): The technique ID (e.g., T1078.001)
+        atomic_data (dict): The parsed YAML file
+
+    Returns:
+        tuple: AtomicTestSummary for each test, in file order
+    """
+    if not isinstance(atomic_data, dict):
+        return ()
+    summaries = []
+    for number, test in enumerate(atomic_data.get("atomic_tests") or [], 1):
+        executor = test.get("executor") or {}
+        summaries.append(AtomicTestSummary(
+            technique_id,
+            number,
+            test.get("name", "Unnamed Test"),
+            str(test.get("auto_generated_guid", "")),
+            tuple(test.get("supported_platforms") or ()),
+            executor.get("name", ""),
+            bool(executor.get("elevation_required", False)),
+            bool(executor.get("cleanup_command")),
+            len(test.get("input_arguments") or ()),
+            len(test.get("dependencies") or ())
+        ))
+    return tuple(summaries)
+
+
+def _parsed_path(parse_cache_dir, content_hash):
+    return os.path.join(parse_cache_dir, f"{content_hash}.json")
+
+
+def _write_json(path, value):
+    """Write a JSON file atomically; the parse cache is only an optimization, so errors are ignored."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".parsed-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            # Dates and other YAML-only scalars are kept as their text
+            json.dump(value, f, default=str)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def _read_json(path):
+    """Read a JSON file written by _write_json(), or None if it is missing or unreadable."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_atomics_yaml(content, content_hash, parse_cache_dir):
+    """
+    Parse an Atomic Red Team file, reusing the result of an earlier parse of the same contents.
+
+    Args:
+        content (bytes): The raw YAML file
+        content_hash (str): SHA-256 of the contents
+        parse_cache_dir (str): Directory of parsed files
+
+    Returns:
+        dict: The parsed YAML data
+
+    Raises:
+        yaml.YAMLError: If the file is not valid YAML
+    """
+    path = _parsed_path(parse_cache_dir, content_hash)
+    atomic_data = _read_json(path)
+    if atomic_data is None:
+        atomic_data = yaml.load(content, Loader=SAFE_LOADER)
+        _write_json(path, atomic_data)
+    return atomic_data
+
+
+def make_session(pool_size=ATOMICS_WORKERS, retries=ATOMICS_RETRIES):
+    """
+    Create an HTTP session whose connections are reused by all worker threads.
+
+    Args:
+        pool_size (int): Connections kept open per host (one per worker)
+        retries (int): Retries of connection errors, 429 and 5xx responses, with exponential backoff
+
+    Returns:
+        requests.Session: The session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        # Hand the last error response back so the snapshot cache can fall back to its copy
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class AtomicsLoader:
+    """
+    Loads and caches the Atomic Red Team tests of techniques.
+
+    Each technique's YAML file goes through the snapshot cache, so it is
+    revalidated with a conditional GET and available offline once downloaded.
+    """
+
+    def __init__(self, base_url=ATOMIC_RED_TEAM_BASE_URL, cache=None, max_workers=ATOMICS_WORKERS,
+                 retries=ATOMICS_RETRIES, negative_ttl=ATOMICS_NEGATIVE_TTL):
+        """
+        Args:
+            base_url (str): URL (or local directory) of the atomics folder
+            cache (SnapshotCache): Cache used for downloads (one with a pooled session by default)
+            max_workers (int): Files downloaded at the same time by prefetch()
+            retries (int): Retries of a failed download
+            negative_ttl (float): Seconds before a technique without tests is checked again
+        """
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max(1, max_workers)
+        self.negative_ttl = negative_ttl
+        self.cache = cache or SnapshotCache(CACHE_DIR, OFFLINE, session=make_session(self.max_workers, retries))
+        self.parse_cache_dir = os.path.join(self.cache.cache_dir, "atomics-parsed")
+        self.warmup_stats = None
+
+        self._lock = threading.Lock()
+        # Technique ID to parsed YAML (None when the technique has no tests or could not be loaded)
+        self._tests = {}
+        # Technique ID to the catalog entries of its tests, for the techniques loaded so far
+        self._catalog = {}
+        # Technique ID to the time a 404 was last seen, shared between runs
+        url_hash = hashlib.sha1(self.base_url.encode("utf-8")).hexdigest()[:16]
+        self._missing_path = os.path.join(self.cache.cache_dir, f"{url_hash}-atomics-missing.json")
+        self._missing = self._read_missing()
+        # Set when a 404 was added to _missing since it was last written
+        self._missing_dirty = False
+        self._warmup_thread = None
+        # Set when the server cannot be reached, so a prefetch stops instead of retrying every file
+        self._unreachable = False
+
+    def url_for(self, technique_id):
+        """
+        Get the location of a technique's Atomic Red Team file.
+
+        Args:
+            technique_id (str): The technique ID (e.g., T1078.001)
+
+        Returns:
+            str: URL or path of the YAML file
+        """
+        return f"{self.base_url}/{technique_id}/{technique_id}.yaml"
+
+    def get(self, technique_id):
+        """
+        Get the Atomic Red Team tests of a technique.
+
+        Args:
+            technique_id (str): The technique ID (e.g., T1078.001)
+
+        Returns:
+            dict: The parsed YAML data, or None if the technique has no tests or they could not be loaded
+
+        Raises:
+            yaml.YAMLError: If the file is not valid YAML
+        """
+        count("atomics_cache_hits" if technique_id in self._tests else "atomics_cache_misses")
+        tests = self._load(technique_id)
+        self._write_missing()
+        return tests
+
+    def catalog(self):
+        """
+        Get the catalog entries of the techniques loaded so far.
+
+        Complete once the warm-up has finished.
+
+        Returns:
+            dict: Technique ID to a tuple of AtomicTestSummary
+        """
+        with self._lock:
+            return dict(self._catalog)
+
+    def prefetch(self, technique_ids):
+        """
+        Load the tests of many techniques concurrently.
+
+        Args:
+            technique_ids (iterable): Technique IDs to load
+
+        Returns:
+            dict: Number of techniques per outcome ("found", "missing", "invalid", "skipped")
+        """
+        with self._lock:
+            pending = iter([tech_id for tech_id in dict.fromkeys(technique_ids) if tech_id not in self._tests])
+        self._unreachable = False
+        outcomes = Counter()
+
+        def worker():
+            while True:
+                with self._lock:
+                    technique_id = next(pending, None)
+                if technique_id is None:
+                    return
+                if self._unreachable:
+                    outcome = "skipped"
+                else:
+                    try:
+                        outcome = "found" if self._load(technique_id) else "missing"
+                    except yaml.YAMLError:
+                        outcome = "invalid"
+                with self._lock:
+                    outcomes[outcome] += 1
+
+        # Daemon threads rather than an executor, so a long prefetch never delays shutdown
+        threads = [threading.Thread(target=worker, name=f"atomics-{n}", daemon=True)
+                   for n in range(self.max_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._write_missing()
+        return dict(outcomes)
+
+    def start_warmup(self, technique_ids):
+        """
+        Prefetch the tests of techniques in a background thread.
+
+        Does nothing if a warm-up is already running or has finished.
+
+        Args:
+            technique_ids (iterable): Technique IDs to load
+        """
+        with self._lock:
+            if self._warmup_thread is not None:
+                return
+            technique_ids = list(technique_ids)
+
+            def warmup():
+                self.warmup_stats = self.prefetch(technique_ids)
+
+            self._warmup_thread = threading.Thread(target=warmup, name="atomics-warmup", daemon=True)
+            self._warmup_thread.start()
+
+    def is_warming_up(self):
+        """
+        Check whether the background warm-up is still running.
+
+        Returns:
+            bool: True while the warm-up thread is alive
+        """
+        return self._warmup_thread is not None and self._warmup_thread.is_alive()
+
+    def _load(self, technique_id):
+        """Load one technique's tests through the memory, negative and snapshot caches."""
+        with self._lock:
+            if technique_id in self._tests:
+                return self._tests[technique_id]
+            checked_at = self._missing.get(technique_id)
+        if checked_at is not None and time.time() - checked_at < self.negative_ttl:
+            return self._remember(technique_id, None)
+
+        try:
+            path = self.cache.fetch(self.url_for(technique_id))
+        except FileNotFoundError:
+            # Not in the local atomics folder
+            return self._remember(technique_id, None)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                # The technique has no tests: remember it so it is not requested again for a while
+                with self._lock:
+                    self._missing[technique_id] = time.time()
+                    self._missing_dirty = True
+            return self._remember(technique_id, None)
+        except requests.exceptions.ConnectionError:
+            self._unreachable = True
+            return self._remember(technique_id, None)
+        except requests.exceptions.RequestException:
+            # Timeouts, offline mode without a cached copy, retries exhausted
+            return self._remember(technique_id, None)
+
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            content_hash = self.cache.content_hash(self.url_for(technique_id), path)
+        except OSError:
+            return self._remember(technique_id, None)
+        return self._remember(technique_id, parse_atomics_yaml(content, content_hash, self.parse_cache_dir))
+
+    def _remember(self, technique_id, tests):
+        """Keep a technique's tests and their catalog entries in memory and return them."""
+        summaries = summarize_tests(technique_id, tests)
+        with self._lock:
+            self._tests[technique_id] = tests
+            if summaries:
+                self._catalog[technique_id] = summaries
+        return tests
+
+    def _read_missing(self):
+        """Read the techniques known to have no tests (only kept for remote atomics)."""
+        if not is_remote_source(self.base_url):
+            return {}
+        try:
+            with open(self._missing_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_missing(self):
+        """Save the techniques known to have no tests, atomically, if any were added since the last save."""
+        if not is_remote_source(self.base_url):
+            return
+        with self._lock:
+            if not self._missing_dirty:
+                return
+            self._missing_dirty = False
+            missing = dict(self._missing)
+        try:
+            os.makedirs(self.cache.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache.cache_dir, prefix=".atomics-missing-")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(missing, f)
+            os.replace(tmp_path, self._missing_path)
+        except OSError:
+            # The negative cache only saves requests; losing it is harmless
+            pass
+
+
+class AtomicsMirror:
+    """
+    Atomic Red Team tests read from a local checkout or tarball of the atomic-red-team repository.
+
+    Offers the same get()/catalog()/prefetch()/start_warmup() methods as
+    AtomicsLoader. Opening a mirror only lists its technique files (the member
+    names of a tarball); a file is parsed the first time its tests are needed,
+    and the catalog grows as files are parsed, like the one of AtomicsLoader.
+    A tarball is opened once and kept open for the life of the mirror.
+    """
+
+    def __init__(self, path, cache_dir=CACHE_DIR):
+        """
+        Args:
+            path (str): Repository checkout, its atomics folder, or a tarball of either
+            cache_dir (str): Directory where parsed files are cached
+        """
+        self.path = local_source_path(path)
+        self.parse_cache_dir = os.path.join(cache_dir, "atomics-parsed")
+        self.warmup_stats = None
+
+        self._lock = threading.RLock()
+        self._tests = {}
+        # Technique ID to the catalog entries of its tests, for the files parsed so far
+        self._catalog = {}
+        # Technique ID to its file path, or its tarfile.TarInfo in a tarball; listed on first use
+        self._files = None
+        self._tar = None
+        self._warmup_thread = None
+
+    def is_tarball(self):
+        """
+        Check whether the mirror is a tarball rather than a directory.
+
+        Returns:
+            bool: True for .tar, .tar.gz, .tgz, .tar.bz2 and .tar.xz files
+        """
+        return os.path.isfile(self.path) and self.path.endswith(TARBALL_SUFFIXES)
+
+    def files(self):
+        """
+        List the technique files of the mirror, from their names only.
+
+        Returns:
+            dict: Technique ID to its file path (or tarfile.TarInfo in a tarball)
+        """
+        with self._lock:
+            if self._files is None:
+                self._files = self._list_tarball() if self.is_tarball() else self._list_directory()
+            return self._files
+
+    def catalog(self):
+        """
+        Get the catalog entries of the techniques parsed so far.
+
+        Complete once the warm-up has finished.
+
+        Returns:
+            dict: Technique ID to a tuple of AtomicTestSummary
+        """
+        with self._lock:
+            return dict(self._catalog)
+
+    def get(self, technique_id):
+        """
+        Get the Atomic Red Team tests of a technique, parsing its file on first use.
+
+        Args:
+            technique_id (str): The technique ID (e.g., T1078.001)
+
+        Returns:
+            dict: The parsed YAML data, or None if the technique has no tests in the mirror
+
+        Raises:
+            yaml.YAMLError: If the file is not valid YAML
+        """
+        files = self.files()
+        with self._lock:
+            if technique_id in self._tests:
+                count("atomics_cache_hits")
+                return self._tests[technique_id]
+        count("atomics_cache_misses")
+        location = files.get(technique_id)
+        if location is None:
+            return None
+        try:
+            content = self._read(location)
+        except (OSError, tarfile.TarError):
+            return None
+        atomic_data = parse_atomics_yaml(content, hashlib.sha256(content).hexdigest(), self.parse_cache_dir)
+        summaries = summarize_tests(technique_id, atomic_data)
+        with self._lock:
+            self._tests[technique_id] = atomic_data
+            if summaries:
+                self._catalog[technique_id] = summaries
+        return atomic_data
+
+    def prefetch(self, technique_ids):
+        """
+        Parse the files of many techniques, filling in the catalog.
+
+        Files are read in the order they are stored, so a compressed tarball is
+        decompressed in a single forward pass.
+
+        Args:
+            technique_ids (iterable): Technique IDs of interest
+
+        Returns:
+            dict: Number of techniques per outcome ("found", "missing", "invalid")
+        """
+        files = self.files()
+        technique_ids = list(dict.fromkeys(technique_ids))
+        outcomes = Counter(missing=sum(1 for tech_id in technique_ids if tech_id not in files))
+        present = [tech_id for tech_id in technique_ids if tech_id in files]
+        if self.is_tarball():
+            present.sort(key=lambda tech_id: files[tech_id].offset)
+        for tech_id in present:
+            try:
+                outcomes["found" if self.get(tech_id) else "missing"] += 1
+            except yaml.YAMLError:
+                # Left out of the catalog so that displaying the technique reports the error
+                outcomes["invalid"] += 1
+        return dict(+outcomes)
+
+    def start_warmup(self, technique_ids):
+        """
+        Parse the files of some techniques in a background thread.
+
+        Does nothing if a warm-up is already running or has finished.
+
+        Args:
+            technique_ids (iterable): Technique IDs of interest
+        """
+        with self._lock:
+            if self._warmup_thread is not None:
+                return
+            technique_ids = list(technique_ids)
+
+            def warmup():
+                self.warmup_stats = self.prefetch(technique_ids)
+
+            self._warmup_thread = threading.Thread(target=warmup, name="atomics-warmup", daemon=True)
+            self._warmup_thread.start()
+
+    def is_warming_up(self):
+        """
+        Check whether the background warm-up is still running.
+
+        Returns:
+            bool: True while the warm-up thread is alive
+        """
+        return self._warmup_thread is not None and self._warmup_thread.is_alive()
+
+    def iter_files(self):
+        """
+        Read every technique file of the mirror, without parsing it.
+
+        Yields:
+            tuple: (technique_id, content) in the order the files are stored
+        """
+        files = self.files()
+        order = sorted(files, key=lambda tech_id: files[tech_id].offset) if self.is_tarball() else sorted(files)
+        for technique_id in order:
+            try:
+                yield technique_id, self._read(files[technique_id])
+            except (OSError, tarfile.TarError):
+                continue
+
+    def close(self):
+        """Close the tarball, if one is open."""
+        with self._lock:
+            if self._tar is not None:
+                self._tar.close()
+                self._tar = None
+
+    def _atomics_dir(self):
+        """Get the atomics folder of a checkout (or the path itself if it is the atomics folder)."""
+        nested = os.path.join(self.path, "atomics")
+        return nested if os.path.isdir(nested) else self.path
+
+    def _list_directory(self):
+        """Find the technique files of a directory from the folder names."""
+        atomics_dir = self._atomics_dir()
+        try:
+            entries = sorted(os.listdir(atomics_dir))
+        except OSError:
+            # No mirror at that path: every technique is reported without tests
+            return {}
+        files = {}
+        for technique_id in entries:
+            location = os.path.join(atomics_dir, technique_id, f"{technique_id}.yaml")
+            if TECHNIQUE_ID_RE.match(technique_id) and os.path.isfile(location):
+                files[technique_id] = location
+        return files
+
+    def _list_tarball(self):
+        """Open the tarball and find the technique files from the member headers."""
+        try:
+            self._tar = tarfile.open(self.path)
+            return {match.group(1): member for member in self._tar
+                    for match in [ATOMICS_FILE_RE.search(member.name)] if match and member.isfile()}
+        except (OSError, tarfile.TarError):
+            return {}
+
+    def _read(self, location):
+        """Read a technique file from the directory or the open tarball."""
+        if not isinstance(location, tarfile.TarInfo):
+            with open(location, "rb") as f:
+                return f.read()
+        # The archive handle is shared, so members are read one at a time
+        with self._lock:
+            return self._tar.extractfile(location).read()
+
+
+def open_atomics(source=ATOMIC_RED_TEAM_BASE_URL):
+    """
+    Open the Atomic Red Team tests at a URL, a local checkout or a tarball.
+
+    Args:
+        source (str): URL of the atomics folder, or path of a checkout, an atomics folder or a tarball
+
+    Returns:
+        AtomicsLoader or AtomicsMirror: The loader for the source
+    """
+    if is_remote_source(source):
+        return AtomicsLoader(source)
+    return AtomicsMirror(source)
@@ -0,0 +1,394 @@
+"""
+Headless export of the techniques of every threat group.
+
+Loads the knowledge base with the same loader as the app (compiled snapshots
+and cache included, no Streamlit) and writes the techniques of all groups, or
+of the selected ones, as CSV, JSON Lines, Parquet or ATT&CK Navigator layers.
+
+Rows are streamed to the files as they are produced, never collected into a
+DataFrame. Groups are split into chunks written by a pool of worker
+processes, which read the records from a compiled snapshot of the loaded
+knowledge base instead of loading the bundles again.
+
+Usage:
+    python batch_export.py --output DIR [--format csv|jsonl|parquet|navigator ...]
+                           [--groups NAME_OR_ID ...] [--domains enterprise,mobile,ics]
+                           [--combined] [--workers N]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from compiled_snapshot import read_records, write_snapshot
+from config import ATTACK_DOMAINS, ATTACK_DOMAIN_URLS
+from knowledge_base import DOMAIN_LABELS, TechniqueUsage, load_domains
+
+# Columns of the CSV, JSON Lines and Parquet exports
+EXPORT_COLUMNS = ("group", "group_id", "technique_id", "technique", "tactics", "domain", "procedure",
+                  "relationship_id")
+
+# File extension of each export format
+EXPORT_FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "parquet": ".parquet", "navigator": ".json"}
+
+# Rows buffered per Parquet row group
+PARQUET_BATCH_ROWS = 50_000
+
+# Versions written in Navigator layers
+NAVIGATOR_VERSIONS = {"navigator": "4.9.1", "layer": "4.5"}
+
+# Navigator domain name of each ATT&CK domain
+NAVIGATOR_DOMAINS = {"enterprise": "enterprise-attack", "mobile": "mobile-attack", "ics": "ics-attack"}
+
+# Usages of each group name, set in every worker process by _init_worker()
+_worker_usages = None
+_worker_releases = None
+
+
+def _file_stem(group):
+    """Get a file name for a group (its ATT&CK ID, or its name with unsafe characters replaced)."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", group.group_id or group.name)
+
+
+def _row(usage):
+    """Turn a TechniqueUsage into an export row."""
+    return (usage.group.name, usage.group.group_id, usage.tech_id, usage.name, ", ".join(usage.tactics),
+            usage.technique.domain, usage.procedure, usage.stix_id)
+
+
+class _CsvWriter:
+    """Streams export rows to a CSV file."""
+
+    def __init__(self, path, header=True):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        if header:
+            self._writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def close(self):
+        self._file.close()
+
+
+class _JsonlWriter:
+    """Streams export rows to a JSON Lines file."""
+
+    def __init__(self, path, header=True):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        self._file.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Streams export rows to a Parquet file, one row group per PARQUET_BATCH_ROWS rows."""
+
+    def __init__(self, path, header=True):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            columns = [self._pa.array(values, type=self._pa.string()) for values in zip(*self._rows)]
+            self._writer.write_batch(self._pa.RecordBatch.from_arrays(columns, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+# Row writer of each tabular export format
+ROW_WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+def navigator_layer(group, usages, releases):
+    """
+    Build the ATT&CK Navigator layers of a group, one per domain of its techniques.
+
+    Args:
+        group (Group): The group
+        usages (iterable): TechniqueUsages of the group
+        releases (dict): Domain name to the release of its bundle
+
+    Returns:
+        dict: Domain name to the layer (a JSON-serializable dict)
+    """
+    by_domain = {}
+    for usage in usages:
+        comments = by_domain.setdefault(usage.technique.domain, {}).setdefault(usage.tech_id, [])
+        if usage.procedure:
+            comments.append(usage.procedure)
+    layers = {}
+    for domain, techniques in by_domain.items():
+        release = releases.get(domain) or {}
+        versions = dict(NAVIGATOR_VERSIONS)
+        if release.get("version"):
+            versions["attack"] = str(release["version"]).split(".")[0]
+        layers[domain] = {
+            "name": f"{group.name} ({group.group_id})" if group.group_id else group.name,
+            "versions": versions,
+            "domain": NAVIGATOR_DOMAINS.get(domain, f"{domain}-attack"),
+            "description": f"{DOMAIN_LABELS.get(domain, domain)} techniques used by {group.name}",
+            "techniques": [{"techniqueID": tech_id, "score": 1, "color": "#e60d0d",
+                            "comment": "\n\n".join(comments), "enabled": True}
+                           for tech_id, comments in sorted(techniques.items())],
+            "gradient": {"colors": ["#ffffff", "#e60d0d"], "minValue": 0, "maxValue": 1},
+            "legendItems": [],
+        }
+    return layers
+
+
+def export_chunk(group_names, usages_by_group, releases, formats, output_dir, part=None):
+    """
+    Write the exports of some groups.
+
+    Args:
+        group_names (list): Names of the groups to export
+        usages_by_group (dict): Group name to its TechniqueUsages
+        releases (dict): Domain name to the release of its bundle
+        formats (list): Export formats
+        output_dir (str): Directory of the exports
+        part (int): Write the tabular formats to one part file with this number instead of
+                    one file per group
+
+    Returns:
+        tuple: (number of rows, list of the paths written)
+    """
+    rows = 0
+    paths = []
+    tabular = [export_format for export_format in formats if export_format in ROW_WRITERS]
+
+    def open_writers(stem):
+        writers = {}
+        for export_format in tabular:
+            path = os.path.join(output_dir, export_format, stem + EXPORT_FORMATS[export_format])
+            # Part files get no header, _combine_parts() writes it once
+            writers[export_format] = ROW_WRITERS[export_format](path, header=part is None)
+            paths.append(path)
+        return writers
+
+    def close_writers(writers):
+        for writer in writers.values():
+            writer.close()
+
+    shared = open_writers(f"part-{part:05d}") if part is not None else None
+    for group_name in group_names:
+        usages = usages_by_group.get(group_name, ())
+        if not usages:
+            continue
+        group = usages[0].group
+        writers = shared if shared is not None else open_writers(_file_stem(group))
+        for usage in usages:
+            row = _row(usage)
+            for writer in writers.values():
+                writer.write(row)
+        rows += len(usages)
+        if shared is None:
+            close_writers(writers)
+        if "navigator" in formats:
+            layers = navigator_layer(group, usages, releases)
+            for domain, layer in layers.items():
+                suffix = f"_{domain}" if len(layers) > 1 else ""
+                path = os.path.join(output_dir, "navigator", _file_stem(group) + suffix + EXPORT_FORMATS["navigator"])
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(layer, f, ensure_ascii=False, indent=1)
+                paths.append(path)
+    if shared is not None:
+        close_writers(shared)
+    return rows, paths
+
+
+def _init_worker(snapshot):
+    """Load the records of the knowledge base in a worker process."""
+    global _worker_usages, _worker_releases
+    records = read_records(snapshot)
+    techniques = {tech.stix_id: tech for tech in records.techniques}
+    groups = {group.stix_id: group for group in records.groups}
+    _worker_usages = {}
+    for group_stix_id, tech_stix_id, procedure, relationship_id in records.uses:
+        group = groups[group_stix_id]
+        _worker_usages.setdefault(group.name, []).append(
+            TechniqueUsage(group, techniques[tech_stix_id], procedure, relationship_id))
+    _worker_releases = records.releases
+
+
+def _export_in_worker(group_names, formats, output_dir, part):
+    """Export a chunk of groups from the records loaded by _init_worker()."""
+    return export_chunk(group_names, _worker_usages, _worker_releases, formats, output_dir, part)
+
+
+def _combine_parts(output_dir, export_format, part_count, name):
+    """
+    Join the part files of a tabular format into one file.
+
+    CSV and JSON Lines parts are appended byte for byte; Parquet parts are
+    copied row group by row group.
+
+    Returns:
+        str: Path of the combined file
+    """
+    directory = os.path.join(output_dir, export_format)
+    parts = [os.path.join(directory, f"part-{part:05d}{EXPORT_FORMATS[export_format]}") for part in range(part_count)]
+    path = os.path.join(output_dir, name + EXPORT_FORMATS[export_format])
+    if export_format == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(path, pq.read_schema(parts[0])) as writer:
+            for part in parts:
+                part_file = pq.ParquetFile(part)
+                for row_group in range(part_file.num_row_groups):
+                    writer.write_table(part_file.read_row_group(row_group))
+    else:
+        with open(path, "wb") as combined:
+            if export_format == "csv":
+                combined.write((",".join(EXPORT_COLUMNS) + "\r\n").encode("utf-8"))
+            for part in parts:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, combined, 1 << 20)
+    shutil.rmtree(directory)
+    return path
+
+
+def select_groups(knowledge_base, selection):
+    """
+    Resolve group names and ATT&CK IDs to group names.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The knowledge base
+        selection (list): Group names or IDs (e.g. "APT29" or "G0016", case-insensitive);
+                          every group that uses a technique when empty
+
+    Returns:
+        list: Group names, sorted
+
+    Raises:
+        ValueError: If a name or ID matches no group
+    """
+    if not selection:
+        return sorted(knowledge_base.group_to_techniques)
+    lookup = {}
+    for group in knowledge_base.groups_dict.values():
+        lookup[group.name.lower()] = group.name
+        if group.group_id:
+            lookup[group.group_id.lower()] = group.name
+    unknown = [value for value in selection if value.lower() not in lookup]
+    if unknown:
+        raise ValueError(f"Unknown groups: {', '.join(unknown)}")
+    return sorted({lookup[value.lower()] for value in selection})
+
+
+def export_groups(knowledge_base, group_names, formats, output_dir, combined=False, workers=None):
+    """
+    Export the techniques of some groups.
+
+    With more than one worker, the groups are split into chunks and written by
+    a pool of processes started with "spawn"; they read the records from a
+    compiled snapshot written once to a temporary directory.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The knowledge base
+        group_names (list): Names of the groups to export
+        formats (list): Export formats (keys of EXPORT_FORMATS)
+        output_dir (str): Directory of the exports (one subdirectory per format)
+        combined (bool): Write one file per tabular format for all groups instead of one per group
+        workers (int): Worker processes (the number of CPUs by default; 1 to export in this process)
+
+    Returns:
+        tuple: (number of rows, list of the paths written)
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(group_names) or 1))
+    for export_format in formats:
+        os.makedirs(os.path.join(output_dir, export_format), exist_ok=True)
+    # Several chunks per worker, so a few large groups do not leave the other workers idle
+    chunk_count = 1 if workers == 1 else min(len(group_names), workers * 4)
+    chunks = [group_names[start::chunk_count] for start in range(chunk_count)]
+
+    if workers == 1:
+        results = [export_chunk(chunk, knowledge_base.group_to_techniques, knowledge_base.releases, formats,
+                                output_dir, part if combined else None)
+                   for part, chunk in enumerate(chunks)]
+    else:
+        with tempfile.TemporaryDirectory(prefix="threat-carver-export-") as tmp_dir:
+            snapshot = os.path.join(tmp_dir, "export.sqlite")
+            write_snapshot(knowledge_base, snapshot, "export")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(snapshot,)) as pool:
+                futures = [pool.submit(_export_in_worker, chunk, formats, output_dir, part if combined else None)
+                           for part, chunk in enumerate(chunks)]
+                results = [future.result() for future in futures]
+
+    rows = sum(chunk_rows for chunk_rows, _ in results)
+    paths = [path for _, chunk_paths in results for path in chunk_paths]
+    if combined:
+        tabular = [export_format for export_format in formats if export_format in ROW_WRITERS]
+        paths = [path for path in paths if not os.path.basename(path).startswith("part-")]
+        paths.extend(_combine_parts(output_dir, export_format, len(chunks), "groups") for export_format in tabular)
+    return rows, paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the techniques of ATT&CK threat groups")
+    parser.add_argument("--output", required=True, help="Directory of the exports")
+    parser.add_argument("--format", dest="formats", action="append", choices=list(EXPORT_FORMATS),
+                        help="Export format (repeat for several; default: csv)")
+    parser.add_argument("--groups", nargs="+", default=[], metavar="NAME_OR_ID",
+                        help="Groups to export, by name or ATT&CK ID (default: every group)")
+    parser.add_argument("--domains", default=",".join(ATTACK_DOMAINS),
+                        help="Comma-separated ATT&CK domains to load (default: %(default)s)")
+    parser.add_argument("--combined", action="store_true",
+                        help="Write one CSV / JSON Lines / Parquet file for all groups instead of one per group")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    formats = list(dict.fromkeys(args.formats or ["csv"]))
+    if "parquet" in formats:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("the parquet format needs pyarrow (pip install pyarrow)")
+    domains = [domain.strip().lower() for domain in args.domains.split(",") if domain.strip()]
+    unknown_domains = [domain for domain in domains if domain not in ATTACK_DOMAIN_URLS]
+    if unknown_domains:
+        parser.error(f"unknown domains: {', '.join(unknown_domains)}")
+
+    start = time.perf_counter()
+    knowledge_base, errors = load_domains(domains)
+    for domain, error in errors.items():
+        print(f"warning: {DOMAIN_LABELS.get(domain, domain)} could not be loaded: {error}", file=sys.stderr)
+    loaded = time.perf_counter()
+    try:
+        group_names = select_groups(knowledge_base, args.groups)
+    except ValueError as e:
+        parser.error(str(e))
+
+    rows, paths = export_groups(knowledge_base, group_names, formats, args.output, args.combined, args.workers)
+    finished = time.perf_counter()
+    print(f"Exported {rows:,} rows of {len(group_names):,} groups to {len(paths):,} files in {args.output} "
+          f"(loaded in {loaded - start:.2f}s, written in {finished - loaded:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
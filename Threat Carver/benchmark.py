@@ -0,0 +1,1179 @@
+"""
+Benchmarks for Threat Carver.
+
+Each measurement runs in a fresh Python process so that cold-start times and
+peak memory are not skewed by earlier runs.
+
+Usage:
+    python benchmark.py cold-start [--bundle PATH] [--repeat N]
+    python benchmark.py search [--bundle PATH] [--scale N] [--repeat N]
+    python benchmark.py memory [--bundle PATH] [--scale N]
+    python benchmark.py atomics [--bundle PATH] [--base-url URL] [--workers N]
+    python benchmark.py atomics-mirror --mirror PATH
+    python benchmark.py similarity [--bundle PATH] [--scale N]
+    python benchmark.py alerts [--bundle PATH] [--rows N]
+    python benchmark.py domains [--scale N]
+    python benchmark.py release [--scale N] [--change-rate F]
+    python benchmark.py graph [--scale N] [--groups N]
+    python benchmark.py api [--scale N] [--clients N] [--requests N]
+    python benchmark.py store [--scale N]
+    python benchmark.py suite [--scales N ...] [--repeat N] [--output REPORT] [--compare BASELINE]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Code run in the child process. It prints the elapsed time and the peak RSS.
+# VmHWM is used where available because ru_maxrss survives exec() on Linux and
+# would report the parent's peak instead of the child's.
+CHILD_TEMPLATE = """
+import json, resource, sys, time
+sys.path.insert(0, {app_dir!r})
+import knowledge_base, compiled_snapshot
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+try:
+    with open("/proc/self/status") as f:
+        peak_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+except OSError:
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "peak_rss_mb": peak_kb / 1024}}))
+"""
+
+# How each cold-start strategy loads the knowledge base
+COLD_START_STRATEGIES = {
+    "baseline (imports only)": "pass",
+    "STIX JSON parse": (
+        "with open({bundle!r}, 'rb') as f:\n"
+        "    kb = knowledge_base.AttackKnowledgeBase.from_bundle(json.load(f))"
+    ),
+    "STIX streaming parse": "kb = knowledge_base.AttackKnowledgeBase.from_file({bundle!r})",
+    "compiled snapshot": "kb = compiled_snapshot.read_snapshot({snapshot!r})",
+}
+
+
+def run_child(body):
+    """Run a benchmark body in a fresh interpreter and return its measurements."""
+    code = CHILD_TEMPLATE.format(app_dir=APP_DIR, body=body)
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def resolve_bundle(bundle):
+    """Get a local path for the bundle, fetching the configured one if none is given."""
+    if bundle:
+        return bundle
+    from config import ATTACK_JSON_URL
+    from snapshot_cache import get_snapshot_cache
+    return get_snapshot_cache().fetch(ATTACK_JSON_URL)
+
+
+def benchmark_cold_start(bundle, repeat):
+    """
+    Compare cold-start time and peak RSS of the STIX JSON parsers and the compiled snapshot.
+
+    Args:
+        bundle (str): Path of the STIX bundle
+        repeat (int): Number of runs per strategy (the best time is reported)
+
+    Returns:
+        dict: Strategy name to {"seconds", "peak_rss_mb"}
+    """
+    from compiled_snapshot import write_snapshot
+    from knowledge_base import AttackKnowledgeBase
+    from snapshot_cache import file_sha256
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot = os.path.join(tmp_dir, "snapshot.sqlite")
+        with open(bundle, "rb") as f:
+            write_snapshot(AttackKnowledgeBase.from_bundle(json.load(f)), snapshot, file_sha256(bundle))
+
+        results = {}
+        for name, body in COLD_START_STRATEGIES.items():
+            runs = [run_child(body.format(bundle=bundle, snapshot=snapshot)) for _ in range(repeat)]
+            results[name] = {
+                "seconds": min(run["seconds"] for run in runs),
+                "peak_rss_mb": max(run["peak_rss_mb"] for run in runs)
+            }
+        results["compiled snapshot"]["file_mb"] = os.path.getsize(snapshot) / (1024 * 1024)
+    return results
+
+
+# Queries typed in the search boxes: words, prefixes, phrases and ATT&CK IDs
+SEARCH_QUERIES = [
+    "powershell", "credential dump", "lsass", "remote desktop", "pers",
+    "exfiltration archive", "T1059", "T1003.001"
+]
+
+
+def _linear_match(tech, term, include_procedure):
+    """The substring test the search boxes used before the inverted index."""
+    return (term in tech.name.lower() or
+            term in tech.description.lower() or
+            (tech.tech_id and term in tech.tech_id.lower()) or
+            (include_procedure and term in tech.procedure.lower()) or
+            any(term in tactic.lower() for tactic in tech.tactics))
+
+
+def search_paths(kb):
+    """
+    Get the search paths of the app as (indexed, linear scan) function pairs.
+
+    Args:
+        kb (AttackKnowledgeBase): The knowledge base to search
+
+    Returns:
+        dict: Path name to (indexed_search, linear_search), each taking a query
+    """
+    largest_group = max(kb.group_positions, key=lambda name: len(kb.group_positions[name]))
+    group_positions = kb.group_positions[largest_group]
+    techniques = list(kb.techniques_dict.values())
+    usages = kb.usages
+
+    def linear_group(query):
+        term = query.lower()
+        return [p for p in group_positions if _linear_match(usages[p], term, True)]
+
+    def linear_all_groups(query):
+        term = query.lower()
+        return [p for p in range(len(usages)) if _linear_match(usages[p], term, True)]
+
+    def linear_explorer(query):
+        term = query.lower()
+        found = [tech for tech in techniques if _linear_match(tech, term, False)]
+        found_ids = {tech.tech_id for tech in found}
+        found.extend(tech for tech in usages
+                     if tech.tech_id not in found_ids and term in tech.procedure.lower())
+        return found
+
+    def linear_replication(query):
+        term = query.lower()
+        return [tech for tech in techniques if _linear_match(tech, term, False)]
+
+    return {
+        "Group Analysis (largest group)": (lambda q: kb.search_usages(q, group_positions), linear_group),
+        "Search All Groups": (kb.search_usages, linear_all_groups),
+        "Technique Explorer": (lambda q: kb.search_techniques(q, include_procedures=True), linear_explorer),
+        "Technique Replication": (kb.search_techniques, linear_replication),
+    }
+
+
+def _latency_ms(function, queries, repeat):
+    """Run each query `repeat` times and return (median, worst) latency in milliseconds."""
+    timings = []
+    for query in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+
+def benchmark_search(kb, repeat):
+    """
+    Measure query latency of every search path, indexed and with the old linear scan.
+
+    Args:
+        kb (AttackKnowledgeBase): The knowledge base to search
+        repeat (int): Runs per query
+
+    Returns:
+        dict: Row name to {"median_ms", "max_ms"}
+    """
+    results = {}
+    for name, (indexed, linear) in search_paths(kb).items():
+        for label, function in (("index", indexed), ("linear", linear)):
+            median, worst = _latency_ms(function, SEARCH_QUERIES, repeat)
+            results[f"{name} [{label}]"] = {"median_ms": median, "max_ms": worst}
+    return results
+
+
+def load_corpora(bundle, scale):
+    """
+    Load the knowledge bases to benchmark: the given (or configured) bundle and a synthetic one.
+
+    Returns:
+        dict: Corpus name to (AttackKnowledgeBase, build seconds)
+    """
+    from knowledge_base import AttackKnowledgeBase
+    from synthetic_data import generate_bundle_objects
+
+    corpora = {}
+    try:
+        path = resolve_bundle(bundle)
+    except Exception as e:
+        print(f"Skipping the ATT&CK bundle ({e})")
+    else:
+        start = time.perf_counter()
+        corpora["ATT&CK bundle"] = (AttackKnowledgeBase.from_file(path), time.perf_counter() - start)
+    if scale:
+        objects = list(generate_bundle_objects(scale))
+        start = time.perf_counter()
+        kb = AttackKnowledgeBase.from_objects(objects)
+        corpora[f"synthetic x{scale:g}"] = (kb, time.perf_counter() - start)
+    return corpora
+
+
+def _traced_mb(build):
+    """Return (result of build(), MB allocated by it and still alive)."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, (after - before) / (1024 * 1024)
+
+
+def benchmark_memory(kb):
+    """
+    Compare the memory of the technique and group-entry records with the previous dict layout.
+
+    The previous layout kept one dict per technique and, for every "uses"
+    relationship, a copy of the technique dict with the procedure added.
+
+    Args:
+        kb (AttackKnowledgeBase): The knowledge base to measure
+
+    Returns:
+        dict: Row name to {"MB", "bytes_per_record"}
+    """
+    from knowledge_base import Technique, TechniqueUsage
+
+    techniques = list(kb.techniques_dict.values())
+    usages = kb.usages
+
+    def dict_techniques():
+        return {tech.stix_id: {"tech_id": tech.tech_id, "name": tech.name, "description": tech.description,
+                               "tactics": list(tech.tactics)} for tech in techniques}
+
+    technique_dicts, dict_technique_mb = _traced_mb(dict_techniques)
+
+    def dict_usages():
+        entries = []
+        for usage in usages:
+            entry = technique_dicts[usage.technique.stix_id].copy()
+            entry["procedure"] = usage.procedure
+            entries.append(entry)
+        return entries
+
+    _, dict_usage_mb = _traced_mb(dict_usages)
+    slot_techniques, slot_technique_mb = _traced_mb(lambda: {
+        tech.stix_id: Technique(tech.stix_id, tech.tech_id, tech.name, tech.description, tuple(tech.tactics),
+                                tech.domain)
+        for tech in techniques})
+    _, slot_usage_mb = _traced_mb(lambda: tuple(
+        TechniqueUsage(usage.group, slot_techniques[usage.technique.stix_id], usage.procedure) for usage in usages))
+
+    def row(mb, count):
+        return {"MB": mb, "bytes_per_record": mb * 1024 * 1024 / max(count, 1)}
+
+    return {
+        "techniques [dicts]": row(dict_technique_mb, len(techniques)),
+        "techniques [slotted records]": row(slot_technique_mb, len(techniques)),
+        "group entries [dict copies]": row(dict_usage_mb, len(usages)),
+        "group entries [shared references]": row(slot_usage_mb, len(usages)),
+    }
+
+
+def benchmark_atomics(technique_ids, base_url, workers):
+    """
+    Compare loading Atomic Red Team files one request at a time with the concurrent prefetch.
+
+    Both start from an empty cache so every file is really downloaded.
+
+    Args:
+        technique_ids (list): Technique IDs to load
+        base_url (str): URL of the atomics folder
+        workers (int): Worker threads of the prefetch
+
+    Returns:
+        dict: Row name to {"seconds", "files_per_s", "found"}
+    """
+    import requests
+    from atomics import AtomicsLoader, make_session
+    from snapshot_cache import SnapshotCache
+
+    results = {}
+    start = time.perf_counter()
+    found = 0
+    for tech_id in technique_ids:
+        # What the page did before: a new connection per technique, 404s included
+        resp = requests.get(f"{base_url}/{tech_id}/{tech_id}.yaml", timeout=30)
+        found += resp.status_code == 200
+    elapsed = time.perf_counter() - start
+    results["one request per technique"] = {"seconds": elapsed, "files_per_s": len(technique_ids) / elapsed,
+                                            "found": found}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        loader = AtomicsLoader(base_url, cache=SnapshotCache(tmp_dir, False, session=make_session(workers)),
+                               max_workers=workers)
+        start = time.perf_counter()
+        outcomes = loader.prefetch(technique_ids)
+        elapsed = time.perf_counter() - start
+    results[f"pooled prefetch ({workers} workers)"] = {"seconds": elapsed, "files_per_s": len(technique_ids) / elapsed,
+                                                      "found": outcomes.get("found", 0)}
+    return results
+
+
+def benchmark_atomics_mirror(mirror):
+    """
+    Compare parsing every file of a local atomics mirror with building its catalog.
+
+    Args:
+        mirror (str): Path of an atomic-red-team checkout, atomics folder or tarball
+
+    Returns:
+        dict: Row name to {"seconds", "tests"}
+    """
+    import yaml
+    from atomics import AtomicsMirror
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Raw file contents, read once so that only parsing is timed
+        contents = [content for _, content in AtomicsMirror(mirror, tmp_dir).iter_files()]
+        loaders = [("pure-Python SafeLoader", yaml.SafeLoader)]
+        if hasattr(yaml, "CSafeLoader"):
+            loaders.append(("libyaml CSafeLoader", yaml.CSafeLoader))
+        for name, loader in loaders:
+            start = time.perf_counter()
+            tests = 0
+            for content in contents:
+                try:
+                    tests += len((yaml.load(content, Loader=loader) or {}).get("atomic_tests") or [])
+                except yaml.YAMLError:
+                    pass
+            results[f"parse every file [{name}]"] = {"seconds": time.perf_counter() - start, "tests": tests}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ("catalog [empty cache]", "catalog [warm cache]"):
+            start = time.perf_counter()
+            atomics_mirror = AtomicsMirror(mirror, tmp_dir)
+            atomics_mirror.prefetch(atomics_mirror.files())
+            catalog = atomics_mirror.catalog()
+            results[name] = {"seconds": time.perf_counter() - start,
+                             "tests": sum(len(summaries) for summaries in catalog.values())}
+    return results
+
+
+def benchmark_similarity(kb, k=10):
+    """
+    Compare group similarity from technique bitsets with Python set intersections.
+
+    Args:
+        kb (AttackKnowledgeBase): The knowledge base
+        k (int): Number of similar groups per top-k query
+
+    Returns:
+        dict: Row name to {"seconds"}
+    """
+    from group_similarity import GroupSimilarity
+
+    group_sets = {group_name: {usage.technique.stix_id for usage in usages}
+                  for group_name, usages in kb.group_to_techniques.items()}
+    group_names = sorted(group_sets)
+    query_group = max(group_names, key=lambda name: len(group_sets[name]))
+
+    def naive_top_k():
+        techniques = group_sets[query_group]
+        scores = []
+        for other in group_names:
+            shared = len(techniques & group_sets[other])
+            if other != query_group and shared:
+                scores.append((-shared / len(techniques | group_sets[other]), other))
+        return sorted(scores)[:k]
+
+    def naive_pairwise():
+        return [[len(group_sets[a] & group_sets[b]) / (len(group_sets[a] | group_sets[b]) or 1)
+                 for b in group_names] for a in group_names]
+
+    results = {}
+    start = time.perf_counter()
+    similarity = GroupSimilarity(kb.usages, kb.group_positions)
+    results["build bitsets"] = {"seconds": time.perf_counter() - start}
+    for name, function in (
+            ("top-k [sets]", naive_top_k),
+            ("top-k [bitsets]", lambda: similarity.most_similar(query_group, k)),
+            ("all pairs [sets]", naive_pairwise),
+            ("all pairs [bitsets]", lambda: similarity.pairwise())):
+        start = time.perf_counter()
+        function()
+        results[name] = {"seconds": time.perf_counter() - start}
+    return results
+
+
+# How each alert ingestion strategy reads the synthetic alert files
+ALERT_STRATEGIES = {
+    "baseline (imports only)": ("csv", "import alert_ingest"),
+    "CSV whole file [pandas]": ("csv", "import pandas as pd\ndf = pd.read_csv({path!r}, dtype=str)"),
+    "CSV streamed [column]": ("csv", (
+        "import alert_ingest\n"
+        "with open({path!r}, 'rb') as f:\n"
+        "    alert_ingest.count_techniques(f, 'csv')")),
+    "CSV streamed [all columns]": ("csv-untagged", (
+        "import alert_ingest\n"
+        "with open({path!r}, 'rb') as f:\n"
+        "    alert_ingest.count_techniques(f, 'csv')")),
+    "JSONL streamed [raw lines]": ("jsonl", (
+        "import alert_ingest\n"
+        "with open({path!r}, 'rb') as f:\n"
+        "    alert_ingest.count_techniques(f, 'jsonl')")),
+    "JSONL streamed [nested field]": ("jsonl", (
+        "import alert_ingest\n"
+        "with open({path!r}, 'rb') as f:\n"
+        "    alert_ingest.count_techniques(f, 'jsonl', field='threat.technique.id')")),
+}
+
+
+def write_alert_files(technique_ids, rows, directory):
+    """
+    Write synthetic SIEM alert exports of the given size.
+
+    Args:
+        technique_ids (list): ATT&CK IDs to draw alerts from (a few are much more frequent, like real alerts)
+        rows (int): Number of alerts
+        directory (str): Where to write the files
+
+    Returns:
+        dict: File kind ("csv", "csv-untagged", "jsonl") to its path
+    """
+    import random
+
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(len(technique_ids))]
+    paths = {kind: os.path.join(directory, f"alerts-{kind}.{kind.split('-')[0]}")
+             for kind in ("csv", "csv-untagged", "jsonl")}
+    with open(paths["csv"], "w") as csv_file, open(paths["csv-untagged"], "w") as untagged_file, \
+            open(paths["jsonl"], "w") as jsonl_file:
+        csv_file.write("timestamp,host,rule_name,severity,technique_id\n")
+        untagged_file.write("timestamp,host,rule_name,severity,details\n")
+        for start in range(0, rows, 10_000):
+            batch = rng.choices(technique_ids, weights, k=min(10_000, rows - start))
+            for number, technique_id in enumerate(batch, start):
+                host = f"host-{number % 500:03d}"
+                csv_file.write(f"2024-05-01T00:00:{number % 60:02d}Z,{host},Rule {number % 97},high,{technique_id}\n")
+                untagged_file.write(f"2024-05-01T00:00:{number % 60:02d}Z,{host},Rule {number % 97},high,"
+                                    f"\"Matched {technique_id} on {host}\"\n")
+                jsonl_file.write(json.dumps({
+                    "@timestamp": f"2024-05-01T00:00:{number % 60:02d}Z", "host": {"name": host},
+                    "rule": {"name": f"Rule {number % 97}"}, "severity": "high",
+                    "threat": {"technique": {"id": [technique_id]}}}) + "\n")
+    return paths
+
+
+def benchmark_alerts(kb, rows):
+    """
+    Measure time, throughput and peak RSS of alert file ingestion.
+
+    Args:
+        kb (AttackKnowledgeBase): Knowledge base the alert technique IDs are drawn from
+        rows (int): Number of synthetic alerts
+
+    Returns:
+        dict: Strategy name to {"seconds", "peak_rss_mb", "file_mb", "k_rows_per_s"}
+    """
+    from alert_ingest import count_techniques, rank_groups
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        paths = write_alert_files(sorted(kb.technique_by_id), rows, tmp_dir)
+        print(f"Wrote {rows:,} alerts per file in {time.perf_counter() - start:.1f}s")
+        for name, (kind, body) in ALERT_STRATEGIES.items():
+            run = run_child(body.format(path=paths[kind]))
+            results[name] = dict(run, file_mb=os.path.getsize(paths[kind]) / (1024 * 1024))
+            if not name.startswith("baseline"):
+                results[name]["k_rows_per_s"] = rows / run["seconds"] / 1000
+
+        with open(paths["csv"], "rb") as f:
+            counts, _ = count_techniques(f, "csv")
+    start = time.perf_counter()
+    rank_groups(kb, counts)
+    results["rank groups"] = {"seconds": time.perf_counter() - start}
+    return results
+
+
+# How each multi-domain strategy loads the three bundles ({sources} maps domain to bundle path)
+DOMAIN_STRATEGIES = {
+    "baseline (imports only)": "pass",
+    "sequential parse": (
+        "records = [knowledge_base.parse_bundle(path, domain) for domain, path in {sources!r}.items()]\n"
+        "kb = knowledge_base.AttackKnowledgeBase.from_records(knowledge_base.merge_records(records))"),
+    "concurrent parse (cold cache)": (
+        "from snapshot_cache import SnapshotCache\n"
+        "kb, errors = knowledge_base.load_domains(list({sources!r}), {sources!r}, SnapshotCache({cache_dir!r}))"),
+    "concurrent parse, worker processes for every bundle (cold cache)": (
+        "from snapshot_cache import SnapshotCache\n"
+        "knowledge_base.PARSE_PROCESS_MIN_BYTES = 0\n"
+        "kb, errors = knowledge_base.load_domains(list({sources!r}), {sources!r},\n"
+        "                                         SnapshotCache({cache_dir!r} + '-processes'))"),
+    "compiled snapshots (warm cache)": (
+        "from snapshot_cache import SnapshotCache\n"
+        "kb, errors = knowledge_base.load_domains(list({sources!r}), {sources!r}, SnapshotCache({cache_dir!r}))"),
+}
+
+
+def write_domain_bundles(scale, directory):
+    """
+    Write one synthetic bundle per ATT&CK domain.
+
+    Techniques and relationships get domain-specific STIX IDs; intrusion sets
+    keep theirs, as real groups appear in several domains under the same ID.
+
+    Args:
+        scale (float): Size of each bundle (1 = about Enterprise ATT&CK)
+        directory (str): Where to write the bundles
+
+    Returns:
+        dict: Domain name to bundle path
+    """
+    from synthetic_data import generate_bundle
+
+    sources = {}
+    for seed, domain in enumerate(("enterprise", "mobile", "ics")):
+        text = json.dumps(generate_bundle(scale, seed=seed))
+        for stix_type in ("attack-pattern", "relationship"):
+            text = text.replace(f'"{stix_type}--synthetic', f'"{stix_type}--{domain}')
+        sources[domain] = os.path.join(directory, f"{domain}-attack.json")
+        with open(sources[domain], "w", encoding="utf-8") as f:
+            f.write(text)
+    return sources
+
+
+def benchmark_domains(scale):
+    """
+    Compare loading three ATT&CK domains one after the other with the concurrent loader.
+
+    Args:
+        scale (float): Size of each synthetic bundle
+
+    Returns:
+        dict: Strategy name to {"seconds", "peak_rss_mb"}
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sources = write_domain_bundles(scale, tmp_dir)
+        cache_dir = os.path.join(tmp_dir, "cache")
+        # Strategies run in order, so the cold run leaves the compiled snapshots for the warm one
+        return {name: run_child(body.format(sources=sources, cache_dir=cache_dir))
+                for name, body in DOMAIN_STRATEGIES.items()}
+
+
+def benchmark_release(scale, change_rate):
+    """
+    Compare rebuilding the knowledge base from scratch for a new release with
+    rebuilding it from the previous release's knowledge base (which only
+    reuses the search tokens of the unchanged techniques and procedures).
+
+    Args:
+        scale (float): Size of the synthetic bundle
+        change_rate (float): Fraction of the techniques and groups changed by the new release
+
+    Returns:
+        dict: Row name to {"seconds"} (and the number of changes for the diff)
+    """
+    from knowledge_base import AttackKnowledgeBase, parse_objects
+    from release_diff import diff_records
+    from synthetic_data import generate_bundle, next_release
+
+    bundle = generate_bundle(scale)
+    old_records = parse_objects(bundle["objects"])
+    new_records = parse_objects(next_release(bundle, change_rate)["objects"])
+    old_kb = AttackKnowledgeBase.from_records(old_records)
+
+    results = {}
+    start = time.perf_counter()
+    diff = diff_records(old_records, new_records, "enterprise")
+    results["diff releases"] = {"seconds": time.perf_counter() - start, "changes": len(diff.changes)}
+    for name, previous in (("full rebuild", None), ("rebuild reusing search tokens", old_kb)):
+        start = time.perf_counter()
+        AttackKnowledgeBase.from_records(new_records, previous)
+        results[name] = {"seconds": time.perf_counter() - start}
+    return results
+
+
+def benchmark_graph(scale, groups):
+    """
+    Compare multi-hop queries on the relationship graph with scans of the bundle objects.
+
+    Each query gets the techniques reached via the software a group uses, then
+    the mitigations of all the group's techniques ranked by coverage.
+
+    Args:
+        scale (float): Size of the synthetic bundle
+        groups (int): Number of groups to query
+
+    Returns:
+        dict: Row name to {"seconds"}
+    """
+    from knowledge_base import AttackKnowledgeBase, parse_objects
+    from synthetic_data import generate_bundle
+
+    objects = generate_bundle(scale)["objects"]
+    start = time.perf_counter()
+    kb = AttackKnowledgeBase.from_records(parse_objects(objects))
+    parse_seconds = time.perf_counter() - start
+    group_ids = [group.stix_id for group in kb.groups_dict.values()][:groups]
+    relationships = [obj for obj in objects if obj["type"] == "relationship"]
+
+    def scan(group_stix_id):
+        # One pass over the objects per hop, the way the pages used to query the bundle
+        software = {rel["target_ref"] for rel in relationships if rel["relationship_type"] == "uses"
+                    and rel["source_ref"] == group_stix_id and rel["target_ref"].startswith(("malware", "tool"))}
+        techniques = {rel["target_ref"] for rel in relationships if rel["relationship_type"] == "uses"
+                      and rel["source_ref"] in software and rel["target_ref"].startswith("attack-pattern")}
+        techniques.update(rel["target_ref"] for rel in relationships if rel["relationship_type"] == "uses"
+                          and rel["source_ref"] == group_stix_id)
+        covered = {}
+        for rel in relationships:
+            if rel["relationship_type"] == "mitigates" and rel["target_ref"] in techniques:
+                covered.setdefault(rel["source_ref"], set()).add(rel["target_ref"])
+        return sorted(covered.items(), key=lambda item: -len(item[1]))
+
+    def query(graph, group_stix_id):
+        via_software = graph.techniques_via_software(group_stix_id)
+        techniques = {usage.technique.stix_id for usage in kb.group_to_techniques[kb.groups_dict[group_stix_id].name]}
+        techniques.update(tech.stix_id for tech in via_software)
+        return graph.mitigations_for(techniques)
+
+    results = {"parse bundle": {"seconds": parse_seconds}}
+    start = time.perf_counter()
+    graph = kb.graph
+    results["build graph"] = {"seconds": time.perf_counter() - start}
+    for name, function in ((f"{len(group_ids)} groups [object scans]", scan),
+                           (f"{len(group_ids)} groups [graph]", lambda group_stix_id: query(graph, group_stix_id))):
+        start = time.perf_counter()
+        for group_stix_id in group_ids:
+            function(group_stix_id)
+        results[name] = {"seconds": time.perf_counter() - start}
+    return results
+
+
+def benchmark_api(scale, clients, requests):
+    """
+    Measure throughput and latency of the JSON API server under concurrent clients.
+
+    Every client keeps one connection open and requests a mix of group,
+    technique and search URLs. The same URLs are requested three times: on an
+    empty response cache, on a warm one, and revalidated with If-None-Match.
+
+    Args:
+        scale (float): Size of the synthetic bundle
+        clients (int): Concurrent clients
+        requests (int): Requests per client and pass
+
+    Returns:
+        dict: Pass name to {"req_per_s", "p50_ms", "p95_ms", "kb_sent"}
+    """
+    import http.client
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.parse import quote
+
+    from api_server import ThreadPoolHTTPServer, ThreatCarverApi
+    from data_refresh import KnowledgeBaseState
+    from knowledge_base import AttackKnowledgeBase, parse_objects
+    from synthetic_data import generate_bundle
+
+    kb = AttackKnowledgeBase.from_records(parse_objects(generate_bundle(scale)["objects"]))
+
+    class StaticRefresher:
+        state = KnowledgeBaseState(kb, {}, {}, time.time(), 1)
+
+    server = ThreadPoolHTTPServer(("127.0.0.1", 0), ThreatCarverApi(StaticRefresher()), clients, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    words = [tech.name.split()[0] for tech in kb.techniques_dict.values()]
+    urls = ["/groups"]
+    urls.extend(f"/groups/{quote(group.group_id or group.name)}/techniques" for group in kb.groups_dict.values())
+    urls.extend(f"/techniques/{tech_id}" for tech_id in kb.technique_by_id)
+    urls.extend(f"/search?q={quote(word)}" for word in words[:200])
+    etags = {}
+
+    def client(number, revalidate):
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        latencies, sent = [], 0
+        for i in range(requests):
+            url = urls[(number * requests + i) % len(urls)]
+            headers = {"Accept-Encoding": "gzip"}
+            if revalidate and url in etags:
+                headers["If-None-Match"] = etags[url]
+            start = time.perf_counter()
+            connection.request("GET", url, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+            latencies.append(time.perf_counter() - start)
+            sent += len(body)
+            etags[url] = response.getheader("ETag") or etags.get(url)
+        connection.close()
+        return latencies, sent
+
+    results = {}
+    try:
+        for name, revalidate in (("cold cache", False), ("warm cache", False), ("If-None-Match (304)", True)):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                outcomes = list(executor.map(client, range(clients), [revalidate] * clients))
+            elapsed = time.perf_counter() - start
+            latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+            results[name] = {
+                "req_per_s": len(latencies) / elapsed,
+                "p50_ms": latencies[len(latencies) // 2] * 1000,
+                "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+                "kb_sent": sum(outcome[1] for outcome in outcomes) / 1024,
+            }
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+# How each worker loads the knowledge base and runs a search, with and without a shared store
+STORE_STRATEGIES = {
+    "compiled snapshot + in-memory index": (
+        "kb = compiled_snapshot.read_snapshot({snapshot!r})\n"
+        "kb.search_techniques({query!r}, include_procedures=True)"
+    ),
+    "shared store (FTS5)": (
+        "import shared_store\n"
+        "kb = shared_store.SharedStore({store!r}).knowledge_base()\n"
+        "kb.search_techniques({query!r}, include_procedures=True)"
+    ),
+}
+
+
+def benchmark_store(scale):
+    """
+    Compare the start time and peak RSS of a worker reading a compiled snapshot with one reading a shared store.
+
+    Args:
+        scale (float): Size of the synthetic bundle
+
+    Returns:
+        dict: Strategy name to {"seconds", "peak_rss_mb"}
+    """
+    from compiled_snapshot import write_snapshot
+    from knowledge_base import AttackKnowledgeBase, parse_objects
+    from shared_store import build_store
+    from synthetic_data import generate_bundle
+
+    kb = AttackKnowledgeBase.from_records(parse_objects(generate_bundle(scale)["objects"]))
+    query = next(iter(kb.techniques_dict.values())).name.split()[0]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot = os.path.join(tmp_dir, "snapshot.sqlite")
+        store = os.path.join(tmp_dir, "store.sqlite")
+        write_snapshot(kb, snapshot, "benchmark")
+        build_store(kb, store)
+        return {name: run_child(body.format(snapshot=snapshot, store=store, query=query))
+                for name, body in STORE_STRATEGIES.items()}
+
+
+# Stage results slower than the baseline by more than this factor are reported as regressions
+REGRESSION_THRESHOLD = 1.25
+
+# Stages faster than this in both reports are left out of the comparison (timer noise)
+MIN_COMPARED_SECONDS = 0.005
+
+# Groups selected by the "group selection" stage
+SUITE_GROUPS = 100
+
+
+def _measure(function, repeat, memory):
+    """
+    Time a stage and measure the peak memory it allocates.
+
+    A first untimed run takes the imports and lazy initialization out of the
+    measurements. The time is the best of `repeat` plain runs; the memory comes
+    from one more run under tracemalloc, which would otherwise slow the timed
+    runs down. Stages that must start cold create a new cache directory on
+    every call.
+
+    Args:
+        function (callable): The stage, called without arguments
+        repeat (int): Timed runs
+        memory (bool): Also measure the peak memory
+
+    Returns:
+        dict: {"seconds"} and, with memory, {"peak_mb"}
+    """
+    function()
+    seconds = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    result = {"seconds": min(seconds)}
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            result["peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def render_group_table(kb, group_name, page_size=50):
+    """
+    Build what the Group Analysis page renders for a group: the first page of its technique
+    table as HTML, and the CSV of every row offered for download.
+
+    Args:
+        kb (AttackKnowledgeBase): The knowledge base
+        group_name (str): Name of the group
+        page_size (int): Rows per page
+
+    Returns:
+        tuple: (HTML of the page, CSV of every row)
+    """
+    import pandas as pd
+
+    from table_view import tactic_badges
+
+    techniques_list = list(kb.group_to_techniques[group_name])
+    top_rows, _ = kb.technique_tree.group_rows(techniques_list, lambda usage: usage.technique.stix_id)
+    html = pd.DataFrame([{
+        "Technique ID": usage.tech_id or "",
+        "Technique Name": usage.name,
+        "Tactic(s)": tactic_badges(usage.tactics),
+        "Description": usage.description[:150] + "..." if usage.description else "",
+        "Procedure Example": usage.procedure[:150] + "..." if usage.procedure else ""
+    } for usage in top_rows[:page_size]]).to_html(escape=False, index=False, classes="dataframe")
+    csv_data = pd.DataFrame([{
+        "Technique ID": usage.tech_id,
+        "Technique Name": usage.name,
+        "Tactic(s)": ", ".join(usage.tactics),
+        "Description": usage.description,
+        "Procedure Example": usage.procedure
+    } for usage in techniques_list]).to_csv(index=False)
+    return html, csv_data
+
+
+def benchmark_suite(scale, repeat=1, memory=True):
+    """
+    Time and memory-profile every stage of the app on synthetic data, offline.
+
+    A synthetic Enterprise bundle (and, for the multi-domain load, a Mobile and
+    an ICS one) and a synthetic atomics folder are written to a temporary
+    directory, then each stage runs on them: loading, parsing, building the
+    indexes, selecting groups, every search path, rendering a table, exporting
+    and reading the Atomic Red Team tests.
+
+    Args:
+        scale (float): Size of the synthetic data (1 = about the real Enterprise ATT&CK and Atomic Red Team)
+        repeat (int): Timed runs per stage (the best is kept)
+        memory (bool): Also measure the peak memory of each stage
+
+    Returns:
+        tuple: (dict of stage name to {"seconds", "peak_mb"}, dict describing the corpus)
+    """
+    from atomics import AtomicsMirror
+    from batch_export import export_groups
+    from group_similarity import GroupSimilarity
+    from knowledge_base import AttackKnowledgeBase, load_domains, load_knowledge_base, parse_bundle
+    from search_index import KnowledgeBaseSearch
+    from shared_store import SharedStore, build_store
+    from snapshot_cache import SnapshotCache
+    from stix_graph import GraphNode, StixGraph
+    from synthetic_data import generate_bundle, write_atomics_tree
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        runs = iter(range(10 ** 6))
+
+        def fresh_dir(name):
+            path = os.path.join(tmp_dir, f"{name}-{next(runs)}")
+            os.makedirs(path)
+            return path
+
+        bundle_path = os.path.join(tmp_dir, "enterprise-attack.json")
+        with open(bundle_path, "w", encoding="utf-8") as f:
+            json.dump(generate_bundle(scale), f)
+        domain_sources = write_domain_bundles(scale, fresh_dir("domains"))
+
+        def stage(name, function):
+            results[name] = _measure(function, repeat, memory)
+            print(f"  {name}: {results[name]['seconds']:.3f}s", file=sys.stderr)
+
+        # Loading: the first start (parse and compile), a restart (compiled snapshot), and three domains
+        warm_cache = SnapshotCache(fresh_dir("cache"), offline=True)
+        load_knowledge_base(bundle_path, warm_cache)
+        stage("load: parse + compile (cold)",
+              lambda: load_knowledge_base(bundle_path, SnapshotCache(fresh_dir("cache"), offline=True)))
+        stage("load: compiled snapshot (warm)", lambda: load_knowledge_base(bundle_path, warm_cache))
+        stage("load: 3 domains (cold)", lambda: load_domains(
+            list(domain_sources), domain_sources, SnapshotCache(fresh_dir("cache"), offline=True)))
+
+        records = parse_bundle(bundle_path, "enterprise")
+        stage("parse: STIX stream", lambda: parse_bundle(bundle_path, "enterprise"))
+
+        kb = AttackKnowledgeBase.from_records(records)
+        stage("index: knowledge base", lambda: AttackKnowledgeBase.from_records(records))
+        stage("index: search", lambda: KnowledgeBaseSearch(kb.techniques_dict, kb.usages))
+        stage("index: group similarity", lambda: GroupSimilarity(kb.usages, kb.group_positions))
+        graph_nodes = [GraphNode(tech.stix_id, "attack-pattern", tech.tech_id, tech.name)
+                       for tech in kb.techniques_dict.values()]
+        graph_nodes.extend(GraphNode(group.stix_id, "intrusion-set", group.group_id, group.name)
+                           for group in kb.groups_dict.values())
+        graph_nodes.extend(records.nodes)
+        stage("index: relationship graph", lambda: StixGraph(graph_nodes, records.edges))
+
+        # What selecting a group computes: tactic counts, a tactic filter, the collapsed technique rows
+        group_names = sorted(kb.group_positions)[:SUITE_GROUPS]
+
+        def select_groups():
+            for group_name in group_names:
+                counts = kb.tactic_matrix.group_counts(group_name)
+                counts = counts[counts > 0]
+                positions = kb.tactic_matrix.filter_positions(kb.group_positions[group_name], list(counts.index[:1]))
+                kb.technique_tree.group_rows([kb.usages[position] for position in positions],
+                                             lambda usage: usage.technique.stix_id)
+                kb.group_similarity.most_similar(group_name, 10)
+
+        # The similarity bitsets are built on the first group selection, which the index stage above measures
+        kb.group_similarity
+        stage(f"group selection ({len(group_names)} groups)", select_groups)
+
+        for name, (indexed, _) in search_paths(kb).items():
+            stage(f"search: {name} ({len(SEARCH_QUERIES)} queries)",
+                  lambda indexed=indexed: [indexed(query) for query in SEARCH_QUERIES])
+
+        largest_group = max(kb.group_positions, key=lambda name: len(kb.group_positions[name]))
+        stage("table render: largest group", lambda: render_group_table(kb, largest_group))
+
+        export_names = sorted(kb.group_positions)
+        stage(f"export: CSV + Navigator ({len(export_names)} groups)", lambda: export_groups(
+            kb, export_names, ["csv", "navigator"], fresh_dir("export"), workers=1))
+
+        atomics_dir, technique_files = write_atomics_tree(kb.technique_by_id, fresh_dir("atomic-red-team"))
+        atomics_cache = fresh_dir("atomics-cache")
+
+        def atomics_catalog(cache_dir):
+            mirror = AtomicsMirror(atomics_dir, cache_dir=cache_dir)
+            mirror.prefetch(mirror.files())
+            return mirror.catalog()
+
+        atomics_catalog(atomics_cache)
+        stage("atomics: open mirror", lambda: AtomicsMirror(atomics_dir, cache_dir=atomics_cache).files())
+        stage("atomics: catalog (cold)", lambda: atomics_catalog(fresh_dir("cache")))
+        stage("atomics: catalog (warm)", lambda: atomics_catalog(atomics_cache))
+
+        def read_all_tests():
+            mirror = AtomicsMirror(atomics_dir, cache_dir=atomics_cache)
+            for technique_id in mirror.files():
+                mirror.get(technique_id)
+
+        stage("atomics: every test file", read_all_tests)
+
+        store_path = os.path.join(tmp_dir, "store.sqlite")
+        stage("shared store: build", lambda: build_store(
+            kb, store_path, AtomicsMirror(atomics_dir, cache_dir=atomics_cache)))
+        store_kb = SharedStore(store_path).knowledge_base()
+        stage(f"search: shared store ({len(SEARCH_QUERIES)} queries)",
+              lambda: [store_kb.search_techniques(query, include_procedures=True) for query in SEARCH_QUERIES])
+
+    corpus = {"techniques": len(kb.techniques_dict), "groups": len(kb.groups_dict), "group_entries": len(kb.usages),
+              "relationships": len(records.edges), "atomics_files": technique_files}
+    return results, corpus
+
+
+def write_report(path, reports, repeat):
+    """
+    Write the results of a suite run as JSON, with what is needed to compare them later.
+
+    Args:
+        path (str): Path of the report
+        reports (dict): Scale label (e.g. "x10") to {"corpus", "stages"}
+        repeat (int): Timed runs per stage
+    """
+    import platform
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+            "scales": reports,
+        }, f, indent=2)
+
+
+def compare_reports(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare the stage times of two suite reports.
+
+    Args:
+        baseline (dict): Earlier report, as written by write_report()
+        current (dict): Report of this run (same layout)
+        threshold (float): Ratio of the times above which a stage counts as a regression
+
+    Returns:
+        tuple: (dict of "scale stage" to {"baseline_s", "current_s", "ratio"}, list of the regressed rows)
+    """
+    rows = {}
+    regressions = []
+    for scale, report in current["scales"].items():
+        baseline_stages = baseline.get("scales", {}).get(scale, {}).get("stages", {})
+        for stage, values in report["stages"].items():
+            before = baseline_stages.get(stage)
+            if before is None or max(before["seconds"], values["seconds"]) < MIN_COMPARED_SECONDS:
+                continue
+            name = f"{scale} {stage}"
+            rows[name] = {"baseline_s": before["seconds"], "current_s": values["seconds"],
+                          "ratio": values["seconds"] / max(before["seconds"], 1e-9)}
+            if rows[name]["ratio"] > threshold:
+                regressions.append(name)
+    return rows, regressions
+
+
+def print_table(results):
+    """Print benchmark results as an aligned table."""
+    width = max(len(name) for name in results)
+    columns = sorted({key for values in results.values() for key in values})
+    print(f"{'':{width}}  " + "  ".join(f"{column:>12}" for column in columns))
+    for name, values in results.items():
+        cells = [f"{values[column]:12.3f}" if column in values else f"{'':12}" for column in columns]
+        print(f"{name:{width}}  " + "  ".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Threat Carver benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cold_start = subparsers.add_parser("cold-start", help="Compare the STIX parsers with the compiled snapshot")
+    cold_start.add_argument("--bundle", help="Path of a STIX bundle (default: the configured ATT&CK source)")
+    cold_start.add_argument("--repeat", type=int, default=3, help="Runs per strategy")
+
+    search = subparsers.add_parser("search", help="Measure query latency of every search box")
+    search.add_argument("--bundle", help="Path of a STIX bundle (default: the configured ATT&CK source)")
+    search.add_argument("--scale", type=float, default=100, help="Size of the synthetic corpus (0 to skip)")
+    search.add_argument("--repeat", type=int, default=5, help="Runs per query")
+
+    memory = subparsers.add_parser("memory", help="Measure the memory of the technique records")
+    memory.add_argument("--bundle", help="Path of a STIX bundle (default: the configured ATT&CK source)")
+    memory.add_argument("--scale", type=float, default=0, help="Also measure a synthetic corpus of this size")
+
+    atomics = subparsers.add_parser("atomics", help="Compare per-technique and pooled Atomic Red Team downloads")
+    atomics.add_argument("--bundle", help="Path of a STIX bundle (default: the configured ATT&CK source)")
+    atomics.add_argument("--base-url", help="URL of the atomics folder (default: the configured one)")
+    atomics.add_argument("--workers", type=int, default=16, help="Worker threads of the prefetch")
+
+    atomics_mirror = subparsers.add_parser("atomics-mirror", help="Measure YAML parsing of a local atomics mirror")
+    atomics_mirror.add_argument("--mirror", required=True, help="Path of an atomic-red-team checkout or tarball")
+
+    similarity = subparsers.add_parser("similarity", help="Measure group similarity queries")
+    similarity.add_argument("--bundle", help="Path of a STIX bundle (default: the configured ATT&CK source)")
+    similarity.add_argument("--scale", type=float, default=10, help="Size of the synthetic corpus (0 to skip)")
+
+    alerts = subparsers.add_parser("alerts", help="Measure streaming ingestion of SIEM alert exports")
+    alerts.add_argument("--bundle", help="Path of a STIX bundle (default: the configured ATT&CK source)")
+    alerts.add_argument("--rows", type=int, default=1_000_000, help="Alerts in the synthetic files")
+
+    domains = subparsers.add_parser("domains", help="Compare sequential and concurrent multi-domain loading")
+    domains.add_argument("--scale", type=float, default=1, help="Size of each synthetic domain bundle")
+
+    release = subparsers.add_parser("release",
+                                    help="Compare a full rebuild with one reusing the previous search tokens")
+    release.add_argument("--scale", type=float, default=10, help="Size of the synthetic bundle")
+    release.add_argument("--change-rate", type=float, default=0.02,
+                         help="Fraction of the objects changed by the new release")
+
+    graph = subparsers.add_parser("graph", help="Compare relationship graph queries with scans of the bundle")
+    graph.add_argument("--scale", type=float, default=1, help="Size of the synthetic bundle")
+    graph.add_argument("--groups", type=int, default=50, help="Groups to query")
+
+    api = subparsers.add_parser("api", help="Measure JSON API throughput and latency under concurrent clients")
+    api.add_argument("--scale", type=float, default=1, help="Size of the synthetic bundle")
+    api.add_argument("--clients", type=int, default=32, help="Concurrent clients")
+    api.add_argument("--requests", type=int, default=200, help="Requests per client and pass")
+
+    store = subparsers.add_parser("store", help="Compare workers reading a compiled snapshot or a shared store")
+    store.add_argument("--scale", type=float, default=10, help="Size of the synthetic bundle")
+
+    suite = subparsers.add_parser("suite", help="Time and memory-profile every stage on synthetic data (offline)")
+    suite.add_argument("--scales", type=float, nargs="+", default=[1, 10],
+                       help="Sizes of the synthetic data, e.g. 1 10 100 (default: %(default)s)")
+    suite.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (the best is kept)")
+    suite.add_argument("--no-memory", action="store_true", help="Skip the memory measurements")
+    suite.add_argument("--output", help="Write the results to this JSON report")
+    suite.add_argument("--compare", help="JSON report of an earlier run to compare with")
+    suite.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                       help="Slowdown factor reported as a regression (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    sys.path.insert(0, APP_DIR)
+
+    if args.command == "cold-start":
+        print_table(benchmark_cold_start(resolve_bundle(args.bundle), args.repeat))
+    elif args.command == "search":
+        for corpus, (kb, build_seconds) in load_corpora(args.bundle, args.scale).items():
+            print(f"\n{corpus}: {len(kb.techniques_dict)} techniques, {len(kb.usages)} group entries, "
+                  f"built in {build_seconds:.2f}s")
+            print_table(benchmark_search(kb, args.repeat))
+    elif args.command == "memory":
+        for corpus, (kb, _) in load_corpora(args.bundle, args.scale).items():
+            print(f"\n{corpus}: {len(kb.techniques_dict)} techniques, {len(kb.usages)} group entries")
+            print_table(benchmark_memory(kb))
+    elif args.command == "atomics":
+        from config import ATOMIC_RED_TEAM_BASE_URL
+        for corpus, (kb, _) in load_corpora(args.bundle, 0).items():
+            print(f"\n{corpus}: {len(kb.technique_by_id)} techniques")
+            print_table(benchmark_atomics(list(kb.technique_by_id), args.base_url or ATOMIC_RED_TEAM_BASE_URL,
+                                          args.workers))
+    elif args.command == "similarity":
+        for corpus, (kb, _) in load_corpora(args.bundle, args.scale).items():
+            print(f"\n{corpus}: {len(kb.group_positions)} groups, {len(kb.techniques_dict)} techniques")
+            print_table(benchmark_similarity(kb))
+    elif args.command == "atomics-mirror":
+        print_table(benchmark_atomics_mirror(args.mirror))
+    elif args.command == "domains":
+        print_table(benchmark_domains(args.scale))
+    elif args.command == "release":
+        print_table(benchmark_release(args.scale, args.change_rate))
+    elif args.command == "graph":
+        print_table(benchmark_graph(args.scale, args.groups))
+    elif args.command == "api":
+        print_table(benchmark_api(args.scale, args.clients, args.requests))
+    elif args.command == "store":
+        print_table(benchmark_store(args.scale))
+    elif args.command == "suite":
+        reports = {}
+        for scale in args.scales:
+            print(f"Synthetic data x{scale:g}", file=sys.stderr)
+            stages, corpus = benchmark_suite(scale, args.repeat, not args.no_memory)
+            reports[f"x{scale:g}"] = {"corpus": corpus, "stages": stages}
+            print(f"\nx{scale:g}: " + ", ".join(f"{count} {name}" for name, count in corpus.items()))
+            print_table(stages)
+        if args.output:
+            write_report(args.output, reports, args.repeat)
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                baseline = json.load(f)
+            rows, regressions = compare_reports(baseline, {"scales": reports}, args.threshold)
+            print(f"\nCompared with {args.compare}:")
+            if rows:
+                print_table(rows)
+            if regressions:
+                print(f"\n{len(regressions)} stage(s) slower than {args.threshold:g}x the baseline:")
+                for name in regressions:
+                    print(f"  {name}")
+                sys.exit(1)
+    elif args.command == "alerts":
+        for corpus, (kb, _) in load_corpora(args.bundle, 0).items():
+            print(f"\n{corpus}: {len(kb.technique_by_id)} techniques, {len(kb.group_positions)} groups")
+            print_table(benchmark_alerts(kb, args.rows))
+
+
+if __name__ == "__main__":
+    main()
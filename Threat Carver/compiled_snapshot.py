@@ -0,0 +1,299 @@
+"""
+Compiled snapshots of the ATT&CK knowledge base.
+
+Parsing the STIX JSON is the slowest part of a cold start. Once a bundle has
+been parsed, its techniques, groups and relationships are written to a small
+SQLite file named after the bundle's SHA-256, so later starts open that file
+(read-only and memory-mapped) and never touch the STIX JSON again. The arrays
+of the bundle's search index are added to the same file once it is built, so
+later starts load the index instead of tokenizing every description again.
+"""
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Bump when the tables change so that older compiled files are ignored
+SNAPSHOT_FORMAT_VERSION = 7
+
+# Bytes of the database file SQLite may memory-map instead of reading
+MMAP_SIZE = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE techniques (
+    stix_id TEXT PRIMARY KEY,
+    tech_id TEXT,
+    name TEXT,
+    description TEXT,
+    tactics TEXT,
+    domain TEXT
+);
+CREATE TABLE groups (
+    stix_id TEXT PRIMARY KEY,
+    name TEXT,
+    group_id TEXT,
+    description TEXT,
+    domains TEXT
+);
+CREATE TABLE uses (
+    position INTEGER PRIMARY KEY,
+    group_stix_id TEXT,
+    technique_stix_id TEXT,
+    procedure TEXT,
+    stix_id TEXT
+);
+CREATE TABLE subtechniques (
+    stix_id TEXT PRIMARY KEY,
+    parent_stix_id TEXT
+);
+CREATE TABLE objects (
+    stix_id TEXT PRIMARY KEY,
+    type TEXT,
+    modified TEXT,
+    revoked INTEGER,
+    deprecated INTEGER
+);
+CREATE TABLE nodes (
+    stix_id TEXT PRIMARY KEY,
+    type TEXT,
+    attack_id TEXT,
+    name TEXT
+);
+CREATE TABLE edges (
+    position INTEGER PRIMARY KEY,
+    source_stix_id TEXT,
+    target_stix_id TEXT,
+    relationship_type TEXT
+);
+CREATE TABLE search (
+    index_name TEXT,
+    array_name TEXT,
+    value BLOB,
+    PRIMARY KEY (index_name, array_name)
+);
+"""
+
+# Names of the technique and procedure indexes of KnowledgeBaseSearch in the search table
+SEARCH_INDEX_NAMES = ("techniques", "procedures")
+
+
+def snapshot_path(snapshot_dir, content_hash):
+    """
+    Get the path of the compiled snapshot for a bundle.
+
+    Args:
+        snapshot_dir (str): Directory holding compiled snapshots
+        content_hash (str): SHA-256 of the raw bundle
+
+    Returns:
+        str: Path of the SQLite file
+    """
+    return os.path.join(snapshot_dir, f"{content_hash}-v{SNAPSHOT_FORMAT_VERSION}.sqlite")
+
+
+def write_snapshot(knowledge_base, path, content_hash):
+    """
+    Write a knowledge base to a compiled snapshot file.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed knowledge base
+        path (str): Destination path of the SQLite file
+        content_hash (str): SHA-256 of the raw bundle the knowledge base came from
+
+    The knowledge base does not keep the STIX versions of its objects, so a
+    snapshot written this way cannot be compared with another release.
+    """
+    from knowledge_base import BundleRecords
+
+    uses = [(usage.group.stix_id, usage.technique.stix_id, usage.procedure, usage.stix_id)
+            for usage in knowledge_base.usages]
+    nodes, edges = knowledge_base.graph_records
+    records = BundleRecords(list(knowledge_base.techniques_dict.values()), list(knowledge_base.groups_dict.values()),
+                            uses, {}, dict(knowledge_base.releases), knowledge_base.technique_tree.edges(),
+                            nodes, edges)
+    write_records(records, path, content_hash)
+
+
+def write_records(records, path, content_hash):
+    """
+    Write parsed records to a compiled snapshot file.
+
+    The file is built under a temporary name and moved into place, so readers
+    never see a half-written snapshot.
+
+    Args:
+        records (BundleRecords): Records as returned by knowledge_base.parse_objects()
+        path (str): Destination path of the SQLite file
+        content_hash (str): SHA-256 of the raw bundle the records came from
+    """
+    techniques, groups, uses, versions, releases, subtechniques, nodes, edges = records
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".sqlite")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("content_hash", content_hash),
+                ("format_version", str(SNAPSHOT_FORMAT_VERSION)),
+                ("releases", json.dumps(releases))
+            ])
+            conn.executemany("INSERT INTO techniques VALUES (?, ?, ?, ?, ?, ?)", [
+                (tech.stix_id, tech.tech_id, tech.name, tech.description, json.dumps(list(tech.tactics)),
+                 tech.domain)
+                for tech in techniques
+            ])
+            conn.executemany("INSERT INTO groups VALUES (?, ?, ?, ?, ?)", [
+                (group.stix_id, group.name, group.group_id, group.description, json.dumps(list(group.domains)))
+                for group in groups
+            ])
+            conn.executemany("INSERT INTO uses VALUES (?, ?, ?, ?, ?)", [
+                (position, group_stix_id, tech_stix_id, procedure, relationship_id)
+                for position, (group_stix_id, tech_stix_id, procedure, relationship_id) in enumerate(uses)
+            ])
+            conn.executemany("INSERT INTO subtechniques VALUES (?, ?)", subtechniques)
+            conn.executemany("INSERT INTO objects VALUES (?, ?, ?, ?, ?)", [
+                (stix_id, version.type, version.modified, int(version.revoked), int(version.deprecated))
+                for stix_id, version in versions.items()
+            ])
+            conn.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?)", nodes)
+            conn.executemany("INSERT INTO edges VALUES (?, ?, ?, ?)", [
+                (position, source, target, relationship_type)
+                for position, (source, target, relationship_type) in enumerate(edges)
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def connect_read_only(path):
+    """
+    Open a compiled snapshot read-only with memory-mapped I/O.
+
+    Args:
+        path (str): Path of the SQLite file
+
+    Returns:
+        sqlite3.Connection: A read-only connection
+    """
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+def read_records(path):
+    """
+    Read the parsed records stored in a compiled snapshot file.
+
+    Args:
+        path (str): Path of the SQLite file
+
+    Returns:
+        BundleRecords: The records, as returned by knowledge_base.parse_objects()
+    """
+    # Imported here to avoid a circular import (knowledge_base uses this module)
+    from knowledge_base import BundleRecords, Group, ObjectVersion, Technique
+    from stix_graph import GraphNode
+
+    conn = connect_read_only(path)
+    try:
+        techniques = [
+            Technique(stix_id, tech_id, name, description, tuple(json.loads(tactics)), domain)
+            for stix_id, tech_id, name, description, tactics, domain in conn.execute(
+                "SELECT stix_id, tech_id, name, description, tactics, domain FROM techniques")
+        ]
+        groups = [
+            Group(stix_id, name, group_id, description, tuple(json.loads(domains)))
+            for stix_id, name, group_id, description, domains in conn.execute(
+                "SELECT stix_id, name, group_id, description, domains FROM groups")
+        ]
+        uses = conn.execute(
+            "SELECT group_stix_id, technique_stix_id, procedure, stix_id FROM uses ORDER BY position").fetchall()
+        versions = {
+            stix_id: ObjectVersion(o_type, modified, bool(revoked), bool(deprecated))
+            for stix_id, o_type, modified, revoked, deprecated in conn.execute(
+                "SELECT stix_id, type, modified, revoked, deprecated FROM objects")
+        }
+        subtechniques = conn.execute("SELECT stix_id, parent_stix_id FROM subtechniques").fetchall()
+        releases = json.loads(conn.execute("SELECT value FROM meta WHERE key = 'releases'").fetchone()[0])
+        nodes = [GraphNode(*row) for row in conn.execute("SELECT stix_id, type, attack_id, name FROM nodes")]
+        edges = conn.execute(
+            "SELECT source_stix_id, target_stix_id, relationship_type FROM edges ORDER BY position").fetchall()
+    finally:
+        conn.close()
+    return BundleRecords(techniques, groups, uses, versions, releases, subtechniques, nodes, edges)
+
+
+def write_search(path, indexes):
+    """
+    Store the search index of the records of a compiled snapshot in its file.
+
+    Args:
+        path (str): Path of the SQLite file (it must exist)
+        indexes (tuple): Technique and procedure SearchIndex, as in KnowledgeBaseSearch.indexes
+    """
+    rows = []
+    for index_name, index in zip(SEARCH_INDEX_NAMES, indexes):
+        for array_name, array in index.to_arrays().items():
+            buffer = io.BytesIO()
+            np.save(buffer, array, allow_pickle=False)
+            rows.append((index_name, array_name, buffer.getvalue()))
+    # Opened read-write without creating the file, so a missing snapshot is an error rather than an empty file
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=rw", uri=True)
+    try:
+        with conn:
+            conn.execute("DELETE FROM search")
+            conn.executemany("INSERT INTO search VALUES (?, ?, ?)", rows)
+    finally:
+        conn.close()
+
+
+def read_search(path):
+    """
+    Load the search index stored in a compiled snapshot file.
+
+    Args:
+        path (str): Path of the SQLite file
+
+    Returns:
+        tuple: Technique and procedure SearchIndex, or None if the snapshot has no index yet
+    """
+    from search_index import SearchIndex
+
+    conn = connect_read_only(path)
+    try:
+        arrays = {}
+        for index_name, array_name, value in conn.execute("SELECT index_name, array_name, value FROM search"):
+            arrays.setdefault(index_name, {})[array_name] = np.load(io.BytesIO(value), allow_pickle=False)
+    finally:
+        conn.close()
+    if set(arrays) != set(SEARCH_INDEX_NAMES):
+        return None
+    return tuple(SearchIndex.from_arrays(arrays[index_name]) for index_name in SEARCH_INDEX_NAMES)
+
+
+def read_snapshot(path):
+    """
+    Load a knowledge base from a compiled snapshot file.
+
+    Args:
+        path (str): Path of the SQLite file
+
+    Returns:
+        AttackKnowledgeBase: The knowledge base stored in the snapshot
+    """
+    from knowledge_base import AttackKnowledgeBase
+
+    return AttackKnowledgeBase.from_records(read_records(path), indexes=read_search(path))
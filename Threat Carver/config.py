@@ -0,0 +1,119 @@
+"""
+Runtime configuration for Threat Carver.
+
+Every setting can be overridden with an environment variable so the same code
+runs on a laptop, on a shared server or in an air-gapped enclave.
+"""
+import os
+
+
+def _env_flag(name, default=False):
+    """Read a boolean environment variable ("1", "true", "yes" and "on" are true)."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# URL (or local file path) of the Enterprise ATT&CK STIX bundle
+ATTACK_JSON_URL = os.environ.get(
+    "THREAT_CARVER_ATTACK_URL",
+    "https://raw.githubusercontent.com/mitre/cti/master/enterprise-attack/enterprise-attack.json"
+)
+
+# URL (or local file path) of the Mobile ATT&CK STIX bundle
+MOBILE_ATTACK_JSON_URL = os.environ.get(
+    "THREAT_CARVER_MOBILE_ATTACK_URL",
+    "https://raw.githubusercontent.com/mitre/cti/master/mobile-attack/mobile-attack.json"
+)
+
+# URL (or local file path) of the ICS ATT&CK STIX bundle
+ICS_ATTACK_JSON_URL = os.environ.get(
+    "THREAT_CARVER_ICS_ATTACK_URL",
+    "https://raw.githubusercontent.com/mitre/cti/master/ics-attack/ics-attack.json"
+)
+
+# Bundle of each ATT&CK domain
+ATTACK_DOMAIN_URLS = {
+    "enterprise": ATTACK_JSON_URL,
+    "mobile": MOBILE_ATTACK_JSON_URL,
+    "ics": ICS_ATTACK_JSON_URL,
+}
+
+
+def _env_domains(name, default):
+    """Read a comma-separated list of ATT&CK domains, keeping the known ones in ATTACK_DOMAIN_URLS order."""
+    requested = {value.strip().lower() for value in os.environ.get(name, default).split(",")}
+    return tuple(domain for domain in ATTACK_DOMAIN_URLS if domain in requested)
+
+
+# ATT&CK domains offered by the app
+ATTACK_DOMAINS = _env_domains("THREAT_CARVER_ATTACK_DOMAINS", "enterprise,mobile,ics")
+
+# Domains only loaded once they are selected in the sidebar (the others are loaded at startup)
+ATTACK_LAZY_DOMAINS = _env_domains("THREAT_CARVER_LAZY_DOMAINS", "mobile,ics")
+
+# Bundles of at least this many bytes are parsed in worker processes when several need parsing at once
+# (starting a worker costs about as much as parsing a smaller bundle in the app process)
+PARSE_PROCESS_MIN_BYTES = int(os.environ.get("THREAT_CARVER_PARSE_PROCESS_MIN_BYTES", str(64 * 1024 * 1024)))
+
+# Keep techniques, groups and relationships that MITRE revoked or deprecated
+INCLUDE_DEPRECATED = _env_flag("THREAT_CARVER_INCLUDE_DEPRECATED")
+
+# Base URL (or local directory) of the Atomic Red Team atomics folder
+ATOMIC_RED_TEAM_BASE_URL = os.environ.get(
+    "THREAT_CARVER_ATOMICS_URL",
+    "https://raw.githubusercontent.com/redcanaryco/atomic-red-team/master/atomics"
+)
+
+# Directory where downloaded bundles are kept between runs
+CACHE_DIR = os.environ.get(
+    "THREAT_CARVER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "threat-carver")
+)
+
+# In offline mode nothing is downloaded: data comes from local paths or the cache only
+OFFLINE = _env_flag("THREAT_CARVER_OFFLINE")
+
+# Seconds to wait for the remote server before falling back to the cached copy
+HTTP_TIMEOUT = float(os.environ.get("THREAT_CARVER_HTTP_TIMEOUT", "30"))
+
+# Path of a detection-rule inventory (CSV or YAML) on the server, offered on the Detection Coverage page
+DETECTION_INVENTORY = os.environ.get("THREAT_CARVER_DETECTION_INVENTORY", "")
+
+# Directory of alert exports on the server that the Alert Analysis page may read (empty: uploads only)
+ALERTS_DIR = os.environ.get("THREAT_CARVER_ALERTS_DIR", "")
+
+# Path of a shared store (see shared_store.py) to read the ATT&CK data, search and Atomic Red Team tests from,
+# instead of downloading and parsing them in every process
+SHARED_STORE = os.environ.get("THREAT_CARVER_SHARED_STORE", "")
+
+# Address, port and worker threads of the JSON API server (api_server.py)
+API_HOST = os.environ.get("THREAT_CARVER_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("THREAT_CARVER_API_PORT", "8502"))
+API_WORKERS = int(os.environ.get("THREAT_CARVER_API_WORKERS", "16"))
+
+# Show the stage timings and counters of each rerun in a sidebar panel of the app
+PERF_PANEL = _env_flag("THREAT_CARVER_PERF_PANEL")
+
+# File the timings and counters of every rerun are appended to as one JSON line ("-" for stderr, empty for none)
+PERF_LOG = os.environ.get("THREAT_CARVER_PERF_LOG", "")
+
+# Port of the Prometheus text endpoint (/metrics) of each app process (0 for none), and its address
+METRICS_PORT = int(os.environ.get("THREAT_CARVER_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("THREAT_CARVER_METRICS_HOST", "127.0.0.1")
+
+# Seconds between background checks for new ATT&CK bundles (0 to only load them at startup)
+REFRESH_INTERVAL = float(os.environ.get("THREAT_CARVER_REFRESH_INTERVAL", "3600"))
+
+# Atomic Red Team tests are prefetched for every technique in the background at startup
+ATOMICS_PREFETCH = _env_flag("THREAT_CARVER_ATOMICS_PREFETCH", default=True)
+
+# Number of Atomic Red Team files downloaded at the same time
+ATOMICS_WORKERS = int(os.environ.get("THREAT_CARVER_ATOMICS_WORKERS", "16"))
+
+# Retries of a failed Atomic Red Team download (connection errors, 429 and 5xx responses)
+ATOMICS_RETRIES = int(os.environ.get("THREAT_CARVER_ATOMICS_RETRIES", "3"))
+
+# Seconds before a technique without Atomic Red Team tests (404) is checked again
+ATOMICS_NEGATIVE_TTL = float(os.environ.get("THREAT_CARVER_ATOMICS_NEGATIVE_TTL", str(24 * 3600)))
@@ -0,0 +1,228 @@
+"""
+Background refresh of the ATT&CK knowledge base.
+
+New CTI data used to arrive only when a cache miss made a user session wait
+for the bundle to be downloaded and parsed. KnowledgeBaseRefresher loads the
+knowledge base once at startup, then a daemon thread checks the bundles on an
+interval (one conditional request each when they did not change). When one
+changed, the new knowledge base is built off the request path, reusing the
+indexes of the current one, and swapped in by replacing a single reference.
+
+Readers take that reference once per rerun, so a rerun never sees a mix of
+two releases, and the app keeps each session on the knowledge base it started
+with until the analyst switches to the new one.
+
+One refresher holds every domain loaded in the process. Domains picked later
+(see THREAT_CARVER_LAZY_DOMAINS) are added to it with add_domains(), which
+merges them into the current knowledge base instead of loading the domains
+already there a second time.
+
+With a shared store configured (see shared_store.py), the knowledge base is
+read from the store file instead, and the background check only looks for a
+new store moved into place.
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from config import ATTACK_DOMAIN_URLS, REFRESH_INTERVAL, SHARED_STORE
+from knowledge_base import check_bundles, load_domains
+from shared_store import SharedStore, store_signature
+from snapshot_cache import get_snapshot_cache
+
+
+class KnowledgeBaseState(namedtuple("KnowledgeBaseState", ["knowledge_base", "errors", "bundles", "loaded_at",
+                                                           "generation"])):
+    """
+    One loaded version of the knowledge base.
+
+    Attributes:
+        knowledge_base (AttackKnowledgeBase): The knowledge base
+        errors (dict): Domain name to the error of each domain that could not be loaded
+        bundles (dict): Domain name to the BundleInfo of the bundle it was built from
+        loaded_at (float): When it was built (Unix time)
+        generation (int): 1 for the startup load, incremented by every swap
+    """
+
+    __slots__ = ()
+
+
+class KnowledgeBaseRefresher:
+    """
+    Holds the current knowledge base of a set of domains and refreshes it in the background.
+
+    More domains can be added later; the set only ever grows.
+    """
+
+    def __init__(self, domains, interval=REFRESH_INTERVAL, sources=ATTACK_DOMAIN_URLS, cache=None,
+                 store=SHARED_STORE):
+        """
+        Load the knowledge base (this call blocks until it is loaded).
+
+        Args:
+            domains (tuple): Domain names to load
+            interval (float): Seconds between checks for new bundles (0 disables the background checks)
+            sources (dict): Domain name to the URL or local path of its bundle
+            cache (SnapshotCache): Cache to use (the shared one by default)
+            store (str): Path of a shared store to read instead of the bundles (it holds the domains
+                         it was built with, whatever domains are asked for)
+        """
+        self._store_path = store or None
+        self._store_signature = None
+        self._domains = tuple(domains)
+        self._interval = interval
+        self._sources = sources
+        self._cache = cache or get_snapshot_cache()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_checked = None
+        self.last_error = None
+
+        if self._store_path:
+            self._state = self._load_store(1)
+            self.last_checked = time.time()
+            return
+
+        # The bundles are checked before loading, so a bundle replaced in between
+        # is picked up by the first background check
+        bundles, _ = check_bundles(self._domains, self._sources, self._cache)
+        knowledge_base, errors = load_domains(self._domains, self._sources, self._cache)
+        self._state = KnowledgeBaseState(knowledge_base, errors, bundles, time.time(), 1)
+        self.last_checked = time.time()
+
+    @property
+    def state(self):
+        """The current KnowledgeBaseState (read it once per rerun for a consistent view)."""
+        return self._state
+
+    @property
+    def domains(self):
+        """Names of the domains loaded (or tried), in the order of the sources."""
+        return self._domains
+
+    @property
+    def interval(self):
+        """Seconds between background checks (0 when disabled)."""
+        return self._interval
+
+    def start(self):
+        """Start the background checks, unless they are disabled or already running."""
+        with self._lock:
+            if self._interval > 0 and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="attack-refresh", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background checks."""
+        self._stop.set()
+
+    def _run(self):
+        """Check for new bundles until stopped."""
+        while not self._stop.wait(self._interval):
+            self.refresh()
+
+    def refresh(self):
+        """
+        Check the bundles once and swap in a new knowledge base if any of them changed.
+
+        Errors are kept in last_error and never reach the sessions, which go on
+        using the current knowledge base.
+
+        Returns:
+            bool: True if a new knowledge base was swapped in
+        """
+        # Only one refresh at a time (e.g. the background thread and a manual check)
+        with self._lock:
+            if self._store_path:
+                return self._refresh_store()
+            try:
+                current = self._state
+                bundles, check_errors = check_bundles(self._domains, self._sources, self._cache)
+                self.last_checked = time.time()
+                # A new bundle, or one of a domain that failed before, needs a reload. A domain
+                # unreachable now keeps the data already loaded
+                changed = [domain for domain, info in bundles.items()
+                           if domain not in current.bundles
+                           or current.bundles[domain].content_hash != info.content_hash]
+                if not changed:
+                    self.last_error = next(iter(check_errors.values()), None)
+                    return False
+                knowledge_base, errors = load_domains(self._domains, self._sources, self._cache,
+                                                      previous=current.knowledge_base)
+            except Exception as e:
+                self.last_error = e
+                return False
+            # Never swap in a knowledge base missing a domain the current one has
+            lost = [domain for domain in errors if domain in current.knowledge_base.domains]
+            if lost:
+                self.last_error = errors[lost[0]]
+                return False
+            # Replacing the reference is atomic: readers get either the old or the new state
+            self._state = KnowledgeBaseState(knowledge_base, errors, bundles, time.time(), current.generation + 1)
+            self.last_error = None
+            return True
+
+    def add_domains(self, domains):
+        """
+        Load more domains and swap in the knowledge base of all the domains (this call blocks until then).
+
+        The domains already loaded are read back from their compiled snapshots,
+        search index included, so only the new domains are parsed and have a
+        search index built. With a shared store it does nothing: the store
+        holds the domains it was built with.
+
+        As with refresh(), an error is kept in last_error and the current
+        knowledge base stays in use, e.g. when a domain already loaded cannot
+        be loaded again.
+
+        Args:
+            domains (iterable): Domain names to add (the ones already loaded are ignored)
+
+        Returns:
+            bool: True if a new knowledge base was swapped in
+        """
+        with self._lock:
+            added = [domain for domain in domains if domain not in self._domains]
+            if self._store_path or not added:
+                return False
+            current = self._state
+            all_domains = tuple(domain for domain in self._sources if domain in self._domains or domain in added)
+            try:
+                bundles, _ = check_bundles(all_domains, self._sources, self._cache)
+                knowledge_base, errors = load_domains(all_domains, self._sources, self._cache,
+                                                      previous=current.knowledge_base)
+            except Exception as e:
+                self.last_error = e
+                return False
+            # Never swap in a knowledge base missing a domain the current one has
+            lost = [domain for domain in errors if domain in current.knowledge_base.domains]
+            if lost:
+                self.last_error = errors[lost[0]]
+                return False
+            self._domains = all_domains
+            self._state = KnowledgeBaseState(knowledge_base, errors, bundles, time.time(), current.generation + 1)
+            return True
+
+    def _load_store(self, generation):
+        """Load the knowledge base of the shared store, and remember which version of the file it came from."""
+        store = SharedStore(self._store_path)
+        state = KnowledgeBaseState(store.knowledge_base(), {}, store.bundles, time.time(), generation)
+        self._store_signature = store.signature
+        return state
+
+    def _refresh_store(self):
+        """Swap in the knowledge base of the shared store if a new one was moved into place."""
+        try:
+            self.last_checked = time.time()
+            if store_signature(self._store_path) == self._store_signature:
+                self.last_error = None
+                return False
+            state = self._load_store(self._state.generation + 1)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.last_error = e
+            return False
+        self._state = state
+        self.last_error = None
+        return True
@@ -0,0 +1,99 @@
+import pandas as pd
+import streamlit as st
+
+
+def _technique_ids(nodes):
+    """Join the ATT&CK IDs of technique nodes, in ID order."""
+    return ", ".join(sorted(node.attack_id or node.name for node in nodes))
+
+
+def display_defense_planning(knowledge_base, group_name):
+    """
+    Display the software, campaigns and mitigations of a group, from the relationship graph.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
+        group_name (str): Name of the selected group
+    """
+    group = knowledge_base.group_by_name[group_name]
+    graph = knowledge_base.graph
+    direct = {usage.technique.stix_id for usage in knowledge_base.group_to_techniques.get(group_name, ())}
+
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown(f'<div class="card-header">🛡️ Software, Campaigns and Mitigations of {group_name}</div>',
+                unsafe_allow_html=True)
+
+    software = graph.software_of(group.stix_id)
+    via_software = graph.techniques_via_software(group.stix_id)
+    campaigns = graph.campaigns_of(group.stix_id)
+    only_via_software = [tech for tech in via_software if tech.stix_id not in direct]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Software", len(software))
+    col2.metric("Techniques via Software", len(via_software),
+                help=f"{len(only_via_software)} of them are not linked to the group directly")
+    col3.metric("Campaigns", len(campaigns))
+
+    software_tab, mitigations_tab, campaigns_tab = st.tabs(["Techniques via Software", "Mitigations", "Campaigns"])
+
+    with software_tab:
+        if software:
+            st.markdown("**Software used:** " + ", ".join(
+                f"`{node.attack_id}` {node.name}" if node.attack_id else node.name for node in software))
+        if via_software:
+            st.dataframe(pd.DataFrame([{
+                "Technique ID": tech.attack_id,
+                "Technique": tech.name,
+                "Via Software": ", ".join(node.name for node in nodes),
+                "Used Directly": "Yes" if tech.stix_id in direct else "No"
+            } for tech, nodes in sorted(via_software.items(), key=lambda item: item[0].attack_id or "")]),
+                use_container_width=True, hide_index=True)
+        else:
+            st.markdown('<div class="alert alert-info">No technique of this group is known through its software.'
+                        '</div>', unsafe_allow_html=True)
+
+    with mitigations_tab:
+        include_software = st.checkbox("Include the techniques reached via software", value=True,
+                                       disabled=not only_via_software)
+        techniques = direct | {tech.stix_id for tech in only_via_software} if include_software else direct
+        mitigations = graph.mitigations_for(techniques)
+        mitigated = {tech.stix_id for _, covered in mitigations for tech in covered}
+
+        col1, col2 = st.columns(2)
+        col1.metric("Mitigations", len(mitigations))
+        col2.metric("Techniques without Mitigation", len(techniques - mitigated))
+        if mitigations:
+            mitigations_df = pd.DataFrame([{
+                "Mitigation ID": mitigation.attack_id,
+                "Mitigation": mitigation.name,
+                "Techniques Covered": len(covered),
+                "Coverage": len(covered) / len(techniques),
+                "Technique IDs": _technique_ids(covered)
+            } for mitigation, covered in mitigations])
+            st.dataframe(mitigations_df, use_container_width=True, hide_index=True,
+                         column_config={"Coverage": st.column_config.ProgressColumn(
+                             "Coverage", min_value=0.0, max_value=1.0, format="%.2f")})
+            st.download_button(
+                label="📥 Download Mitigations as CSV",
+                data=mitigations_df.to_csv(index=False),
+                file_name=f"{group_name.replace(' ', '_')}_mitigations.csv",
+                mime="text/csv",
+            )
+        else:
+            st.markdown('<div class="alert alert-info">No mitigation is linked to the techniques of this group.'
+                        '</div>', unsafe_allow_html=True)
+
+    with campaigns_tab:
+        if campaigns:
+            st.dataframe(pd.DataFrame([{
+                "Campaign ID": campaign.attack_id,
+                "Campaign": campaign.name,
+                "Techniques": len(used),
+                "New to the Group": len([tech for tech in used if tech.stix_id not in direct]),
+                "Technique IDs": _technique_ids(used)
+            } for campaign, used in campaigns.items()]), use_container_width=True, hide_index=True)
+        else:
+            st.markdown('<div class="alert alert-info">No campaign is attributed to this group.</div>',
+                        unsafe_allow_html=True)
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,168 @@
+import os
+
+import streamlit as st
+
+from config import DETECTION_INVENTORY
+from detection_inventory import COVERAGE_LEVELS, DetectionCoverage, detect_inventory_format, load_inventory
+
+# Display name of each coverage level
+LEVEL_LABELS = {"rule": "Rule", "telemetry": "Telemetry only", "gap": "Gap"}
+
+TECHNIQUE_COLUMNS = {
+    "technique_id": "Technique ID", "technique": "Technique", "tactics": "Tactics", "level": "Coverage",
+    "groups": "Groups Using", "rules": "Rules", "collected_components": "Collected Data Components",
+    "missing_components": "Missing Data Components"
+}
+
+
+def _technique_filters(table, key):
+    """
+    Filter a technique coverage table by level and tactic.
+
+    Args:
+        table (pandas.DataFrame): Table from DetectionCoverage.technique_table()
+        key (str): Prefix of the widget keys
+
+    Returns:
+        pandas.DataFrame: The matching rows, with display column names
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        levels = st.multiselect("Coverage", COVERAGE_LEVELS, default=["gap"], format_func=LEVEL_LABELS.get,
+                                key=f"{key}_levels")
+    with col2:
+        tactics = sorted({tactic for value in table["tactics"] for tactic in value.split(", ") if tactic})
+        selected_tactics = st.multiselect("Tactics", tactics, key=f"{key}_tactics")
+    rows = table[table["level"].isin(levels)]
+    if selected_tactics:
+        rows = rows[rows["tactics"].apply(lambda value: any(tactic in value.split(", ")
+                                                            for tactic in selected_tactics))]
+    rows = rows.assign(level=rows["level"].map(LEVEL_LABELS))
+    return rows.sort_values(["groups", "technique_id"], ascending=[False, True]).rename(columns=TECHNIQUE_COLUMNS)
+
+
+def _download(rows, label, file_name):
+    """Offer a table as a CSV download."""
+    st.download_button(label=label, data=rows.to_csv(index=False), file_name=file_name, mime="text/csv")
+
+
+def display_detection_coverage_page(knowledge_base):
+    """
+    Display the Detection Coverage page: a detection-rule inventory against the techniques of threat groups.
+
+    The inventory is read once per file and knowledge base; the coverage of
+    every technique and the counts of every group are then kept in the session,
+    so changing the group or the filters does not compute anything again.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
+    """
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-header">🛡️ Detection Coverage</div>', unsafe_allow_html=True)
+
+    st.markdown("""
+    Load your detection-rule inventory (CSV or YAML, mapping rules to ATT&CK technique IDs and optionally
+    to data components). A technique is covered by a **rule** when a rule is mapped to it or to one of its
+    sub-techniques, by **telemetry only** when no rule is, but a data component your rules already collect
+    detects it in ATT&CK, and is a **gap** otherwise.
+    """)
+
+    uploaded_file = st.file_uploader(
+        "Detection inventory",
+        type=["csv", "yaml", "yml"],
+        help="Columns or keys: rule name, technique IDs (several per cell are fine) and data components. "
+             "Sigma rules with attack.tXXXX tags are read too."
+    )
+    # The inventory on the server is set by THREAT_CARVER_DETECTION_INVENTORY; sessions cannot pick another path
+    server_path = DETECTION_INVENTORY
+    if uploaded_file is None and server_path:
+        st.caption(f"Using the inventory configured on the server ({os.path.basename(server_path)}); "
+                   "upload a file to analyze another one.")
+
+    if uploaded_file is not None:
+        source = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, "file_id", None))
+    elif server_path:
+        if not os.path.isfile(server_path):
+            st.error("The detection inventory configured on the server could not be found.")
+            st.markdown('</div>', unsafe_allow_html=True)
+            return
+        source = (server_path, os.path.getsize(server_path), os.path.getmtime(server_path))
+    else:
+        st.markdown('<div class="alert alert-info">Choose a detection inventory to analyze.</div>',
+                    unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+
+    # Read the inventory and compute the coverage only when the file or the data changes
+    cache_key = (source, id(knowledge_base))
+    if st.session_state.get("detection_coverage_source") != cache_key:
+        try:
+            inventory_format = detect_inventory_format(source[0])
+            if uploaded_file is not None:
+                uploaded_file.seek(0)
+                rules = load_inventory(uploaded_file, inventory_format)
+            else:
+                with open(server_path, "rb") as inventory_file:
+                    rules = load_inventory(inventory_file, inventory_format)
+        except (ValueError, OSError) as e:
+            st.error(f"Could not read the inventory: {e}")
+            st.markdown('</div>', unsafe_allow_html=True)
+            return
+        st.session_state["detection_coverage_source"] = cache_key
+        st.session_state["detection_coverage"] = DetectionCoverage(knowledge_base, rules)
+    coverage = st.session_state["detection_coverage"]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Rules", len(coverage.rules))
+    col2.metric("Unknown technique IDs", len(coverage.unknown_techniques))
+    col3.metric("Unknown data components", len(coverage.unknown_components))
+    if coverage.unknown_techniques or coverage.unknown_components:
+        with st.expander("Inventory entries not found in the ATT&CK data"):
+            st.dataframe(
+                [{"Kind": "Technique", "Value": tech_id, "Rules": ", ".join(rules)}
+                 for tech_id, rules in sorted(coverage.unknown_techniques.items())] +
+                [{"Kind": "Data component", "Value": name, "Rules": ", ".join(rules)}
+                 for name, rules in sorted(coverage.unknown_components.items())],
+                use_container_width=True, hide_index=True)
+
+    summary = coverage.group_summary()
+    if summary.empty:
+        st.markdown('<div class="alert alert-info">No threat group uses a technique.</div>', unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+
+    scope = st.radio("Scope", ["One group", "All groups"], horizontal=True)
+    if scope == "One group":
+        group_name = st.selectbox("Threat group", summary["group"].tolist())
+        counts = summary[summary["group"] == group_name].iloc[0]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Techniques", int(counts["techniques"]))
+        col2.metric("Covered by a Rule", int(counts["rule"]), f"{counts['coverage']:.0%}", delta_color="off")
+        col3.metric("Telemetry Only", int(counts["telemetry"]))
+        col4.metric("Gaps", int(counts["gap"]))
+
+        group = knowledge_base.group_by_name[group_name]
+        stix_ids = [usage.technique.stix_id for usage in knowledge_base.group_to_techniques.get(group_name, ())]
+        rows = _technique_filters(coverage.technique_table(stix_ids), "detection_group")
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        _download(rows, "📥 Download Coverage as CSV",
+                  f"{(group.group_id or group_name).replace(' ', '_')}_detection_coverage.csv")
+    else:
+        st.markdown("### 👥 Coverage of Every Group")
+        groups = summary.sort_values(["gap", "group"], ascending=[False, True]).rename(columns={
+            "group": "Group", "techniques": "Techniques", "rule": "Rule", "telemetry": "Telemetry Only",
+            "gap": "Gaps", "coverage": "Rule Coverage", "detectable": "Rule or Telemetry"
+        })
+        st.dataframe(groups, use_container_width=True, hide_index=True, column_config={
+            column: st.column_config.ProgressColumn(column, min_value=0.0, max_value=1.0, format="%.2f")
+            for column in ("Rule Coverage", "Rule or Telemetry")
+        })
+        _download(groups, "📥 Download Group Coverage as CSV", "group_detection_coverage.csv")
+
+        st.markdown("### 🕳️ Techniques Across All Groups")
+        st.caption("Techniques used by the most groups first.")
+        rows = _technique_filters(coverage.technique_table(), "detection_all")
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        _download(rows, "📥 Download Techniques as CSV", "detection_coverage_gaps.csv")
+
+    st.markdown('</div>', unsafe_allow_html=True)
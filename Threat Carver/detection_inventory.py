@@ -0,0 +1,332 @@
+"""
+Detection-rule inventories and the coverage they give against threat groups.
+
+An inventory maps each detection rule to the ATT&CK techniques it detects
+and, optionally, the data components (telemetry) it relies on. A technique is
+covered by a rule when a rule is mapped to it (or to one of its
+sub-techniques), covered by telemetry when no rule is mapped to it but a data
+component the rules already collect "detects" it in the STIX bundle, and a
+gap otherwise.
+
+The level of every technique is computed once per inventory. Per-group counts
+then come from the group x technique bitsets of group_similarity.py (one AND +
+popcount per level for all groups at once), so changing the group or the
+filters on the page only slices precomputed tables.
+"""
+import csv
+import io
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from alert_ingest import TECHNIQUE_ID_RE
+from stix_graph import DATA_SOURCE_EDGE, GraphStep
+
+# Supported inventory file formats, by file extension
+INVENTORY_FORMATS = {".csv": "csv", ".yaml": "yaml", ".yml": "yaml"}
+
+# Coverage levels of a technique, best first
+COVERAGE_LEVELS = ("rule", "telemetry", "gap")
+
+# Column or key names read from the inventory, in order of preference
+RULE_NAME_FIELDS = ("name", "title", "rule", "rule_name", "id")
+RULE_TECHNIQUE_FIELDS = ("techniques", "technique_ids", "technique_id", "technique", "mitre_attack", "attack")
+RULE_COMPONENT_FIELDS = ("data_components", "data_component", "datacomponents", "telemetry")
+
+# Sigma-style tags (e.g. attack.t1059.001)
+ATTACK_TAG_RE = re.compile(r"^attack\.(t\d{4}(?:\.\d{3})?)$", re.IGNORECASE)
+
+# Separators of several data components in one CSV cell
+_LIST_SEPARATORS_RE = re.compile(r"[;,|\n]")
+
+
+class DetectionRule(namedtuple("DetectionRule", ["name", "techniques", "data_components"])):
+    """
+    One rule of a detection inventory.
+
+    Attributes:
+        name (str): Name or ID of the rule
+        techniques (tuple): ATT&CK technique IDs it detects (upper case)
+        data_components (tuple): Names of the data components it relies on
+    """
+
+    __slots__ = ()
+
+
+def detect_inventory_format(filename):
+    """
+    Get the format of an inventory file from its extension.
+
+    Args:
+        filename (str): Name or path of the file
+
+    Returns:
+        str: "csv" or "yaml"
+
+    Raises:
+        ValueError: If the extension is not supported
+    """
+    for extension, inventory_format in INVENTORY_FORMATS.items():
+        if filename.lower().endswith(extension):
+            return inventory_format
+    raise ValueError(f"Unsupported inventory file {filename!r} (expected one of {', '.join(INVENTORY_FORMATS)})")
+
+
+def _pick(record, names):
+    """Get the first non-empty value of a record among some keys (case-insensitive)."""
+    lowered = {str(key).strip().lower(): value for key, value in record.items()}
+    for name in names:
+        value = lowered.get(name)
+        if value not in (None, "", []):
+            return value
+    return None
+
+
+def _technique_ids(value):
+    """Extract the technique IDs of a cell, a string or a list of them."""
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return tuple(dict.fromkeys(match.upper() for item in values if item is not None
+                               for match in TECHNIQUE_ID_RE.findall(str(item))))
+
+
+def _components(value):
+    """Split the data component names of a cell, a string or a list of them."""
+    values = value if isinstance(value, (list, tuple)) else _LIST_SEPARATORS_RE.split(str(value or ""))
+    return tuple(dict.fromkeys(str(item).strip() for item in values if item is not None and str(item).strip()))
+
+
+def _rule(record, number):
+    """Turn one CSV row or YAML mapping into a DetectionRule."""
+    techniques = _technique_ids(_pick(record, RULE_TECHNIQUE_FIELDS))
+    if not techniques:
+        # Sigma rules list their techniques as tags
+        tags = _pick(record, ("tags",)) or []
+        techniques = tuple(dict.fromkeys(match.group(1).upper() for tag in tags
+                                         for match in [ATTACK_TAG_RE.match(str(tag))] if match))
+    name = _pick(record, RULE_NAME_FIELDS)
+    return DetectionRule(str(name) if name is not None else f"Rule {number}", techniques,
+                         _components(_pick(record, RULE_COMPONENT_FIELDS)))
+
+
+def load_inventory(fileobj, inventory_format):
+    """
+    Read a detection-rule inventory.
+
+    CSV files need a column of technique IDs (several IDs per cell are fine)
+    and may have a rule name and a data components column. YAML files hold a
+    list of rules, a mapping with a "rules" or "detections" list, or several
+    Sigma rule documents.
+
+    Args:
+        fileobj (file): Binary file object of the inventory
+        inventory_format (str): "csv" or "yaml"
+
+    Returns:
+        list: DetectionRule of every rule with at least one technique or data component
+
+    Raises:
+        ValueError: If the file cannot be parsed or has no usable rule
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if inventory_format == "csv":
+            records = list(csv.DictReader(text))
+        elif inventory_format == "yaml":
+            records = []
+            for document in yaml.safe_load_all(text):
+                if isinstance(document, dict):
+                    document = document.get("rules", document.get("detections", [document]))
+                records.extend(record for record in document or [] if isinstance(record, dict))
+        else:
+            raise ValueError(f"Unknown inventory format {inventory_format!r}")
+    except (csv.Error, yaml.YAMLError, UnicodeDecodeError) as e:
+        raise ValueError(f"Could not parse the inventory: {e}") from e
+    finally:
+        text.detach()
+
+    rules = [_rule(record, number) for number, record in enumerate(records, 1)]
+    rules = [rule for rule in rules if rule.techniques or rule.data_components]
+    if not rules:
+        raise ValueError("No rule with technique IDs or data components was found in the inventory")
+    return rules
+
+
+def data_component_index(graph):
+    """
+    Map the names data components are written with to their STIX IDs.
+
+    Both "Process Creation" and "Process: Process Creation" (data source,
+    then component, as in ATT&CK) are accepted, in any case.
+
+    Args:
+        graph (StixGraph): The relationship graph
+
+    Returns:
+        dict: Lower-case name to the list of STIX IDs of the components with that name
+    """
+    index = {}
+    for component in graph.nodes_of_type("x-mitre-data-component"):
+        names = [component.name]
+        names.extend(f"{source.name}: {component.name}" for source in graph.neighbors(component.stix_id,
+                                                                                      DATA_SOURCE_EDGE))
+        for name in names:
+            index.setdefault(name.strip().lower(), []).append(component.stix_id)
+    return index
+
+
+class DetectionCoverage:
+    """
+    Coverage level of every technique under a detection inventory, and the per-group counts.
+    """
+
+    __slots__ = ("_rules", "_levels", "_table", "_groups", "_counts", "_unknown_techniques", "_unknown_components")
+
+    def __init__(self, knowledge_base, rules):
+        """
+        Args:
+            knowledge_base (AttackKnowledgeBase): Groups, techniques and the relationship graph
+            rules (list): DetectionRule records of the inventory
+        """
+        self._rules = tuple(rules)
+        graph = knowledge_base.graph
+        tree = knowledge_base.technique_tree
+
+        # Rules of each technique; a rule for a sub-technique also counts for its parent
+        rule_names = {}
+        unknown_techniques = {}
+        for rule in self._rules:
+            for tech_id in rule.techniques:
+                tech = knowledge_base.technique_by_id.get(tech_id)
+                if tech is None:
+                    unknown_techniques.setdefault(tech_id, []).append(rule.name)
+                    continue
+                for stix_id in (tech.stix_id, getattr(tree.parent(tech.stix_id), "stix_id", None)):
+                    if stix_id is not None:
+                        rule_names.setdefault(stix_id, {}).setdefault(rule.name, None)
+        self._unknown_techniques = unknown_techniques
+
+        # Data components the rules collect, matched by name against the bundle
+        component_ids = data_component_index(graph)
+        collected = set()
+        unknown_components = {}
+        for rule in self._rules:
+            for name in rule.data_components:
+                matches = component_ids.get(name.lower())
+                if matches:
+                    collected.update(matches)
+                else:
+                    unknown_components.setdefault(name, []).append(rule.name)
+        self._unknown_components = unknown_components
+
+        # Components detecting each technique, split into collected and missing ones
+        techniques = list(knowledge_base.techniques_dict)
+        paths = graph.paths(techniques, [GraphStep("detects", "in", ("x-mitre-data-component",))])
+        detected_by = {}
+        for tech_position, component_position in paths.tolist():
+            detected_by.setdefault(graph.nodes[tech_position].stix_id, []).append(graph.nodes[component_position])
+        groups_using = {}
+        for usage in knowledge_base.usages:
+            groups_using.setdefault(usage.technique.stix_id, set()).add(usage.group.stix_id)
+
+        # Coverage of every technique, computed once; the page only filters this table
+        self._levels = {}
+        rows = []
+        for stix_id in techniques:
+            tech = knowledge_base.techniques_dict[stix_id]
+            components = detected_by.get(stix_id, ())
+            collected_names = [node.name for node in components if node.stix_id in collected]
+            if stix_id in rule_names:
+                level = "rule"
+            elif collected_names:
+                level = "telemetry"
+            else:
+                level = "gap"
+            self._levels[stix_id] = level
+            rows.append((tech.tech_id, tech.name, ", ".join(tech.tactics), level,
+                         len(groups_using.get(stix_id, ())), ", ".join(rule_names.get(stix_id, ())),
+                         ", ".join(collected_names),
+                         ", ".join(node.name for node in components if node.stix_id not in collected)))
+        self._table = pd.DataFrame(rows, index=pd.Index(techniques, name="stix_id"), columns=[
+            "technique_id", "technique", "tactics", "level", "groups", "rules", "collected_components",
+            "missing_components"])
+
+        # Techniques of each level per group, from the group x technique bitsets
+        similarity = knowledge_base.group_similarity
+        self._groups = similarity.groups
+        self._counts = {
+            "techniques": np.array([similarity.technique_count(group) for group in self._groups], dtype=np.int64),
+            "rule": similarity.count_techniques(s for s, level in self._levels.items() if level == "rule"),
+            "telemetry": similarity.count_techniques(s for s, level in self._levels.items() if level == "telemetry"),
+        }
+
+    @property
+    def rules(self):
+        """Tuple of the DetectionRules of the inventory."""
+        return self._rules
+
+    @property
+    def unknown_techniques(self):
+        """Dict of the technique IDs of the inventory that are not in the knowledge base, to their rule names."""
+        return self._unknown_techniques
+
+    @property
+    def unknown_components(self):
+        """Dict of the data component names of the inventory that are not in the bundle, to their rule names."""
+        return self._unknown_components
+
+    def level(self, stix_id):
+        """
+        Get the coverage level of a technique.
+
+        Args:
+            stix_id (str): STIX ID of the technique
+
+        Returns:
+            str: "rule", "telemetry" or "gap"
+        """
+        return self._levels.get(stix_id, "gap")
+
+    def group_summary(self):
+        """
+        Count the covered techniques and the gaps of every group.
+
+        Returns:
+            pandas.DataFrame: Columns group, techniques, rule, telemetry, gap, coverage (share of the
+                              techniques with a rule) and detectable (share with a rule or telemetry),
+                              one row per group that uses a technique
+        """
+        techniques = self._counts["techniques"]
+        rule = self._counts["rule"]
+        telemetry = self._counts["telemetry"]
+        sizes = np.maximum(techniques, 1)
+        summary = pd.DataFrame({
+            "group": list(self._groups),
+            "techniques": techniques,
+            "rule": rule,
+            "telemetry": telemetry,
+            "gap": techniques - rule - telemetry,
+            "coverage": np.round(rule / sizes, 3),
+            "detectable": np.round((rule + telemetry) / sizes, 3),
+        })
+        return summary[summary["techniques"] > 0].reset_index(drop=True)
+
+    def technique_table(self, stix_ids=None):
+        """
+        List the coverage of some techniques.
+
+        Args:
+            stix_ids (iterable): STIX IDs of the techniques (every technique used by a group by default;
+                                 unknown ones are ignored)
+
+        Returns:
+            pandas.DataFrame: Columns technique_id, technique, tactics, level, groups (number of groups
+                              using it), rules, collected_components and missing_components
+        """
+        if stix_ids is None:
+            table = self._table[self._table["groups"] > 0]
+        else:
+            table = self._table.loc[[stix_id for stix_id in dict.fromkeys(stix_ids) if stix_id in self._levels]]
+        return table.reset_index(drop=True)
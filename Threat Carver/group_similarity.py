@@ -0,0 +1,228 @@
+"""
+Similarity and technique overlap between threat groups.
+
+Each group is a bit vector over the techniques used by any group, packed 64
+techniques to a word. Finding the groups most similar to one group is a
+vectorized AND + popcount of its bit vector against every other group, and the
+pairwise overlap of many groups is a single matrix product, instead of Python
+set intersections for every pair on every rerun.
+"""
+import numpy as np
+
+# Number of set bits in every byte value, for NumPy versions without bitwise_count()
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.int32)
+
+# Similarity measures offered by the pages
+METRICS = ("jaccard", "cosine")
+
+
+def _row_popcounts(words):
+    """
+    Count the set bits of each row of a bitset array.
+
+    Args:
+        words (numpy.ndarray): 2-D uint64 array
+
+    Returns:
+        numpy.ndarray: Set bits per row
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT[words.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+def _similarity(intersections, sizes_a, sizes_b, metric):
+    """
+    Turn shared-technique counts into similarities.
+
+    Args:
+        intersections (numpy.ndarray): Techniques shared by each pair
+        sizes_a (numpy.ndarray): Techniques of the first group of each pair (broadcast against intersections)
+        sizes_b (numpy.ndarray): Techniques of the second group of each pair
+        metric (str): "jaccard" (shared / union) or "cosine" (shared / geometric mean of the sizes)
+
+    Returns:
+        numpy.ndarray: Similarities between 0 and 1 (0 when a group has no techniques)
+    """
+    intersections = intersections.astype(np.float64)
+    if metric == "jaccard":
+        denominators = sizes_a + sizes_b - intersections
+    elif metric == "cosine":
+        denominators = np.sqrt(sizes_a * sizes_b.astype(np.float64))
+    else:
+        raise ValueError(f"Unknown similarity metric {metric!r}")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominators > 0, intersections / denominators, 0.0)
+
+
+class GroupSimilarity:
+    """
+    Technique bitsets of every group, with similarity queries over them.
+
+    Rows follow the sorted group names; bit columns follow the techniques used
+    by at least one group.
+    """
+
+    __slots__ = ("_groups", "_group_rows", "_techniques", "_columns", "_bits", "_sizes")
+
+    def __init__(self, usages, group_positions):
+        """
+        Args:
+            usages (tuple): TechniqueUsages of all groups
+            group_positions (dict): Group name to the positions of its entries in usages
+        """
+        self._groups = tuple(sorted(group_positions))
+        self._group_rows = {group_name: row for row, group_name in enumerate(self._groups)}
+
+        # Columns: techniques used by at least one group, in first-use order
+        columns = {}
+        for usage in usages:
+            columns.setdefault(usage.technique.stix_id, usage.technique)
+        self._techniques = tuple(columns.values())
+        self._columns = {stix_id: column for column, stix_id in enumerate(columns)}
+
+        # Set one bit per (group, technique) pair, straight into the packed array
+        # (bytes in np.packbits order, rows padded to whole 64-bit words)
+        rows = np.fromiter((self._group_rows[group_name] for group_name, positions in group_positions.items()
+                            for _ in positions), dtype=np.int64)
+        cols = np.fromiter((self._columns[usages[position].technique.stix_id]
+                            for positions in group_positions.values() for position in positions), dtype=np.int64)
+        bits = np.zeros((len(self._groups), (len(self._techniques) + 63) // 64 * 8), dtype=np.uint8)
+        np.bitwise_or.at(bits, (rows, cols >> 3), (np.uint8(128) >> (cols & 7)).astype(np.uint8))
+        bits = bits.view(np.uint64)
+        bits.flags.writeable = False
+        self._bits = bits
+        # Distinct techniques per group (a technique used twice by a group counts once)
+        self._sizes = _row_popcounts(bits)
+
+    @property
+    def groups(self):
+        """Tuple of all group names, in row order."""
+        return self._groups
+
+    @property
+    def techniques(self):
+        """Tuple of the Technique records of the bit columns (the techniques used by at least one group)."""
+        return self._techniques
+
+    def technique_count(self, group_name):
+        """
+        Get the number of distinct techniques a group uses.
+
+        Args:
+            group_name (str): The group
+
+        Returns:
+            int: The number of techniques
+        """
+        return int(self._sizes[self._group_rows[group_name]])
+
+    def similarities(self, group_name, metric="jaccard"):
+        """
+        Compare one group with every group.
+
+        Args:
+            group_name (str): The group to compare
+            metric (str): "jaccard" or "cosine"
+
+        Returns:
+            tuple: (similarities, shared technique counts), two arrays in the order of groups
+        """
+        row = self._group_rows[group_name]
+        shared = _row_popcounts(np.bitwise_and(self._bits, self._bits[row]))
+        return _similarity(shared, self._sizes[row], self._sizes, metric), shared
+
+    def most_similar(self, group_name, k=10, metric="jaccard"):
+        """
+        Get the groups most similar to one group.
+
+        Args:
+            group_name (str): The group to compare
+            k (int): Number of groups to return
+            metric (str): "jaccard" or "cosine"
+
+        Returns:
+            list: (group name, similarity, shared technique count) tuples, most similar first
+        """
+        similarity, shared = self.similarities(group_name, metric)
+        row = self._group_rows[group_name]
+        candidates = np.flatnonzero((shared > 0) & (np.arange(len(self._groups)) != row))
+        # Highest similarity first, then most shared techniques, then by name (row order)
+        order = np.lexsort((candidates, -shared[candidates], -similarity[candidates]))[:k]
+        return [(self._groups[i], float(similarity[i]), int(shared[i])) for i in candidates[order]]
+
+    def pairwise(self, group_names=None, metric="jaccard"):
+        """
+        Compare every pair of groups.
+
+        The bit vectors of the groups are unpacked into a dense 0/1 matrix and
+        multiplied by its transpose, so memory grows with the number of groups
+        times the number of techniques.
+
+        Args:
+            group_names (list): Groups to compare (all groups by default)
+            metric (str): "jaccard" or "cosine"
+
+        Returns:
+            tuple: (group names, similarity matrix, shared technique count matrix)
+        """
+        group_names = list(self._groups if group_names is None else group_names)
+        rows = np.array([self._group_rows[group_name] for group_name in group_names], dtype=np.int64)
+        dense = np.unpackbits(self._bits[rows].view(np.uint8), axis=1, count=len(self._techniques)).astype(np.float32)
+        shared = np.rint(dense @ dense.T).astype(np.int32)
+        sizes = self._sizes[rows]
+        return group_names, _similarity(shared, sizes[:, None], sizes[None, :], metric), shared
+
+    def membership(self, stix_ids):
+        """
+        Check which groups use each of some techniques.
+
+        Args:
+            stix_ids (list): Technique STIX IDs
+
+        Returns:
+            numpy.ndarray: Boolean matrix, one row per group and one column per technique
+                           (all False for techniques no group uses)
+        """
+        columns = np.array([self._columns.get(stix_id, -1) for stix_id in stix_ids], dtype=np.int64)
+        known = columns >= 0
+        matrix = np.zeros((len(self._groups), len(columns)), dtype=bool)
+        if known.any():
+            # Bit c of a row is bit (7 - c % 8) of byte c // 8 (np.packbits order)
+            octets = self._bits.view(np.uint8)[:, columns[known] >> 3]
+            matrix[:, known] = (octets & (np.uint8(128) >> (columns[known] & 7)).astype(np.uint8)) != 0
+        return matrix
+
+    def count_techniques(self, stix_ids):
+        """
+        Count how many of some techniques each group uses.
+
+        The techniques are packed into one bit vector, so counting them for
+        every group is a single AND + popcount over the group bitsets.
+
+        Args:
+            stix_ids (iterable): Technique STIX IDs (techniques no group uses are ignored)
+
+        Returns:
+            numpy.ndarray: Number of the techniques used by each group, in the order of groups
+        """
+        columns = np.array(sorted({self._columns[stix_id] for stix_id in stix_ids if stix_id in self._columns}),
+                           dtype=np.int64)
+        mask = np.zeros(self._bits.shape[1] * 8, dtype=np.uint8)
+        np.bitwise_or.at(mask, columns >> 3, (np.uint8(128) >> (columns & 7)).astype(np.uint8))
+        return _row_popcounts(np.bitwise_and(self._bits, mask.view(np.uint64)))
+
+    def shared_techniques(self, group_a, group_b):
+        """
+        Get the techniques used by both groups.
+
+        Args:
+            group_a (str): First group
+            group_b (str): Second group
+
+        Returns:
+            list: Technique records used by both, in column order
+        """
+        both = np.bitwise_and(self._bits[self._group_rows[group_a]], self._bits[self._group_rows[group_b]])
+        columns = np.flatnonzero(np.unpackbits(both.view(np.uint8), count=len(self._techniques)))
+        return [self._techniques[column] for column in columns]
@@ -0,0 +1,360 @@
+"""
+Stage timers and counters for the hot paths of the app.
+
+A Streamlit session reruns the whole app script on every interaction, and a
+slow rerun can be spent fetching or parsing a bundle, filtering, building a
+DataFrame, rendering HTML or building a Plotly figure. The app starts a
+RerunMetrics at the top of each rerun; code anywhere below it wraps its
+stages in timed() and bumps counters with count(), without the metrics being
+passed around. The current rerun is kept per thread (Streamlit runs each
+session's script in its own thread), so concurrent sessions never mix their
+numbers. Work done in other threads (the background refresh, the Atomic Red
+Team warm-up, the bundle download pool) has no rerun and only adds to the
+process totals.
+
+Every stage and counter also goes to a process-wide MetricsRegistry. Finished
+reruns can be appended to a file as one JSON line each, and the registry is
+served as Prometheus text by start_metrics_server().
+"""
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the histogram buckets of stage and rerun durations
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "threat_carver"
+
+# Help text of the counters the app records (others are exported with a generic one)
+COUNTER_HELP = {
+    "attack_data_cache_hits": "Reruns served by the knowledge base already loaded in this process",
+    "attack_data_cache_misses": "Reruns that had to load the ATT&CK knowledge base",
+    "snapshot_cache_hits": "Remote files served from the on-disk snapshot cache (unchanged, offline or stale)",
+    "snapshot_cache_misses": "Remote files downloaded into the on-disk snapshot cache",
+    "compiled_snapshot_hits": "ATT&CK bundles loaded from their compiled snapshot",
+    "compiled_snapshot_misses": "ATT&CK bundles stream-parsed from the STIX JSON",
+    "atomics_cache_hits": "Atomic Red Team lookups served from memory",
+    "atomics_cache_misses": "Atomic Red Team lookups that read, downloaded or parsed a file",
+    "rows_rendered": "Table rows built for display",
+    "bytes_rendered": "Bytes of HTML generated for display",
+}
+
+
+class RerunMetrics:
+    """
+    Stage timings and counters of one rerun of the app script.
+
+    Stages may nest (e.g. to_html inside a page), in which case the time of the
+    inner stage is also part of the outer one.
+    """
+
+    __slots__ = ("page", "session", "started", "seconds", "stages", "counters")
+
+    def __init__(self, page="", session=""):
+        """
+        Args:
+            page (str): Page being rendered (can be set later, once it is known)
+            session (str): Identifier of the browser session
+        """
+        self.page = page
+        self.session = session
+        self.started = time.time()
+        self.seconds = None
+        # Stage name to [calls, seconds], in the order the stages first ran
+        self.stages = {}
+        self.counters = {}
+
+    def add_stage(self, stage, seconds):
+        """Add one run of a stage."""
+        totals = self.stages.setdefault(stage, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def add_count(self, counter, amount):
+        """Add to a counter."""
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def elapsed(self):
+        """Seconds since the rerun started, or its duration once finished."""
+        return self.seconds if self.seconds is not None else time.time() - self.started
+
+    def as_dict(self):
+        """
+        Get the metrics as a JSON-serializable dict.
+
+        Returns:
+            dict: time, session, page, seconds, stages (name to calls and seconds) and counters
+        """
+        return {
+            "time": round(self.started, 3),
+            "session": self.session,
+            "page": self.page,
+            "seconds": round(self.elapsed(), 6),
+            "stages": {stage: {"calls": calls, "seconds": round(seconds, 6)}
+                       for stage, (calls, seconds) in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+
+class _Histogram:
+    """Bucket counts, sum and count of observed durations."""
+
+    __slots__ = ("buckets", "total", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.buckets[bisect_left(DURATION_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+def _label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    Process-wide totals of every stage, counter and rerun, safe to update from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._stages = {}
+        self._reruns = {}
+
+    def record_stage(self, stage, seconds):
+        """Add one run of a stage."""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = _Histogram()
+            histogram.observe(seconds)
+
+    def record_count(self, counter, amount=1):
+        """Add to a counter."""
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def record_rerun(self, metrics):
+        """Add the duration of a finished rerun, by page."""
+        with self._lock:
+            histogram = self._reruns.get(metrics.page)
+            if histogram is None:
+                histogram = self._reruns[metrics.page] = _Histogram()
+            histogram.observe(metrics.elapsed())
+
+    def snapshot(self):
+        """
+        Get the current totals.
+
+        Returns:
+            dict: counters (name to total), stages and reruns (name or page to calls and seconds)
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "stages": {stage: {"calls": h.count, "seconds": h.total} for stage, h in self._stages.items()},
+                "reruns": {page: {"calls": h.count, "seconds": h.total} for page, h in self._reruns.items()},
+            }
+
+    def prometheus_text(self):
+        """
+        Render the totals in the Prometheus text exposition format.
+
+        Returns:
+            str: One counter per recorded counter, plus the stage and rerun duration histograms
+        """
+        lines = []
+        with self._lock:
+            for counter in sorted(self._counters):
+                name = f"{METRIC_PREFIX}_{counter}_total"
+                lines.append(f"# HELP {name} {COUNTER_HELP.get(counter, counter.replace('_', ' ').capitalize())}")
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {self._counters[counter]}")
+            lines.append(f"# HELP {METRIC_PREFIX}_reruns_total App script reruns, by page")
+            lines.append(f"# TYPE {METRIC_PREFIX}_reruns_total counter")
+            for page in sorted(self._reruns):
+                lines.append(f'{METRIC_PREFIX}_reruns_total{{page="{_label(page)}"}} {self._reruns[page].count}')
+            self._histogram_lines(lines, "rerun_seconds", "Duration of app script reruns, by page", "page",
+                                  self._reruns)
+            self._histogram_lines(lines, "stage_seconds", "Time spent in each stage of the hot paths", "stage",
+                                  self._stages)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(lines, metric, help_text, label, histograms):
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key in sorted(histograms):
+            histogram = histograms[key]
+            labels = f'{label}="{_label(key)}"'
+            cumulative = 0
+            for bound, bucket in zip(DURATION_BUCKETS + ("+Inf",), histogram.buckets):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+_registry = MetricsRegistry()
+_local = threading.local()
+_log_lock = threading.Lock()
+_server_lock = threading.Lock()
+_server = None
+
+
+def get_registry():
+    """Get the process-wide MetricsRegistry."""
+    return _registry
+
+
+def start_rerun(page="", session=""):
+    """
+    Start recording a rerun in the current thread, replacing any unfinished one.
+
+    Args:
+        page (str): Page being rendered
+        session (str): Identifier of the browser session
+
+    Returns:
+        RerunMetrics: The metrics of the new rerun
+    """
+    metrics = _local.metrics = RerunMetrics(page, session)
+    return metrics
+
+
+def current_rerun():
+    """Get the RerunMetrics being recorded in this thread, or None."""
+    return getattr(_local, "metrics", None)
+
+
+def finish_rerun(log_path=""):
+    """
+    Stop recording the rerun of this thread and add it to the process totals.
+
+    Args:
+        log_path (str): File to append the rerun to as one JSON line ("-" for stderr, empty for none)
+
+    Returns:
+        RerunMetrics: The finished rerun, or None if none was started
+    """
+    metrics = current_rerun()
+    if metrics is None:
+        return None
+    _local.metrics = None
+    metrics.seconds = time.time() - metrics.started
+    _registry.record_rerun(metrics)
+    if log_path:
+        write_json_log(metrics.as_dict(), log_path)
+    return metrics
+
+
+def write_json_log(record, log_path):
+    """
+    Append a record as one JSON line.
+
+    Args:
+        record (dict): JSON-serializable record
+        log_path (str): File to append to ("-" for stderr)
+    """
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _log_lock:
+        if log_path == "-":
+            sys.stderr.write(line)
+            sys.stderr.flush()
+            return
+        try:
+            with open(log_path, "a", encoding="utf-8") as log_file:
+                log_file.write(line)
+        except OSError:
+            # Losing a log line must never break a rerun
+            pass
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block of code as a stage of the current rerun and of the process totals.
+
+    Args:
+        stage (str): Name of the stage (e.g. "dataframe", "to_html")
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics = current_rerun()
+        if metrics is not None:
+            metrics.add_stage(stage, seconds)
+        _registry.record_stage(stage, seconds)
+
+
+def count(counter, amount=1):
+    """
+    Add to a counter of the current rerun and of the process totals.
+
+    Args:
+        counter (str): Name of the counter (e.g. "rows_rendered")
+        amount (int): Amount to add
+    """
+    metrics = current_rerun()
+    if metrics is not None:
+        metrics.add_count(counter, amount)
+    _registry.record_count(counter, amount)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /metrics with the Prometheus text of the process-wide registry."""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        body = _registry.prometheus_text().encode("utf-8")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the app's output
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serve the process-wide metrics at http://host:port/metrics in a daemon thread, once per process.
+
+    Args:
+        port (int): Port to listen on
+        host (str): Address to listen on
+
+    Returns:
+        ThreadingHTTPServer: The running server (the existing one when already started)
+
+    Raises:
+        OSError: If the port cannot be bound
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            _server = server
+        return _server
@@ -0,0 +1,1021 @@
+"""
+Parsed view of the MITRE ATT&CK data used by every page of Threat Carver.
+
+The STIX bundle is walked once and the techniques, groups and group-to-technique
+mappings are frozen into an AttackKnowledgeBase. Every technique is stored once;
+a group's entries only hold a reference to it plus the group's procedure text.
+The app shares a single instance per process through st.cache_resource, so
+Streamlit reruns never parse again.
+
+The Enterprise, Mobile and ICS domains are separate bundles. load_domains()
+fetches them concurrently, parses the ones without a compiled snapshot (large
+ones in worker processes, on multi-core machines), and merges them into one
+knowledge base whose techniques and groups record the domain they come from.
+
+Each load also records which release of every bundle it saw. When MITRE
+publishes a new one, the loader compares it with the snapshot of the previous
+release (see release_diff). When the previous knowledge base is passed in, the
+search index reuses the tokens of the techniques and procedures that did not
+change; the records are still parsed and the other indexes (reverse lookups,
+tactic matrix, similarity bitsets) are rebuilt in full. The search index of
+each bundle is kept in its compiled snapshot, so it is built once per release
+and loaded on later starts.
+
+Revoked and deprecated objects are dropped while parsing (set
+THREAT_CARVER_INCLUDE_DEPRECATED to keep them), and the "subtechnique-of"
+relationships are kept to build the parent / sub-technique tree.
+"""
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import MappingProxyType
+
+from compiled_snapshot import read_records, read_search, snapshot_path, write_records, write_search
+from config import ATTACK_DOMAIN_URLS, ATTACK_DOMAINS, ATTACK_JSON_URL, INCLUDE_DEPRECATED, PARSE_PROCESS_MIN_BYTES
+from group_similarity import GroupSimilarity
+from instrumentation import count, timed
+from release_diff import load_release_diff, track_release
+from search_index import KnowledgeBaseSearch, SearchIndex
+from snapshot_cache import get_snapshot_cache
+from stix_graph import DATA_SOURCE_EDGE, GRAPH_NODE_TYPES, GraphNode, StixGraph
+from stix_stream import iter_bundle_objects
+from tactic_matrix import GroupTacticMatrix
+from technique_tree import TechniqueTree
+
+
+def load_attack_data(source=ATTACK_JSON_URL, cache=None):
+    """
+    Load the ATT&CK STIX bundle through the on-disk snapshot cache.
+
+    Args:
+        source (str): URL or local path of the bundle
+        cache (SnapshotCache): Cache to use (the shared one by default)
+
+    Returns:
+        dict: The decoded STIX bundle
+    """
+    with timed("fetch"):
+        path = (cache or get_snapshot_cache()).fetch(source)
+    with timed("parse"), open(path, "rb") as f:
+        return json.load(f)
+
+
+# Domain names used in the x_mitre_domains property of STIX objects
+STIX_DOMAINS = {
+    "enterprise-attack": "enterprise",
+    "mobile-attack": "mobile",
+    "ics-attack": "ics",
+}
+
+# Display name of each domain
+DOMAIN_LABELS = {
+    "enterprise": "Enterprise",
+    "mobile": "Mobile",
+    "ics": "ICS",
+}
+
+
+def _locate_snapshot(cache, source, include_deprecated=INCLUDE_DEPRECATED):
+    """
+    Fetch a bundle and get the path its compiled snapshot has (or will have).
+
+    Args:
+        cache (SnapshotCache): Cache used to fetch the bundle
+        source (str): URL or local path of the bundle
+        include_deprecated (bool): Whether the snapshot keeps revoked and deprecated objects
+
+    Returns:
+        tuple: (bundle path, SHA-256 of the bundle, compiled snapshot path)
+    """
+    bundle_path = cache.fetch(source)
+    content_hash = cache.content_hash(source, bundle_path)
+    return bundle_path, content_hash, snapshot_path(_compiled_dir(cache, include_deprecated), content_hash)
+
+
+def _compiled_dir(cache, include_deprecated=INCLUDE_DEPRECATED):
+    """
+    Get the directory of the compiled snapshots (and release diffs) of a cache.
+
+    Snapshots keeping revoked and deprecated objects have their own directory,
+    so switching the option never loads the other kind.
+    """
+    return os.path.join(cache.cache_dir, "compiled-all" if include_deprecated else "compiled")
+
+
+class BundleInfo(namedtuple("BundleInfo", ["content_hash", "fetched_at"])):
+    """The SHA-256 of a fetched bundle and when it was downloaded (or last modified, for local files)."""
+
+    __slots__ = ()
+
+
+def check_bundles(domains=ATTACK_DOMAINS, sources=ATTACK_DOMAIN_URLS, cache=None):
+    """
+    Fetch (or revalidate) the bundles of several domains concurrently, without parsing them.
+
+    An unchanged remote bundle costs one conditional request, so this is cheap
+    enough to call periodically to find out whether a reload is needed.
+
+    Args:
+        domains (iterable): Domain names, keys of sources
+        sources (dict): Domain name to the URL or local path of its bundle
+        cache (SnapshotCache): Cache to use (the shared one by default)
+
+    Returns:
+        tuple: (dict of domain name to its BundleInfo, dict of domain name to the error of each failed domain)
+    """
+    cache = cache or get_snapshot_cache()
+    errors = {}
+
+    def check(domain):
+        try:
+            bundle_path = cache.fetch(sources[domain])
+            metadata = cache.read_metadata(sources[domain]) or {}
+            return BundleInfo(cache.content_hash(sources[domain], bundle_path),
+                              metadata.get("fetched_at") or os.path.getmtime(bundle_path))
+        except Exception as e:
+            errors[domain] = e
+            return None
+
+    domains = list(domains)
+    with ThreadPoolExecutor(max_workers=max(1, len(domains))) as threads:
+        bundles = {domain: info for domain, info in zip(domains, threads.map(check, domains)) if info is not None}
+    return bundles, errors
+
+
+def parse_bundle(bundle_path, domain, compiled_path=None, content_hash=None, include_deprecated=INCLUDE_DEPRECATED):
+    """
+    Stream-parse a STIX bundle file and compile it for the next start.
+
+    This is a module-level function so it can run in a worker process.
+
+    Args:
+        bundle_path (str): Path of the STIX bundle
+        domain (str): Domain of objects without x_mitre_domains (e.g. "enterprise")
+        compiled_path (str): Where to write the compiled snapshot (not written when None)
+        content_hash (str): SHA-256 of the bundle, stored in the snapshot
+        include_deprecated (bool): Keep revoked and deprecated objects
+
+    Returns:
+        BundleRecords: The records of the bundle
+    """
+    with open(bundle_path, "rb") as f:
+        records = parse_objects(iter_bundle_objects(f), domain, include_deprecated)
+    if compiled_path:
+        try:
+            write_records(records, compiled_path, content_hash)
+        except OSError:
+            # A read-only cache directory only costs us the faster next start
+            pass
+    return records
+
+
+def load_knowledge_base(source=ATTACK_JSON_URL, cache=None, domain="enterprise", previous=None,
+                        include_deprecated=INCLUDE_DEPRECATED):
+    """
+    Load the knowledge base of one bundle, preferring its compiled snapshot.
+
+    The bundle is fetched (or revalidated) through the snapshot cache and its
+    SHA-256 is used to find a compiled snapshot. When there is none yet, the STIX
+    JSON is stream-parsed once and the result is compiled for the next start.
+
+    Args:
+        source (str): URL or local path of the bundle
+        cache (SnapshotCache): Cache to use (the shared one by default)
+        domain (str): Domain of objects without x_mitre_domains
+        previous (AttackKnowledgeBase): Knowledge base of an earlier release, whose search tokens are reused
+        include_deprecated (bool): Keep revoked and deprecated objects
+
+    Returns:
+        AttackKnowledgeBase: The parsed knowledge base
+    """
+    cache = cache or get_snapshot_cache()
+    with timed("fetch"):
+        bundle_path, content_hash, compiled_path = _locate_snapshot(cache, source, include_deprecated)
+    with timed("parse"):
+        if os.path.exists(compiled_path):
+            count("compiled_snapshot_hits")
+            records = read_records(compiled_path)
+        else:
+            count("compiled_snapshot_misses")
+            records = parse_bundle(bundle_path, domain, compiled_path, content_hash, include_deprecated)
+    track_release(_compiled_dir(cache, include_deprecated), source, domain, content_hash, records)
+    with timed("index"):
+        indexes = _snapshot_indexes(compiled_path, records, previous)
+        return AttackKnowledgeBase.from_records(records, previous, indexes=indexes)
+
+
+def load_domains(domains=ATTACK_DOMAINS, sources=ATTACK_DOMAIN_URLS, cache=None, previous=None,
+                 include_deprecated=INCLUDE_DEPRECATED):
+    """
+    Load several ATT&CK domains concurrently and merge them into one knowledge base.
+
+    The bundles are fetched (or revalidated) in parallel threads. Compiled
+    snapshots are read in those threads too; bundles without one are
+    stream-parsed in separate processes when several of them are at least
+    PARSE_PROCESS_MIN_BYTES and there is more than one CPU, since parsing is
+    CPU-bound and would otherwise run one bundle at a time under the GIL.
+    Smaller bundles (the Mobile and ICS ones, and at its current size the
+    Enterprise one) are parsed in this process, as are large ones when the
+    workers cannot be started.
+
+    A domain that cannot be loaded (e.g. not cached in offline mode) is left
+    out, so one unavailable bundle does not keep the others from loading.
+
+    Passing the knowledge base currently in use as previous lets a refresh
+    reuse the search tokens of the techniques and procedures that did not
+    change. Everything else is rebuilt from the new records: the cost of a
+    refresh follows the size of the release, not the size of the diff.
+
+    Args:
+        domains (iterable): Domain names, keys of sources
+        sources (dict): Domain name to the URL or local path of its bundle
+        cache (SnapshotCache): Cache to use (the shared one by default)
+        previous (AttackKnowledgeBase): Knowledge base of an earlier load, whose search tokens are reused
+        include_deprecated (bool): Keep revoked and deprecated objects
+
+    Returns:
+        tuple: (AttackKnowledgeBase of the loaded domains, dict of domain name to the error of each failed domain)
+
+    Raises:
+        Exception: The error of the first domain when none could be loaded
+    """
+    cache = cache or get_snapshot_cache()
+    domains = list(domains)
+    records = {}
+    errors = {}
+
+    def locate(domain):
+        try:
+            return _locate_snapshot(cache, sources[domain], include_deprecated)
+        except Exception as e:
+            errors[domain] = e
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, len(domains))) as threads:
+        with timed("fetch"):
+            located = dict(zip(domains, threads.map(locate, domains)))
+        compiled = [domain for domain in domains if located[domain] and os.path.exists(located[domain][2])]
+        missing = [domain for domain in domains if located[domain] and domain not in compiled]
+        count("compiled_snapshot_hits", len(compiled))
+        count("compiled_snapshot_misses", len(missing))
+
+        with timed("parse"):
+            # Compiled snapshots are read while the missing bundles are being parsed
+            read_futures = {domain: threads.submit(read_records, located[domain][2]) for domain in compiled}
+            # Starting a worker and sending the records back only pays off for large bundles
+            large = [domain for domain in missing if os.path.getsize(located[domain][0]) >= PARSE_PROCESS_MIN_BYTES]
+            if len(large) > 1 and (os.cpu_count() or 1) > 1:
+                records.update(_parse_in_processes({domain: located[domain] for domain in large},
+                                                   include_deprecated))
+            for domain in missing:
+                if domain not in records:
+                    try:
+                        records[domain] = parse_bundle(located[domain][0], domain, located[domain][2],
+                                                       located[domain][1], include_deprecated)
+                    except Exception as e:
+                        errors[domain] = e
+            for domain, future in read_futures.items():
+                try:
+                    records[domain] = future.result()
+                except Exception as e:
+                    errors[domain] = e
+
+    if not records:
+        raise next(iter(errors.values())) if errors else ValueError("No ATT&CK domain to load")
+    for domain in records:
+        track_release(_compiled_dir(cache, include_deprecated), sources[domain], domain, located[domain][1],
+                      records[domain])
+    with timed("index"):
+        loaded = [domain for domain in domains if domain in records]
+        merged = merge_records([records[domain] for domain in loaded])
+        domain_indexes = [_snapshot_indexes(located[domain][2], records[domain], previous) for domain in loaded]
+        indexes = domain_indexes[0] if len(domain_indexes) == 1 else \
+            tuple(SearchIndex.concatenate(parts) for parts in zip(*domain_indexes))
+        return AttackKnowledgeBase.from_records(merged, previous, indexes=indexes), errors
+
+
+def release_changes(domains=ATTACK_DOMAINS, sources=ATTACK_DOMAIN_URLS, cache=None,
+                    include_deprecated=INCLUDE_DEPRECATED):
+    """
+    Get what changed in the last release loaded of each domain.
+
+    Args:
+        domains (iterable): Domain names, keys of sources
+        sources (dict): Domain name to the URL or local path of its bundle
+        cache (SnapshotCache): Cache to use (the shared one by default)
+        include_deprecated (bool): Whether the loaded data keeps revoked and deprecated objects
+
+    Returns:
+        dict: Domain name to its ReleaseDiff, for the domains with a recorded diff
+    """
+    compiled_dir = _compiled_dir(cache or get_snapshot_cache(), include_deprecated)
+    changes = {}
+    for domain in domains:
+        diff = load_release_diff(compiled_dir, sources[domain])
+        if diff is not None:
+            changes[domain] = diff
+    return changes
+
+
+def index_records(records, previous=None):
+    """
+    Build the search index of parsed records.
+
+    Args:
+        records (BundleRecords): Records of one or more bundles
+        previous (AttackKnowledgeBase): Knowledge base of an earlier release; the techniques
+                                        and procedures it already indexed are not tokenized again
+
+    Returns:
+        KnowledgeBaseSearch: The search over the techniques and procedures of the records
+    """
+    techniques = {tech.stix_id: tech for tech in records.techniques}
+    groups = {group.stix_id: group for group in records.groups}
+    usages = tuple(TechniqueUsage(groups[group_stix_id], techniques[tech_stix_id], procedure, relationship_id)
+                   for group_stix_id, tech_stix_id, procedure, relationship_id in records.uses)
+    previous_search = getattr(previous, "_search", None)
+    return KnowledgeBaseSearch(techniques, usages,
+                               previous_search if isinstance(previous_search, KnowledgeBaseSearch) else None)
+
+
+def _snapshot_indexes(compiled_path, records, previous=None):
+    """
+    Get the search index of a bundle's records from its compiled snapshot.
+
+    A snapshot without one (just compiled, or written by write_snapshot) gets
+    it built and added, so it is only built once per release.
+
+    Args:
+        compiled_path (str): Path of the compiled snapshot of the bundle
+        records (BundleRecords): The records of the bundle
+        previous (AttackKnowledgeBase): Knowledge base of an earlier release, whose search tokens are reused
+
+    Returns:
+        tuple: Technique and procedure SearchIndex of the records
+    """
+    try:
+        indexes = read_search(compiled_path)
+    except (sqlite3.Error, ValueError, KeyError):
+        # Not compiled (read-only cache directory) or unreadable: built below
+        indexes = None
+    if indexes is None:
+        indexes = index_records(records, previous).indexes
+        try:
+            write_search(compiled_path, indexes)
+        except (OSError, sqlite3.Error):
+            # A read-only cache directory only costs us the faster next start
+            pass
+    return indexes
+
+
+def _parse_in_processes(located, include_deprecated):
+    """
+    Parse several bundles at once, one worker process each.
+
+    Args:
+        located (dict): Domain name to (bundle path, SHA-256, compiled snapshot path)
+        include_deprecated (bool): Keep revoked and deprecated objects
+
+    Returns:
+        dict: Domain name to its records, for the bundles parsed successfully. Bundles
+              missing from it (e.g. the workers could not start) are parsed by the caller.
+    """
+    records = {}
+    try:
+        # "spawn" starts clean interpreters; forking the multi-threaded app process is unsafe
+        with ProcessPoolExecutor(max_workers=len(located), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {domain: pool.submit(parse_bundle, bundle_path, domain, compiled_path, content_hash,
+                                           include_deprecated)
+                       for domain, (bundle_path, content_hash, compiled_path) in located.items()}
+            for domain, future in futures.items():
+                try:
+                    records[domain] = future.result()
+                except Exception:
+                    pass
+    except (OSError, RuntimeError):
+        # No worker processes available here; the caller parses in this process instead
+        pass
+    return records
+
+
+def merge_records(records_list):
+    """
+    Merge the records of several bundles.
+
+    Techniques are domain-specific, but an intrusion set can appear in several
+    domains under the same STIX ID; it is kept once with the union of its domains.
+
+    Args:
+        records_list (list): BundleRecords of each bundle
+
+    Returns:
+        BundleRecords: The records of all bundles, with the release of each domain
+    """
+    if len(records_list) == 1:
+        return records_list[0]
+    techniques = {}
+    groups = {}
+    uses = []
+    versions = {}
+    releases = {}
+    subtechniques = []
+    nodes = {}
+    edges = {}
+    for records in records_list:
+        for tech in records.techniques:
+            techniques.setdefault(tech.stix_id, tech)
+        for group in records.groups:
+            known = groups.get(group.stix_id)
+            if known is None:
+                groups[group.stix_id] = group
+            else:
+                groups[group.stix_id] = known._replace(domains=tuple(dict.fromkeys(known.domains + group.domains)))
+        uses.extend(records.uses)
+        versions.update(records.versions)
+        releases.update(records.releases)
+        subtechniques.extend(records.subtechniques)
+        # Software and mitigations shared by several domains are kept once
+        for node in records.nodes:
+            nodes.setdefault(node.stix_id, node)
+        edges.update(dict.fromkeys(records.edges))
+    return BundleRecords(list(techniques.values()), list(groups.values()), uses, versions, releases, subtechniques,
+                         list(nodes.values()), list(edges))
+
+
+def get_external_id(obj):
+    """
+    Get the ATT&CK external ID (e.g. T1059.001 or G0007) of a STIX object.
+
+    Args:
+        obj (dict): A STIX object from the bundle
+
+    Returns:
+        str: The external ID, or None if the object has no mitre-attack reference
+    """
+    for ref in obj.get("external_references", []):
+        if ref.get("source_name") == "mitre-attack":
+            return ref.get("external_id")
+    return None
+
+
+def get_tactics(obj):
+    """
+    Get the tactic names (kill chain phases) of an attack-pattern.
+
+    Args:
+        obj (dict): An attack-pattern STIX object
+
+    Returns:
+        list: The phase names of the MITRE kill chains (e.g. "defense-evasion")
+    """
+    tactics = []
+    for phase in obj.get("kill_chain_phases", []):
+        if phase.get("kill_chain_name", "").startswith("mitre"):
+            tactics.append(phase.get("phase_name"))
+    return tactics
+
+
+def get_domains(obj, default_domain):
+    """
+    Get the ATT&CK domains (enterprise, mobile, ics) a STIX object belongs to.
+
+    Args:
+        obj (dict): A STIX object from the bundle
+        default_domain (str): Domain of the bundle, used when the object does not list any
+
+    Returns:
+        tuple: Domain names
+    """
+    domains = tuple(STIX_DOMAINS.get(name, name) for name in obj.get("x_mitre_domains", ()))
+    return domains or (default_domain,)
+
+
+class Technique(namedtuple("Technique", ["stix_id", "tech_id", "name", "description", "tactics", "domain"],
+                           defaults=("enterprise",))):
+    """
+    An ATT&CK technique (attack-pattern).
+
+    Each technique is stored once and shared by reference by every group that
+    uses it. Records are immutable tuples without a per-instance __dict__.
+    """
+
+    __slots__ = ()
+
+
+class Group(namedtuple("Group", ["stix_id", "name", "group_id", "description", "domains"],
+                       defaults=(("enterprise",),))):
+    """An ATT&CK group (intrusion-set), with every domain it appears in."""
+
+    __slots__ = ()
+
+
+class TechniqueUsage(namedtuple("TechniqueUsage", ["group", "technique", "procedure", "stix_id"],
+                                defaults=(None,))):
+    """
+    One "uses" relationship: a group, a reference to the shared technique, the procedure text
+    and the STIX ID of the relationship.
+
+    The technique fields are readable directly on the usage, so a group's
+    technique list can be displayed like a list of techniques.
+    """
+
+    __slots__ = ()
+
+    @property
+    def tech_id(self):
+        return self.technique.tech_id
+
+    @property
+    def name(self):
+        return self.technique.name
+
+    @property
+    def description(self):
+        return self.technique.description
+
+    @property
+    def tactics(self):
+        return self.technique.tactics
+
+
+class ObjectVersion(namedtuple("ObjectVersion", ["type", "modified", "revoked", "deprecated"])):
+    """The STIX version fields of an object, compared between two releases of a bundle."""
+
+    __slots__ = ()
+
+
+class BundleRecords(namedtuple("BundleRecords", ["techniques", "groups", "uses", "versions", "releases",
+                                                 "subtechniques", "nodes", "edges"], defaults=((), (), ()))):
+    """
+    Everything kept from one or more STIX bundles, before the indexes are built.
+
+    Attributes:
+        techniques (list): Technique records
+        groups (list): Group records
+        uses (list): (group STIX ID, technique STIX ID, procedure, relationship STIX ID) tuples
+        versions (dict): STIX ID of every technique, group and "uses" relationship to its ObjectVersion
+        releases (dict): Domain name to the release of its bundle ({"name", "version", "modified"})
+        subtechniques (list): (sub-technique STIX ID, parent technique STIX ID) tuples
+        nodes (list): GraphNode of every other kept object (software, mitigations, campaigns, ...)
+        edges (list): (source STIX ID, target STIX ID, relationship type) of every relationship
+                      between kept objects
+    """
+
+    __slots__ = ()
+
+
+def get_version(obj):
+    """
+    Get the fields telling two releases of a STIX object apart.
+
+    Args:
+        obj (dict): A STIX object from the bundle
+
+    Returns:
+        ObjectVersion: Its type, modified timestamp and revoked / deprecated flags
+    """
+    return ObjectVersion(obj.get("type"), obj.get("modified"), bool(obj.get("revoked")),
+                         bool(obj.get("x_mitre_deprecated")))
+
+
+def is_retired(obj):
+    """
+    Check whether a STIX object was revoked or deprecated by MITRE.
+
+    Args:
+        obj (dict): A STIX object from the bundle
+
+    Returns:
+        bool: True for revoked or deprecated objects
+    """
+    return bool(obj.get("revoked") or obj.get("x_mitre_deprecated"))
+
+
+def parse_objects(objects, domain="enterprise", include_deprecated=INCLUDE_DEPRECATED):
+    """
+    Extract the techniques, groups and "uses" relationships of STIX objects in a single pass.
+
+    The other objects of GRAPH_NODE_TYPES (software, mitigations, campaigns,
+    data sources, ...) and every relationship between kept objects are kept
+    too, for the relationship graph.
+
+    Only the fields the index needs are kept from each object, so the objects
+    can come straight from stix_stream.iter_bundle_objects() without the
+    bundle ever being held in memory. Revoked and deprecated objects are left
+    out unless include_deprecated is set; their versions are still recorded so
+    the release diff can report them.
+
+    Args:
+        objects (iterable): STIX objects (dicts), in any order
+        domain (str): Domain of objects without x_mitre_domains (e.g. "enterprise")
+        include_deprecated (bool): Keep revoked and deprecated objects
+
+    Returns:
+        BundleRecords: The records of the objects
+    """
+    # Dictionaries to store techniques and groups
+    techniques_dict = {}
+    groups_dict = {}
+    versions = {}
+    release = None
+    # Relationships may come before the objects they reference
+    relationships = []
+    subtechnique_of = []
+    flagged_subtechniques = set()
+    nodes = {}
+    edges = []
+
+    for obj in objects:
+        o_type = obj.get("type")
+        if o_type == "attack-pattern":
+            versions[obj.get("id")] = get_version(obj)
+            if is_retired(obj) and not include_deprecated:
+                continue
+            techniques_dict[obj.get("id")] = Technique(
+                stix_id=obj.get("id"),
+                tech_id=get_external_id(obj),
+                name=obj.get("name", ""),
+                description=obj.get("description", ""),
+                tactics=tuple(get_tactics(obj)),
+                domain=get_domains(obj, domain)[0]
+            )
+            if obj.get("x_mitre_is_subtechnique"):
+                flagged_subtechniques.add(obj.get("id"))
+        elif o_type == "intrusion-set":
+            versions[obj.get("id")] = get_version(obj)
+            if is_retired(obj) and not include_deprecated:
+                continue
+            groups_dict[obj.get("id")] = Group(
+                stix_id=obj.get("id"),
+                name=obj.get("name", ""),
+                group_id=get_external_id(obj),
+                description=obj.get("description", ""),
+                domains=get_domains(obj, domain)
+            )
+        elif o_type == "relationship":
+            relationship_type = obj.get("relationship_type")
+            if include_deprecated or not is_retired(obj):
+                edges.append((obj.get("source_ref"), obj.get("target_ref"), relationship_type))
+            if relationship_type == "uses":
+                relationships.append((obj.get("source_ref"), obj.get("target_ref"), obj.get("description", ""),
+                                      obj.get("id"), get_version(obj), is_retired(obj)))
+            elif relationship_type == "subtechnique-of" and (include_deprecated or not is_retired(obj)):
+                subtechnique_of.append((obj.get("source_ref"), obj.get("target_ref")))
+        elif o_type in GRAPH_NODE_TYPES:
+            if is_retired(obj) and not include_deprecated:
+                continue
+            nodes[obj.get("id")] = GraphNode(obj.get("id"), o_type, get_external_id(obj), obj.get("name", ""))
+            if obj.get("x_mitre_data_source_ref"):
+                edges.append((obj.get("id"), obj.get("x_mitre_data_source_ref"), DATA_SOURCE_EDGE))
+        elif o_type == "x-mitre-collection":
+            # The release this bundle belongs to (e.g. "Enterprise ATT&CK" version "15.1")
+            release = {"name": obj.get("name"), "version": obj.get("x_mitre_version"),
+                       "modified": obj.get("modified")}
+
+    # Keep the group -> technique "uses" relationships with their procedure text (and the
+    # versions of those between a group and a technique, even when one of them was left out)
+    uses = []
+    for src_id, tgt_id, procedure, relationship_id, version, retired in relationships:
+        source, target = versions.get(src_id), versions.get(tgt_id)
+        if source and target and source.type == "intrusion-set" and target.type == "attack-pattern":
+            versions[relationship_id] = version
+        if src_id in groups_dict and tgt_id in techniques_dict and (include_deprecated or not retired):
+            uses.append((src_id, tgt_id, procedure, relationship_id))
+
+    # Every relationship between two kept objects goes into the graph
+    def kept(stix_id):
+        return stix_id in nodes or stix_id in techniques_dict or stix_id in groups_dict
+
+    edges = [edge for edge in edges if kept(edge[0]) and kept(edge[1])]
+
+    return BundleRecords(list(techniques_dict.values()), list(groups_dict.values()), uses, versions,
+                         {domain: release} if release else {},
+                         subtechnique_edges(techniques_dict, subtechnique_of, flagged_subtechniques),
+                         list(nodes.values()), edges)
+
+
+def subtechnique_edges(techniques_dict, subtechnique_of, flagged_subtechniques):
+    """
+    Pair every sub-technique with its parent technique.
+
+    The "subtechnique-of" relationships are used first. A technique marked with
+    x_mitre_is_subtechnique but without such a relationship is attached to the
+    technique whose ID is its own without the suffix (T1059.001 -> T1059).
+
+    Args:
+        techniques_dict (dict): STIX ID to Technique of the kept techniques
+        subtechnique_of (list): (source STIX ID, target STIX ID) of the "subtechnique-of" relationships
+        flagged_subtechniques (set): STIX IDs of the techniques marked as sub-techniques
+
+    Returns:
+        list: (sub-technique STIX ID, parent STIX ID) tuples
+    """
+    parents = {}
+    for sub_stix_id, parent_stix_id in subtechnique_of:
+        if sub_stix_id in techniques_dict and parent_stix_id in techniques_dict:
+            parents.setdefault(sub_stix_id, parent_stix_id)
+    orphans = flagged_subtechniques.difference(parents)
+    if orphans:
+        by_tech_id = {tech.tech_id: stix_id for stix_id, tech in techniques_dict.items() if tech.tech_id}
+        for sub_stix_id in orphans:
+            tech_id = techniques_dict[sub_stix_id].tech_id or ""
+            parent_stix_id = by_tech_id.get(tech_id.split(".")[0]) if "." in tech_id else None
+            if parent_stix_id:
+                parents[sub_stix_id] = parent_stix_id
+    return list(parents.items())
+
+
+class AttackKnowledgeBase:
+    """
+    Immutable index of ATT&CK techniques, groups and the techniques each group uses.
+
+    All mappings are exposed as read-only views and every record is an immutable
+    tuple, so a single instance can safely be shared between all Streamlit sessions.
+    """
+
+    __slots__ = ("_techniques_dict", "_groups_dict", "_usages", "_group_positions", "_group_to_techniques",
+                 "_technique_by_id", "_group_by_name", "_groups_by_technique", "_techniques_by_tactic",
+                 "_tactic_matrix", "_search", "_group_similarity", "_lazy_lock", "_domains", "_releases",
+                 "_technique_tree", "_graph_nodes", "_graph_edges", "_graph")
+
+    def __init__(self, techniques, groups, uses, releases=None, previous=None, subtechniques=(), nodes=(),
+                 edges=(), search=None, indexes=None):
+        """
+        Args:
+            techniques (iterable): Technique records
+            groups (iterable): Group records
+            uses (iterable): (group STIX ID, technique STIX ID, procedure, relationship STIX ID) tuples
+                             from the "uses" relationships
+            releases (dict): Domain name to the release of its bundle
+            previous (AttackKnowledgeBase): Knowledge base of an earlier release; the search index reuses the
+                                            tokens of what did not change (the other indexes are rebuilt)
+            subtechniques (iterable): (sub-technique STIX ID, parent STIX ID) tuples
+            nodes (iterable): GraphNode of the other objects of the relationship graph
+            edges (iterable): (source STIX ID, target STIX ID, relationship type) tuples of every relationship
+            search (object): Search over these records with the methods of KnowledgeBaseSearch, e.g. the
+                             StoreSearch of a shared store (an in-memory index is built by default)
+            indexes (tuple): Technique and procedure SearchIndex already built for these records (e.g. read
+                             from compiled snapshots), used instead of building the in-memory index
+        """
+        self._techniques_dict = MappingProxyType({tech.stix_id: tech for tech in techniques})
+        self._groups_dict = MappingProxyType({group.stix_id: group for group in groups})
+
+        # One usage per "uses" relationship, referencing the shared technique and group records
+        self._usages = tuple(
+            TechniqueUsage(self._groups_dict[group_stix_id], self._techniques_dict[tech_stix_id], procedure,
+                           relationship_id)
+            for group_stix_id, tech_stix_id, procedure, relationship_id in uses
+        )
+        group_positions = {}
+        for position, usage in enumerate(self._usages):
+            group_positions.setdefault(usage.group.name, []).append(position)
+        self._group_positions = MappingProxyType({
+            group_name: tuple(positions) for group_name, positions in group_positions.items()
+        })
+
+        # Build mapping from group name to techniques list
+        self._group_to_techniques = MappingProxyType({
+            group_name: tuple(self._usages[position] for position in positions)
+            for group_name, positions in self._group_positions.items()
+        })
+
+        # Reverse indexes so that pages never scan the techniques or groups
+        self._technique_by_id = MappingProxyType({
+            tech.tech_id: tech for tech in self._techniques_dict.values() if tech.tech_id
+        })
+        self._group_by_name = MappingProxyType({
+            group.name: group for group in self._groups_dict.values()
+        })
+        groups_by_technique = {}
+        for usage in self._usages:
+            groups_by_technique.setdefault(usage.tech_id, []).append(usage)
+        self._groups_by_technique = MappingProxyType({
+            tech_id: tuple(usages) for tech_id, usages in groups_by_technique.items()
+        })
+        techniques_by_tactic = {}
+        for tech in self._techniques_dict.values():
+            for tactic in tech.tactics:
+                techniques_by_tactic.setdefault(tactic, []).append(tech)
+        self._techniques_by_tactic = MappingProxyType({
+            tactic: tuple(techs) for tactic, techs in sorted(techniques_by_tactic.items())
+        })
+
+        # Domains of the techniques, known ones first in their usual order
+        found = {tech.domain for tech in self._techniques_dict.values()}
+        self._domains = tuple(domain for domain in ATTACK_DOMAIN_URLS if domain in found) + \
+            tuple(sorted(found.difference(ATTACK_DOMAIN_URLS)))
+
+        # Parent / sub-technique hierarchy behind the collapsible technique tables
+        self._technique_tree = TechniqueTree(self._techniques_dict, subtechniques)
+
+        # Group x tactic counts behind the Group Analysis stats and charts
+        self._tactic_matrix = GroupTacticMatrix(self._usages, self._group_positions)
+
+        # Full-text index behind every search box
+        if search is None and indexes is not None and \
+                (len(indexes[0]), len(indexes[1])) == (len(self._techniques_dict), len(self._usages)):
+            search = KnowledgeBaseSearch.from_indexes(self._techniques_dict, self._usages, *indexes)
+        if search is None:
+            previous_search = getattr(previous, "_search", None)
+            search = KnowledgeBaseSearch(self._techniques_dict, self._usages,
+                                         previous_search if isinstance(previous_search, KnowledgeBaseSearch) else None)
+        self._search = search
+        self._releases = MappingProxyType(dict(releases or {}))
+
+        # Built on first use by the pages that need them
+        self._group_similarity = None
+        self._graph = None
+        self._graph_nodes = tuple(nodes)
+        self._graph_edges = tuple(edges)
+        self._lazy_lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, records, previous=None, search=None, indexes=None):
+        """
+        Build a knowledge base from parsed records.
+
+        Args:
+            records (BundleRecords): Records of one or more bundles
+            previous (AttackKnowledgeBase): Knowledge base of an earlier release, whose search
+                                            tokens are reused for what did not change
+            search (object): Search to use instead of building an in-memory index
+            indexes (tuple): Technique and procedure SearchIndex of the records, used instead of building them
+
+        Returns:
+            AttackKnowledgeBase: The knowledge base
+        """
+        return cls(records.techniques, records.groups, records.uses, records.releases, previous,
+                   records.subtechniques, records.nodes, records.edges, search, indexes)
+
+    @classmethod
+    def from_bundle(cls, attack_data, domain="enterprise"):
+        """
+        Parse a decoded STIX bundle into a knowledge base.
+
+        Args:
+            attack_data (dict): The decoded ATT&CK STIX bundle
+            domain (str): Domain of objects without x_mitre_domains
+
+        Returns:
+            AttackKnowledgeBase: The parsed knowledge base
+        """
+        return cls.from_objects(attack_data.get("objects", []), domain)
+
+    @classmethod
+    def from_objects(cls, objects, domain="enterprise"):
+        """
+        Parse STIX objects into a knowledge base in a single pass.
+
+        Args:
+            objects (iterable): STIX objects (dicts), in any order
+            domain (str): Domain of objects without x_mitre_domains
+
+        Returns:
+            AttackKnowledgeBase: The parsed knowledge base
+        """
+        return cls.from_records(parse_objects(objects, domain))
+
+    @classmethod
+    def from_file(cls, path, domain="enterprise"):
+        """
+        Parse a STIX bundle file into a knowledge base, streaming its objects.
+
+        Args:
+            path (str): Path of the STIX bundle
+            domain (str): Domain of objects without x_mitre_domains
+
+        Returns:
+            AttackKnowledgeBase: The parsed knowledge base
+        """
+        return cls.from_records(parse_bundle(path, domain))
+
+    @property
+    def releases(self):
+        """Read-only mapping of domain name to the release of its bundle ({"name", "version", "modified"})."""
+        return self._releases
+
+    @property
+    def domains(self):
+        """Tuple of the ATT&CK domains the techniques come from (e.g. ("enterprise", "ics"))."""
+        return self._domains
+
+    @property
+    def techniques_dict(self):
+        """Read-only mapping of technique STIX ID to Technique."""
+        return self._techniques_dict
+
+    @property
+    def groups_dict(self):
+        """Read-only mapping of group STIX ID to Group."""
+        return self._groups_dict
+
+    @property
+    def usages(self):
+        """Tuple of TechniqueUsage, one per group "uses" relationship."""
+        return self._usages
+
+    @property
+    def group_positions(self):
+        """Read-only mapping of group name to the positions of its entries in usages."""
+        return self._group_positions
+
+    @property
+    def group_to_techniques(self):
+        """Read-only mapping of group name to the TechniqueUsages (technique and procedure) of the group."""
+        return self._group_to_techniques
+
+    @property
+    def technique_by_id(self):
+        """Read-only mapping of ATT&CK technique ID (e.g. T1059.001) to Technique."""
+        return self._technique_by_id
+
+    @property
+    def group_by_name(self):
+        """Read-only mapping of group name to Group."""
+        return self._group_by_name
+
+    @property
+    def techniques_by_tactic(self):
+        """Read-only mapping of tactic name to the Techniques in that tactic."""
+        return self._techniques_by_tactic
+
+    @property
+    def tactic_matrix(self):
+        """GroupTacticMatrix of technique entries per group and tactic."""
+        return self._tactic_matrix
+
+    @property
+    def technique_tree(self):
+        """TechniqueTree of the parent technique of every sub-technique."""
+        return self._technique_tree
+
+    @property
+    def group_similarity(self):
+        """GroupSimilarity of the technique sets of all groups (built on first access)."""
+        with self._lazy_lock:
+            if self._group_similarity is None:
+                self._group_similarity = GroupSimilarity(self._usages, self._group_positions)
+            return self._group_similarity
+
+    @property
+    def graph(self):
+        """StixGraph of every kept object and relationship (built on first access)."""
+        with self._lazy_lock:
+            if self._graph is None:
+                nodes = [GraphNode(tech.stix_id, "attack-pattern", tech.tech_id, tech.name)
+                         for tech in self._techniques_dict.values()]
+                nodes.extend(GraphNode(group.stix_id, "intrusion-set", group.group_id, group.name)
+                             for group in self._groups_dict.values())
+                nodes.extend(self._graph_nodes)
+                self._graph = StixGraph(nodes, self._graph_edges)
+            return self._graph
+
+    @property
+    def graph_records(self):
+        """Tuple of (GraphNodes, edges) the graph is built from, besides the techniques and groups."""
+        return self._graph_nodes, self._graph_edges
+
+    def groups_using(self, tech_id):
+        """
+        Get the groups that use a technique.
+
+        Args:
+            tech_id (str): The ATT&CK technique ID (e.g. T1059.001)
+
+        Returns:
+            tuple: TechniqueUsages (group and procedure), in relationship order
+        """
+        return self._groups_by_technique.get(tech_id, ())
+
+    def search_techniques(self, query, include_procedures=False, limit=None):
+        """
+        Search techniques by ID, name, tactic and description.
+
+        Args:
+            query (str): The search text
+            include_procedures (bool): Also match techniques whose group procedures contain the terms
+            limit (int): Maximum number of results (all by default)
+
+        Returns:
+            list: Techniques, most relevant first
+        """
+        return [self._techniques_dict[stix_id]
+                for stix_id in self._search.search_techniques(query, include_procedures, limit)]
+
+    def search_usages(self, query, positions=None, limit=None):
+        """
+        Search group technique entries by technique fields and procedure text.
+
+        Args:
+            query (str): The search text
+            positions (iterable): Positions in usages to search, e.g. one group's (all by default)
+            limit (int): Maximum number of results (all by default)
+
+        Returns:
+            list: Positions in usages, most relevant first
+        """
+        return self._search.search_usages(query, positions, limit)
@@ -0,0 +1,277 @@
+"""
+Changes between two releases of an ATT&CK bundle.
+
+Every compiled snapshot keeps the STIX id, type, modified timestamp and
+revoked / deprecated flags of its techniques, groups and "uses" relationships.
+When a bundle with a new SHA-256 is loaded, its records are compared with the
+snapshot of the release loaded before it, object by object, and the result is
+stored next to the snapshots so the "What's New" page can show it without
+diffing the JSON again. A small pointer file per source remembers which
+release was loaded last.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from collections import namedtuple
+
+from compiled_snapshot import SNAPSHOT_FORMAT_VERSION, read_records, snapshot_path
+
+# Kinds of change, in display order
+CHANGE_KINDS = ("added", "changed", "revoked", "deprecated", "removed")
+
+# Display name of each STIX type kept by the knowledge base
+OBJECT_TYPES = {
+    "attack-pattern": "Technique",
+    "intrusion-set": "Group",
+    "relationship": "Group technique",
+}
+
+
+class Change(namedtuple("Change", ["kind", "object_type", "stix_id", "attack_id", "name", "group"])):
+    """
+    One object that differs between two releases.
+
+    For "uses" relationships, attack_id and name are those of the technique and
+    group is the name of the group using it; group is None for other objects.
+    """
+
+    __slots__ = ()
+
+
+class ReleaseDiff(namedtuple("ReleaseDiff", ["domain", "previous_release", "release", "changes",
+                                             "new_group_techniques"])):
+    """
+    Changes of one domain's bundle since the release loaded before it.
+
+    Attributes:
+        domain (str): Domain of the bundle (e.g. "enterprise")
+        previous_release (dict): {"name", "version", "modified"} of the older bundle (None if unknown)
+        release (dict): {"name", "version", "modified"} of the newer bundle (None if unknown)
+        changes (list): Change records, in CHANGE_KINDS order
+        new_group_techniques (list): (group name, group ID, technique ID, technique name) of every
+                                     technique a group was not known to use before
+    """
+
+    __slots__ = ()
+
+    def counts(self):
+        """
+        Count the changes of each kind.
+
+        Returns:
+            dict: Kind to number of changes, for every kind in CHANGE_KINDS
+        """
+        counts = dict.fromkeys(CHANGE_KINDS, 0)
+        for change in self.changes:
+            counts[change.kind] += 1
+        return counts
+
+    def techniques_by_group(self):
+        """
+        Group the new techniques of each group.
+
+        Returns:
+            dict: Group name to the list of (technique ID, technique name) it newly uses
+        """
+        by_group = {}
+        for group_name, _, tech_id, tech_name in self.new_group_techniques:
+            by_group.setdefault(group_name, []).append((tech_id, tech_name))
+        return by_group
+
+
+def _change_kind(old_version, new_version):
+    """
+    Classify how an object present in both releases changed.
+
+    Args:
+        old_version (ObjectVersion): The object in the older release
+        new_version (ObjectVersion): The object in the newer release
+
+    Returns:
+        str: "revoked", "deprecated" or "changed", or None when it did not change
+    """
+    if new_version.revoked and not old_version.revoked:
+        return "revoked"
+    if new_version.deprecated and not old_version.deprecated:
+        return "deprecated"
+    if new_version != old_version:
+        return "changed"
+    return None
+
+
+def diff_records(old, new, domain):
+    """
+    Compare two releases of a bundle by STIX id and modified timestamp.
+
+    Args:
+        old (BundleRecords): Records of the older release
+        new (BundleRecords): Records of the newer release
+        domain (str): Domain of the bundle
+
+    Returns:
+        ReleaseDiff: The objects added, changed, revoked, deprecated and removed
+    """
+    techniques = {tech.stix_id: tech for tech in old.techniques}
+    techniques.update((tech.stix_id, tech) for tech in new.techniques)
+    groups = {group.stix_id: group for group in old.groups}
+    groups.update((group.stix_id, group) for group in new.groups)
+    uses = {use[3]: use for use in old.uses}
+    uses.update((use[3], use) for use in new.uses)
+
+    # Revoked and deprecated objects are versioned but may not be in the records of
+    # either release (e.g. added already deprecated), so their names can be unknown
+    def describe(kind, stix_id, version):
+        object_type = OBJECT_TYPES.get(version.type, version.type)
+        if version.type == "attack-pattern":
+            tech = techniques.get(stix_id)
+            return Change(kind, object_type, stix_id, tech and tech.tech_id, tech.name if tech else "", None)
+        if version.type == "intrusion-set":
+            group = groups.get(stix_id)
+            return Change(kind, object_type, stix_id, group and group.group_id, group.name if group else "", None)
+        group_stix_id, tech_stix_id = uses[stix_id][:2] if stix_id in uses else (None, None)
+        tech = techniques.get(tech_stix_id)
+        group = groups.get(group_stix_id)
+        return Change(kind, object_type, stix_id, tech and tech.tech_id, tech.name if tech else "",
+                      group.name if group else None)
+
+    changes = []
+    for stix_id, version in new.versions.items():
+        old_version = old.versions.get(stix_id)
+        kind = "added" if old_version is None else _change_kind(old_version, version)
+        if kind:
+            changes.append(describe(kind, stix_id, version))
+    for stix_id, version in old.versions.items():
+        if stix_id not in new.versions:
+            changes.append(describe("removed", stix_id, version))
+    changes.sort(key=lambda change: (CHANGE_KINDS.index(change.kind), change.object_type, change.attack_id or ""))
+
+    # Techniques a group uses now but did not before, whatever relationship object carries them
+    old_pairs = {(group_stix_id, tech_stix_id) for group_stix_id, tech_stix_id, _, _ in old.uses}
+    new_group_techniques = []
+    for group_stix_id, tech_stix_id, _, _ in new.uses:
+        if (group_stix_id, tech_stix_id) not in old_pairs:
+            old_pairs.add((group_stix_id, tech_stix_id))
+            group = groups[group_stix_id]
+            tech = techniques[tech_stix_id]
+            new_group_techniques.append((group.name, group.group_id, tech.tech_id, tech.name))
+    new_group_techniques.sort()
+
+    return ReleaseDiff(domain, old.releases.get(domain), new.releases.get(domain), changes, new_group_techniques)
+
+
+def diff_to_json(diff):
+    """Turn a ReleaseDiff into JSON-serializable data."""
+    return {
+        "domain": diff.domain,
+        "previous_release": diff.previous_release,
+        "release": diff.release,
+        "changes": [list(change) for change in diff.changes],
+        "new_group_techniques": [list(entry) for entry in diff.new_group_techniques],
+    }
+
+
+def diff_from_json(data):
+    """Rebuild a ReleaseDiff from the data of diff_to_json()."""
+    return ReleaseDiff(
+        data["domain"], data["previous_release"], data["release"],
+        [Change(*change) for change in data["changes"]],
+        [tuple(entry) for entry in data["new_group_techniques"]]
+    )
+
+
+def release_state_path(compiled_dir, source):
+    """
+    Get the path of the file remembering the last release loaded from a source.
+
+    Args:
+        compiled_dir (str): Directory holding compiled snapshots
+        source (str): URL or local path of the bundle
+
+    Returns:
+        str: Path of the JSON pointer file
+    """
+    key = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(compiled_dir, f"release-{key}.json")
+
+
+def _read_json(path):
+    """Read a JSON file, or return None when it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """Write a JSON file atomically."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".release-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def track_release(compiled_dir, source, domain, content_hash, records):
+    """
+    Record the release just loaded from a source, and diff it against the previous one.
+
+    Nothing is done when the bundle is the one loaded last time, so this only
+    costs a small file read on ordinary starts. When the bundle changed and the
+    snapshot of the previous release is still there, the two are compared and
+    the diff is written next to the snapshots.
+
+    Args:
+        compiled_dir (str): Directory holding compiled snapshots
+        source (str): URL or local path of the bundle
+        domain (str): Domain of the bundle
+        content_hash (str): SHA-256 of the bundle just loaded
+        records (BundleRecords): Its records
+
+    Returns:
+        ReleaseDiff: The changes since the previous release, or None when the bundle did not
+                     change, no previous release is known or the diff could not be stored
+    """
+    state_path = release_state_path(compiled_dir, source)
+    state = _read_json(state_path) or {}
+    previous_hash = state.get("content_hash")
+    if previous_hash == content_hash:
+        return None
+
+    diff = None
+    diff_name = None
+    previous_path = snapshot_path(compiled_dir, previous_hash) if previous_hash else None
+    try:
+        if previous_path and os.path.exists(previous_path):
+            old = read_records(previous_path)
+            # Snapshots written from a knowledge base have no versions to compare
+            if old.versions and records.versions:
+                diff = diff_records(old, records, domain)
+                diff_name = f"diff-{previous_hash[:16]}-{content_hash[:16]}-v{SNAPSHOT_FORMAT_VERSION}.json"
+                _write_json(os.path.join(compiled_dir, diff_name), diff_to_json(diff))
+        _write_json(state_path, {"content_hash": content_hash, "previous_hash": previous_hash, "diff": diff_name})
+    except (OSError, sqlite3.Error):
+        # A read-only cache directory or an unreadable old snapshot only costs us the diff
+        return None
+    return diff
+
+
+def load_release_diff(compiled_dir, source):
+    """
+    Load the changes of the last release loaded from a source.
+
+    Args:
+        compiled_dir (str): Directory holding compiled snapshots
+        source (str): URL or local path of the bundle
+
+    Returns:
+        ReleaseDiff: The changes since the release before it, or None when there is no diff
+    """
+    state = _read_json(release_state_path(compiled_dir, source)) or {}
+    if not state.get("diff"):
+        return None
+    data = _read_json(os.path.join(compiled_dir, state["diff"]))
+    return diff_from_json(data) if data else None
@@ -0,0 +1,566 @@
+"""
+Inverted full-text index for technique, group and procedure search.
+
+The search boxes used to scan every technique (and every procedure of every
+group) with a substring test on each rerun. The knowledge base now builds the
+indexes below once: queries are split into terms, each term is looked up in a
+sorted vocabulary (exact and prefix matches, and words containing terms of
+MIN_INFIX_LENGTH characters or more, so "shell" still finds PowerShell), and
+documents matching every term are ranked by a field-weighted TF-IDF score.
+Punctuation is not indexed: a query made only of punctuation matches nothing. ATT&CK IDs such as T1059 or
+T1059.001 are matched exactly, or as a prefix of their sub-techniques.
+
+Posting lists are NumPy arrays and each term is scored into a dense vector with
+one slot per document, so combining terms, restricting a search to one group
+and ranking are vectorized instead of looping over matches in Python. The
+arrays are stored in the compiled snapshot of each bundle (see
+compiled_snapshot.py), so an index is built once per bundle rather than once
+per start, and the indexes of several bundles are joined without tokenizing
+their text again.
+"""
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+# Words are runs of letters and digits
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# ATT&CK IDs: techniques (T1059.001), groups (G0007), software (S0154), mitigations (M1036) ...
+ATTACK_ID_RE = re.compile(r"^[a-z]{1,2}\d{4}(\.\d{3})?$")
+
+# How much a hit in each technique field counts towards relevance
+TECHNIQUE_FIELD_WEIGHTS = {
+    "name": 3.0,
+    "tactics": 2.0,
+    "description": 1.0
+}
+PROCEDURE_FIELD_WEIGHTS = {
+    "procedure": 1.0
+}
+
+# Scores of ID matches, well above any text match
+EXACT_ID_SCORE = 1000.0
+PREFIX_ID_SCORE = 500.0
+
+# A prefix match counts less than the whole word, and a match inside a word less than a prefix
+PREFIX_MATCH_FACTOR = 0.5
+INFIX_MATCH_FACTOR = 0.25
+
+# Shorter terms are only matched at the start of words (inside words, they would match most of the vocabulary)
+MIN_INFIX_LENGTH = 3
+
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens.
+
+    Args:
+        text (str): The text to split
+
+    Returns:
+        list: The tokens, in order
+    """
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def parse_query(query):
+    """
+    Split a search query into terms.
+
+    Words that look like ATT&CK IDs are kept whole; other words are split into
+    tokens the same way documents are, so punctuation gives no term.
+
+    Args:
+        query (str): The text typed in a search box
+
+    Returns:
+        list: (kind, text) tuples where kind is "id" or "word"
+    """
+    terms = []
+    for word in query.lower().split():
+        if ATTACK_ID_RE.match(word):
+            terms.append(("id", word))
+        else:
+            terms.extend(("word", token) for token in tokenize(word))
+    return terms
+
+
+def _stable_order(keys, bound):
+    """
+    Get the stable sort order of small non-negative integers.
+
+    Args:
+        keys (numpy.ndarray): The integers
+        bound (int): Upper bound of the integers
+
+    Returns:
+        numpy.ndarray: Positions of the keys in sorted order (equal keys keep their order)
+    """
+    # NumPy radix-sorts 16-bit integers, several times faster than merge-sorting 32-bit ones
+    if bound <= 1 << 16:
+        keys = keys.astype(np.uint16)
+    return np.argsort(keys, kind="stable")
+
+
+class SearchIndex:
+    """
+    Immutable inverted index over a fixed list of documents.
+
+    Each token's posting list holds document numbers and scores, where the
+    score is the field-weighted log term frequency times the token's IDF. The
+    weights of every document are also kept (without the IDF), so an index for
+    a new release can reuse the documents that did not change and only
+    tokenize the others.
+    """
+
+    __slots__ = ("_vocabulary", "_joined_vocabulary", "_token_starts", "_offsets", "_docs", "_scores",
+                 "_doc_offsets", "_doc_tokens", "_doc_weights", "_ids", "_id_vocabulary", "_size")
+
+    def __init__(self, documents, field_weights, previous=None, reuse=None):
+        """
+        Args:
+            documents (iterable): (attack_id, {field: text}) tuples; document numbers follow this order
+            field_weights (dict): Weight of a hit in each field
+            previous (SearchIndex): Index of an earlier version of the documents
+            reuse (sequence): For each document, the number of the identical document in previous
+                              (-1 when it is new or changed and has to be tokenized)
+        """
+        documents = list(documents)
+        size = len(documents)
+        reuse = np.full(size, -1, dtype=np.int64) if previous is None or reuse is None else \
+            np.asarray(reuse, dtype=np.int64)
+
+        # Tokens numbered in first-seen order, starting with the previous vocabulary
+        vocabulary = list(previous._vocabulary) if previous is not None else []
+        token_numbers = {token: number for number, token in enumerate(vocabulary)}
+
+        # (document, token, weight) entries of the documents that are tokenized here
+        new_docs = array("i")
+        new_tokens = array("i")
+        new_weights = array("f")
+        ids = {}
+        for doc_number, (attack_id, fields) in enumerate(documents):
+            if attack_id:
+                ids.setdefault(attack_id.lower(), []).append(doc_number)
+            if reuse[doc_number] >= 0:
+                continue
+            weights = {}
+            for field, text in fields.items():
+                weight = field_weights[field]
+                for token, count in Counter(tokenize(text)).items():
+                    weights[token] = weights.get(token, 0.0) + weight * (1.0 + math.log(count))
+            for token, weight in weights.items():
+                number = token_numbers.get(token)
+                if number is None:
+                    number = token_numbers[token] = len(vocabulary)
+                    vocabulary.append(token)
+                new_docs.append(doc_number)
+                new_tokens.append(number)
+                new_weights.append(weight)
+
+        # Entries of the reused documents, copied from the previous index in one vectorized gather
+        reused = np.flatnonzero(reuse >= 0)
+        if len(reused):
+            gather, lengths = _ranges(previous._doc_offsets, reuse[reused])
+            old_docs = np.repeat(reused.astype(np.int32), lengths)
+            old_tokens = previous._doc_tokens[gather]
+            old_weights = previous._doc_weights[gather]
+        else:
+            old_docs = old_tokens = np.zeros(0, dtype=np.int32)
+            old_weights = np.zeros(0, dtype=np.float32)
+        docs = np.concatenate([old_docs, np.frombuffer(new_docs, dtype=np.int32)])
+        tokens = np.concatenate([old_tokens, np.frombuffer(new_tokens, dtype=np.int32)])
+        weights = np.concatenate([old_weights, np.frombuffer(new_weights, dtype=np.float32)])
+        self._build(docs, tokens, weights, vocabulary, ids, size)
+
+    def _build(self, docs, tokens, weights, vocabulary, ids, size):
+        """
+        Build the posting lists from the (document, token, weight) entries of every document.
+
+        Args:
+            docs (numpy.ndarray): Document number of each entry (int32)
+            tokens (numpy.ndarray): Token number of each entry, in vocabulary (int32)
+            weights (numpy.ndarray): Weight of each entry, without the IDF (float32)
+            vocabulary (list): Token of each token number (tokens without entries are dropped)
+            ids (dict): Lowercase ATT&CK ID to the numbers of the documents with that ID
+            size (int): Number of documents
+        """
+        # Keep the tokens still used, renumbered in sorted order for prefix lookups
+        used = np.flatnonzero(np.bincount(tokens, minlength=len(vocabulary)))
+        sorted_used = sorted(used.tolist(), key=vocabulary.__getitem__)
+        renumber = np.zeros(len(vocabulary), dtype=np.int32)
+        renumber[sorted_used] = np.arange(len(sorted_used), dtype=np.int32)
+        tokens = renumber[tokens]
+        self._set_vocabulary([vocabulary[number] for number in sorted_used])
+
+        # Per-document weights, ordered by document
+        order = _stable_order(docs, size)
+        docs = docs[order]
+        tokens = tokens[order]
+        weights = weights[order]
+        self._doc_tokens = tokens
+        self._doc_weights = weights
+        self._doc_offsets = np.concatenate([[0], np.cumsum(np.bincount(docs, minlength=size))]).astype(np.int64)
+
+        # Posting lists, ordered by token then document (a stable sort keeps the document order),
+        # with the inverse document frequency folded in
+        order = _stable_order(tokens, len(self._vocabulary))
+        document_frequency = np.bincount(tokens, minlength=len(self._vocabulary))
+        idf = np.log1p(size / np.maximum(document_frequency, 1)).astype(np.float32)
+        self._docs = docs[order]
+        self._scores = weights[order] * idf[tokens[order]]
+        self._offsets = np.concatenate([[0], np.cumsum(document_frequency)]).astype(np.int64)
+
+        self._ids = {attack_id: np.array(doc_numbers, dtype=np.int32) for attack_id, doc_numbers in ids.items()}
+        self._id_vocabulary = sorted(ids)
+        self._size = size
+
+    @classmethod
+    def concatenate(cls, indexes):
+        """
+        Join the indexes of several document lists into the index of their concatenation.
+
+        No text is tokenized again: the weights of every document are copied,
+        and only the IDF and the posting lists are computed over all documents.
+
+        Args:
+            indexes (iterable): SearchIndex of each document list, in order
+
+        Returns:
+            SearchIndex: The index of all documents, numbered in the same order
+        """
+        vocabulary = []
+        token_numbers = {}
+        docs = [np.zeros(0, dtype=np.int32)]
+        tokens = [np.zeros(0, dtype=np.int32)]
+        weights = [np.zeros(0, dtype=np.float32)]
+        ids = {}
+        size = 0
+        for index in indexes:
+            renumber = np.zeros(len(index._vocabulary), dtype=np.int32)
+            for number, token in enumerate(index._vocabulary):
+                renumber[number] = token_numbers.setdefault(token, len(vocabulary))
+                if renumber[number] == len(vocabulary):
+                    vocabulary.append(token)
+            docs.append(np.repeat(np.arange(size, size + index._size, dtype=np.int32), np.diff(index._doc_offsets)))
+            tokens.append(renumber[index._doc_tokens])
+            weights.append(index._doc_weights)
+            for attack_id, doc_numbers in index._ids.items():
+                ids.setdefault(attack_id, []).extend((doc_numbers + size).tolist())
+            size += index._size
+        joined = cls.__new__(cls)
+        joined._build(np.concatenate(docs), np.concatenate(tokens), np.concatenate(weights), vocabulary, ids, size)
+        return joined
+
+    def to_arrays(self):
+        """
+        Get the contents of the index as NumPy arrays, e.g. to store them.
+
+        Returns:
+            dict: Array name to numpy.ndarray, as accepted by from_arrays()
+        """
+        id_docs = [self._ids[attack_id] for attack_id in self._id_vocabulary]
+        id_offsets = np.concatenate([[0], np.cumsum([len(doc_numbers) for doc_numbers in id_docs])])
+        return {
+            "vocabulary": np.array(self._vocabulary, dtype=str),
+            "offsets": self._offsets,
+            "docs": self._docs,
+            "scores": self._scores,
+            "doc_offsets": self._doc_offsets,
+            "doc_tokens": self._doc_tokens,
+            "doc_weights": self._doc_weights,
+            "id_vocabulary": np.array(self._id_vocabulary, dtype=str),
+            "id_offsets": id_offsets.astype(np.int64),
+            "id_docs": np.concatenate([np.zeros(0, dtype=np.int32)] + id_docs),
+            "size": np.array([self._size], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Rebuild an index from the arrays returned by to_arrays().
+
+        Args:
+            arrays (dict): Array name to numpy.ndarray
+
+        Returns:
+            SearchIndex: The index
+        """
+        index = cls.__new__(cls)
+        index._set_vocabulary(arrays["vocabulary"].tolist())
+        index._offsets = arrays["offsets"]
+        index._docs = arrays["docs"]
+        index._scores = arrays["scores"]
+        index._doc_offsets = arrays["doc_offsets"]
+        index._doc_tokens = arrays["doc_tokens"]
+        index._doc_weights = arrays["doc_weights"]
+        index._id_vocabulary = arrays["id_vocabulary"].tolist()
+        id_offsets = arrays["id_offsets"]
+        index._ids = {attack_id: arrays["id_docs"][id_offsets[number]:id_offsets[number + 1]]
+                      for number, attack_id in enumerate(index._id_vocabulary)}
+        index._size = int(arrays["size"][0])
+        return index
+
+    def _set_vocabulary(self, vocabulary):
+        """Keep the sorted vocabulary, and its tokens joined into one string to find the words containing a term."""
+        self._vocabulary = vocabulary
+        self._joined_vocabulary, self._token_starts = join_tokens(vocabulary)
+
+    def __len__(self):
+        return self._size
+
+    def match_term(self, kind, text):
+        """
+        Score every document against one query term.
+
+        Args:
+            kind (str): "id" or "word", as returned by parse_query()
+            text (str): The term
+
+        Returns:
+            numpy.ndarray: One score per document (0 where the term does not match)
+        """
+        matches = np.zeros(self._size, dtype=np.float32)
+        if kind == "id":
+            for i in _with_prefix(self._id_vocabulary, text):
+                attack_id = self._id_vocabulary[i]
+                score = EXACT_ID_SCORE if attack_id == text else PREFIX_ID_SCORE
+                doc_numbers = self._ids[attack_id]
+                matches[doc_numbers] = np.maximum(matches[doc_numbers], score)
+            if matches.any():
+                return matches
+            # An ID typed in a search box may also appear in the text (e.g. in procedures)
+            text = text.split(".")[0]
+
+        for i in _with_prefix(self._vocabulary, text):
+            factor = 1.0 if self._vocabulary[i] == text else PREFIX_MATCH_FACTOR
+            doc_numbers = self._docs[self._offsets[i]:self._offsets[i + 1]]
+            scores = self._scores[self._offsets[i]:self._offsets[i + 1]]
+            matches[doc_numbers] = np.maximum(matches[doc_numbers], scores * factor)
+        if len(text) >= MIN_INFIX_LENGTH:
+            # Words containing the term, e.g. "shell" in "powershell", scored together
+            gather, _ = _ranges(self._offsets, tokens_containing(self._joined_vocabulary, self._token_starts, text))
+            np.maximum.at(matches, self._docs[gather], self._scores[gather] * INFIX_MATCH_FACTOR)
+        return matches
+
+
+class KnowledgeBaseSearch:
+    """
+    Search over the techniques and group procedures of a knowledge base.
+
+    Two indexes are kept: one document per technique (ID, name, tactics and
+    description) and one document per group "uses" relationship (procedure
+    text). Group technique entries match on either of them without the
+    technique text being indexed once per group.
+    """
+
+    __slots__ = ("_technique_ids", "_technique_fields", "_technique_index", "_procedure_index", "_procedures",
+                 "_usage_techniques")
+
+    def __init__(self, techniques_dict, usages, previous=None):
+        """
+        Args:
+            techniques_dict (dict): Techniques keyed by STIX ID
+            usages (tuple): TechniqueUsages of all groups
+            previous (KnowledgeBaseSearch): Search of an earlier release; the techniques and
+                                            procedures it already indexed are not tokenized again
+        """
+        self._set_documents(techniques_dict, usages)
+
+        technique_reuse = procedure_reuse = None
+        if previous is not None:
+            previous_numbers = {stix_id: number for number, stix_id in enumerate(previous._technique_ids)}
+            technique_reuse = [
+                number if number is not None and previous._technique_fields[number] == fields else -1
+                for number, fields in ((previous_numbers.get(stix_id), fields)
+                                       for stix_id, fields in zip(self._technique_ids, self._technique_fields))
+            ]
+            # Procedures are only indexed by their text, so any earlier procedure with the same text will do
+            previous_procedures = {procedure: number for number, procedure in enumerate(previous._procedures)}
+            procedure_reuse = [previous_procedures.get(procedure, -1) for procedure in self._procedures]
+
+        self._technique_index = SearchIndex(
+            ((tech.tech_id, {
+                "name": tech.name,
+                "tactics": " ".join(tech.tactics),
+                "description": tech.description
+            }) for tech in techniques_dict.values()),
+            TECHNIQUE_FIELD_WEIGHTS,
+            previous._technique_index if previous is not None else None,
+            technique_reuse
+        )
+        self._procedure_index = SearchIndex(
+            ((None, {"procedure": procedure}) for procedure in self._procedures),
+            PROCEDURE_FIELD_WEIGHTS,
+            previous._procedure_index if previous is not None else None,
+            procedure_reuse
+        )
+
+    @classmethod
+    def from_indexes(cls, techniques_dict, usages, technique_index, procedure_index):
+        """
+        Make the search of techniques and usages from indexes already built for them.
+
+        Args:
+            techniques_dict (dict): Techniques keyed by STIX ID
+            usages (tuple): TechniqueUsages of all groups
+            technique_index (SearchIndex): Index of the techniques, in techniques_dict order
+            procedure_index (SearchIndex): Index of the procedures of the usages, in order
+
+        Returns:
+            KnowledgeBaseSearch: The search
+        """
+        search = cls.__new__(cls)
+        search._set_documents(techniques_dict, usages)
+        search._technique_index = technique_index
+        search._procedure_index = procedure_index
+        return search
+
+    def _set_documents(self, techniques_dict, usages):
+        """Keep what identifies the indexed documents, and the technique of each usage."""
+        self._technique_ids = tuple(techniques_dict)
+        # Indexed text of each technique, to recognize unchanged techniques in the next release
+        self._technique_fields = tuple((tech.tech_id, tech.name, tech.tactics, tech.description)
+                                       for tech in techniques_dict.values())
+        self._procedures = tuple(usage.procedure for usage in usages)
+
+        # Technique document number of each usage
+        technique_numbers = {stix_id: number for number, stix_id in enumerate(self._technique_ids)}
+        self._usage_techniques = np.fromiter(
+            (technique_numbers[usage.technique.stix_id] for usage in usages), dtype=np.int32, count=len(usages))
+
+    @property
+    def indexes(self):
+        """The technique and procedure SearchIndex, e.g. to store them with the records they index."""
+        return self._technique_index, self._procedure_index
+
+    def search_techniques(self, query, include_procedures=False, limit=None):
+        """
+        Search techniques by ID, name, tactic and description.
+
+        Args:
+            query (str): The search text
+            include_procedures (bool): Also match techniques whose group procedures contain the terms
+            limit (int): Maximum number of results (all by default)
+
+        Returns:
+            list: Technique STIX IDs, most relevant first
+        """
+        term_scores = []
+        for kind, text in parse_query(query):
+            scores = self._technique_index.match_term(kind, text)
+            if include_procedures:
+                # A procedure hit counts for the technique the procedure is about
+                np.maximum.at(scores, self._usage_techniques, self._procedure_index.match_term(kind, text))
+            term_scores.append(scores)
+        return [self._technique_ids[number] for number in _rank(term_scores, None, limit)]
+
+    def search_usages(self, query, positions=None, limit=None):
+        """
+        Search group technique entries by technique fields and procedure text.
+
+        Args:
+            query (str): The search text
+            positions (iterable): Positions in knowledge_base.usages to search (all by default)
+            limit (int): Maximum number of results (all by default)
+
+        Returns:
+            list: Positions in knowledge_base.usages, most relevant first
+        """
+        mask = None
+        if positions is not None:
+            mask = np.zeros(len(self._usage_techniques), dtype=bool)
+            mask[np.fromiter(positions, dtype=np.int64)] = True
+
+        term_scores = []
+        for kind, text in parse_query(query):
+            technique_scores = self._technique_index.match_term(kind, text)
+            term_scores.append(self._procedure_index.match_term(kind, text) +
+                               technique_scores[self._usage_techniques])
+        return _rank(term_scores, mask, limit)
+
+
+def join_tokens(tokens):
+    """
+    Join tokens into one string that tokens_containing() can search.
+
+    Args:
+        tokens (list): The tokens
+
+    Returns:
+        tuple: (the tokens, one per line, numpy.ndarray of the position where each token starts)
+    """
+    # One line per token: a term (which has no newline) found in the string lies inside a single token
+    starts = np.cumsum([0] + [len(token) + 1 for token in tokens[:-1]]).astype(np.int64)
+    return "\n".join(tokens), starts
+
+
+def tokens_containing(joined, starts, text):
+    """
+    Find the tokens containing a term other than at their start.
+
+    Args:
+        joined (str): The tokens, as returned by join_tokens()
+        starts (numpy.ndarray): The position of each token, as returned by join_tokens()
+        text (str): The term
+
+    Returns:
+        numpy.ndarray: Numbers of the tokens containing it (in order, without repeats)
+    """
+    found = np.fromiter((match.start() for match in re.finditer(re.escape(text), joined)), dtype=np.int64)
+    numbers = np.searchsorted(starts, found, side="right") - 1
+    return np.unique(numbers[found != starts[numbers]])
+
+
+def _with_prefix(vocabulary, prefix):
+    """Yield the positions of the entries of a sorted vocabulary that start with prefix."""
+    i = bisect_left(vocabulary, prefix)
+    while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+        yield i
+        i += 1
+
+
+def _ranges(offsets, numbers):
+    """
+    Get the positions of several slices of an array, given the offsets of its slices.
+
+    Args:
+        offsets (numpy.ndarray): Start of each slice, followed by the end of the last one
+        numbers (numpy.ndarray): Numbers of the slices to take, in order
+
+    Returns:
+        tuple: (positions of the entries of the slices, one after the other, length of each slice)
+    """
+    starts = offsets[numbers]
+    lengths = offsets[numbers + 1] - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum()), lengths
+
+
+def _rank(term_scores, mask, limit):
+    """
+    Keep the documents matching every term and sort them by total score.
+
+    Args:
+        term_scores (list): One score vector per query term
+        mask (numpy.ndarray): Documents allowed in the results (all when None)
+        limit (int): Maximum number of results (all when None)
+
+    Returns:
+        list: Document numbers, best first (ties in document order)
+    """
+    if not term_scores:
+        return []
+    matched = np.ones(len(term_scores[0]), dtype=bool) if mask is None else mask.copy()
+    total = np.zeros(len(term_scores[0]), dtype=np.float32)
+    for scores in term_scores:
+        matched &= scores > 0
+        total += scores
+    doc_numbers = np.flatnonzero(matched)
+    order = np.lexsort((doc_numbers, -total[doc_numbers]))
+    if limit is not None:
+        order = order[:limit]
+    return doc_numbers[order].tolist()
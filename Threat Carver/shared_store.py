@@ -0,0 +1,500 @@
+"""
+Shared read-only SQLite store for multi-process and multi-replica deployments.
+
+Without it, every Streamlit process downloads and parses the ATT&CK bundles
+and the Atomic Red Team YAML, builds its own in-memory search index and keeps
+its own cache of parsed tests. A shared store is one SQLite file built once
+(python shared_store.py --output PATH) holding:
+
+- the compiled snapshot tables of the knowledge base (see compiled_snapshot.py)
+- FTS5 tables over the techniques (name, tactics, description) and the group
+  procedures, which the search boxes query instead of a per-process index
+- the parsed Atomic Red Team tests of every technique, and their catalog
+
+Every worker opens it read-only with memory-mapped I/O. The search index and
+the Atomic Red Team tests stay in the file, whose pages are shared through the
+OS page cache instead of being copied into each process. Rebuild the store and
+move it into place to publish new data; workers notice the new file on their
+next refresh check and switch to it.
+
+The store does not make a worker's memory constant. Each worker still reads
+the techniques, groups and group usages out of the store into its own
+in-memory AttackKnowledgeBase, together with the reverse indexes, tactic matrix
+and similarity bitsets built from them, because every page works on that
+object. What a worker saves is the download, the parse, the search index and
+the parsed YAML. Its memory still grows with the size of the ATT&CK data
+(about 206 MB instead of 280 MB per worker at scale 10 in
+`benchmark.py store`).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from atomics import AtomicTestSummary, open_atomics, summarize_tests
+from compiled_snapshot import connect_read_only, read_records, write_snapshot
+from config import ATTACK_DOMAINS
+from instrumentation import count
+from knowledge_base import AttackKnowledgeBase, BundleInfo, check_bundles, load_domains
+from search_index import (EXACT_ID_SCORE, INFIX_MATCH_FACTOR, MIN_INFIX_LENGTH, PREFIX_ID_SCORE, PREFIX_MATCH_FACTOR,
+                          TECHNIQUE_FIELD_WEIGHTS, _rank, join_tokens, parse_query, tokens_containing)
+
+# Bump when the store tables change so that workers refuse an incompatible file
+STORE_FORMAT_VERSION = 1
+
+STORE_SCHEMA = """
+CREATE TABLE technique_search (
+    number INTEGER PRIMARY KEY,
+    stix_id TEXT,
+    attack_id TEXT
+);
+CREATE INDEX technique_search_attack_id ON technique_search (attack_id);
+CREATE VIRTUAL TABLE technique_fts USING fts5(name, tactics, description, prefix='2 3');
+CREATE VIRTUAL TABLE procedure_fts USING fts5(procedure, prefix='2 3');
+CREATE TABLE atomics (
+    technique_id TEXT PRIMARY KEY,
+    content TEXT
+);
+CREATE TABLE atomic_tests (
+    technique_id TEXT,
+    number INTEGER,
+    name TEXT,
+    guid TEXT,
+    platforms TEXT,
+    executor TEXT,
+    elevation_required INTEGER,
+    has_cleanup INTEGER,
+    input_argument_count INTEGER,
+    dependency_count INTEGER,
+    PRIMARY KEY (technique_id, number)
+);
+"""
+
+# BM25 weight of each column of technique_fts, as for the in-memory index
+TECHNIQUE_FTS_WEIGHTS = tuple(TECHNIQUE_FIELD_WEIGHTS[field] for field in ("name", "tactics", "description"))
+
+# Column weights of each FTS5 table, for the words containing a query term
+FTS_COLUMN_WEIGHTS = {
+    "technique_fts": TECHNIQUE_FIELD_WEIGHTS,
+    "procedure_fts": {"procedure": 1.0}
+}
+
+# Tokens looked up per query of an fts5vocab table (SQLite limits the number of parameters)
+VOCAB_BATCH_SIZE = 5000
+
+
+def build_store(knowledge_base, path, atomics=None, bundles=None):
+    """
+    Write a shared store file.
+
+    The file is built under a temporary name and moved into place, so workers
+    never open a half-written store and keep reading the previous one until
+    they switch.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The knowledge base to store
+        path (str): Destination path of the SQLite file
+        atomics (AtomicsLoader or AtomicsMirror): Source of the Atomic Red Team tests (none stored when None)
+        bundles (dict): Domain name to the BundleInfo of the bundle each domain was built from
+
+    Returns:
+        dict: Number of stored techniques, procedures and techniques with atomic tests
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".store-", suffix=".sqlite")
+    os.close(fd)
+    try:
+        write_snapshot(knowledge_base, tmp_path, "shared-store")
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(STORE_SCHEMA)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("store_format_version", str(STORE_FORMAT_VERSION)),
+                ("built_at", str(time.time())),
+                ("bundles", json.dumps({domain: list(info) for domain, info in (bundles or {}).items()})),
+            ])
+            techniques = list(knowledge_base.techniques_dict.values())
+            conn.executemany("INSERT INTO technique_search VALUES (?, ?, ?)", [
+                (number, tech.stix_id, (tech.tech_id or "").lower()) for number, tech in enumerate(techniques)
+            ])
+            conn.executemany("INSERT INTO technique_fts (rowid, name, tactics, description) VALUES (?, ?, ?, ?)", [
+                (number, tech.name, " ".join(tech.tactics), tech.description)
+                for number, tech in enumerate(techniques)
+            ])
+            conn.executemany("INSERT INTO procedure_fts (rowid, procedure) VALUES (?, ?)", [
+                (position, usage.procedure) for position, usage in enumerate(knowledge_base.usages)
+            ])
+
+            with_tests = 0
+            if atomics is not None:
+                technique_ids = [tech_id for tech_id, tech in knowledge_base.technique_by_id.items()
+                                 if tech.domain == "enterprise"]
+                atomics.prefetch(technique_ids)
+                for tech_id in technique_ids:
+                    atomic_data = atomics.get(tech_id)
+                    if not atomic_data:
+                        continue
+                    with_tests += 1
+                    conn.execute("INSERT INTO atomics VALUES (?, ?)",
+                                 (tech_id, json.dumps(atomic_data, default=str)))
+                    conn.executemany("INSERT INTO atomic_tests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                        (summary.technique_id, summary.number, summary.name, summary.guid,
+                         json.dumps(list(summary.platforms)), summary.executor, int(summary.elevation_required),
+                         int(summary.has_cleanup), summary.input_argument_count, summary.dependency_count)
+                        for summary in summarize_tests(tech_id, atomic_data)
+                    ])
+            conn.execute("INSERT INTO technique_fts (technique_fts) VALUES ('optimize')")
+            conn.execute("INSERT INTO procedure_fts (procedure_fts) VALUES ('optimize')")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"techniques": len(knowledge_base.techniques_dict), "procedures": len(knowledge_base.usages),
+            "techniques_with_atomics": with_tests}
+
+
+def store_signature(path):
+    """
+    Identify the current version of a store file.
+
+    Args:
+        path (str): Path of the SQLite file
+
+    Returns:
+        tuple: (inode, size, modification time), which changes when a new store is moved into place
+    """
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class SharedStore:
+    """
+    One version of a shared store file, opened read-only.
+
+    Each thread gets its own connection. The connections keep the file they
+    were opened on, so a store replaced on disk does not change the data under
+    a knowledge base built from this one.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the SQLite file
+
+        Raises:
+            ValueError: If the file is not a shared store of this version
+        """
+        self.path = path
+        self.signature = store_signature(path)
+        self._local = threading.local()
+        meta = dict(self.connection().execute("SELECT key, value FROM meta"))
+        if meta.get("store_format_version") != str(STORE_FORMAT_VERSION):
+            raise ValueError(f"{path} is not a shared store of format version {STORE_FORMAT_VERSION}")
+        self.built_at = float(meta["built_at"])
+        self.bundles = {domain: BundleInfo(*info) for domain, info in json.loads(meta["bundles"]).items()}
+
+    def connection(self):
+        """
+        Get the read-only, memory-mapped connection of the calling thread.
+
+        Returns:
+            sqlite3.Connection: The connection
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_read_only(self.path)
+        return conn
+
+    def knowledge_base(self):
+        """
+        Load the knowledge base of the store, searching through its FTS5 tables.
+
+        The records are copied into an in-memory AttackKnowledgeBase of this
+        process; only the search (and the Atomic Red Team tests) are served
+        from the file.
+
+        Returns:
+            AttackKnowledgeBase: The knowledge base
+        """
+        return AttackKnowledgeBase.from_records(read_records(self.path), search=StoreSearch(self))
+
+
+class StoreSearch:
+    """
+    Search over the techniques and group procedures of a shared store.
+
+    Offers the same methods as search_index.KnowledgeBaseSearch. Each query
+    term is matched through FTS5 (BM25, exact words, prefixes, and words
+    containing it, found in the vocabulary of the table) and scored into one
+    vector per term, then ranked like the in-memory index does.
+    """
+
+    __slots__ = ("_store", "_technique_ids", "_usage_techniques", "_vocabularies")
+
+    def __init__(self, store):
+        """
+        Args:
+            store (SharedStore): The store
+        """
+        self._store = store
+        conn = store.connection()
+        self._technique_ids = tuple(stix_id for stix_id, in conn.execute(
+            "SELECT stix_id FROM technique_search ORDER BY number"))
+        numbers = {stix_id: number for number, stix_id in enumerate(self._technique_ids)}
+        self._usage_techniques = np.array([numbers[stix_id] for stix_id, in conn.execute(
+            "SELECT technique_stix_id FROM uses ORDER BY position")], dtype=np.int32)
+        # FTS5 table name to its tokens, joined by join_tokens() (read on the first search inside words)
+        self._vocabularies = {}
+
+    def _vocabulary_table(self, table, kind):
+        """Get the name of an fts5vocab table over an FTS5 table, created in the calling thread's connection."""
+        name = f"temp.{table}_{kind}"
+        self._store.connection().execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5vocab(main, {table}, {kind})")
+        return name
+
+    def _vocabulary(self, table):
+        """Get the tokens of an FTS5 table, joined by join_tokens()."""
+        if table not in self._vocabularies:
+            tokens = [term for term, in self._store.connection().execute(
+                f"SELECT term FROM {self._vocabulary_table(table, 'row')}")]
+            self._vocabularies[table] = (tokens,) + join_tokens(tokens)
+        return self._vocabularies[table]
+
+    def _match_containing(self, table, text, matches):
+        """
+        Score the rows of an FTS5 table holding words that contain a term other than at their start.
+
+        BM25 over an OR of every such word costs one pass over all the words per row, so the
+        occurrences are read from the fts5vocab instance table and scored like the in-memory
+        index weighs a word: the log of the field-weighted count, times INFIX_MATCH_FACTOR.
+        """
+        tokens, joined, starts = self._vocabulary(table)
+        containing = [tokens[number] for number in tokens_containing(joined, starts, text)]
+        if not containing:
+            return
+        column_weights = FTS_COLUMN_WEIGHTS[table]
+        instances = self._vocabulary_table(table, "instance")
+        conn = self._store.connection()
+        weighted = np.zeros(len(matches), dtype=np.float32)
+        for batch in range(0, len(containing), VOCAB_BATCH_SIZE):
+            terms = containing[batch:batch + VOCAB_BATCH_SIZE]
+            rows = conn.execute(f"SELECT doc, col FROM {instances} WHERE term IN ({', '.join('?' * len(terms))})",
+                                terms).fetchall()
+            if rows:
+                numbers, columns = zip(*rows)
+                np.add.at(weighted, np.array(numbers, dtype=np.int64),
+                          np.array([column_weights[column] for column in columns], dtype=np.float32))
+        np.maximum(matches, np.log1p(weighted) * INFIX_MATCH_FACTOR, out=matches)
+
+    def _match_text(self, table, weights, text, size):
+        """Score the rows of an FTS5 table against one word, whole words scoring more than prefixes."""
+        matches = np.zeros(size, dtype=np.float32)
+        if len(text) >= MIN_INFIX_LENGTH:
+            # Words containing the term, e.g. "shell" in "powershell"
+            self._match_containing(table, text, matches)
+        weights = ", ".join(str(weight) for weight in weights)
+        conn = self._store.connection()
+        for pattern, factor in ((f'"{text}"*', PREFIX_MATCH_FACTOR), (f'"{text}"', 1.0)):
+            # bm25() is negative, more negative for better matches
+            rows = conn.execute(f"SELECT rowid, -bm25({table}, {weights}) FROM {table} WHERE {table} MATCH ?",
+                                (pattern,)).fetchall()
+            if rows:
+                numbers, scores = zip(*rows)
+                numbers = np.array(numbers, dtype=np.int64)
+                matches[numbers] = np.maximum(matches[numbers], np.array(scores, dtype=np.float32) * factor)
+        return matches
+
+    def _match_technique(self, kind, text):
+        """Score every technique against one query term."""
+        size = len(self._technique_ids)
+        if kind == "id":
+            matches = np.zeros(size, dtype=np.float32)
+            for number, attack_id in self._store.connection().execute(
+                    "SELECT number, attack_id FROM technique_search WHERE attack_id GLOB ?", (text + "*",)):
+                matches[number] = EXACT_ID_SCORE if attack_id == text else PREFIX_ID_SCORE
+            if matches.any():
+                return matches
+            # An ID typed in a search box may also appear in the text
+            text = text.split(".")[0]
+        return self._match_text("technique_fts", TECHNIQUE_FTS_WEIGHTS, text, size)
+
+    def _match_procedure(self, kind, text):
+        """Score every procedure against one query term."""
+        if kind == "id":
+            text = text.split(".")[0]
+        return self._match_text("procedure_fts", (1.0,), text, len(self._usage_techniques))
+
+    def search_techniques(self, query, include_procedures=False, limit=None):
+        """
+        Search techniques by ID, name, tactic and description.
+
+        Args:
+            query (str): The search text
+            include_procedures (bool): Also match techniques whose group procedures contain the terms
+            limit (int): Maximum number of results (all by default)
+
+        Returns:
+            list: Technique STIX IDs, most relevant first
+        """
+        term_scores = []
+        for kind, text in parse_query(query):
+            scores = self._match_technique(kind, text)
+            if include_procedures:
+                np.maximum.at(scores, self._usage_techniques, self._match_procedure(kind, text))
+            term_scores.append(scores)
+        return [self._technique_ids[number] for number in _rank(term_scores, None, limit)]
+
+    def search_usages(self, query, positions=None, limit=None):
+        """
+        Search group technique entries by technique fields and procedure text.
+
+        Args:
+            query (str): The search text
+            positions (iterable): Positions in knowledge_base.usages to search (all by default)
+            limit (int): Maximum number of results (all by default)
+
+        Returns:
+            list: Positions in knowledge_base.usages, most relevant first
+        """
+        mask = None
+        if positions is not None:
+            mask = np.zeros(len(self._usage_techniques), dtype=bool)
+            mask[np.fromiter(positions, dtype=np.int64)] = True
+
+        term_scores = []
+        for kind, text in parse_query(query):
+            technique_scores = self._match_technique(kind, text)
+            term_scores.append(self._match_procedure(kind, text) + technique_scores[self._usage_techniques])
+        return _rank(term_scores, mask, limit)
+
+
+class StoreAtomics:
+    """
+    Atomic Red Team tests read from a shared store.
+
+    Offers the same get()/catalog()/prefetch()/start_warmup() methods as
+    AtomicsLoader and AtomicsMirror; nothing is downloaded or parsed from YAML.
+    A store replaced on disk is picked up on the next call.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the shared store file
+        """
+        self.path = path
+        self.warmup_stats = None
+        self._lock = threading.Lock()
+        self._store = None
+        self._catalog = None
+        self._tests = {}
+
+    def _current(self):
+        """Get the store and its catalog, reopening them if a new store was moved into place."""
+        with self._lock:
+            if self._store is None or store_signature(self.path) != self._store.signature:
+                store = SharedStore(self.path)
+                catalog = {}
+                for row in store.connection().execute(
+                        "SELECT technique_id, number, name, guid, platforms, executor, elevation_required, "
+                        "has_cleanup, input_argument_count, dependency_count FROM atomic_tests "
+                        "ORDER BY technique_id, number"):
+                    summary = AtomicTestSummary(row[0], row[1], row[2], row[3], tuple(json.loads(row[4])), row[5],
+                                                bool(row[6]), bool(row[7]), row[8], row[9])
+                    catalog.setdefault(summary.technique_id, []).append(summary)
+                self._store = store
+                self._catalog = {tech_id: tuple(summaries) for tech_id, summaries in catalog.items()}
+                self._tests = {}
+            return self._store, self._catalog
+
+    def catalog(self):
+        """
+        Get the catalog of every technique's tests.
+
+        Returns:
+            dict: Technique ID to a tuple of AtomicTestSummary
+        """
+        return self._current()[1]
+
+    def get(self, technique_id):
+        """
+        Get the Atomic Red Team tests of a technique.
+
+        Args:
+            technique_id (str): The technique ID (e.g., T1078.001)
+
+        Returns:
+            dict: The parsed YAML data, or None if the technique has no tests in the store
+        """
+        store, _ = self._current()
+        tests = self._tests
+        if technique_id in tests:
+            count("atomics_cache_hits")
+        else:
+            count("atomics_cache_misses")
+            row = store.connection().execute("SELECT content FROM atomics WHERE technique_id = ?",
+                                             (technique_id,)).fetchone()
+            tests[technique_id] = json.loads(row[0]) if row else None
+        return tests[technique_id]
+
+    def prefetch(self, technique_ids):
+        """
+        Read the catalog; tests themselves are only read when displayed.
+
+        Args:
+            technique_ids (iterable): Technique IDs of interest
+
+        Returns:
+            dict: Number of techniques per outcome ("found", "missing")
+        """
+        catalog = self.catalog()
+        found = sum(1 for tech_id in dict.fromkeys(technique_ids) if catalog.get(tech_id))
+        return {"found": found, "missing": len(dict.fromkeys(technique_ids)) - found}
+
+    def start_warmup(self, technique_ids):
+        """Nothing to warm up: the store already holds every test."""
+
+    def is_warming_up(self):
+        """
+        Check whether a background warm-up is running.
+
+        Returns:
+            bool: Always False
+        """
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a shared Threat Carver store")
+    parser.add_argument("--output", required=True, help="Path of the store file")
+    parser.add_argument("--domains", nargs="+", default=list(ATTACK_DOMAINS),
+                        help="ATT&CK domains to store (default: %(default)s)")
+    parser.add_argument("--no-atomics", action="store_true", help="Do not store the Atomic Red Team tests")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    bundles, _ = check_bundles(args.domains)
+    knowledge_base, errors = load_domains(args.domains)
+    for domain, error in errors.items():
+        print(f"Skipped the {domain} domain: {error}", file=sys.stderr)
+    counts = build_store(knowledge_base, args.output, None if args.no_atomics else open_atomics(),
+                         {domain: info for domain, info in bundles.items() if domain in knowledge_base.domains})
+    print(f"Stored {counts['techniques']} techniques, {counts['procedures']} procedures and the tests of "
+          f"{counts['techniques_with_atomics']} techniques in {args.output} "
+          f"({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
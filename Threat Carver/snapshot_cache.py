@@ -0,0 +1,305 @@
+"""
+Persistent on-disk cache for the remote data files used by Threat Carver.
+
+Downloaded files (the ATT&CK STIX bundle, Atomic Red Team YAML files) are stored
+in a cache directory together with their ETag and Last-Modified headers. On the
+next start they are revalidated with a conditional GET, so an unchanged bundle
+costs a single 304 response instead of a full download. In offline mode the
+network is never touched and data comes from local paths or the cache only.
+
+The SHA-256 of a large local file (e.g. a bundle from an offline mirror) is
+recorded with its size, modification time and inode, so it is only computed
+again once the file changed rather than on every start.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from config import CACHE_DIR, OFFLINE, HTTP_TIMEOUT
+from instrumentation import count
+
+# Size of the blocks streamed from the network to disk
+CHUNK_SIZE = 1024 * 1024
+
+# Local files smaller than this are hashed on the spot: recording their digest would cost more than it saves
+RECORDED_HASH_MIN_SIZE = 1024 * 1024
+
+# File of the cache directory holding the recorded digests of local files
+LOCAL_HASHES_FILE = "local-hashes.json"
+
+
+class OfflineError(requests.exceptions.RequestException):
+    """Raised when a remote file is needed in offline mode and is not in the cache."""
+
+
+def is_remote_source(source):
+    """
+    Check whether a data source is a URL rather than a local file or mirror path.
+
+    Args:
+        source (str): A URL, a file:// URL or a local path
+
+    Returns:
+        bool: True for http(s) URLs
+    """
+    return source.startswith(("http://", "https://"))
+
+
+def local_source_path(source):
+    """Turn a local source (plain path or file:// URL) into a filesystem path."""
+    if source.startswith("file://"):
+        source = source[len("file://"):]
+    return os.path.expanduser(source)
+
+
+def file_sha256(path):
+    """
+    Compute the SHA-256 of a file without reading it into memory at once.
+
+    Args:
+        path (str): Path of the file
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SnapshotCache:
+    """
+    Directory of cached downloads revalidated with conditional GET requests.
+
+    Each URL is stored as a body file plus a small JSON metadata file holding
+    the ETag, Last-Modified, SHA-256 and fetch timestamps of the body.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, offline=OFFLINE, session=None, timeout=HTTP_TIMEOUT):
+        """
+        Args:
+            cache_dir (str): Directory where cached files are stored
+            offline (bool): Never touch the network when True
+            session (requests.Session): Session used for downloads (a new one by default)
+            timeout (float): Seconds to wait for the server before using the cached copy
+        """
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self._hashes_lock = threading.Lock()
+
+    def entry_paths(self, url):
+        """
+        Get the body and metadata paths used to cache a URL.
+
+        Args:
+            url (str): The remote URL
+
+        Returns:
+            tuple: (body_path, metadata_path)
+        """
+        url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        base_name = os.path.basename(url.rstrip("/")) or "index"
+        entry = os.path.join(self.cache_dir, f"{url_hash}-{base_name}")
+        return entry, entry + ".meta.json"
+
+    def read_metadata(self, url):
+        """
+        Get the cached metadata of a URL.
+
+        Args:
+            url (str): The remote URL
+
+        Returns:
+            dict: The metadata (etag, last_modified, sha256, ...), or None if the URL is not cached
+        """
+        body_path, meta_path = self.entry_paths(url)
+        if not os.path.exists(body_path):
+            return None
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def content_hash(self, source, path):
+        """
+        Get the SHA-256 of the contents of a fetched source.
+
+        Remote sources reuse the digest recorded when the file was downloaded.
+        Large local files reuse the digest recorded the last time they were
+        hashed, as long as their size, modification time and inode are the same.
+
+        Args:
+            source (str): The source passed to fetch()
+            path (str): The path fetch() returned
+
+        Returns:
+            str: The hex digest
+        """
+        if is_remote_source(source):
+            metadata = self.read_metadata(source)
+            if metadata and metadata.get("sha256"):
+                return metadata["sha256"]
+        return self._local_hash(path)
+
+    def fetch(self, source):
+        """
+        Get a local path holding the current contents of a data source.
+
+        Local paths and file:// URLs are returned as they are. Remote URLs are
+        revalidated against the cache and only downloaded when they changed.
+        If the server cannot be reached, the cached copy is used when there is one.
+
+        Args:
+            source (str): A URL, a file:// URL or a local file path
+
+        Returns:
+            str: Path of a local file with the contents of the source
+
+        Raises:
+            FileNotFoundError: If a local source does not exist
+            OfflineError: If the source is remote, offline mode is on and it is not cached
+            requests.exceptions.RequestException: If the download fails and there is no cached copy
+        """
+        if not is_remote_source(source):
+            path = local_source_path(source)
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return path
+
+        body_path, meta_path = self.entry_paths(source)
+        metadata = self.read_metadata(source)
+
+        if self.offline:
+            if metadata is None:
+                raise OfflineError(f"{source} is not available in the offline cache")
+            count("snapshot_cache_hits")
+            return body_path
+
+        # Ask the server to only send the file if it changed since we cached it
+        headers = {}
+        if metadata is not None:
+            if metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+        try:
+            resp = self.session.get(source, headers=headers, stream=True, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            if metadata is not None:
+                # A stale copy is better than no data at all
+                count("snapshot_cache_hits")
+                return body_path
+            raise
+
+        with resp:
+            if resp.status_code == 304 and metadata is not None:
+                metadata["validated_at"] = time.time()
+                self._write_metadata(meta_path, metadata)
+                count("snapshot_cache_hits")
+                return body_path
+            if resp.status_code >= 500 and metadata is not None:
+                count("snapshot_cache_hits")
+                return body_path
+            resp.raise_for_status()
+
+            sha256, size = self._write_body(body_path, resp)
+            now = time.time()
+            self._write_metadata(meta_path, {
+                "url": source,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "sha256": sha256,
+                "size": size,
+                "fetched_at": now,
+                "validated_at": now
+            })
+        count("snapshot_cache_misses")
+        return body_path
+
+    def _local_hash(self, path):
+        """Hash a local file, or reuse the digest recorded for the same version of it."""
+        stat = os.stat(path)
+        if stat.st_size < RECORDED_HASH_MIN_SIZE:
+            return file_sha256(path)
+        key = os.path.abspath(path)
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        hashes_path = os.path.join(self.cache_dir, LOCAL_HASHES_FILE)
+        with self._hashes_lock:
+            recorded = self._read_local_hashes(hashes_path).get(key)
+        if recorded and recorded.get("signature") == signature:
+            return recorded["sha256"]
+
+        digest = file_sha256(path)
+        with self._hashes_lock:
+            hashes = self._read_local_hashes(hashes_path)
+            hashes[key] = {"signature": signature, "sha256": digest}
+            try:
+                self._write_metadata(hashes_path, hashes)
+            except OSError:
+                # Without the record the file is only hashed again next time
+                pass
+        return digest
+
+    @staticmethod
+    def _read_local_hashes(hashes_path):
+        """Read the recorded digests of local files (path to signature and sha256)."""
+        try:
+            with open(hashes_path, encoding="utf-8") as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return hashes if isinstance(hashes, dict) else {}
+
+    def _write_body(self, body_path, resp):
+        """Stream a response body to disk atomically and return its (sha256, size)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".download-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, body_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest.hexdigest(), size
+
+    def _write_metadata(self, meta_path, metadata):
+        """Write a metadata file atomically."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".meta-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, meta_path)
+
+
+_default_cache = None
+
+
+def get_snapshot_cache():
+    """
+    Get the process-wide cache configured from config.py.
+
+    Returns:
+        SnapshotCache: The shared cache instance
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SnapshotCache()
+    return _default_cache
@@ -0,0 +1,285 @@
+"""
+Graph of the STIX objects of the knowledge base and every relationship between them.
+
+Only the group -> technique "uses" relationships used to be indexed, so
+software, campaigns, mitigations and data components could only be reached by
+scanning the whole bundle again for each question. StixGraph keeps every kept
+object as a node and every relationship as an edge, in compressed sparse row
+(CSR) adjacency arrays in both directions. A multi-hop question such as
+"techniques reached via the software a group uses" is a short list of steps
+that paths() follows for all the starting nodes at once, with array gathers
+instead of Python loops over the objects.
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+
+# STIX types kept as graph nodes, besides the techniques and groups of the knowledge base
+GRAPH_NODE_TYPES = (
+    "malware", "tool", "campaign", "course-of-action",
+    "x-mitre-data-source", "x-mitre-data-component", "x-mitre-asset"
+)
+
+# Types of the software nodes
+SOFTWARE_TYPES = ("malware", "tool")
+
+# Relationship type of the edges from a data component to its data source, which
+# the bundle stores as the x_mitre_data_source_ref property rather than a relationship
+DATA_SOURCE_EDGE = "component-of"
+
+
+class GraphNode(namedtuple("GraphNode", ["stix_id", "type", "attack_id", "name"])):
+    """A STIX object of the graph: its STIX ID and type, ATT&CK ID (e.g. S0002 or M1036) and name."""
+
+    __slots__ = ()
+
+
+class GraphStep(namedtuple("GraphStep", ["relationship_type", "direction", "node_types"], defaults=("out", None))):
+    """
+    One hop of a path query.
+
+    Attributes:
+        relationship_type (str): Relationship type of the edges to follow (e.g. "uses")
+        direction (str): "out" to follow edges from source to target, "in" from target to source
+        node_types (tuple): STIX types of the nodes to reach (any type when None)
+    """
+
+    __slots__ = ()
+
+
+class StixGraph:
+    """
+    Every kept STIX object and relationship, as CSR adjacency arrays in both directions.
+    """
+
+    __slots__ = ("_nodes", "_index", "_node_types", "_type_codes", "_relationship_codes", "_relationship_types",
+                 "_out", "_in")
+
+    def __init__(self, nodes, edges):
+        """
+        Args:
+            nodes (iterable): GraphNode records
+            edges (iterable): (source STIX ID, target STIX ID, relationship type) tuples; edges
+                              with an endpoint that is not one of the nodes are left out
+        """
+        self._nodes = tuple(nodes)
+        self._index = MappingProxyType({node.stix_id: position for position, node in enumerate(self._nodes)})
+
+        # Node and relationship types as small integer codes, compared in bulk
+        type_codes = {}
+        self._node_types = np.fromiter((type_codes.setdefault(node.type, len(type_codes)) for node in self._nodes),
+                                       dtype=np.int16, count=len(self._nodes))
+        self._type_codes = MappingProxyType(type_codes)
+        relationship_codes = {}
+        sources, targets, codes = [], [], []
+        for source, target, relationship_type in edges:
+            source_position = self._index.get(source)
+            target_position = self._index.get(target)
+            if source_position is not None and target_position is not None:
+                sources.append(source_position)
+                targets.append(target_position)
+                codes.append(relationship_codes.setdefault(relationship_type, len(relationship_codes)))
+        self._relationship_codes = MappingProxyType(relationship_codes)
+        self._relationship_types = tuple(relationship_codes)
+
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        codes = np.asarray(codes, dtype=np.int16)
+        self._out = self._adjacency(sources, targets, codes)
+        self._in = self._adjacency(targets, sources, codes)
+
+    def _adjacency(self, sources, targets, codes):
+        """
+        Build the CSR arrays of the edges leaving each node.
+
+        Returns:
+            tuple: (offsets, neighbour positions, relationship codes); the edges of node i
+                   are at offsets[i]:offsets[i + 1]
+        """
+        order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(len(self._nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self._nodes)), out=offsets[1:])
+        return offsets, targets[order], codes[order]
+
+    @property
+    def nodes(self):
+        """Tuple of every GraphNode."""
+        return self._nodes
+
+    @property
+    def relationship_types(self):
+        """Tuple of the relationship types of the edges."""
+        return self._relationship_types
+
+    @property
+    def edge_count(self):
+        """Number of edges."""
+        return len(self._out[1])
+
+    def node(self, stix_id):
+        """
+        Get a node by STIX ID.
+
+        Args:
+            stix_id (str): STIX ID of the object
+
+        Returns:
+            GraphNode: The node, or None when the object is not in the graph
+        """
+        position = self._index.get(stix_id)
+        return self._nodes[position] if position is not None else None
+
+    def nodes_of_type(self, *node_types):
+        """
+        Get the nodes of some STIX types.
+
+        Args:
+            *node_types (str): STIX types (e.g. "malware", "tool")
+
+        Returns:
+            list: GraphNodes, in node order
+        """
+        codes = [self._type_codes[node_type] for node_type in node_types if node_type in self._type_codes]
+        return [self._nodes[position] for position in np.flatnonzero(np.isin(self._node_types, codes))]
+
+    def paths(self, stix_ids, steps):
+        """
+        Follow the same steps from several nodes at once.
+
+        Args:
+            stix_ids (iterable): STIX IDs of the starting nodes (unknown ones are ignored)
+            steps (iterable): GraphStep of each hop
+
+        Returns:
+            numpy.ndarray: One row of node positions per path found (start node first), with
+                           one column per node of the path
+        """
+        starts = [self._index[stix_id] for stix_id in dict.fromkeys(stix_ids) if stix_id in self._index]
+        paths = np.asarray(starts, dtype=np.int32).reshape(-1, 1)
+        for step in steps:
+            step = GraphStep(*step)
+            code = self._relationship_codes.get(step.relationship_type)
+            if code is None or not len(paths):
+                return np.empty((0, paths.shape[1] + 1), dtype=np.int32)
+            offsets, neighbours, codes = self._out if step.direction == "out" else self._in
+
+            # Positions of the edges of every path end, gathered without a loop
+            ends = paths[:, -1]
+            first = offsets[ends]
+            lengths = offsets[ends + 1] - first
+            rows = np.repeat(np.arange(len(paths)), lengths)
+            edges = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - first, lengths)
+
+            keep = codes[edges] == code
+            reached = neighbours[edges]
+            if step.node_types is not None:
+                type_codes = [self._type_codes[t] for t in step.node_types if t in self._type_codes]
+                keep &= np.isin(self._node_types[reached], type_codes)
+            paths = np.column_stack((paths[rows[keep]], reached[keep]))
+        return paths
+
+    def neighbors(self, stix_id, relationship_type, direction="out", node_types=None):
+        """
+        Get the nodes one relationship away from a node.
+
+        Args:
+            stix_id (str): STIX ID of the node
+            relationship_type (str): Relationship type of the edges to follow
+            direction (str): "out" (the node is the source) or "in" (the node is the target)
+            node_types (tuple): STIX types of the nodes to return (any type when None)
+
+        Returns:
+            list: GraphNodes, without duplicates, in edge order
+        """
+        paths = self.paths([stix_id], [GraphStep(relationship_type, direction, node_types)])
+        return [self._nodes[position] for position in dict.fromkeys(paths[:, -1].tolist())]
+
+    def _reached_via(self, paths, via_column=1):
+        """
+        Group the end nodes of paths with the nodes they were reached through.
+
+        Returns:
+            dict: End GraphNode to the tuple of GraphNodes in column via_column of its paths
+        """
+        reached = {}
+        for row in paths.tolist():
+            reached.setdefault(row[-1], {}).setdefault(row[via_column], None)
+        return {self._nodes[end]: tuple(self._nodes[via] for via in vias) for end, vias in reached.items()}
+
+    def software_of(self, group_stix_id):
+        """
+        Get the software (malware and tools) a group uses.
+
+        Args:
+            group_stix_id (str): STIX ID of the group
+
+        Returns:
+            list: GraphNodes of the software, by name
+        """
+        software = self.neighbors(group_stix_id, "uses", "out", SOFTWARE_TYPES)
+        return sorted(software, key=lambda node: node.name.lower())
+
+    def techniques_via_software(self, group_stix_id):
+        """
+        Get the techniques reached through the software a group uses.
+
+        Args:
+            group_stix_id (str): STIX ID of the group
+
+        Returns:
+            dict: Technique GraphNode to the tuple of the group's software GraphNodes that use it
+        """
+        paths = self.paths([group_stix_id], [GraphStep("uses", "out", SOFTWARE_TYPES),
+                                             GraphStep("uses", "out", ("attack-pattern",))])
+        return self._reached_via(paths)
+
+    def campaigns_of(self, group_stix_id):
+        """
+        Get the campaigns attributed to a group, with the techniques each of them used.
+
+        Args:
+            group_stix_id (str): STIX ID of the group
+
+        Returns:
+            dict: Campaign GraphNode to the tuple of technique GraphNodes it used
+        """
+        campaigns = self.neighbors(group_stix_id, "attributed-to", "in", ("campaign",))
+        paths = self.paths([campaign.stix_id for campaign in campaigns],
+                           [GraphStep("uses", "out", ("attack-pattern",))])
+        used = {}
+        for campaign, tech in paths.tolist():
+            used.setdefault(campaign, {}).setdefault(tech, None)
+        return {campaign: tuple(self._nodes[tech] for tech in used.get(self._index[campaign.stix_id], ()))
+                for campaign in campaigns}
+
+    def covering(self, technique_stix_ids, relationship_type, node_types):
+        """
+        Rank the nodes related to a set of techniques by how many of them they cover.
+
+        Args:
+            technique_stix_ids (iterable): STIX IDs of the techniques
+            relationship_type (str): Relationship from the covering node to the technique
+                                     (e.g. "mitigates" or "detects")
+            node_types (tuple): STIX types of the covering nodes
+
+        Returns:
+            list: (GraphNode, tuple of the technique GraphNodes it covers), the nodes covering
+                  the most techniques first
+        """
+        paths = self.paths(technique_stix_ids, [GraphStep(relationship_type, "in", node_types)])
+        covered = self._reached_via(paths, via_column=0)
+        return sorted(covered.items(), key=lambda item: (-len(item[1]), item[0].attack_id or "", item[0].name))
+
+    def mitigations_for(self, technique_stix_ids):
+        """
+        Rank the mitigations (courses of action) of a set of techniques by coverage.
+
+        Args:
+            technique_stix_ids (iterable): STIX IDs of the techniques
+
+        Returns:
+            list: (mitigation GraphNode, tuple of the technique GraphNodes it mitigates),
+                  the mitigations covering the most techniques first
+        """
+        return self.covering(technique_stix_ids, "mitigates", ("course-of-action",))
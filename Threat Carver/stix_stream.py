@@ -0,0 +1,159 @@
+"""
+Incremental reader for STIX bundles.
+
+json.load() decodes a whole bundle before anything can be done with it, so peak
+memory grows with the size of the bundle. iter_bundle_objects() instead reads the
+file (or HTTP response stream) in fixed-size blocks and yields the entries of the
+top-level "objects" array one at a time. Only the object being decoded and one
+block of text are held in memory, so peak memory is bounded by the largest
+single object rather than by the bundle. iter_array_items() does the same for
+a file holding a top-level JSON array, such as a SIEM alert export.
+"""
+import codecs
+import json
+import re
+
+# Size of the blocks read from the stream
+CHUNK_SIZE = 256 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+# Characters that can follow a number or a literal (true, false, null) in valid JSON
+_TOKEN_END = re.compile(r"[ \t\n\r,:\]}]")
+
+
+class _JsonStreamReader:
+    """Buffered cursor over a JSON text stream that decodes one value at a time."""
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, min_size=0):
+        """Read the next block into the buffer. Returns False at the end of the stream."""
+        if self.eof:
+            return False
+        chunk = self.fp.read(max(self.chunk_size, min_size))
+        if not chunk:
+            self.eof = True
+            if isinstance(chunk, bytes):
+                self.buf += self.utf8.decode(b"", final=True)
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk)
+        # Drop the consumed part of the buffer so it never grows past one value
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ("" at the end of the stream)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be `char`."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON: expected {char!r} but found {found!r} in the stream")
+        self.pos += 1
+
+    def decode_value(self):
+        """Decode the next JSON value, reading more blocks until it is complete."""
+        if self.peek() not in "{[\"":
+            # A number or literal can be cut anywhere by a block boundary ("4." then "5" decodes as 4),
+            # so it is only decoded once the character after it has been read
+            while not _TOKEN_END.search(self.buf, self.pos) and self.fill():
+                pass
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Grow the read size with the pending value so large objects stay linear
+                if not self.fill(len(self.buf) - self.pos):
+                    raise
+                continue
+            self.pos = end
+            return value
+
+
+def iter_bundle_objects(fp, chunk_size=CHUNK_SIZE):
+    """
+    Yield the STIX objects of a bundle one at a time.
+
+    Args:
+        fp: A binary or text file-like object (an open file, or response.raw of a streamed request)
+        chunk_size (int): Number of bytes read at a time
+
+    Yields:
+        dict: Each entry of the bundle's "objects" array
+
+    Raises:
+        ValueError: If the stream is not a JSON object
+    """
+    reader = _JsonStreamReader(fp, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        key = reader.decode_value()
+        reader.expect(":")
+        if key == "objects":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.decode_value()
+                    if reader.peek() == ",":
+                        reader.pos += 1
+                    else:
+                        reader.expect("]")
+                        break
+        else:
+            # Other top-level members (type, id, spec_version) are small and not needed
+            reader.decode_value()
+
+        if reader.peek() == ",":
+            reader.pos += 1
+        else:
+            reader.expect("}")
+            return
+
+
+def iter_array_items(fp, chunk_size=CHUNK_SIZE):
+    """
+    Yield the entries of a top-level JSON array one at a time.
+
+    Args:
+        fp: A binary or text file-like object
+        chunk_size (int): Number of bytes read at a time
+
+    Yields:
+        object: Each entry of the array
+
+    Raises:
+        ValueError: If the stream is not a JSON array
+    """
+    reader = _JsonStreamReader(fp, chunk_size)
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode_value()
+        if reader.peek() == ",":
+            reader.pos += 1
+        else:
+            reader.expect("]")
+            return
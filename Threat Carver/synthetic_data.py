@@ -0,0 +1,411 @@
+"""
+Synthetic ATT&CK data for benchmarks.
+
+Generates STIX bundles shaped like the Enterprise ATT&CK bundle (techniques,
+sub-techniques, groups and "uses" relationships with procedure text, plus
+software, campaigns, mitigations and data components) at any
+multiple of its real size, so performance can be measured on corpora far larger
+than the published one and without network access. next_release() turns a
+bundle into a plausible next ATT&CK release, for the release-diff benchmark.
+write_atomics_tree() writes an atomic-red-team style atomics folder for the
+techniques of a bundle, for the Atomic Red Team benchmarks.
+"""
+import os
+import random
+import uuid
+
+import yaml
+
+# Approximate object counts of the Enterprise ATT&CK bundle (scale 1)
+BASE_COUNTS = {
+    "techniques": 200,
+    "subtechniques": 430,
+    "groups": 150,
+    "techniques_per_group": 30,
+    "software": 700,
+    "software_per_group": 5,
+    "techniques_per_software": 15,
+    "campaigns": 30,
+    "mitigations": 45,
+    "mitigations_per_technique": 2,
+    "data_sources": 40,
+    "data_components": 110,
+    "data_components_per_technique": 3,
+}
+
+TACTICS = [
+    "reconnaissance", "resource-development", "initial-access", "execution", "persistence",
+    "privilege-escalation", "defense-evasion", "credential-access", "discovery",
+    "lateral-movement", "collection", "command-and-control", "exfiltration", "impact"
+]
+
+# Real security words, so that benchmark queries hit realistic posting lists
+DOMAIN_WORDS = [
+    "adversaries", "may", "use", "powershell", "registry", "credential", "credentials", "dump", "lsass",
+    "process", "injection", "scheduled", "task", "phishing", "spearphishing", "attachment", "network",
+    "share", "remote", "desktop", "token", "manipulation", "bypass", "uac", "command", "scripting",
+    "interpreter", "windows", "linux", "macos", "service", "execution", "persistence", "malware",
+    "backdoor", "payload", "encrypted", "channel", "exfiltration", "archive", "collected", "data"
+]
+
+# Approximate shape of the Atomic Red Team repository: share of the techniques with tests,
+# and tests per covered technique
+ATOMICS_COVERAGE = 0.5
+TESTS_PER_TECHNIQUE = 5
+
+ATOMIC_PLATFORMS = ["windows", "linux", "macos"]
+
+# Executor names and the platforms they run on
+ATOMIC_EXECUTORS = {
+    "powershell": "windows",
+    "command_prompt": "windows",
+    "sh": "linux",
+    "bash": "macos",
+}
+
+# modified timestamp of every generated object
+RELEASE_TIMESTAMP = "2024-01-01T00:00:00.000Z"
+
+# modified timestamp of the objects touched by next_release()
+NEXT_RELEASE_TIMESTAMP = "2024-06-01T00:00:00.000Z"
+
+_SYLLABLES = ["ka", "ro", "mi", "ten", "sha", "lo", "vex", "qua", "dri", "zen", "pol", "un", "ar", "is", "tor"]
+
+
+def _vocabulary(rng, size):
+    """Build a list of made-up words plus the domain words."""
+    words = set(DOMAIN_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _text(rng, vocabulary, length):
+    """Make a sentence-like string of words, favouring the domain words."""
+    words = []
+    for _ in range(length):
+        if rng.random() < 0.3:
+            words.append(rng.choice(DOMAIN_WORDS))
+        else:
+            words.append(rng.choice(vocabulary))
+    return " ".join(words).capitalize() + "."
+
+
+def _reference(external_id):
+    return [{"source_name": "mitre-attack", "external_id": external_id}]
+
+
+def generate_bundle_objects(scale=1, seed=0):
+    """
+    Generate the objects of a synthetic Enterprise-like STIX bundle.
+
+    Args:
+        scale (float): Multiple of the real object counts (1 = about the size of Enterprise ATT&CK)
+        seed (int): Random seed, so the same arguments always give the same bundle
+
+    Yields:
+        dict: STIX objects (attack-patterns, intrusion-sets, software, campaigns, mitigations,
+              data sources and components, and relationships)
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng, 20000)
+    technique_count = max(1, int(BASE_COUNTS["techniques"] * scale))
+    subtechnique_count = int(BASE_COUNTS["subtechniques"] * scale)
+    group_count = max(1, int(BASE_COUNTS["groups"] * scale))
+
+    yield {"type": "x-mitre-collection", "id": "x-mitre-collection--synthetic",
+           "name": f"Synthetic ATT&CK x{scale}", "x_mitre_version": "1.0", "modified": RELEASE_TIMESTAMP}
+
+    technique_ids = []
+    group_ids = []
+    for number in range(technique_count):
+        stix_id = f"attack-pattern--synthetic-{number}"
+        technique_ids.append(stix_id)
+        yield {
+            "type": "attack-pattern",
+            "id": stix_id,
+            "modified": RELEASE_TIMESTAMP,
+            "name": _text(rng, vocabulary, rng.randint(2, 4)).rstrip("."),
+            "description": _text(rng, vocabulary, rng.randint(60, 200)),
+            "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": tactic}
+                                  for tactic in rng.sample(TACTICS, rng.randint(1, 2))],
+            "external_references": _reference(f"T{1000 + number}")
+        }
+
+    for number in range(subtechnique_count):
+        parent = rng.randrange(technique_count)
+        stix_id = f"attack-pattern--synthetic-sub-{number}"
+        technique_ids.append(stix_id)
+        yield {
+            "type": "attack-pattern",
+            "id": stix_id,
+            "modified": RELEASE_TIMESTAMP,
+            "name": _text(rng, vocabulary, rng.randint(2, 4)).rstrip("."),
+            "description": _text(rng, vocabulary, rng.randint(40, 150)),
+            "x_mitre_is_subtechnique": True,
+            "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": rng.choice(TACTICS)}],
+            "external_references": _reference(f"T{1000 + parent}.{number % 1000:03d}")
+        }
+        yield {
+            "type": "relationship",
+            "id": f"relationship--synthetic-sub-{number}",
+            "modified": RELEASE_TIMESTAMP,
+            "relationship_type": "subtechnique-of",
+            "source_ref": stix_id,
+            "target_ref": f"attack-pattern--synthetic-{parent}"
+        }
+
+    for number in range(group_count):
+        stix_id = f"intrusion-set--synthetic-{number}"
+        name = f"Synthetic Group {number}"
+        group_ids.append(stix_id)
+        yield {
+            "type": "intrusion-set",
+            "id": stix_id,
+            "modified": RELEASE_TIMESTAMP,
+            "name": name,
+            "description": _text(rng, vocabulary, rng.randint(30, 80)),
+            "aliases": [name],
+            "external_references": _reference(f"G{number:04d}")
+        }
+        used = rng.sample(technique_ids, min(len(technique_ids), rng.randint(
+            BASE_COUNTS["techniques_per_group"] // 3, BASE_COUNTS["techniques_per_group"] * 2)))
+        for tech_stix_id in used:
+            yield {
+                "type": "relationship",
+                "id": f"relationship--synthetic-{number}-{tech_stix_id}",
+                "modified": RELEASE_TIMESTAMP,
+                "relationship_type": "uses",
+                "source_ref": stix_id,
+                "target_ref": tech_stix_id,
+                "description": f"{name} has used " + _text(rng, vocabulary, rng.randint(8, 40))
+            }
+
+    # Drawn from their own generator, so the objects above do not depend on them
+    yield from _generate_related_objects(random.Random(seed + 1), scale, technique_ids, group_ids)
+
+
+def _relationship(number, relationship_type, source_ref, target_ref):
+    return {
+        "type": "relationship",
+        "id": f"relationship--synthetic-{relationship_type}-{number}",
+        "modified": RELEASE_TIMESTAMP,
+        "relationship_type": relationship_type,
+        "source_ref": source_ref,
+        "target_ref": target_ref
+    }
+
+
+def _generate_related_objects(rng, scale, technique_ids, group_ids):
+    """
+    Generate the software, campaigns, mitigations and data components of a synthetic bundle.
+
+    Args:
+        rng (random.Random): Random generator
+        scale (float): Multiple of the real object counts
+        technique_ids (list): STIX IDs of the techniques
+        group_ids (list): STIX IDs of the groups
+
+    Yields:
+        dict: STIX objects and their relationships
+    """
+    numbers = iter(range(10 ** 9))
+
+    software_ids = []
+    for number in range(max(1, int(BASE_COUNTS["software"] * scale))):
+        software_type = "malware" if rng.random() < 0.75 else "tool"
+        stix_id = f"{software_type}--synthetic-{number}"
+        software_ids.append(stix_id)
+        yield {"type": software_type, "id": stix_id, "modified": RELEASE_TIMESTAMP,
+               "name": f"Synthetic Software {number}", "external_references": _reference(f"S{number:04d}")}
+        for tech_stix_id in rng.sample(technique_ids, min(len(technique_ids), rng.randint(
+                1, BASE_COUNTS["techniques_per_software"] * 2))):
+            yield _relationship(next(numbers), "uses", stix_id, tech_stix_id)
+    for group_stix_id in group_ids:
+        for software_id in rng.sample(software_ids, min(len(software_ids), rng.randint(
+                0, BASE_COUNTS["software_per_group"] * 2))):
+            yield _relationship(next(numbers), "uses", group_stix_id, software_id)
+
+    for number in range(int(BASE_COUNTS["campaigns"] * scale)):
+        stix_id = f"campaign--synthetic-{number}"
+        yield {"type": "campaign", "id": stix_id, "modified": RELEASE_TIMESTAMP,
+               "name": f"Synthetic Campaign {number}", "external_references": _reference(f"C{number:04d}")}
+        yield _relationship(next(numbers), "attributed-to", stix_id, rng.choice(group_ids))
+        for tech_stix_id in rng.sample(technique_ids, min(len(technique_ids), rng.randint(5, 40))):
+            yield _relationship(next(numbers), "uses", stix_id, tech_stix_id)
+
+    mitigation_ids = [f"course-of-action--synthetic-{number}" for number in range(BASE_COUNTS["mitigations"])]
+    for number, stix_id in enumerate(mitigation_ids):
+        yield {"type": "course-of-action", "id": stix_id, "modified": RELEASE_TIMESTAMP,
+               "name": f"Synthetic Mitigation {number}", "external_references": _reference(f"M{1000 + number}")}
+
+    source_ids = [f"x-mitre-data-source--synthetic-{number}" for number in range(BASE_COUNTS["data_sources"])]
+    for number, stix_id in enumerate(source_ids):
+        yield {"type": "x-mitre-data-source", "id": stix_id, "modified": RELEASE_TIMESTAMP,
+               "name": f"Synthetic Data Source {number}", "external_references": _reference(f"DS{number:04d}")}
+    component_ids = [f"x-mitre-data-component--synthetic-{number}"
+                     for number in range(BASE_COUNTS["data_components"])]
+    for number, stix_id in enumerate(component_ids):
+        yield {"type": "x-mitre-data-component", "id": stix_id, "modified": RELEASE_TIMESTAMP,
+               "name": f"Synthetic Data Component {number}", "x_mitre_data_source_ref": rng.choice(source_ids)}
+
+    for tech_stix_id in technique_ids:
+        for mitigation_id in rng.sample(mitigation_ids, rng.randint(0, BASE_COUNTS["mitigations_per_technique"] * 2)):
+            yield _relationship(next(numbers), "mitigates", mitigation_id, tech_stix_id)
+        for component_id in rng.sample(component_ids,
+                                       rng.randint(0, BASE_COUNTS["data_components_per_technique"] * 2)):
+            yield _relationship(next(numbers), "detects", component_id, tech_stix_id)
+
+
+def generate_bundle(scale=1, seed=0):
+    """
+    Generate a synthetic Enterprise-like STIX bundle.
+
+    Args:
+        scale (float): Multiple of the real object counts
+        seed (int): Random seed
+
+    Returns:
+        dict: The STIX bundle
+    """
+    return {
+        "type": "bundle",
+        "id": f"bundle--synthetic-{scale}-{seed}",
+        "objects": list(generate_bundle_objects(scale, seed))
+    }
+
+
+def next_release(bundle, change_rate=0.02, seed=1):
+    """
+    Make the next release of a synthetic bundle.
+
+    A fraction of the techniques is edited, revoked or deprecated, a few new
+    techniques appear and groups gain new "uses" relationships, the way a
+    real ATT&CK release changes a small part of the previous one.
+
+    Args:
+        bundle (dict): A bundle from generate_bundle() (left unchanged)
+        change_rate (float): Fraction of the techniques and groups that change
+        seed (int): Random seed
+
+    Returns:
+        dict: The new STIX bundle
+    """
+    rng = random.Random(seed)
+    objects = [dict(obj) for obj in bundle["objects"]]
+    techniques = [obj for obj in objects if obj["type"] == "attack-pattern"]
+    groups = [obj for obj in objects if obj["type"] == "intrusion-set"]
+    changed = max(1, int(len(techniques) * change_rate))
+
+    for obj in objects:
+        if obj["type"] == "x-mitre-collection":
+            obj["x_mitre_version"] = "1.1"
+            obj["modified"] = NEXT_RELEASE_TIMESTAMP
+    for tech in rng.sample(techniques, min(len(techniques), changed * 3)):
+        kind = rng.random()
+        if kind < 0.7:
+            tech["description"] += " Updated detection guidance."
+        elif kind < 0.85:
+            tech["revoked"] = True
+        else:
+            tech["x_mitre_deprecated"] = True
+        tech["modified"] = NEXT_RELEASE_TIMESTAMP
+
+    vocabulary = _vocabulary(rng, 2000)
+    for number in range(changed):
+        stix_id = f"attack-pattern--synthetic-new-{number}"
+        techniques.append({"id": stix_id})
+        objects.append({
+            "type": "attack-pattern",
+            "id": stix_id,
+            "modified": NEXT_RELEASE_TIMESTAMP,
+            "name": _text(rng, vocabulary, rng.randint(2, 4)).rstrip("."),
+            "description": _text(rng, vocabulary, rng.randint(60, 200)),
+            "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": rng.choice(TACTICS)}],
+            "external_references": _reference(f"T{8000 + number}")
+        })
+    for group in rng.sample(groups, min(len(groups), max(1, int(len(groups) * change_rate)))):
+        for tech in rng.sample(techniques, min(len(techniques), 3)):
+            objects.append({
+                "type": "relationship",
+                "id": f"relationship--synthetic-next-{group['id']}-{tech['id']}",
+                "modified": NEXT_RELEASE_TIMESTAMP,
+                "relationship_type": "uses",
+                "source_ref": group["id"],
+                "target_ref": tech["id"],
+                "description": f"{group['name']} has used " + _text(rng, vocabulary, rng.randint(8, 40))
+            })
+
+    return {"type": "bundle", "id": bundle["id"] + "-next", "objects": objects}
+
+
+def generate_atomic_tests(technique_id, rng, vocabulary):
+    """
+    Generate the Atomic Red Team file of one technique.
+
+    Args:
+        technique_id (str): The technique ID (e.g. T1059.001)
+        rng (random.Random): Random generator
+        vocabulary (list): Words of the generated text
+
+    Returns:
+        dict: The file contents, in the layout of the atomic-red-team repository
+    """
+    tests = []
+    for _ in range(rng.randint(1, TESTS_PER_TECHNIQUE * 2 - 1)):
+        executor = rng.choice(list(ATOMIC_EXECUTORS))
+        arguments = {f"arg_{number}": {"description": _text(rng, vocabulary, 6), "type": "string",
+                                       "default": rng.choice(vocabulary)}
+                     for number in range(rng.randint(0, 3))}
+        test = {
+            "name": _text(rng, vocabulary, rng.randint(3, 6)).rstrip("."),
+            "auto_generated_guid": str(uuid.UUID(int=rng.getrandbits(128))),
+            "description": _text(rng, vocabulary, rng.randint(10, 40)),
+            "supported_platforms": sorted({ATOMIC_EXECUTORS[executor]} | set(rng.sample(ATOMIC_PLATFORMS, 1))),
+            "input_arguments": arguments,
+            "executor": {
+                "name": executor,
+                "elevation_required": rng.random() < 0.3,
+                "command": " ".join(["echo"] + [f"#{{{name}}}" for name in arguments] +
+                                    [rng.choice(vocabulary) for _ in range(rng.randint(3, 12))]),
+            },
+        }
+        if rng.random() < 0.6:
+            test["executor"]["cleanup_command"] = "echo cleanup " + rng.choice(vocabulary)
+        if rng.random() < 0.4:
+            test["dependencies"] = [{"description": _text(rng, vocabulary, 5), "prereq_command": "exit 0",
+                                     "get_prereq_command": "echo " + rng.choice(vocabulary)}]
+        tests.append(test)
+    return {"attack_technique": technique_id, "display_name": _text(rng, vocabulary, 3).rstrip("."),
+            "atomic_tests": tests}
+
+
+def write_atomics_tree(technique_ids, directory, coverage=ATOMICS_COVERAGE, seed=0):
+    """
+    Write a synthetic atomics folder (atomics/T1059.001/T1059.001.yaml, ...) for some techniques.
+
+    Its size follows the bundle it is written for: a bundle at 10x gets ten
+    times as many technique files.
+
+    Args:
+        technique_ids (iterable): ATT&CK technique IDs, e.g. the keys of a knowledge base's technique_by_id
+        directory (str): Directory to write the atomics folder into
+        coverage (float): Share of the techniques that get tests
+        seed (int): Random seed
+
+    Returns:
+        tuple: (path of the atomics folder, number of technique files written)
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng, 2000)
+    atomics_dir = os.path.join(directory, "atomics")
+    written = 0
+    for technique_id in sorted(technique_ids):
+        if rng.random() >= coverage:
+            continue
+        technique_dir = os.path.join(atomics_dir, technique_id)
+        os.makedirs(technique_dir, exist_ok=True)
+        with open(os.path.join(technique_dir, f"{technique_id}.yaml"), "w", encoding="utf-8") as f:
+            yaml.safe_dump(generate_atomic_tests(technique_id, rng, vocabulary), f, sort_keys=False)
+        written += 1
+    return atomics_dir, written
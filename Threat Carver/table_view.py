@@ -0,0 +1,145 @@
+"""
+Paginated tables for the Streamlit pages.
+
+The technique tables used to turn every filtered row into HTML (or a DataFrame)
+on each rerun and send all of it to the browser, which made large groups slow
+to interact with. paginate() sorts the full list of records on the server and
+returns only the rows of the page being viewed, so only those rows are turned
+into HTML. Tactic badge HTML is built once per distinct set of tactics.
+
+Sub-techniques are folded under their parent technique by default: pages are
+made of parent rows, and the sub-technique rows of a parent are only built
+when the analyst expands it.
+"""
+import math
+from functools import lru_cache
+
+import streamlit as st
+
+# Choices of the "Rows per page" selector
+PAGE_SIZES = (25, 50, 100, 250)
+
+
+@lru_cache(maxsize=1024)
+def tactic_badges(tactics):
+    """
+    Format tactics as HTML badges.
+
+    Args:
+        tactics (tuple): Tactic names (a tuple, so the result can be cached per tactic set)
+
+    Returns:
+        str: The badges, separated by spaces
+    """
+    badges = []
+    for tactic in tactics:
+        tactic_slug = tactic.lower().replace(" ", "-")
+        badges.append(f'<span class="badge badge-{tactic_slug}">{tactic}</span>')
+    return " ".join(badges)
+
+
+def paginate(items, sort_options, key, default_page_size=50):
+    """
+    Show sorting and paging controls and return the rows of the current page.
+
+    Args:
+        items (list): All rows, in their default order (e.g. by search relevance)
+        sort_options (dict): Label of each sort choice to a key function (None keeps the default order)
+        key (str): Prefix of the widget keys, unique per table
+        default_page_size (int): Rows per page until the user picks another size
+
+    Returns:
+        list: The rows to display
+    """
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        sort_label = st.selectbox("Sort by", list(sort_options), key=f"{key}_sort")
+    with col2:
+        descending = st.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order") == "Descending"
+    with col3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(default_page_size),
+                                 key=f"{key}_size")
+    page_count = max(1, math.ceil(len(items) / page_size))
+    # A new search or filter (another row count) or page size starts again at page 1; the page
+    # is also kept in range, since the widget rejects a stored value above max_value
+    page_key = f"{key}_page"
+    if st.session_state.get(f"{key}_page_of") != (len(items), page_size):
+        st.session_state[f"{key}_page_of"] = (len(items), page_size)
+        st.session_state[page_key] = 1
+    st.session_state[page_key] = min(max(1, int(st.session_state.get(page_key, 1))), page_count)
+    with col4:
+        page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key=page_key)
+
+    sort_key = sort_options[sort_label]
+    if sort_key is not None:
+        items = sorted(items, key=sort_key, reverse=descending)
+    elif descending:
+        items = items[::-1]
+
+    start = (page - 1) * page_size
+    rows = items[start:start + page_size]
+    if items:
+        st.caption(f"Showing rows {start + 1}–{start + len(rows)} of {len(items)}")
+    return rows
+
+
+def collapse_subtechniques(items, tree, key, technique=None):
+    """
+    Show the "group sub-techniques" toggle and fold sub-technique rows under their parents.
+
+    Args:
+        items (list): All rows, in their default order
+        tree (TechniqueTree): The knowledge base's technique tree
+        key (str): Prefix of the widget keys, unique per table
+        technique (callable): Gets the technique STIX ID of a row (row.stix_id by default)
+
+    Returns:
+        tuple: (rows to paginate, dict of parent technique STIX ID to its sub-technique rows)
+    """
+    if not st.checkbox("Group sub-techniques under their parent", value=True, key=f"{key}_collapse"):
+        return items, {}
+    return tree.group_rows(items, technique)
+
+
+def expand_subtechniques(rows, children, key, technique=None):
+    """
+    Show the expansion controls of a page and insert the sub-technique rows of the expanded parents.
+
+    Args:
+        rows (list): Rows of the current page, as returned by paginate()
+        children (dict): Parent technique STIX ID to its sub-technique rows, from collapse_subtechniques()
+        key (str): Prefix of the widget keys, unique per table
+        technique (callable): Gets the technique STIX ID of a row (row.stix_id by default)
+
+    Returns:
+        list: (row, depth, folded sub-technique count) tuples in display order; depth is 1 for
+              sub-technique rows, and the count is 0 for expanded or childless rows
+    """
+    technique = technique or (lambda item: item.stix_id)
+    parents = [row for row in rows if technique(row) in children]
+    expanded = set()
+    if parents:
+        labels = {technique(row): f"{row.tech_id} - {row.name}" for row in parents}
+        col1, col2 = st.columns([3, 1])
+        with col2:
+            expand_all = st.checkbox("Expand all", key=f"{key}_expand_all")
+        with col1:
+            if expand_all:
+                expanded = set(labels)
+            else:
+                expanded = set(st.multiselect("Show the sub-techniques of", list(labels),
+                                              format_func=labels.__getitem__, key=f"{key}_expand"))
+
+    # A parent can have several rows (e.g. two procedures of a group); its sub-techniques go under the first one
+    table_rows = []
+    folded = set()
+    for row in rows:
+        stix_id = technique(row)
+        subs = children.get(stix_id, ()) if stix_id not in folded else ()
+        folded.add(stix_id)
+        if stix_id in expanded:
+            table_rows.append((row, 0, 0))
+            table_rows.extend((sub, 1, 0) for sub in subs)
+        else:
+            table_rows.append((row, 0, len(subs)))
+    return table_rows
@@ -0,0 +1,126 @@
+"""
+Group x tactic statistics of the knowledge base.
+
+The Group Analysis page used to rebuild the selected group's tactic set, tactic
+counts, most common tactic and chart data in Python loops on every rerun.
+GroupTacticMatrix computes a boolean usage x tactic matrix and the group x tactic
+count matrix once, when the knowledge base is built. Pages read slices of it,
+and filtered views are recomputed from boolean masks over the usage rows.
+"""
+import numpy as np
+
+
+class GroupTacticMatrix:
+    """
+    Tactic membership of every group technique entry, and technique counts per group and tactic.
+
+    Rows of the usage matrix follow knowledge_base.usages; rows of the count
+    matrix follow groups and columns follow tactics (both sorted by name).
+    """
+
+    __slots__ = ("_tactics", "_groups", "_tactic_columns", "_group_rows", "_usage_tactics", "_counts", "_frame")
+
+    def __init__(self, usages, group_positions):
+        """
+        Args:
+            usages (tuple): TechniqueUsages of all groups
+            group_positions (dict): Group name to the positions of its entries in usages
+        """
+        self._tactics = tuple(sorted({tactic for usage in usages for tactic in usage.tactics}))
+        self._groups = tuple(sorted(group_positions))
+        self._tactic_columns = {tactic: column for column, tactic in enumerate(self._tactics)}
+        self._group_rows = {group_name: row for row, group_name in enumerate(self._groups)}
+
+        # One row per usage, True in the columns of its technique's tactics
+        usage_tactics = np.zeros((len(usages), len(self._tactics)), dtype=bool)
+        rows = [position for position, usage in enumerate(usages) for _ in usage.tactics]
+        cols = [self._tactic_columns[tactic] for usage in usages for tactic in usage.tactics]
+        usage_tactics[rows, cols] = True
+
+        # Group of each usage, then the counts summed per group in one vectorized pass
+        usage_groups = np.zeros(len(usages), dtype=np.int32)
+        for group_name, positions in group_positions.items():
+            usage_groups[list(positions)] = self._group_rows[group_name]
+        counts = np.zeros((len(self._groups), len(self._tactics)), dtype=np.int32)
+        np.add.at(counts, usage_groups, usage_tactics.astype(np.int32))
+
+        # The matrices are shared between all sessions, so they are made read-only
+        usage_tactics.flags.writeable = False
+        counts.flags.writeable = False
+        self._usage_tactics = usage_tactics
+        self._counts = counts
+        self._frame = None
+
+    @property
+    def tactics(self):
+        """Tuple of all tactic names, in column order."""
+        return self._tactics
+
+    @property
+    def groups(self):
+        """Tuple of all group names, in row order."""
+        return self._groups
+
+    @property
+    def counts(self):
+        """Read-only NumPy array of technique entries per group (rows) and tactic (columns)."""
+        return self._counts
+
+    def counts_frame(self):
+        """
+        Get the group x tactic counts as a DataFrame, for all-groups comparisons.
+
+        Returns:
+            pandas.DataFrame: Counts indexed by group name, one column per tactic
+        """
+        if self._frame is None:
+            import pandas as pd
+            self._frame = pd.DataFrame(self._counts, index=list(self._groups), columns=list(self._tactics))
+        return self._frame
+
+    def group_counts(self, group_name):
+        """
+        Get a group's number of technique entries per tactic.
+
+        Args:
+            group_name (str): The group
+
+        Returns:
+            pandas.Series: Counts indexed by tactic (all tactics, zeros included)
+        """
+        import pandas as pd
+        row = self._group_rows.get(group_name)
+        counts = self._counts[row] if row is not None else np.zeros(len(self._tactics), dtype=np.int32)
+        return pd.Series(counts, index=list(self._tactics))
+
+    def tactic_counts(self, positions):
+        """
+        Count the entries per tactic of a subset of usages (e.g. a filtered group view).
+
+        Args:
+            positions (sequence): Positions in knowledge_base.usages
+
+        Returns:
+            pandas.Series: Counts indexed by tactic (all tactics, zeros included)
+        """
+        import pandas as pd
+        counts = self._usage_tactics[np.asarray(positions, dtype=np.int64)].sum(axis=0)
+        return pd.Series(counts, index=list(self._tactics))
+
+    def filter_positions(self, positions, tactics):
+        """
+        Keep the usages whose technique is in any of the given tactics.
+
+        Args:
+            positions (sequence): Positions in knowledge_base.usages
+            tactics (iterable): Tactic names
+
+        Returns:
+            list: The matching positions, in their original order
+        """
+        columns = [self._tactic_columns[tactic] for tactic in tactics if tactic in self._tactic_columns]
+        positions = np.asarray(positions, dtype=np.int64)
+        if not columns or not len(positions):
+            return []
+        mask = self._usage_tactics[np.ix_(positions, columns)].any(axis=1)
+        return positions[mask].tolist()
@@ -1,11 +1,40 @@
 import streamlit as st
 import yaml
-import requests
 
-# URL to the Atomic Red Team repository
-ATOMIC_RED_TEAM_BASE_URL = "https://raw.githubusercontent.com/redcanaryco/atomic-red-team/master/atomics"
+from atomic_tests import AtomicTestTable
+from atomics import open_atomics
+from config import SHARED_STORE
+from instrumentation import count, timed
+from shared_store import StoreAtomics
+from table_view import paginate
+
+@st.cache_resource
+def get_atomics_loader():
+    """
+    Get the Atomic Red Team loader shared by all sessions.
+
+    Returns:
+        AtomicsLoader, AtomicsMirror or StoreAtomics: The process-wide loader for the configured
+        URL, local checkout or tarball (see atomics.py), or for the shared store (see shared_store.py)
+    """
+    if SHARED_STORE:
+        return StoreAtomics(SHARED_STORE)
+    return open_atomics()
+
+def start_atomics_warmup(knowledge_base):
+    """
+    Start prefetching the Atomic Red Team tests of every Enterprise technique in the background.
+
+    Atomic Red Team only covers Enterprise ATT&CK, so Mobile and ICS techniques
+    are not requested. Only the first call starts the warm-up; later reruns
+    return immediately.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
+    """
+    get_atomics_loader().start_warmup([tech_id for tech_id, tech in knowledge_base.technique_by_id.items()
+                                       if tech.domain == "enterprise"])
 
-@st.cache_data  # Cache the data to prevent re-downloading on every interaction
 def load_atomic_red_team_data(technique_id):
     """
     Load Atomic Red Team test data for a specific technique ID.
@@ -16,29 +45,41 @@ def load_atomic_red_team_data(technique_id):
     Returns:
         dict: The parsed YAML data containing Atomic Red Team tests for the technique
     """
-    # Format the URL to the specific technique's YAML file
-    url = f"{ATOMIC_RED_TEAM_BASE_URL}/{technique_id}/{technique_id}.yaml"
-    
     try:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        # Parse the YAML content
-        atomic_data = yaml.safe_load(resp.text)
-        return atomic_data
-    except requests.exceptions.RequestException as e:
-        # Handle the case where the technique doesn't have Atomic Red Team tests
-        return None
+        # Served from the loader's memory once prefetched; techniques without tests are remembered too
+        with timed("atomics"):
+            return get_atomics_loader().get(technique_id)
     except yaml.YAMLError as e:
         # Handle YAML parsing errors
         st.error(f"Error parsing YAML for technique {technique_id}: {str(e)}")
         return None
 
-def display_technique_replication_page(techniques_dict):
+@st.cache_resource(max_entries=1)
+def _build_atomic_test_table(_knowledge_base, _catalog, knowledge_base_id, catalog_size):
+    # The catalog only grows while the warm-up runs, so its size identifies its contents
+    return AtomicTestTable(_catalog, _knowledge_base)
+
+def get_atomic_test_table(knowledge_base):
+    """
+    Get the table of every atomic test known so far.
+
+    Rebuilt only when the catalog or the knowledge base changes.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
+
+    Returns:
+        AtomicTestTable: All tests of the catalog
+    """
+    catalog = get_atomics_loader().catalog()
+    return _build_atomic_test_table(knowledge_base, catalog, id(knowledge_base), len(catalog))
+
+def display_technique_replication_page(knowledge_base):
     """
     Display the Technique Replication page.
     
     Args:
-        techniques_dict (dict): Dictionary of techniques from MITRE ATT&CK
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
     """
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.markdown('<div class="card-header">🧪 Technique Replication with Atomic Red Team</div>', unsafe_allow_html=True)
@@ -49,51 +90,66 @@ def display_technique_replication_page(techniques_dict):
     These tests are small, highly portable detection tests mapped to specific ATT&CK techniques.
     """)
     
+    if get_atomics_loader().is_warming_up():
+        st.caption("⏳ Atomic Red Team tests are being prefetched in the background")
+    
     # Search for techniques
     technique_search = st.text_input("🔍 Search for techniques by ID, name, or description", "")
     
+    # Catalog of the tests known so far (filled in by the warm-up)
+    catalog = get_atomics_loader().catalog()
+    only_with_tests = st.checkbox("Only techniques with Atomic Red Team tests", value=False)
+    
     # Get all techniques
-    all_techniques = list(techniques_dict.values())
+    all_techniques = list(knowledge_base.techniques_dict.values())
+    if only_with_tests:
+        all_techniques = [tech for tech in all_techniques if catalog.get(tech.tech_id)]
     
-    # Filter techniques based on search
-    if technique_search:
-        search_term_lower = technique_search.lower()
-        filtered_techniques = []
-        
-        for tech in all_techniques:
-            # Check all possible fields for the search term
-            if (search_term_lower in tech["name"].lower() or
-                search_term_lower in tech.get("description", "").lower() or
-                (tech["tech_id"] and search_term_lower in tech["tech_id"].lower()) or
-                any(search_term_lower in tactic.lower() for tactic in tech.get("tactics", []))):
-                filtered_techniques.append(tech)
-    else:
-        filtered_techniques = all_techniques[:100]  # Limit to 100 techniques if no search term
+    # Filter techniques based on search (ranked by relevance)
+    with timed("filter"):
+        if technique_search:
+            filtered_techniques = knowledge_base.search_techniques(technique_search)
+            if only_with_tests:
+                filtered_techniques = [tech for tech in filtered_techniques if catalog.get(tech.tech_id)]
+        else:
+            filtered_techniques = all_techniques
     
     # Display technique count
-    st.markdown(f"**Found {len(filtered_techniques)} techniques**" + (" (showing first 100)" if not technique_search and len(all_techniques) > 100 else ""))
+    st.markdown(f"**Found {len(filtered_techniques)} techniques**")
     
     # Create a DataFrame for display
     if filtered_techniques:
         import pandas as pd
-        technique_df = pd.DataFrame([{
-            "ID": tech["tech_id"],
-            "Name": tech["name"],
-            "Tactics": ", ".join(tech.get("tactics", []))
-        } for tech in filtered_techniques])
         
-        st.dataframe(technique_df, use_container_width=True)
+        # Only the rows of the visible page are built and sent to the browser
+        page_rows = paginate(filtered_techniques, {
+            "Relevance" if technique_search else "Default": None,
+            "ID": lambda tech: tech.tech_id or "",
+            "Name": lambda tech: tech.name.lower(),
+            "Atomic Tests": lambda tech: len(catalog.get(tech.tech_id, ()))
+        }, key="replication_techniques")
+        
+        with timed("dataframe"):
+            technique_df = pd.DataFrame([{
+                "ID": tech.tech_id,
+                "Name": tech.name,
+                "Tactics": ", ".join(tech.tactics),
+                "Atomic Tests": len(catalog.get(tech.tech_id, ()))
+            } for tech in page_rows])
+        count("rows_rendered", len(technique_df))
         
-        # Select a technique to view details
+        st.dataframe(technique_df, use_container_width=True, hide_index=True)
+        
+        # Select a technique to view details (from the visible page)
         selected_technique_id = st.selectbox(
             "Select a technique to view Atomic Red Team tests:",
-            options=[f"{tech['tech_id']} - {tech['name']}" for tech in filtered_techniques]
+            options=[f"{tech.tech_id} - {tech.name}" for tech in page_rows]
         )
         
         # Display technique details and Atomic Red Team tests
         if selected_technique_id:
             tech_id = selected_technique_id.split(" - ")[0]
-            technique = next((t for t in filtered_techniques if t["tech_id"] == tech_id), None)
+            technique = knowledge_base.technique_by_id.get(tech_id)
             
             if technique:
                 st.markdown("""
@@ -101,16 +157,16 @@ def display_technique_replication_page(techniques_dict):
                     <div class="card-header">Technique Details</div>
                 """, unsafe_allow_html=True)
                 
-                st.markdown(f"**ID:** {technique['tech_id']}")
-                st.markdown(f"**Name:** {technique['name']}")
-                st.markdown(f"**Tactics:** {', '.join(technique.get('tactics', []))}")
+                st.markdown(f"**ID:** {technique.tech_id}")
+                st.markdown(f"**Name:** {technique.name}")
+                st.markdown(f"**Tactics:** {', '.join(technique.tactics)}")
                 st.markdown("**Description:**")
-                st.markdown(f"{technique.get('description', 'No description available.')}")
+                st.markdown(f"{technique.description or 'No description available.'}")
                 
                 st.markdown("</div>", unsafe_allow_html=True)
                 
                 # Display Atomic Red Team tests
-                display_atomic_red_team_tests(technique["tech_id"])
+                display_atomic_red_team_tests(technique.tech_id)
     else:
         st.warning("No techniques found matching your search criteria.")
     
@@ -133,6 +189,19 @@ def display_atomic_red_team_tests(technique_id):
     st.markdown(f"## Atomic Red Team Tests for {technique_id}")
     st.markdown(f"**Technique Name:** {atomic_data.get('display_name', 'Unknown')}")
     
+    # Overview of the tests from the catalog
+    summaries = get_atomics_loader().catalog().get(technique_id, ())
+    if summaries:
+        import pandas as pd
+        st.dataframe(pd.DataFrame([{
+            "#": summary.number,
+            "Test": summary.name,
+            "Platforms": ", ".join(summary.platforms),
+            "Executor": summary.executor,
+            "Elevation": "Yes" if summary.elevation_required else "No",
+            "Dependencies": summary.dependency_count
+        } for summary in summaries]), use_container_width=True, hide_index=True)
+    
     # Display each atomic test
     for i, test in enumerate(atomic_data.get('atomic_tests', [])):
         with st.expander(f"Test #{i+1}: {test.get('name', 'Unnamed Test')} ({test.get('supported_platforms', ['Unknown'])})", expanded=i==0):
@@ -197,3 +266,127 @@ def display_atomic_red_team_tests(technique_id):
                 st.markdown("### References")
                 for ref in test['references']:
                     st.markdown(f"- [{ref}]({ref})")
+
+def display_atomic_test_planner_page(knowledge_base):
+    """
+    Display the Atomic Test Planner page: every atomic test, filtered and summarized across techniques.
+    
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
+    """
+    import plotly.express as px
+    
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-header">🗂️ Atomic Test Planner</div>', unsafe_allow_html=True)
+    
+    st.markdown("""
+    Plan a purple-team exercise from every Atomic Red Team test at once: pick a threat group,
+    platforms and executors, and get the matching tests across all techniques.
+    """)
+    
+    if get_atomics_loader().is_warming_up():
+        st.caption("⏳ Atomic Red Team tests are being prefetched in the background; the table grows as they arrive")
+    
+    table = get_atomic_test_table(knowledge_base)
+    if not len(table):
+        st.warning("No Atomic Red Team tests are available yet.")
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+    
+    # Scope the tests to a threat group
+    col1, col2 = st.columns(2)
+    with col1:
+        group_name = st.selectbox("Threat group", ["Any group"] + sorted(knowledge_base.group_positions))
+    with col2:
+        group_scope = st.radio(
+            "Group scope",
+            ["Tactics used by the group", "Techniques used by the group"],
+            disabled=group_name == "Any group",
+            horizontal=True
+        )
+    
+    technique_ids = None
+    group_tactics = []
+    if group_name != "Any group":
+        usages = knowledge_base.group_to_techniques.get(group_name, [])
+        if group_scope == "Techniques used by the group":
+            technique_ids = {usage.tech_id for usage in usages}
+        else:
+            group_tactics = sorted({tactic for usage in usages for tactic in usage.tactics})
+    
+    # Test filters
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        tactics = st.multiselect("Tactics", list(table.tactics.columns), default=group_tactics)
+        platforms = st.multiselect("Platforms", list(table.platforms.columns))
+    with col2:
+        executors = st.multiselect("Executors", table.executors)
+        elevation = st.selectbox("Elevation", ["Any", "Not required", "Required"])
+    with col3:
+        cleanup_only = st.checkbox("Only tests with a cleanup command")
+        summary_dimension = st.selectbox("Summarize by", ["tactic", "platform", "executor", "technique_id"])
+    
+    with timed("filter"):
+        tests = table.filter(
+            platforms=platforms,
+            executors=executors,
+            tactics=tactics,
+            technique_ids=technique_ids,
+            elevation_required=None if elevation == "Any" else elevation == "Required",
+            has_cleanup=True if cleanup_only else None
+        )
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Tests", len(tests))
+    col2.metric("Techniques", tests["technique_id"].nunique())
+    col3.metric("Need elevation", int(tests["elevation_required"].sum()))
+    
+    if tests.empty:
+        st.markdown('<div class="alert alert-info">No tests match these filters.</div>', unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+    
+    # Aggregate view
+    summary = table.summarize(tests, summary_dimension)
+    with timed("plotly"):
+        fig = px.bar(
+            summary.head(30),
+            x=summary_dimension,
+            y='tests',
+            color='elevated',
+            color_continuous_scale='Reds',
+            labels={'tests': 'Number of Tests', 'elevated': 'Need Elevation'}
+        )
+        fig.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(family="Segoe UI, sans-serif", size=12),
+            margin=dict(l=20, r=20, t=40, b=20),
+        )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # The matching tests
+    count("rows_rendered", len(tests))
+    st.dataframe(tests.rename(columns={
+        "technique_id": "Technique ID",
+        "technique_name": "Technique",
+        "test_number": "#",
+        "test_name": "Test",
+        "guid": "GUID",
+        "tactics": "Tactics",
+        "platforms": "Platforms",
+        "executor": "Executor",
+        "elevation_required": "Elevation",
+        "has_cleanup": "Cleanup",
+        "input_argument_count": "Arguments",
+        "dependency_count": "Dependencies"
+    }), use_container_width=True, hide_index=True)
+    
+    st.download_button(
+        label="📥 Download test plan (CSV)",
+        data=tests.to_csv(index=False),
+        file_name="atomic_test_plan.csv",
+        mime="text/csv"
+    )
+    
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,99 @@
+"""
+Parent / sub-technique hierarchy of the knowledge base.
+
+Sub-techniques used to be listed as flat rows next to their parents, so a
+group or a search matching a parent and its sub-techniques filled the tables
+with near-duplicate rows. TechniqueTree is built once from the
+"subtechnique-of" relationships; pages use group_rows() to show one row per
+parent technique and only list the sub-techniques of the parents the analyst
+expands.
+"""
+from types import MappingProxyType
+
+
+class TechniqueTree:
+    """
+    Parent technique of every sub-technique, and the sub-techniques of every parent.
+    """
+
+    __slots__ = ("_parents", "_children")
+
+    def __init__(self, techniques_dict, edges):
+        """
+        Args:
+            techniques_dict (dict): STIX ID to Technique record
+            edges (iterable): (sub-technique STIX ID, parent STIX ID) tuples
+        """
+        parents = {}
+        children = {}
+        for sub_stix_id, parent_stix_id in edges:
+            if sub_stix_id in techniques_dict and parent_stix_id in techniques_dict:
+                parents[sub_stix_id] = techniques_dict[parent_stix_id]
+                children.setdefault(parent_stix_id, []).append(techniques_dict[sub_stix_id])
+        self._parents = MappingProxyType(parents)
+        self._children = MappingProxyType({
+            parent_stix_id: tuple(sorted(subs, key=lambda tech: tech.tech_id or ""))
+            for parent_stix_id, subs in children.items()
+        })
+
+    def edges(self):
+        """
+        Get every (sub-technique STIX ID, parent STIX ID) pair of the tree.
+
+        Returns:
+            list: The pairs, as passed to the constructor
+        """
+        return [(sub_stix_id, parent.stix_id) for sub_stix_id, parent in self._parents.items()]
+
+    def parent(self, stix_id):
+        """
+        Get the parent of a sub-technique.
+
+        Args:
+            stix_id (str): STIX ID of a technique
+
+        Returns:
+            Technique: The parent technique, or None for techniques that are not sub-techniques
+        """
+        return self._parents.get(stix_id)
+
+    def subtechniques(self, stix_id):
+        """
+        Get the sub-techniques of a technique.
+
+        Args:
+            stix_id (str): STIX ID of a technique
+
+        Returns:
+            tuple: Sub-technique records, by technique ID (empty when it has none)
+        """
+        return self._children.get(stix_id, ())
+
+    def group_rows(self, items, technique=None):
+        """
+        Split table rows into top-level rows and the sub-technique rows under each of them.
+
+        A sub-technique row goes under its parent when the parent is one of the
+        rows too; otherwise it stays a top-level row, so nothing is hidden. The
+        sub-technique rows of a parent are listed once, however many rows the
+        parent has.
+
+        Args:
+            items (list): Rows (Technique records, TechniqueUsages, ...), in display order
+            technique (callable): Gets the technique STIX ID of a row (row.stix_id by default)
+
+        Returns:
+            tuple: (top-level rows in their original order,
+                    dict of parent technique STIX ID to the list of its sub-technique rows)
+        """
+        technique = technique or (lambda item: item.stix_id)
+        present = {technique(item) for item in items}
+        top = []
+        children = {}
+        for item in items:
+            parent = self._parents.get(technique(item))
+            if parent is not None and parent.stix_id in present:
+                children.setdefault(parent.stix_id, []).append(item)
+            else:
+                top.append(item)
+        return top, children
@@ -0,0 +1,135 @@
+"""
+Shared fixtures of the Threat Carver tests.
+
+The modules of the app are flat files in the parent directory, so it is put on
+sys.path. Tests never use the network: remote sources are served by a local
+HTTP stand-in (see http_stand_in), and the settings read by config.py at import
+are pointed at a temporary directory before any test imports it, so the app
+loads a small synthetic bundle (see attack_bundle) into a fresh cache.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+DATA_DIR = tempfile.mkdtemp(prefix="threat-carver-tests-")
+ENTERPRISE_BUNDLE = os.path.join(DATA_DIR, "enterprise-attack.json")
+os.environ.update({
+    "THREAT_CARVER_ATTACK_URL": ENTERPRISE_BUNDLE,
+    "THREAT_CARVER_ATTACK_DOMAINS": "enterprise",
+    "THREAT_CARVER_CACHE_DIR": os.path.join(DATA_DIR, "cache"),
+    "THREAT_CARVER_ATOMICS_URL": os.path.join(DATA_DIR, "atomics"),
+    "THREAT_CARVER_ATOMICS_PREFETCH": "0",
+    "THREAT_CARVER_REFRESH_INTERVAL": "0",
+    "THREAT_CARVER_METRICS_PORT": "0",
+    "THREAT_CARVER_OFFLINE": "1",
+})
+for _name in ("THREAT_CARVER_LAZY_DOMAINS", "THREAT_CARVER_SHARED_STORE", "THREAT_CARVER_PERF_LOG"):
+    os.environ.pop(_name, None)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Serves the files of an HttpStandIn, with ETags and scripted error responses."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        with stand_in.lock:
+            stand_in.requests.append((self.path, self.headers.get("If-None-Match")))
+            scripted = stand_in.statuses.get(self.path)
+            status = scripted.pop(0) if scripted else None
+        body = stand_in.files.get(self.path)
+        if status is None and body is None:
+            status = 404
+        if status is not None:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpStandIn:
+    """
+    Local HTTP server standing in for a remote data source.
+
+    Attributes:
+        base_url (str): URL of the server, without a trailing slash
+        files (dict): URL path to the bytes served with 200 (and an ETag); other paths get a 404
+        statuses (dict): URL path to a list of status codes answered (without a body) before the file
+        requests (list): (URL path, If-None-Match header) of every request received
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.statuses = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path):
+        """Get the URL of a path of the server."""
+        return self.base_url + path
+
+    def hits(self, path):
+        """Count the requests received for a path."""
+        with self.lock:
+            return sum(1 for requested, _ in self.requests if requested == path)
+
+    def stop(self):
+        """Stop the server; later requests fail to connect."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def http_stand_in():
+    stand_in = HttpStandIn()
+    yield stand_in
+    stand_in.stop()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _remove_data_dir():
+    yield
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def attack_bundle():
+    """Write a small synthetic Enterprise bundle where the app looks for it, and get its path."""
+    from synthetic_data import generate_bundle
+
+    with open(ENTERPRISE_BUNDLE, "w", encoding="utf-8") as f:
+        json.dump(generate_bundle(scale=0.1), f)
+    return ENTERPRISE_BUNDLE
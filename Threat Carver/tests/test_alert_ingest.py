@@ -0,0 +1,104 @@
+"""Alert exports: technique counts of each format, whatever the chunk boundaries, and server directory access."""
+import io
+import json
+import os
+from collections import Counter
+
+import pytest
+
+import alert_ingest
+from alert_ingest import count_techniques, list_server_exports, server_export_path
+
+
+def _count(data, alert_format, **kwargs):
+    reports = []
+    counts, stats = count_techniques(io.BytesIO(data), alert_format,
+                                     progress=lambda rows, bytes_read: reports.append(rows), **kwargs)
+    assert stats.bytes_read == len(data)
+    assert reports and reports[-1] == stats.rows
+    return counts, stats, reports
+
+
+def test_csv_column_is_read_in_chunks():
+    lines = ["id,technique_id,message,technique_id"]
+    expected = Counter()
+    for number in range(50):
+        technique_id = f"T10{number % 7:02d}" + (".001" if number % 3 == 0 else "")
+        expected[technique_id] += 1
+        # Multi-line quoted messages, and a repeated column name whose second column is not read
+        lines.append(f'{number},{technique_id.lower()},"line one\nmentions T9999",T8888')
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+
+    counts, stats, reports = _count(data, "csv", chunk_rows=7)
+    assert counts == expected
+    assert stats.rows == 50 and stats.field == "technique_id" and stats.technique_hits == 50
+    assert reports == [7, 14, 21, 28, 35, 42, 49, 50]
+
+    with pytest.raises(ValueError):
+        _count(data, "csv", field="tactic")
+
+
+def test_csv_cells_with_several_ids():
+    data = b'alert,Techniques\na,"T1059.001, T1003"\nb,T1003\nc,none\n'
+    counts, stats, _ = _count(data, "csv")
+    assert counts == {"T1059.001": 1, "T1003": 2}
+    assert stats.field == "Techniques" and stats.rows == 3
+
+
+def test_jsonl_field_is_read_line_by_line():
+    records = [{"threat": {"technique": {"id": ["T1059", "t1003.001"]}}, "message": "T9999"},
+               {"threat": {"technique": {"id": "T1078"}}},
+               {"message": "no technique field, T9999"},
+               {"threat": [{"technique": {"id": "T1078"}}, {"technique": {"id": "T1110"}}]}]
+    lines = [json.dumps(record) for record in records] + ["", "not json T1234", json.dumps(records[1])]
+    data = "\n".join(lines).encode("utf-8")
+
+    counts, stats, reports = _count(data, "jsonl", field="threat.technique.id", chunk_rows=2)
+    assert counts == {"T1059": 1, "T1003.001": 1, "T1078": 3, "T1110": 1}
+    assert stats.rows == 6 and reports == [2, 4, 6]
+
+
+def test_json_array_records_span_the_read_blocks():
+    filler = "x" * 300
+    records = [{"technique_id": f"T{1000 + number % 40}", "raw": filler} for number in range(3000)]
+    data = json.dumps(records, indent=1).encode("utf-8")
+    assert len(data) > 3 * 256 * 1024
+
+    counts, stats, reports = _count(data, "jsonl", field="technique_id", chunk_rows=1000)
+    assert counts == Counter(record["technique_id"] for record in records)
+    assert stats.rows == 3000 and reports == [1000, 2000, 3000]
+    # Without a field every value of the record is searched
+    assert _count(b' [{"a": {"b": ["T1059"]}}, "T1003", 5]', "jsonl")[0] == {"T1059": 1, "T1003": 1}
+
+
+def test_raw_scan_finds_ids_across_block_boundaries(monkeypatch):
+    monkeypatch.setattr(alert_ingest, "RAW_BLOCK_BYTES", 16)
+    lines = [f"{number} host-{number} ran T1059.00{number % 3} then t1003" for number in range(20)]
+    # The last line has no line break
+    data = "\n".join(lines).encode("utf-8")
+    expected = Counter({"T1003": 20})
+    expected.update(f"T1059.00{number % 3}" for number in range(20))
+
+    # No technique column, and no JSON field: the file is scanned without parsing
+    for alert_format, header in (("csv", b"host,message\n"), ("jsonl", b"")):
+        counts, stats, _ = _count(header + data, alert_format)
+        assert counts == expected
+        assert stats.field is None and stats.technique_hits == 40
+
+
+def test_only_exports_inside_the_alerts_directory_are_served(tmp_path):
+    alerts_dir = tmp_path / "alerts"
+    alerts_dir.mkdir()
+    (alerts_dir / "siem.csv").write_text("technique_id\nT1059\n")
+    (alerts_dir / "notes.txt").write_text("not an export")
+    (alerts_dir / "nested").mkdir()
+    secret = tmp_path / "secret.csv"
+    secret.write_text("technique_id\n")
+    os.symlink(secret, alerts_dir / "link.csv")
+
+    assert list_server_exports(str(alerts_dir)) == ["siem.csv"]
+    assert list_server_exports(str(tmp_path / "missing")) == []
+    assert server_export_path(str(alerts_dir), "siem.csv") == os.path.realpath(alerts_dir / "siem.csv")
+    for name in ("../secret.csv", str(secret), "link.csv", ""):
+        with pytest.raises(ValueError):
+            server_export_path(str(alerts_dir), name)
@@ -0,0 +1,105 @@
+"""The Streamlit app, run with AppTest: each domain is parsed and indexed once per process, not per rerun."""
+import json
+import os
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import config
+import data_refresh
+import knowledge_base
+import search_index
+from conftest import APP_DIR
+from synthetic_data import generate_bundle
+
+
+def _counting(calls, name, function):
+    def wrapper(*args, **kwargs):
+        calls[name] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+@pytest.fixture
+def app(attack_bundle, monkeypatch):
+    # styles.css is read relative to the working directory
+    monkeypatch.chdir(APP_DIR)
+    st.cache_resource.clear()
+    yield AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=60)
+    st.cache_resource.clear()
+
+
+def test_reruns_do_not_parse_or_index_again(app, monkeypatch):
+    calls = {"parse_objects": 0, "SearchIndex": 0}
+    monkeypatch.setattr(knowledge_base, "parse_objects",
+                        _counting(calls, "parse_objects", knowledge_base.parse_objects))
+    monkeypatch.setattr(search_index.SearchIndex, "__init__",
+                        _counting(calls, "SearchIndex", search_index.SearchIndex.__init__))
+
+    app.run()
+    assert not app.exception
+    # One bundle parsed, and its technique and procedure indexes built
+    assert calls == {"parse_objects": 1, "SearchIndex": 2}
+
+    app.text_input[0].input("powershell").run()
+    assert not app.exception
+    app.sidebar.radio[0].set_value("Technique Explorer").run()
+    assert not app.exception
+    assert calls == {"parse_objects": 1, "SearchIndex": 2}
+
+
+def test_lazy_domain_is_merged_into_the_loaded_knowledge_base(app, tmp_path, monkeypatch):
+    mobile_bundle = str(tmp_path / "mobile-attack.json")
+    with open(mobile_bundle, "w", encoding="utf-8") as f:
+        f.write(json.dumps(generate_bundle(scale=0.1, seed=1)).replace("--synthetic-", "--mobile-"))
+    monkeypatch.setattr(config, "ATTACK_DOMAINS", ("enterprise", "mobile"))
+    monkeypatch.setattr(config, "ATTACK_LAZY_DOMAINS", ("mobile",))
+    monkeypatch.setitem(config.ATTACK_DOMAIN_URLS, "mobile", mobile_bundle)
+
+    refreshers = []
+    parsed = []
+    create_refresher = data_refresh.KnowledgeBaseRefresher.__init__
+    parse_objects = knowledge_base.parse_objects
+
+    def counted_refresher(self, *args, **kwargs):
+        refreshers.append(self)
+        create_refresher(self, *args, **kwargs)
+
+    def counted_parse(objects, domain, *args):
+        parsed.append(domain)
+        return parse_objects(objects, domain, *args)
+    monkeypatch.setattr(data_refresh.KnowledgeBaseRefresher, "__init__", counted_refresher)
+    monkeypatch.setattr(knowledge_base, "parse_objects", counted_parse)
+
+    app.run()
+    assert not app.exception
+    assert refreshers[0].domains == ("enterprise",)
+    parsed.clear()
+
+    app.sidebar.multiselect[0].select("mobile").run()
+    assert not app.exception
+    # The same refresher now holds both domains, and only Mobile was parsed
+    assert len(refreshers) == 1
+    assert refreshers[0].domains == ("enterprise", "mobile")
+    assert parsed == ["mobile"]
+    _, kb_state = app.session_state["knowledge_base_state"]
+    assert set(kb_state.knowledge_base.domains) == {"enterprise", "mobile"}
+
+
+def test_failed_lazy_domain_is_reported_in_the_page(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "ATTACK_DOMAINS", ("enterprise", "mobile"))
+    monkeypatch.setattr(config, "ATTACK_LAZY_DOMAINS", ("mobile",))
+    monkeypatch.setitem(config.ATTACK_DOMAIN_URLS, "mobile", str(tmp_path / "mobile-attack.json"))
+    app.run()
+    assert not app.exception
+
+    def failing_load(*args, **kwargs):
+        raise OSError("cache directory is gone")
+    monkeypatch.setattr(data_refresh, "load_domains", failing_load)
+    app.sidebar.multiselect[0].select("mobile").run()
+    assert not app.exception
+    assert "cache directory is gone" in app.error[0].value
+    # The page still works on the data already loaded
+    _, kb_state = app.session_state["knowledge_base_state"]
+    assert kb_state.knowledge_base.domains == ("enterprise",)
@@ -0,0 +1,99 @@
+"""AtomicsLoader against a local HTTP stand-in: retries, the negative cache and deduplicated fetches."""
+import atomics
+from atomics import AtomicsLoader, make_session
+from snapshot_cache import SnapshotCache
+
+
+def _yaml(technique_id):
+    return (f"attack_technique: {technique_id}\n"
+            "atomic_tests:\n"
+            "- name: Test one\n"
+            "  supported_platforms: [windows]\n"
+            "  executor:\n"
+            "    name: powershell\n"
+            "    command: whoami\n").encode("utf-8")
+
+
+def _path(technique_id):
+    return f"/atomics/{technique_id}/{technique_id}.yaml"
+
+
+def _loader(stand_in, cache_dir, retries=2, workers=4):
+    cache = SnapshotCache(str(cache_dir), offline=False, session=make_session(workers, retries), timeout=5)
+    return AtomicsLoader(stand_in.url("/atomics"), cache=cache, max_workers=workers, retries=retries)
+
+
+def test_server_errors_are_retried(http_stand_in, tmp_path):
+    http_stand_in.files[_path("T1059")] = _yaml("T1059")
+    http_stand_in.statuses[_path("T1059")] = [503, 502]
+    loader = _loader(http_stand_in, tmp_path, retries=2)
+
+    tests = loader.get("T1059")
+    assert tests["attack_technique"] == "T1059"
+    assert http_stand_in.hits(_path("T1059")) == 3
+    assert [summary.executor for summary in loader.catalog()["T1059"]] == ["powershell"]
+
+
+def test_exhausted_retries_give_no_tests(http_stand_in, tmp_path):
+    http_stand_in.files[_path("T1059")] = _yaml("T1059")
+    http_stand_in.statuses[_path("T1059")] = [503, 503, 503]
+    loader = _loader(http_stand_in, tmp_path, retries=2)
+
+    assert loader.get("T1059") is None
+    assert http_stand_in.hits(_path("T1059")) == 3
+
+
+def test_missing_technique_is_remembered(http_stand_in, tmp_path):
+    loader = _loader(http_stand_in, tmp_path)
+    assert loader.get("T1001") is None
+    assert loader.get("T1001") is None
+    assert http_stand_in.hits(_path("T1001")) == 1
+
+    # The negative cache is kept on disk, so another loader does not ask again
+    assert _loader(http_stand_in, tmp_path).get("T1001") is None
+    assert http_stand_in.hits(_path("T1001")) == 1
+
+    # Until it expires
+    expired = _loader(http_stand_in, tmp_path)
+    expired.negative_ttl = 0
+    assert expired.get("T1001") is None
+    assert http_stand_in.hits(_path("T1001")) == 2
+
+
+def test_prefetch_fetches_each_file_once(http_stand_in, tmp_path):
+    found = ["T1003", "T1003.001", "T1059", "T1059.001", "T1078"]
+    for technique_id in found:
+        http_stand_in.files[_path(technique_id)] = _yaml(technique_id)
+    technique_ids = found + ["T1001", "T1002"]
+    loader = _loader(http_stand_in, tmp_path, workers=4)
+
+    assert loader.prefetch(technique_ids + technique_ids) == {"found": 5, "missing": 2}
+    assert loader.prefetch(technique_ids) == {}
+    for technique_id in technique_ids:
+        loader.get(technique_id)
+    for technique_id in technique_ids:
+        assert http_stand_in.hits(_path(technique_id)) == 1
+    assert sorted(loader.catalog()) == sorted(found)
+
+
+def test_negative_cache_is_only_written_when_it_changes(http_stand_in, tmp_path, monkeypatch):
+    http_stand_in.files[_path("T1059")] = _yaml("T1059")
+    saves = []
+    mkstemp = atomics.tempfile.mkstemp
+
+    def counted_mkstemp(*args, **kwargs):
+        if kwargs.get("prefix") == ".atomics-missing-":
+            saves.append(args)
+        return mkstemp(*args, **kwargs)
+    monkeypatch.setattr(atomics.tempfile, "mkstemp", counted_mkstemp)
+    loader = _loader(http_stand_in, tmp_path)
+
+    assert loader.get("T1001") is None
+    assert len(saves) == 1
+    # Cache hits and found techniques leave the file alone
+    for _ in range(3):
+        assert loader.get("T1001") is None
+        assert loader.get("T1059")
+    assert len(saves) == 1
+    assert loader.get("T1002") is None
+    assert len(saves) == 2
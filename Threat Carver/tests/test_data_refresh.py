@@ -0,0 +1,70 @@
+"""KnowledgeBaseRefresher: lazy domains are merged into the knowledge base already loaded."""
+import json
+import os
+
+import knowledge_base
+import search_index
+from data_refresh import KnowledgeBaseRefresher
+from snapshot_cache import SnapshotCache
+from synthetic_data import generate_bundle
+
+
+def _write_bundle(path, domain, seed):
+    # Techniques are domain-specific, so each bundle gets its own STIX IDs
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(generate_bundle(scale=0.1, seed=seed)).replace("--synthetic-", f"--{domain}-"))
+    return str(path)
+
+
+def test_added_domain_is_merged_into_the_current_state(tmp_path, monkeypatch):
+    sources = {domain: _write_bundle(tmp_path / f"{domain}.json", domain, seed)
+               for seed, domain in enumerate(("enterprise", "mobile"))}
+    refresher = KnowledgeBaseRefresher(("enterprise",), interval=0, sources=sources,
+                                       cache=SnapshotCache(str(tmp_path / "cache"), offline=True))
+    first = refresher.state
+
+    parsed = []
+    built = []
+    parse_objects = knowledge_base.parse_objects
+    build_index = search_index.SearchIndex.__init__
+
+    def counted_parse(objects, domain, *args):
+        parsed.append(domain)
+        return parse_objects(objects, domain, *args)
+
+    def counted_build(*args):
+        built.append(args)
+        build_index(*args)
+    monkeypatch.setattr(knowledge_base, "parse_objects", counted_parse)
+    monkeypatch.setattr(search_index.SearchIndex, "__init__", counted_build)
+
+    assert refresher.add_domains(["mobile"])
+    assert refresher.domains == ("enterprise", "mobile")
+    state = refresher.state
+    assert state.generation == first.generation + 1
+    assert set(state.knowledge_base.domains) == {"enterprise", "mobile"}
+    assert set(state.bundles) == {"enterprise", "mobile"}
+    assert len(state.knowledge_base.techniques_dict) == \
+        len(first.knowledge_base.techniques_dict) + sum(tech.domain == "mobile"
+                                                        for tech in state.knowledge_base.techniques_dict.values())
+    # Only the new domain is parsed and indexed
+    assert parsed == ["mobile"]
+    assert len(built) == 2
+
+    assert not refresher.add_domains(["enterprise", "mobile"])
+    assert refresher.state is state
+
+
+def test_failed_add_keeps_the_current_state(tmp_path):
+    sources = {domain: _write_bundle(tmp_path / f"{domain}.json", domain, seed)
+               for seed, domain in enumerate(("enterprise", "mobile"))}
+    refresher = KnowledgeBaseRefresher(("enterprise",), interval=0, sources=sources,
+                                       cache=SnapshotCache(str(tmp_path / "cache"), offline=True))
+    state = refresher.state
+
+    # Enterprise can no longer be read, so the merged knowledge base would lose it
+    os.remove(sources["enterprise"])
+    assert not refresher.add_domains(["mobile"])
+    assert isinstance(refresher.last_error, FileNotFoundError)
+    assert refresher.domains == ("enterprise",)
+    assert refresher.state is state
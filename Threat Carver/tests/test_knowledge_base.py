@@ -0,0 +1,89 @@
+"""Loading the knowledge base: recorded bundle hashes and search indexes kept in the compiled snapshots."""
+import json
+
+import pytest
+
+import knowledge_base
+import search_index
+import snapshot_cache
+from knowledge_base import load_domains
+from search_index import KnowledgeBaseSearch
+from snapshot_cache import SnapshotCache
+from synthetic_data import generate_bundle
+
+# Words of the synthetic vocabulary, ATT&CK IDs (and ID prefixes), a word prefix and a word matching nothing
+QUERIES = ["exfiltration", "archive use", "T1001", "T1000.005", "mi", "share zzz"]
+
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = {}
+    for seed, domain in enumerate(("enterprise", "mobile")):
+        paths[domain] = str(tmp_path / f"{domain}.json")
+        # Techniques are domain-specific, so each bundle gets its own STIX IDs
+        bundle = json.dumps(generate_bundle(scale=0.1, seed=seed)).replace("--synthetic-", f"--{domain}-")
+        with open(paths[domain], "w", encoding="utf-8") as f:
+            f.write(bundle)
+    return paths
+
+
+def _counting(monkeypatch, owner, name):
+    calls = []
+    function = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return function(*args, **kwargs)
+    monkeypatch.setattr(owner, name, wrapper)
+    return calls
+
+
+def test_local_bundle_is_hashed_once_per_version(sources, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_cache, "RECORDED_HASH_MIN_SIZE", 0)
+    hashed = _counting(monkeypatch, snapshot_cache, "file_sha256")
+    cache = SnapshotCache(str(tmp_path / "cache"), offline=True)
+    path = sources["enterprise"]
+
+    digest = cache.content_hash(path, path)
+    assert SnapshotCache(str(tmp_path / "cache"), offline=True).content_hash(path, path) == digest
+    assert len(hashed) == 1
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert cache.content_hash(path, path) != digest
+    assert len(hashed) == 2
+
+
+def test_search_index_is_loaded_from_the_snapshots(sources, tmp_path, monkeypatch):
+    cache = SnapshotCache(str(tmp_path / "cache"), offline=True)
+    first, errors = load_domains(["enterprise", "mobile"], sources, cache)
+    assert not errors
+
+    built = _counting(monkeypatch, search_index.SearchIndex, "__init__")
+    parsed = _counting(monkeypatch, knowledge_base, "parse_objects")
+    second, _ = load_domains(["enterprise", "mobile"], sources, cache)
+    assert not built and not parsed
+
+    # The joined per-bundle indexes rank like an index built over the merged knowledge base
+    monkeypatch.undo()
+    rebuilt = KnowledgeBaseSearch(second.techniques_dict, second.usages)
+    assert all(rebuilt.search_techniques(query) for query in QUERIES[:-1])
+    for kb in (first, second):
+        for query in QUERIES:
+            assert kb._search.search_techniques(query, True) == rebuilt.search_techniques(query, True)
+            assert kb._search.search_usages(query) == rebuilt.search_usages(query)
+
+
+def test_only_large_bundles_are_parsed_in_worker_processes(sources, tmp_path, monkeypatch):
+    pooled = []
+    monkeypatch.setattr(knowledge_base.os, "cpu_count", lambda: 4)
+    # Recorded only: the bundles are then parsed in this process
+    monkeypatch.setattr(knowledge_base, "_parse_in_processes", lambda located, *args: pooled.append(set(located)) or {})
+
+    kb, errors = load_domains(["enterprise", "mobile"], sources, SnapshotCache(str(tmp_path / "small"), offline=True))
+    assert not errors and set(kb.domains) == {"enterprise", "mobile"}
+    assert not pooled
+
+    monkeypatch.setattr(knowledge_base, "PARSE_PROCESS_MIN_BYTES", 0)
+    load_domains(["enterprise", "mobile"], sources, SnapshotCache(str(tmp_path / "large"), offline=True))
+    assert pooled == [{"enterprise", "mobile"}]
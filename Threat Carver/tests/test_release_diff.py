@@ -0,0 +1,58 @@
+"""Release diffs: what changed between two releases of a bundle, and the knowledge base rebuilt from the previous one."""
+import json
+
+from knowledge_base import AttackKnowledgeBase, load_domains, parse_objects, release_changes
+from release_diff import CHANGE_KINDS, diff_records
+from snapshot_cache import SnapshotCache
+from synthetic_data import generate_bundle, next_release
+
+
+def test_diff_lists_every_changed_object():
+    bundle = generate_bundle(scale=0.1)
+    old = parse_objects(bundle["objects"])
+    new = parse_objects(next_release(bundle, change_rate=0.2)["objects"])
+
+    diff = diff_records(old, new, "enterprise")
+    counts = diff.counts()
+    assert list(counts) == list(CHANGE_KINDS)
+    assert counts["added"] and counts["changed"]
+    # Every object whose modified timestamp differs shows up once
+    expected = {stix_id for stix_id, version in new.versions.items() if old.versions.get(stix_id) != version}
+    expected.update(set(old.versions).difference(new.versions))
+    assert sorted(change.stix_id for change in diff.changes) == sorted(expected)
+    assert [CHANGE_KINDS.index(change.kind) for change in diff.changes] == \
+        sorted(CHANGE_KINDS.index(change.kind) for change in diff.changes)
+
+    old_pairs = {use[:2] for use in old.uses}
+    assert diff.new_group_techniques
+    for group_name, _, tech_id, _ in diff.new_group_techniques:
+        assert tech_id in {tech_id for tech_id, _ in diff.techniques_by_group()[group_name]}
+    assert len(diff.new_group_techniques) == len({use[:2] for use in new.uses}.difference(old_pairs))
+
+    assert not diff_records(new, new, "enterprise").changes
+
+
+def test_new_release_is_diffed_and_searched_like_a_full_rebuild(tmp_path):
+    source = str(tmp_path / "enterprise.json")
+    bundle = generate_bundle(scale=0.1)
+    with open(source, "w", encoding="utf-8") as f:
+        json.dump(bundle, f)
+    cache = SnapshotCache(str(tmp_path / "cache"), offline=True)
+    sources = {"enterprise": source}
+
+    first, _ = load_domains(["enterprise"], sources, cache)
+    assert release_changes(["enterprise"], sources, cache) == {}
+
+    release = next_release(bundle, change_rate=0.2)
+    with open(source, "w", encoding="utf-8") as f:
+        json.dump(release, f)
+    second, _ = load_domains(["enterprise"], sources, cache, previous=first)
+    diff = release_changes(["enterprise"], sources, cache)["enterprise"]
+    assert diff.release["version"] == "1.1"
+    assert diff.counts() == diff_records(parse_objects(bundle["objects"]), parse_objects(release["objects"]),
+                                         "enterprise").counts()
+
+    full = AttackKnowledgeBase.from_records(parse_objects(release["objects"], "enterprise"))
+    for query in ("updated detection", "exfiltration", "T1001"):
+        assert second.search_techniques(query, True) == full.search_techniques(query, True)
+        assert second.search_usages(query) == full.search_usages(query)
@@ -0,0 +1,73 @@
+"""Search ranking: whole words, prefixes and words containing a term, in memory and through a shared store."""
+import pytest
+
+from knowledge_base import AttackKnowledgeBase
+from shared_store import SharedStore, build_store
+
+TECHNIQUES = [
+    ("T1059.001", "PowerShell", "Adversaries may abuse PowerShell commands and scripts."),
+    ("T1059.004", "Unix Shell", "Adversaries may abuse Unix shell commands and a script."),
+    ("T1055", "Process Injection", "Adversaries may inject shellcode into processes."),
+    ("T1003", "OS Credential Dumping", "Adversaries may dump credentials, e.g. from LSASS."),
+]
+
+
+def _bundle():
+    objects = [{"type": "intrusion-set", "id": "intrusion-set--g1", "name": "APT Test",
+                "external_references": [{"source_name": "mitre-attack", "external_id": "G0001"}]}]
+    for number, (tech_id, name, description) in enumerate(TECHNIQUES):
+        objects.append({"type": "attack-pattern", "id": f"attack-pattern--t{number}", "name": name,
+                        "description": description,
+                        "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": "execution"}],
+                        "external_references": [{"source_name": "mitre-attack", "external_id": tech_id}]})
+        objects.append({"type": "relationship", "id": f"relationship--u{number}", "relationship_type": "uses",
+                        "source_ref": "intrusion-set--g1", "target_ref": f"attack-pattern--t{number}",
+                        "description": f"APT Test has used {name} ({tech_id})."})
+    return {"type": "bundle", "id": "bundle--search", "objects": objects}
+
+
+@pytest.fixture(params=["memory", "store"])
+def kb(request, tmp_path):
+    kb = AttackKnowledgeBase.from_bundle(_bundle())
+    if request.param == "store":
+        build_store(kb, str(tmp_path / "store.db"))
+        kb = SharedStore(str(tmp_path / "store.db")).knowledge_base()
+    return kb
+
+
+def _tech_ids(kb, query, include_procedures=False):
+    return [tech.tech_id for tech in kb.search_techniques(query, include_procedures)]
+
+
+def test_whole_words_rank_before_prefixes_and_words_containing_the_term(kb):
+    # "shell" is a word of Unix Shell, inside "PowerShell" (in its name, which weighs more) and starts "shellcode"
+    assert _tech_ids(kb, "shell") == ["T1059.004", "T1059.001", "T1055"]
+    # In the same field, the whole word ranks before a word starting with it
+    assert _tech_ids(kb, "script") == ["T1059.004", "T1059.001"]
+    assert _tech_ids(kb, "owershel") == ["T1059.001"]
+    assert _tech_ids(kb, "lsass dump") == ["T1003"]
+
+
+def test_attack_ids_match_exactly_then_as_a_prefix(kb):
+    assert _tech_ids(kb, "T1059.004") == ["T1059.004"]
+    assert sorted(_tech_ids(kb, "T1059")) == ["T1059.001", "T1059.004"]
+    # The ID of a technique only mentioned in the procedures
+    assert _tech_ids(kb, "t1003", include_procedures=True) == ["T1003"]
+
+
+def test_short_fragments_and_punctuation(kb):
+    # Terms under MIN_INFIX_LENGTH characters only match the start of words
+    assert _tech_ids(kb, "sh") == ["T1059.004", "T1055"]
+    assert _tech_ids(kb, "he") == []
+    # Punctuation is not indexed
+    assert _tech_ids(kb, "(.)") == []
+    assert kb.search_usages("--") == []
+
+
+def test_group_entries_match_on_procedures_and_technique_text(kb):
+    # "apt" is only in the procedures, "shell" in the techniques
+    tech_ids = [kb.usages[position].tech_id for position in kb.search_usages("shell apt")]
+    assert tech_ids[0] == "T1059.004"
+    assert sorted(tech_ids) == ["T1055", "T1059.001", "T1059.004"]
+    first = kb.group_positions["APT Test"][:1]
+    assert kb.search_usages("shell", first) == [first[0]]
@@ -0,0 +1,75 @@
+"""SnapshotCache against a local HTTP stand-in: conditional revalidation and the offline fallbacks."""
+import pytest
+import requests
+
+from snapshot_cache import OfflineError, SnapshotCache
+
+BUNDLE = b'{"type": "bundle", "objects": []}'
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_unchanged_file_is_revalidated_with_a_304(http_stand_in, tmp_path):
+    http_stand_in.files["/enterprise-attack.json"] = BUNDLE
+    url = http_stand_in.url("/enterprise-attack.json")
+    cache = SnapshotCache(str(tmp_path), offline=False)
+
+    path = cache.fetch(url)
+    metadata = cache.read_metadata(url)
+    assert _read(path) == BUNDLE
+    assert metadata["etag"]
+
+    # The second fetch sends the ETag back and keeps the cached body on a 304
+    assert cache.fetch(url) == path
+    assert http_stand_in.requests == [("/enterprise-attack.json", None), ("/enterprise-attack.json", metadata["etag"])]
+    assert _read(path) == BUNDLE
+    assert cache.read_metadata(url)["fetched_at"] == metadata["fetched_at"]
+    assert cache.read_metadata(url)["validated_at"] >= metadata["validated_at"]
+
+
+def test_changed_file_is_downloaded_again(http_stand_in, tmp_path):
+    http_stand_in.files["/enterprise-attack.json"] = BUNDLE
+    url = http_stand_in.url("/enterprise-attack.json")
+    cache = SnapshotCache(str(tmp_path), offline=False)
+    first_hash = cache.content_hash(url, cache.fetch(url))
+
+    http_stand_in.files["/enterprise-attack.json"] = BUNDLE.replace(b"[]", b'[{"type": "x"}]')
+    path = cache.fetch(url)
+    assert _read(path) == http_stand_in.files["/enterprise-attack.json"]
+    assert cache.content_hash(url, path) != first_hash
+
+
+def test_offline_mode_uses_the_cache_without_the_network(http_stand_in, tmp_path):
+    http_stand_in.files["/enterprise-attack.json"] = BUNDLE
+    url = http_stand_in.url("/enterprise-attack.json")
+    SnapshotCache(str(tmp_path), offline=False).fetch(url)
+    requests_before = len(http_stand_in.requests)
+
+    offline = SnapshotCache(str(tmp_path), offline=True)
+    assert _read(offline.fetch(url)) == BUNDLE
+    with pytest.raises(OfflineError):
+        offline.fetch(http_stand_in.url("/mobile-attack.json"))
+    assert len(http_stand_in.requests) == requests_before
+
+
+def test_cached_copy_is_used_when_the_server_fails(http_stand_in, tmp_path):
+    http_stand_in.files["/enterprise-attack.json"] = BUNDLE
+    url = http_stand_in.url("/enterprise-attack.json")
+    cache = SnapshotCache(str(tmp_path), offline=False, timeout=5)
+    path = cache.fetch(url)
+
+    # A server error, then no server at all: the stale copy is better than nothing
+    http_stand_in.statuses["/enterprise-attack.json"] = [503]
+    assert cache.fetch(url) == path
+    http_stand_in.stop()
+    assert _read(cache.fetch(url)) == BUNDLE
+
+
+def test_uncached_file_fails_when_the_server_is_unreachable(http_stand_in, tmp_path):
+    url = http_stand_in.url("/enterprise-attack.json")
+    http_stand_in.stop()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        SnapshotCache(str(tmp_path), offline=False, timeout=5).fetch(url)
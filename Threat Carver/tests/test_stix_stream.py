@@ -0,0 +1,47 @@
+"""Incremental JSON reading: the same documents decoded whatever the block size."""
+import io
+import json
+
+import pytest
+
+from stix_stream import iter_array_items, iter_bundle_objects
+
+ITEMS = [1, 4.5, -2e-3, 10, 1.5e+10, True, False, None, "café → \"quoted\"", [], {},
+         {"technique_id": "T1059.001", "score": 0.75, "tags": [1, 22.5, None], "nested": {"count": -3}}]
+
+BUNDLE = {
+    "type": "bundle",
+    "id": "bundle--stream",
+    "spec_version": 2.1,
+    "objects": [{"type": "attack-pattern", "id": f"attack-pattern--{number}", "name": f"Téchnique {number}",
+                 "x_mitre_version": 1.0 + number / 10, "x_mitre_deprecated": number % 2 == 0}
+                for number in range(5)],
+    "x_count": 12345,
+}
+
+
+def _streams(document):
+    text = json.dumps(document, ensure_ascii=False)
+    return io.BytesIO(text.encode("utf-8")), io.StringIO(text), io.BytesIO(json.dumps(document, indent=2).encode())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7, 8, 64, 1 << 16])
+def test_array_items_do_not_depend_on_the_block_size(chunk_size):
+    for stream in _streams(ITEMS):
+        assert list(iter_array_items(stream, chunk_size)) == ITEMS
+    # A number at the very end of the array
+    assert list(iter_array_items(io.BytesIO(b"[1, 4.5]"), chunk_size)) == [1, 4.5]
+    assert list(iter_array_items(io.BytesIO(b" [ ] "), chunk_size)) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7, 8, 64, 1 << 16])
+def test_bundle_objects_do_not_depend_on_the_block_size(chunk_size):
+    for stream in _streams(BUNDLE):
+        assert list(iter_bundle_objects(stream, chunk_size)) == BUNDLE["objects"]
+
+
+@pytest.mark.parametrize("document", [b"[1, 4.]", b"[1 2]", b"[tru]", b'{"objects": [1}'])
+def test_invalid_documents_are_rejected(document):
+    with pytest.raises(ValueError):
+        list(iter_array_items(io.BytesIO(document), 2) if document.startswith(b"[") else
+             iter_bundle_objects(io.BytesIO(document), 2))
@@ -0,0 +1,37 @@
+"""Paginated tables: the page is kept across reruns and starts again at 1 for other rows."""
+from streamlit.testing.v1 import AppTest
+
+
+def _table_page():
+    import streamlit as st
+
+    from table_view import paginate
+
+    rows = paginate(list(range(st.session_state.get("row_count", 120))), {"Default": None}, key="numbers")
+    st.write(rows[:1])
+
+
+def test_page_is_kept_until_the_rows_change():
+    app = AppTest.from_function(_table_page)
+    app.run()
+    assert app.number_input(key="numbers_page").value == 1
+
+    app.number_input(key="numbers_page").set_value(3).run()
+    assert not app.exception
+    assert app.caption[0].value == "Showing rows 101–120 of 120"
+    # Sorting reruns the page without changing the rows
+    app.selectbox(key="numbers_order").set_value("Descending").run()
+    assert app.number_input(key="numbers_page").value == 3
+
+    # Fewer rows (e.g. a narrower search): page 1 again
+    app.session_state["row_count"] = 30
+    app.run()
+    assert not app.exception
+    assert app.number_input(key="numbers_page").value == 1
+    assert app.caption[0].value == "Showing rows 1–30 of 30"
+
+    app.session_state["row_count"] = 120
+    app.run()
+    app.number_input(key="numbers_page").set_value(2).run()
+    app.selectbox(key="numbers_size").set_value(100).run()
+    assert app.number_input(key="numbers_page").value == 1
@@ -0,0 +1,97 @@
+import pandas as pd
+import streamlit as st
+
+from knowledge_base import DOMAIN_LABELS, release_changes
+from release_diff import CHANGE_KINDS
+
+
+def _release_label(release):
+    """Format a release as "Enterprise ATT&CK v16.0 (2024-10-31)"."""
+    if not release:
+        return "unknown release"
+    label = release.get("name") or "ATT&CK"
+    if release.get("version"):
+        label += f" v{release['version']}"
+    if release.get("modified"):
+        label += f" ({release['modified'][:10]})"
+    return label
+
+
+def display_whats_new_page(knowledge_base):
+    """
+    Display the What's New page: what changed in the last ATT&CK release loaded of each domain.
+
+    Args:
+        knowledge_base (AttackKnowledgeBase): The parsed MITRE ATT&CK data
+    """
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-header">🆕 What Changed Since the Last Version</div>', unsafe_allow_html=True)
+
+    changes = release_changes(knowledge_base.domains)
+    if not changes:
+        st.markdown('<div class="alert alert-info">No earlier ATT&CK release has been loaded on this server yet. '
+                    'Changes are listed here once a new release of a bundle is fetched.</div>',
+                    unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+
+    domain = st.selectbox("Domain", list(changes), format_func=lambda name: DOMAIN_LABELS.get(name, name))
+    diff = changes[domain]
+    st.markdown(f"**{_release_label(diff.previous_release)}** → **{_release_label(diff.release)}**")
+
+    # Number of changed objects of each kind
+    counts = diff.counts()
+    for column, kind in zip(st.columns(len(CHANGE_KINDS)), CHANGE_KINDS):
+        column.metric(kind.capitalize(), counts[kind])
+
+    # New techniques per group
+    st.markdown("### 👥 New Techniques per Group")
+    by_group = diff.techniques_by_group()
+    if by_group:
+        group_ids = {group_name: group_id for group_name, group_id, _, _ in diff.new_group_techniques}
+        st.dataframe(pd.DataFrame([{
+            "Group": group_name,
+            "Group ID": group_ids[group_name],
+            "New Techniques": len(techniques),
+            "Technique IDs": ", ".join(tech_id for tech_id, _ in techniques)
+        } for group_name, techniques in by_group.items()]).sort_values(
+            ["New Techniques", "Group"], ascending=[False, True]),
+            use_container_width=True, hide_index=True)
+
+        selected_group = st.selectbox("Show the new techniques of", sorted(by_group))
+        st.dataframe([{"Technique ID": tech_id, "Technique": tech_name}
+                      for tech_id, tech_name in by_group[selected_group]],
+                     use_container_width=True, hide_index=True)
+    else:
+        st.markdown('<div class="alert alert-info">No group gained techniques in this release.</div>',
+                    unsafe_allow_html=True)
+
+    # Every changed object
+    st.markdown("### 📋 All Changes")
+    col1, col2 = st.columns(2)
+    with col1:
+        kinds = st.multiselect("Kind of change", CHANGE_KINDS, default=[kind for kind in CHANGE_KINDS if counts[kind]],
+                               format_func=str.capitalize)
+    with col2:
+        object_types = sorted({change.object_type for change in diff.changes})
+        selected_types = st.multiselect("Object type", object_types, default=object_types)
+    rows = pd.DataFrame([{
+        "Change": change.kind.capitalize(),
+        "Type": change.object_type,
+        "ATT&CK ID": change.attack_id,
+        "Name": change.name,
+        "Group": change.group or "",
+        "STIX ID": change.stix_id
+    } for change in diff.changes if change.kind in kinds and change.object_type in selected_types])
+    if rows.empty:
+        st.markdown('<div class="alert alert-info">No changes match the filters.</div>', unsafe_allow_html=True)
+    else:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        st.download_button(
+            label="📥 Download Changes as CSV",
+            data=rows.to_csv(index=False),
+            file_name=f"attack_{domain}_changes.csv",
+            mime="text/csv",
+        )
+
+    st.markdown('</div>', unsafe_allow_html=True)